@@ -0,0 +1,41 @@
+"""unique communication gmail message
+
+Revision ID: 4d1e7a2c9b30
+Revises: b0c7c3b8ce21
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d1e7a2c9b30'
+down_revision: Union[str, None] = 'b0c7c3b8ce21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Remove duplicate synced messages, keeping the first copy of each
+    op.execute("""
+        DELETE FROM communications
+        WHERE gmail_message_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM communications
+              WHERE gmail_message_id IS NOT NULL
+              GROUP BY user_id, gmail_message_id
+          )
+    """)
+
+    op.create_index(
+        'uq_communications_user_gmail_message',
+        'communications',
+        ['user_id', 'gmail_message_id'],
+        unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_communications_user_gmail_message', table_name='communications')
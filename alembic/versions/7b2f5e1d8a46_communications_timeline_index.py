@@ -0,0 +1,38 @@
+"""communications timeline index
+
+Revision ID: 7b2f5e1d8a46
+Revises: 4d1e7a2c9b30
+Create Date: 2026-10-18 11:40:05.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2f5e1d8a46'
+down_revision: Union[str, None] = '4d1e7a2c9b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The timeline pages on date_sent, which must not be NULL, so give older
+    # rows without one their record date (or the time of the upgrade)
+    op.execute("UPDATE communications SET date_sent = COALESCE(date, CURRENT_TIMESTAMP) WHERE date_sent IS NULL")
+    with op.batch_alter_table('communications') as batch_op:
+        batch_op.alter_column('date_sent', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index(
+        'ix_communications_user_date_sent_id',
+        'communications',
+        ['user_id', 'date_sent', 'id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_communications_user_date_sent_id', table_name='communications')
+    with op.batch_alter_table('communications') as batch_op:
+        batch_op.alter_column('date_sent', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,41 @@
+"""communications full text search
+
+Revision ID: 9e4c3a7f2b15
+Revises: 7b2f5e1d8a46
+Create Date: 2026-10-18 13:05:47.661209
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from models import COMMUNICATION_SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4c3a7f2b15'
+down_revision: Union[str, None] = '7b2f5e1d8a46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for statement in COMMUNICATION_SEARCH_DDL.get(dialect, []):
+        op.execute(statement)
+
+    if dialect == 'sqlite':
+        # Index the communications that already exist
+        op.execute("INSERT INTO communications_fts(communications_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS communications_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS communications_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS communications_fts_insert")
+        op.execute("DROP TABLE IF EXISTS communications_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_communications_search_vector")
+        op.execute("ALTER TABLE communications DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,62 @@
+"""route query indexes
+
+Revision ID: a7c3e9d5f182
+Revises: f2c6d8b1a347
+Create Date: 2026-10-18 21:14:52.603118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9d5f182'
+down_revision: Union[str, None] = 'f2c6d8b1a347'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index, table, columns), each matched to the route queries that filter on it;
+# scripts/check_query_plans.py checks those queries use them
+INDEXES = [
+    ('ix_contacts_email', 'contacts', ['email']),
+    ('ix_people_user_id', 'people', ['user_id']),
+    ('ix_people_church_id', 'people', ['church_id']),
+    ('ix_churches_office_id', 'churches', ['office_id']),
+    ('ix_churches_main_contact_id', 'churches', ['main_contact_id']),
+    ('ix_tasks_user_status_due_date', 'tasks', ['user_id', 'status', 'due_date']),
+    ('ix_tasks_person_id', 'tasks', ['person_id']),
+    ('ix_tasks_church_id', 'tasks', ['church_id']),
+    ('ix_communications_person_date_sent', 'communications', ['person_id', 'date_sent']),
+    ('ix_communications_church_date_sent', 'communications', ['church_id', 'date_sent']),
+    ('ix_communications_gmail_message_id', 'communications', ['gmail_message_id']),
+    ('ix_email_signatures_user_default', 'email_signatures', ['user_id', 'is_default']),
+    ('ix_user_offices_user_office', 'user_offices', ['user_id', 'office_id']),
+    ('ix_user_offices_office_id', 'user_offices', ['office_id']),
+]
+
+# Created by the old add_index.py script and covered by the indexes above
+# and ix_communications_user_date_sent_id
+LEGACY_INDEXES = ['idx_comm_user_date', 'idx_comm_gmail_id']
+
+
+def upgrade() -> None:
+    for name in LEGACY_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    # Databases created by create_all already have the indexes on new tables
+    inspector = sa.inspect(op.get_bind())
+    existing = {}
+    for table in {table for _, table, _ in INDEXES}:
+        existing[table] = {index['name'] for index in inspector.get_indexes(table)}
+
+    for name, table, columns in INDEXES:
+        if name not in existing[table]:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,41 @@
+"""task due date detail indexes
+
+Revision ID: b4d8f1e6c205
+Revises: a7c3e9d5f182
+Create Date: 2026-10-18 23:02:17.840531
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d8f1e6c205'
+down_revision: Union[str, None] = 'a7c3e9d5f182'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Detail pages read a contact's latest due tasks, so due_date joins the key
+# (old index, new index, columns)
+REPLACED_INDEXES = [
+    ('ix_tasks_person_id', 'ix_tasks_person_due_date', ['person_id', 'due_date']),
+    ('ix_tasks_church_id', 'ix_tasks_church_due_date', ['church_id', 'due_date']),
+]
+
+
+def upgrade() -> None:
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('tasks')}
+    for old, new, columns in REPLACED_INDEXES:
+        if new not in existing:
+            op.create_index(new, 'tasks', columns, unique=False)
+        if old in existing:
+            op.drop_index(old, table_name='tasks')
+
+
+def downgrade() -> None:
+    for old, new, columns in REPLACED_INDEXES:
+        op.create_index(old, 'tasks', columns[:1], unique=False)
+        op.drop_index(new, table_name='tasks')
@@ -0,0 +1,39 @@
+"""contact search index
+
+Revision ID: c3d8e6a1f4b7
+Revises: 9e4c3a7f2b15
+Create Date: 2026-10-18 14:22:10.384512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from models import CONTACT_SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d8e6a1f4b7'
+down_revision: Union[str, None] = '9e4c3a7f2b15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # On SQLite the last statement fills the new index from existing contacts
+    for statement in CONTACT_SEARCH_DDL.get(op.get_bind().dialect.name, []):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('churches_fts_update', 'churches_fts_insert', 'contacts_fts_delete',
+                        'contacts_fts_update', 'contacts_fts_insert'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_churches_pastor_search_text_trgm")
+        op.execute("ALTER TABLE churches DROP COLUMN IF EXISTS pastor_search_text")
+        op.execute("DROP INDEX IF EXISTS ix_contacts_search_text_trgm")
+        op.execute("ALTER TABLE contacts DROP COLUMN IF EXISTS search_text")
@@ -0,0 +1,97 @@
+"""pipeline rollups
+
+Revision ID: d5a1f9c2e846
+Revises: c3d8e6a1f4b7
+Create Date: 2026-10-18 16:05:48.911203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a1f9c2e846'
+down_revision: Union[str, None] = 'c3d8e6a1f4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Counts each contact as entering its current bucket on its last modified day,
+# with labels normalised as in utils.pipeline_rollups
+BACKFILL_SQL = """
+    INSERT INTO pipeline_rollups
+        (contact_type, office_id, user_id, pipeline_stage, priority, assigned_to, day, entered, exited)
+    SELECT '{contact_type}', {office_id}, {user_id}, {stage}, {priority}, {assigned_to}, {day}, COUNT(*), 0
+    FROM {source}
+    WHERE contacts.type = '{contact_type}'
+    GROUP BY {office_id}, {user_id}, {stage}, {priority}, {assigned_to}, {day}
+"""
+
+
+def _label(column):
+    return f"UPPER(TRIM(COALESCE({column}, '')))"
+
+
+def _backfill(contact_type, table, stage, user_id, source):
+    op.execute(BACKFILL_SQL.format(
+        contact_type=contact_type,
+        office_id='COALESCE(churches.office_id, 0)',
+        user_id=user_id,
+        stage=_label(f'{table}.{stage}'),
+        priority=_label(f'{table}.priority'),
+        assigned_to=_label(f'{table}.assigned_to'),
+        day='DATE(COALESCE(contacts.date_modified, contacts.date_created, CURRENT_DATE))',
+        source=source,
+    ))
+
+
+def upgrade() -> None:
+    # Databases created by create_all already have the table and its indexes, but no rows
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'pipeline_rollups' not in inspector.get_table_names():
+        op.create_table(
+            'pipeline_rollups',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('contact_type', sa.String(length=50), nullable=False),
+            sa.Column('office_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.String(length=128), nullable=False),
+            sa.Column('pipeline_stage', sa.String(length=100), nullable=False),
+            sa.Column('priority', sa.String(length=100), nullable=False),
+            sa.Column('assigned_to', sa.String(length=100), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('entered', sa.Integer(), nullable=False),
+            sa.Column('exited', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        indexes = set()
+    else:
+        indexes = {index['name'] for index in inspector.get_indexes('pipeline_rollups')}
+
+    if 'uq_pipeline_rollups_bucket_day' not in indexes:
+        op.create_index(
+            'uq_pipeline_rollups_bucket_day',
+            'pipeline_rollups',
+            ['contact_type', 'office_id', 'user_id', 'pipeline_stage', 'priority', 'assigned_to', 'day'],
+            unique=True
+        )
+    if 'ix_pipeline_rollups_type_day' not in indexes:
+        op.create_index('ix_pipeline_rollups_type_day', 'pipeline_rollups', ['contact_type', 'day'])
+
+    if bind.execute(sa.text("SELECT COUNT(*) FROM pipeline_rollups")).scalar():
+        return
+
+    # Fill the rollups from the existing contacts; people take their church's office
+    _backfill('person', 'people', 'people_pipeline', "COALESCE(people.user_id, '')",
+              'people JOIN contacts ON contacts.id = people.id '
+              'LEFT JOIN churches ON churches.id = people.church_id')
+    _backfill('church', 'churches', 'church_pipeline', "''",
+              'churches JOIN contacts ON contacts.id = churches.id')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pipeline_rollups_type_day', table_name='pipeline_rollups')
+    op.drop_index('uq_pipeline_rollups_bucket_day', table_name='pipeline_rollups')
+    op.drop_table('pipeline_rollups')
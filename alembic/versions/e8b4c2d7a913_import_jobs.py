@@ -0,0 +1,50 @@
+"""import jobs
+
+Revision ID: e8b4c2d7a913
+Revises: d5a1f9c2e846
+Create Date: 2026-10-18 17:32:14.508326
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b4c2d7a913'
+down_revision: Union[str, None] = 'd5a1f9c2e846'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases created by create_all already have the table
+    if 'import_jobs' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'import_jobs',
+            sa.Column('id', sa.String(length=36), nullable=False),
+            sa.Column('user_id', sa.String(length=128), nullable=False),
+            sa.Column('contact_type', sa.String(length=50), nullable=False),
+            sa.Column('source', sa.String(length=50), nullable=False, server_default='csv'),
+            sa.Column('filename', sa.String(length=255), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('total_bytes', sa.Integer(), nullable=False),
+            sa.Column('processed_bytes', sa.Integer(), nullable=False),
+            sa.Column('rows_processed', sa.Integer(), nullable=False),
+            sa.Column('rows_imported', sa.Integer(), nullable=False),
+            sa.Column('rows_failed', sa.Integer(), nullable=False),
+            sa.Column('errors', sa.Text(), nullable=True),
+            sa.Column('message', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade() -> None:
+    # The table only exists for this revision's model, whichever of the
+    # migration or create_all made it
+    if 'import_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        op.drop_table('import_jobs')
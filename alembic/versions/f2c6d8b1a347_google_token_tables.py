@@ -0,0 +1,72 @@
+"""google token tables
+
+Revision ID: f2c6d8b1a347
+Revises: e8b4c2d7a913
+Create Date: 2026-10-18 19:05:41.227913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6d8b1a347'
+down_revision: Union[str, None] = 'e8b4c2d7a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Token storage used to create these tables on first use, so they may
+    # already exist, possibly without the newer columns
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if 'google_tokens' not in tables:
+        op.create_table(
+            'google_tokens',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('user_id', sa.String(), nullable=False),
+            sa.Column('user_email', sa.String(), nullable=True),
+            sa.Column('token', sa.String(), nullable=True),
+            sa.Column('refresh_token', sa.String(), nullable=True),
+            sa.Column('token_uri', sa.String(), nullable=True),
+            sa.Column('client_id', sa.String(), nullable=True),
+            sa.Column('client_secret', sa.String(), nullable=True),
+            sa.Column('scopes', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    else:
+        columns = {column['name'] for column in inspector.get_columns('google_tokens')}
+        if 'user_email' not in columns:
+            op.add_column('google_tokens', sa.Column('user_email', sa.String(), nullable=True))
+
+    indexes = set()
+    if 'google_tokens' in tables:
+        indexes = {index['name'] for index in inspector.get_indexes('google_tokens')}
+    if 'ix_google_tokens_user_updated' not in indexes:
+        op.create_index('ix_google_tokens_user_updated', 'google_tokens', ['user_id', 'updated_at'], unique=False)
+
+    if 'google_sync_state' not in tables:
+        op.create_table(
+            'google_sync_state',
+            sa.Column('user_id', sa.String(), nullable=False),
+            sa.Column('gmail_history_id', sa.String(), nullable=True),
+            sa.Column('calendar_sync_token', sa.String(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('user_id')
+        )
+    else:
+        columns = {column['name'] for column in inspector.get_columns('google_sync_state')}
+        if 'calendar_sync_token' not in columns:
+            op.add_column('google_sync_state', sa.Column('calendar_sync_token', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    # The tables hold users' stored OAuth tokens and sync cursors, and token
+    # storage created them before this revision, so only the index is dropped
+    op.drop_index('ix_google_tokens_user_updated', table_name='google_tokens')
@@ -8,7 +8,7 @@ import logging
 from datetime import datetime
 import sys
 import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import credentials
 import os
 import base64
 import json
@@ -34,6 +34,10 @@ try:
     
     # Initialize database
     init_db(app)
+
+    # Count queries and log slow ones per request
+    from utils.query_stats import init_query_stats
+    init_query_stats(app)
     
     # Initialize Firebase Admin SDK
     try:
@@ -100,7 +104,10 @@ try:
     from routes.gmail_api import gmail_api
     from routes.import_csv import import_csv_bp
     from routes.offices_admin import offices_admin_bp
+    from routes.analytics import analytics_bp
     from utils.background_jobs import start_background_jobs
+    from utils.auth import get_request_user, get_current_user_id
+    from utils.access_context import get_access_context
 
     # Register blueprints
     app.register_blueprint(dashboard_bp, url_prefix='/')
@@ -117,6 +124,7 @@ try:
     app.register_blueprint(gmail_api, url_prefix='/api/gmail')
     app.register_blueprint(import_csv_bp, url_prefix='/import')
     app.register_blueprint(offices_admin_bp, url_prefix='/admin')
+    app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
 
     # Initialize Flask-Migrate
     migrate = Migrate(app, Base)
@@ -150,17 +158,8 @@ try:
     @app.context_processor
     def inject_user_offices():
         """Inject user_offices into all templates."""
-        def get_user_offices():
-            # For now, return a simple list with hardcoded values to ensure the admin panel shows up
-            return [
-                {
-                    'office': {'name': 'USA Office', 'id': 1},
-                    'role': 'super_admin',
-                    'office_id': 1
-                }
-            ]
-        
-        return dict(user_offices=get_user_offices())
+        # Answered from the user's cached access context, not a query per render
+        return dict(user_offices=get_access_context(get_current_user_id()).offices())
 
     # Error handlers
     @app.errorhandler(404)
@@ -181,25 +180,10 @@ try:
 
     @app.route('/')
     def home():
-        # Check if user is authenticated
-        auth_header = request.headers.get('Authorization')
-        token = None
-        
-        # Check Authorization header
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split('Bearer ')[1]
-            
-        # If no auth header, check cookie
-        if not token:
-            token = request.cookies.get('firebase_token')
-            
-        if token:
-            try:
-                decoded_token = auth.verify_id_token(token)
-                app.logger.info("Valid token found, redirecting to dashboard")
-                return redirect(url_for('dashboard_bp.dashboard'))
-            except Exception as e:
-                app.logger.warning(f"Token verification failed: {str(e)}")
+        # Check if user is authenticated (Authorization header, then cookie)
+        if get_request_user():
+            app.logger.info("Valid token found, redirecting to dashboard")
+            return redirect(url_for('dashboard_bp.dashboard'))
                 
         # If not authenticated or token invalid, show landing page
         return render_template('landing.html')
@@ -0,0 +1,9 @@
+"""
+Load-test benchmarks for Mobilize CRM
+
+synthetic_data seeds a database with production-sized volumes, fakes
+stands in for Firebase and the Google APIs, and run drives the Flask app
+through its busiest endpoints and reports latency and query counts:
+
+    python -m benchmarks.run --scale 0.1
+"""
@@ -0,0 +1,166 @@
+"""
+Stand-ins for Firebase and the Google APIs during benchmarks
+
+Only the network calls are replaced: Gmail sync still matches messages to
+contacts and writes them through the normal code, and the Google contacts
+routes still page, parse and import what the fake People API returns.
+"""
+from contextlib import ExitStack, contextmanager
+from email.utils import format_datetime
+from datetime import datetime, timedelta
+import itertools
+import random
+import time
+from unittest import mock
+
+
+class FakeMailbox:
+    """A Gmail mailbox that receives new mail from contacts before every sync.
+
+    Each sync finds messages_per_sync new messages, a tenth of them from
+    addresses that are not contacts, plus a few it has already returned so
+    the already-synced check has work to do.
+    """
+
+    def __init__(self, contact_emails, user_email, messages_per_sync=50, seed=7):
+        self.contact_emails = list(contact_emails) or ['nobody@example.com']
+        self.user_email = user_email
+        self.messages_per_sync = messages_per_sync
+        self.history_id = 1000
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._messages = {}
+        self._returned = []
+
+    def _receive(self):
+        new_ids = []
+        for _ in range(self.messages_per_sync):
+            msg_id = f'fake{next(self._ids):08x}'
+            known = self._rng.random() < 0.9
+            contact = self._rng.choice(self.contact_emails) if known else f'stranger{msg_id}@example.net'
+            inbound = self._rng.random() < 0.5
+            sent = datetime.now() - timedelta(minutes=self._rng.randint(0, 600))
+            self._messages[msg_id] = {
+                'id': msg_id,
+                'thread_id': f'thread-{msg_id}',
+                'subject': f'Benchmark message {msg_id}',
+                'from': contact if inbound else self.user_email,
+                'to': self.user_email if inbound else contact,
+                'body': 'Hello from the benchmark mailbox',
+                'date': format_datetime(sent.astimezone()),
+            }
+            new_ids.append(msg_id)
+        self.history_id += 1
+        repeats = self._returned[-5:]
+        self._returned.extend(new_ids)
+        return [{'id': msg_id} for msg_id in new_ids + repeats]
+
+    # utils.gmail_integration replacements, patched into utils.gmail_sync
+
+    def build_service(self, token, user_id=None):
+        return self
+
+    def get_user_email(self, access_token, user_id):
+        return self.user_email
+
+    def get_mailbox_history_id(self, service, user_id):
+        return str(self.history_id)
+
+    def list_messages(self, service, user_id, query='', max_results=None):
+        messages = self._receive()
+        return messages[:max_results] if max_results else messages
+
+    def list_history_message_ids(self, service, user_id, start_history_id):
+        return [message['id'] for message in self._receive()], str(self.history_id)
+
+    def iter_message_contents(self, service, user_id, msg_ids, **kwargs):
+        for msg_id in msg_ids:
+            yield self._messages[msg_id]
+
+    @contextmanager
+    def installed(self):
+        """Patch Gmail sync to read from this mailbox"""
+        with mock.patch.multiple(
+            'utils.gmail_sync',
+            build_gmail_service=self.build_service,
+            _get_google_user_email=self.get_user_email,
+            get_mailbox_history_id=self.get_mailbox_history_id,
+            list_messages=self.list_messages,
+            list_history_message_ids=self.list_history_message_ids,
+            iter_message_contents=self.iter_message_contents,
+        ):
+            yield self
+
+
+class _Request:
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class FakePeopleService:
+    """The parts of a People API client used by utils.google_contacts.
+
+    Serves count generated connections in pages. A request with a sync token
+    returns the last changed_per_sync connections as changes.
+    """
+
+    def __init__(self, count=2000, changed_per_sync=10):
+        self.connections_list = [{
+            'resourceName': f'people/c{n:06d}',
+            'names': [{'displayName': f'Google Contact {n}'}],
+            'emailAddresses': [{'value': f'google.contact.{n}@example.com'}],
+            'phoneNumbers': [{'value': f'555-01{n % 100:02d}'}],
+            'addresses': [{'formattedValue': f'{n} Main St, Springfield, IL 62701'}],
+            'memberships': [],
+        } for n in range(count)]
+        self.changed_per_sync = changed_per_sync
+
+    def people(self):
+        return self
+
+    def connections(self):
+        return self
+
+    def contactGroups(self):
+        return _ContactGroups()
+
+    def list(self, pageSize=1000, pageToken=None, syncToken=None, **params):
+        if syncToken:
+            return _Request({'connections': self.connections_list[-self.changed_per_sync:],
+                             'nextSyncToken': 'sync-next'})
+        start = int(pageToken or 0)
+        end = start + pageSize
+        result = {'connections': self.connections_list[start:end]}
+        if end < len(self.connections_list):
+            result['nextPageToken'] = str(end)
+        else:
+            result['nextSyncToken'] = 'sync-1'
+        return _Request(result)
+
+    def getBatchGet(self, resourceNames, **params):
+        by_name = {person['resourceName']: person for person in self.connections_list}
+        return _Request({'responses': [{'person': by_name[name]} for name in resourceNames if name in by_name]})
+
+
+class _ContactGroups:
+    def list(self, **params):
+        return _Request({'contactGroups': [{'resourceName': 'contactGroups/friends', 'name': 'Friends'}]})
+
+
+@contextmanager
+def firebase_signed_in(user_id):
+    """
+    Skip Firebase Admin setup and accept any ID token as user_id
+
+    The app initializes Firebase at import from a credentials file, so this
+    must be active while the app module is imported.
+    """
+    decoded = {'uid': user_id, 'email': f'{user_id}@example.com', 'exp': time.time() + 86400}
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch('firebase_admin.initialize_app'))
+        stack.enter_context(mock.patch('firebase_admin.credentials.Certificate'))
+        stack.enter_context(mock.patch('firebase_admin.auth.verify_id_token', return_value=decoded))
+        yield decoded
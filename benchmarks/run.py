@@ -0,0 +1,322 @@
+"""
+Benchmark the CRM's busiest endpoints against a seeded database
+
+Seeds the database with synthetic data when it is empty, loads the Flask app
+with Firebase and the Google APIs faked (see benchmarks.fakes), then drives
+the test client through the dashboard, list, detail, search and sync paths.
+Reports p50/p95 latency and SQL query counts per endpoint. Save a run with
+--json and pass it back as --baseline to flag regressions.
+
+Usage:
+    python -m benchmarks.run                                   # full volumes in instance/benchmark.db
+    python -m benchmarks.run --scale 0.05 --iterations 10      # quick run on a small dataset
+    python -m benchmarks.run --database-url postgresql://localhost/crm_bench --json results.json
+    python -m benchmarks.run --baseline results.json           # exit 1 if an endpoint got slower
+"""
+from contextlib import ExitStack
+from unittest import mock
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add parent directory to path so we can import from the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.pardir, 'instance', 'benchmark.db'))
+
+# auth_required signs every request in as this user, so the data is seeded for them
+SIGNED_IN_USER = 'CVjBoi6rGMazZ3J6vAAtu1hra4H2'
+SIGNED_IN_EMAIL = 'bench.user@example.com'
+
+# Contacts sent to the bulk Google import per request
+IMPORT_BATCH = 100
+
+
+def percentile(values, pct):
+    """Linearly interpolated percentile (0-100) of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples):
+    """
+    Latency and query statistics for one endpoint
+
+    Args:
+        samples: (status_code, seconds, queries) per request
+
+    Returns:
+        dict: requests, errors, statuses, p50_ms, p95_ms, max_ms, queries and max_queries
+    """
+    timings = [seconds * 1000 for _, seconds, _ in samples]
+    queries = [count for _, _, count in samples]
+    statuses = {}
+    for status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for status, _, _ in samples if status >= 400),
+        'statuses': statuses,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': statistics.median(queries),
+        'max_queries': max(queries),
+    }
+
+
+def compare(results, baseline, max_regression=0.25, min_delta_ms=5.0):
+    """
+    Endpoints that got slower or run more queries than in a baseline run
+
+    A p95 counts as slower when it is both max_regression (a fraction) and
+    min_delta_ms above the baseline, so noise on fast endpoints is ignored.
+
+    Returns:
+        list: Description of each regression
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if (current['p95_ms'] > before['p95_ms'] * (1 + max_regression)
+                and current['p95_ms'] - before['p95_ms'] > min_delta_ms):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {current['queries']}")
+    return regressions
+
+
+def format_report(results, baseline=None):
+    """Plain-text table of the results, with p95 change against a baseline if given"""
+    header = f"{'endpoint':<26}{'reqs':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'queries':>9}{'max q':>7}"
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    lines = [header, '-' * len(header)]
+    for name, result in results.items():
+        line = (f"{name:<26}{result['requests']:>6}{result['errors']:>8}{result['p50_ms']:>10.1f}"
+                f"{result['p95_ms']:>10.1f}{result['max_ms']:>10.1f}{result['queries']:>9g}{result['max_queries']:>7}")
+        if baseline:
+            before = baseline.get(name)
+            change = f"{(result['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%" if before and before['p95_ms'] else 'new'
+            line += f"{change:>13}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class BenchmarkContext:
+    """Ids and fakes the scenarios draw their requests from"""
+
+    def __init__(self, session, people_service, seed=1):
+        from models import Church, Person, UserOffice
+        self.rng = random.Random(seed)
+        self.people_service = people_service
+        self.import_offset = 0
+
+        user_people = session.query(Person.id, Person.last_name, Person.church_id)\
+            .filter(Person.user_id == SIGNED_IN_USER).limit(2000).all()
+        if not user_people:
+            raise RuntimeError(f"No people belong to {SIGNED_IN_USER}; seed the database for that user")
+        self.person_ids = [row.id for row in user_people]
+        self.church_ids = sorted({row.church_id for row in user_people if row.church_id}) or \
+            [church_id for church_id, in session.query(Church.id).limit(100)]
+        self.last_names = sorted({row.last_name for row in user_people})
+        self.office_id = session.query(UserOffice.office_id).filter_by(user_id=SIGNED_IN_USER).scalar()
+        self.search_words = ['mission', 'prayer', 'conference', 'newsletter', 'volunteer']
+
+    def pick(self, values):
+        return self.rng.choice(values)
+
+    def next_import_batch(self):
+        connections = self.people_service.connections_list
+        start = self.import_offset % len(connections)
+        self.import_offset += IMPORT_BATCH
+        return [{
+            'resource_name': person['resourceName'],
+            'names': person['names'][0]['displayName'],
+            'email_addresses': [email['value'] for email in person['emailAddresses']],
+            'phone_numbers': [phone['value'] for phone in person['phoneNumbers']],
+            'addresses': [address['formattedValue'] for address in person['addresses']],
+        } for person in connections[start:start + IMPORT_BATCH]]
+
+
+def _google_headers():
+    return {'Authorization': 'Bearer benchmark-token', 'X-Google-Token': 'benchmark-access-token'}
+
+
+# (name, function(ctx, url_for) -> (method, url, request keyword arguments))
+SCENARIOS = [
+    ('dashboard', lambda ctx, url_for: ('GET', url_for('dashboard_bp.dashboard'), {})),
+    ('dashboard summary', lambda ctx, url_for: ('GET', url_for('dashboard_bp.dashboard_summary'), {})),
+    ('people list', lambda ctx, url_for: ('GET', url_for('people_bp.list_people'), {})),
+    ('people api page', lambda ctx, url_for: ('GET', url_for('people_bp.people_api', limit=50), {})),
+    ('people search', lambda ctx, url_for: ('GET', url_for('people_bp.people_api', q=ctx.pick(ctx.last_names)), {})),
+    ('person detail', lambda ctx, url_for: ('GET', url_for('people_bp.person_detail',
+                                                           person_id=ctx.pick(ctx.person_ids)), {})),
+    ('person lookup', lambda ctx, url_for: ('GET', url_for('people_bp.person_lookup',
+                                                           q=ctx.pick(ctx.last_names)[:3]), {})),
+    ('churches list', lambda ctx, url_for: ('GET', url_for('churches_bp.list_churches',
+                                                           office_id=ctx.office_id), {})),
+    ('church detail', lambda ctx, url_for: ('GET', url_for('churches_bp.view_church',
+                                                           church_id=ctx.pick(ctx.church_ids)), {})),
+    ('tasks list', lambda ctx, url_for: ('GET', url_for('tasks_bp.tasks'), {})),
+    ('communications timeline', lambda ctx, url_for: ('GET', url_for('communications_bp.communications_route'), {})),
+    ('communications search', lambda ctx, url_for: ('GET', url_for('communications_bp.search_communications',
+                                                                   q=ctx.pick(ctx.search_words)), {})),
+    ('contact search', lambda ctx, url_for: ('GET', url_for('contacts_api.search_contacts_api',
+                                                            q=ctx.pick(ctx.last_names)[:4]), {})),
+    ('pipeline funnel', lambda ctx, url_for: ('GET', url_for('analytics_bp.funnel'), {})),
+    ('gmail sync', lambda ctx, url_for: ('POST', url_for('gmail_api.sync_emails'), {
+        'headers': _google_headers(), 'json': {'user_email': SIGNED_IN_EMAIL}})),
+    ('google contacts list', lambda ctx, url_for: ('POST', url_for('contacts_api.list_contacts'), {
+        'headers': _google_headers(), 'json': {'access_token': 'benchmark-access-token'}})),
+    ('google contacts import', lambda ctx, url_for: ('POST', url_for('contacts_api.import_contacts_bulk'), {
+        'headers': _google_headers(), 'json': {'import_type': 'person', 'contacts': ctx.next_import_batch()}})),
+]
+
+
+def run_scenarios(app, ctx, scenarios=SCENARIOS, iterations=20, warmup=2):
+    """
+    Send each scenario's requests through the test client
+
+    Returns:
+        dict: summarize() result per scenario name, in scenario order
+    """
+    from utils.query_stats import count_queries
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = SIGNED_IN_USER
+        session['user_email'] = SIGNED_IN_EMAIL
+
+    results = {}
+    for name, build in scenarios:
+        samples = []
+        for n in range(warmup + iterations):
+            with app.test_request_context():
+                from flask import url_for
+                method, url, kwargs = build(ctx, url_for)
+            with count_queries() as stats:
+                started = time.perf_counter()
+                response = client.open(url, method=method, **kwargs)
+                elapsed = time.perf_counter() - started
+            queries = stats.count
+            if response.status_code >= 500 and n == 0:
+                logger.warning(f"{name}: {method} {url} returned {response.status_code}")
+            if n >= warmup:
+                samples.append((response.status_code, elapsed, queries))
+        results[name] = summarize(samples)
+        logger.info(f"{name}: p50 {results[name]['p50_ms']}ms, p95 {results[name]['p95_ms']}ms")
+    return results
+
+
+def load_app(stack):
+    """
+    Import the Flask app with Firebase faked and background jobs off
+
+    The fakes stay active until the stack is closed.
+    """
+    stack.enter_context(mock.patch('utils.background_jobs.start_background_jobs'))
+    import app as app_module
+    app = app_module.app
+    if 'dashboard_bp' not in app.blueprints:
+        raise RuntimeError("The app failed to initialize; see the output above")
+    # Request logging at INFO would dominate the timings
+    app.logger.setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Mobilize CRM endpoints against synthetic data')
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL,
+                        help='Database to seed (when empty) and benchmark (default: instance/benchmark.db)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Fraction of the full dataset to seed: 1.0 is 100k people and 1M communications')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint first')
+    parser.add_argument('--only', action='append', help='Benchmark only this endpoint (repeatable)')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Results file from an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='Allowed p95 slowdown against the baseline, as a fraction (default: 0.25)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    # The app reads its database from the environment when it is imported
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['DB_CONNECTION_STRING'] = args.database_url
+
+    from benchmarks.fakes import FakeMailbox, FakePeopleService, firebase_signed_in
+    from benchmarks.synthetic_data import dataset_counts, seed_database
+    from database import get_engine
+    from models import Base, Person
+    from sqlalchemy.orm import Session
+
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    counts = dataset_counts(engine)
+    if not counts['people']:
+        counts = seed_database(engine, args.scale, user_ids=[SIGNED_IN_USER])
+    else:
+        logger.info(f"Using existing data: {counts}")
+
+    with ExitStack() as stack:
+        stack.enter_context(firebase_signed_in(SIGNED_IN_USER))
+        app = load_app(stack)
+
+        with Session(bind=engine) as session:
+            contact_emails = [email for email, in session.query(Person.email)
+                              .filter(Person.user_id == SIGNED_IN_USER, Person.email != None).limit(5000)]
+            people_service = FakePeopleService()
+            mailbox = FakeMailbox(contact_emails, SIGNED_IN_EMAIL)
+            ctx = BenchmarkContext(session, people_service)
+        stack.enter_context(mailbox.installed())
+        stack.enter_context(mock.patch('routes.contacts_api._people_service', return_value=people_service))
+
+        scenarios = [entry for entry in SCENARIOS if not args.only or entry[0] in args.only]
+        results = run_scenarios(app, ctx, scenarios, args.iterations, args.warmup)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    print()
+    print(f"{engine.dialect.name} database: " + ', '.join(f'{count} {name}' for name, count in counts.items()))
+    print(format_report(results, baseline))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'database': engine.dialect.name, 'dataset': counts, 'iterations': args.iterations,
+                       'results': results}, f, indent=2)
+        logger.info(f"Wrote results to {args.json}")
+
+    failed = [name for name, result in results.items() if result['errors']]
+    if failed:
+        logger.error(f"Requests failed for: {', '.join(failed)}")
+    if baseline:
+        regressions = compare(results, baseline, args.max_regression)
+        for regression in regressions:
+            logger.error(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+Synthetic CRM data at production volumes
+
+Rows are generated deterministically from a seed and written with chunked
+executemany inserts, so the full dataset (100k people, 10k churches, 1M
+communications, 200k tasks across 50 users and 10 offices) loads in minutes.
+Search indexes are kept up to date by the database triggers as rows go in,
+and pipeline rollups are rebuilt once at the end.
+"""
+from datetime import date, datetime, timedelta
+import logging
+import random
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from models import (Contacts, Person, Church, Task, Communication, EmailSignature, Office, UserOffice,
+                    CHURCH_PIPELINE_CHOICES, PEOPLE_PIPELINE_CHOICES, PRIORITY_CHOICES, ASSIGNED_TO_CHOICES,
+                    SOURCE_CHOICES, STATE_CHOICES)
+from utils.pipeline_rollups import rebuild_pipeline_rollups
+
+logger = logging.getLogger(__name__)
+
+# Row counts at scale 1.0
+FULL_SCALE = {
+    'users': 50,
+    'offices': 10,
+    'churches': 10_000,
+    'people': 100_000,
+    'tasks': 200_000,
+    'communications': 1_000_000,
+}
+
+# Users and offices stay at full count at every scale so per-user filters keep their selectivity
+UNSCALED = ('users', 'offices')
+
+INSERT_CHUNK_SIZE = 5000
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Susan', 'Joseph', 'Jessica', 'Daniel', 'Sarah', 'Samuel', 'Grace',
+               'Andrew', 'Ruth', 'Joshua', 'Esther', 'Caleb', 'Hannah', 'Nathan', 'Lydia']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore',
+              'Jackson', 'Martin', 'Lee', 'Thompson', 'White', 'Harris', 'Clark', 'Lewis', 'Walker']
+CHURCH_WORDS = ['Grace', 'Faith', 'Hope', 'Calvary', 'Trinity', 'Cornerstone', 'Redeemer', 'Harvest',
+                'Living Water', 'New Life', 'Community', 'First Baptist', 'Crossroads', 'Bethel']
+CITIES = ['Springfield', 'Franklin', 'Greenville', 'Bristol', 'Clinton', 'Fairview', 'Salem', 'Madison',
+          'Georgetown', 'Arlington', 'Ashland', 'Dover', 'Oxford', 'Jackson', 'Burlington', 'Manchester']
+DENOMINATIONS = ['Baptist', 'Methodist', 'Presbyterian', 'Non-denominational', 'Lutheran', 'Pentecostal']
+WORDS = ['mission', 'trip', 'support', 'prayer', 'update', 'meeting', 'follow', 'up', 'thanks', 'partner',
+         'training', 'conference', 'invitation', 'newsletter', 'budget', 'visit', 'team', 'schedule',
+         'question', 'report', 'family', 'ministry', 'outreach', 'church', 'pastor', 'event', 'volunteer']
+
+
+def scaled_counts(scale=1.0):
+    """
+    Row counts for a fraction of the full dataset
+
+    Args:
+        scale: 1.0 for production volumes, e.g. 0.01 for a quick run
+
+    Returns:
+        dict: Count per entity, as in FULL_SCALE
+    """
+    return {name: count if name in UNSCALED else max(1, int(round(count * scale)))
+            for name, count in FULL_SCALE.items()}
+
+
+def default_user_ids(count):
+    return [f'bench-user-{n:02d}' for n in range(1, count + 1)]
+
+
+def _choice(rng, choices):
+    return rng.choice(choices)[0]
+
+
+def _sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _insert_chunks(engine, table, rows, label):
+    """Insert generated rows (all with the same keys) in committed chunks, returning the number written"""
+    written = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            with engine.begin() as connection:
+                connection.execute(table.insert(), chunk)
+            written += len(chunk)
+            chunk = []
+            if written % (INSERT_CHUNK_SIZE * 20) == 0:
+                logger.info(f"  {label}: {written} rows")
+    if chunk:
+        with engine.begin() as connection:
+            connection.execute(table.insert(), chunk)
+        written += len(chunk)
+    return written
+
+
+def _contact_row(rng, contact_id, contact_type, today, **values):
+    created = today - timedelta(days=rng.randint(0, 3 * 365))
+    return {
+        'id': contact_id,
+        'type': contact_type,
+        'phone': f'555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}',
+        'city': rng.choice(CITIES),
+        'state': _choice(rng, STATE_CHOICES),
+        'zip_code': f'{rng.randint(10000, 99999)}',
+        'date_created': created,
+        'date_modified': created + timedelta(days=rng.randint(0, (today - created).days)),
+        **values,
+    }
+
+
+def seed_database(engine, scale=1.0, user_ids=None, seed=42):
+    """
+    Fill an empty database with synthetic offices, users, contacts, tasks and email
+
+    People are spread evenly over the users and each person's communications
+    and tasks belong to that person's user; churches are spread over the
+    offices. Contact ids are assigned here, churches first.
+
+    Args:
+        engine: Engine for a database with the schema created and no data
+        scale: Fraction of FULL_SCALE to generate
+        user_ids: Firebase user ids to own the data; generated if not given.
+            Extra ids beyond FULL_SCALE['users'] are ignored.
+        seed: Random seed, so runs with the same arguments produce the same data
+
+    Returns:
+        dict: Rows written per entity
+    """
+    rng = random.Random(seed)
+    counts = scaled_counts(scale)
+    users = list(user_ids or [])[:counts['users']]
+    users += default_user_ids(counts['users'])[len(users):]
+    today = date.today()
+    now = datetime.now().replace(microsecond=0)
+    started = time.time()
+    written = {'users': len(users)}
+
+    logger.info(f"Seeding {', '.join(f'{count} {name}' for name, count in counts.items())}")
+
+    offices = [{'id': n, 'name': f'{city} Office', 'city': city, 'state': _choice(rng, STATE_CHOICES),
+                'created_at': now, 'updated_at': now}
+               for n, city in enumerate(CITIES[:counts['offices']], start=1)]
+    while len(offices) < counts['offices']:
+        n = len(offices) + 1
+        offices.append({'id': n, 'name': f'Office {n}', 'created_at': now, 'updated_at': now})
+    written['offices'] = _insert_chunks(engine, Office.__table__, offices, 'offices')
+
+    # Every user works in one office; the first is that office's admin
+    user_offices = [{'user_id': user_id, 'office_id': n % len(offices) + 1,
+                     'role': 'standard_user' if n else 'office_admin', 'created_at': now, 'updated_at': now}
+                    for n, user_id in enumerate(users)]
+    _insert_chunks(engine, UserOffice.__table__, user_offices, 'user offices')
+    signatures = [{'user_id': user_id, 'name': name, 'content': f'<p>{name} signature</p>',
+                   'is_default': name == 'Default', 'created_at': now, 'updated_at': now}
+                  for user_id in users for name in ('Default', 'Short')]
+    _insert_chunks(engine, EmailSignature.__table__, signatures, 'signatures')
+
+    n_churches, n_people = counts['churches'], counts['people']
+    church_ids = range(1, n_churches + 1)
+    person_ids = range(n_churches + 1, n_churches + n_people + 1)
+
+    def person_user(person_id):
+        return users[(person_id - n_churches - 1) % len(users)]
+
+    def user_person(user_n):
+        """A random person belonging to users[user_n]"""
+        owned = (n_people - user_n + len(users) - 1) // len(users)
+        if owned <= 0:
+            return rng.choice(person_ids)
+        return person_ids[user_n + len(users) * rng.randrange(owned)]
+
+    def church_contacts():
+        for church_id in church_ids:
+            name = f'{rng.choice(CHURCH_WORDS)} {rng.choice(["Church", "Fellowship", "Chapel"])} {church_id}'
+            yield _contact_row(rng, church_id, 'church', today, church_name=name,
+                               email=f'office{church_id}@church{church_id}.example.org')
+
+    def churches():
+        for church_id in church_ids:
+            yield {
+                'id': church_id,
+                'office_id': rng.randint(1, len(offices)),
+                'location': rng.choice(CITIES),
+                'denomination': rng.choice(DENOMINATIONS),
+                'congregation_size': rng.randint(40, 4000),
+                'church_pipeline': _choice(rng, CHURCH_PIPELINE_CHOICES),
+                'priority': _choice(rng, PRIORITY_CHOICES),
+                'assigned_to': _choice(rng, ASSIGNED_TO_CHOICES),
+                'source': _choice(rng, SOURCE_CHOICES),
+                'senior_pastor_first_name': rng.choice(FIRST_NAMES),
+                'senior_pastor_last_name': rng.choice(LAST_NAMES),
+                'virtuous': False,
+            }
+
+    def person_contacts():
+        for person_id in person_ids:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            yield _contact_row(rng, person_id, 'person', today, first_name=first, last_name=last,
+                               email=f'{first.lower()}.{last.lower()}.{person_id}@example.com',
+                               preferred_contact_method='email')
+
+    def people():
+        for person_id in person_ids:
+            yield {
+                'id': person_id,
+                'user_id': person_user(person_id),
+                'church_id': rng.choice(church_ids) if rng.random() < 0.7 else None,
+                'people_pipeline': _choice(rng, PEOPLE_PIPELINE_CHOICES),
+                'priority': _choice(rng, PRIORITY_CHOICES),
+                'assigned_to': _choice(rng, ASSIGNED_TO_CHOICES),
+                'source': _choice(rng, SOURCE_CHOICES),
+                'virtuous': False,
+            }
+
+    _insert_chunks(engine, Contacts.__table__, church_contacts(), 'church contacts')
+    written['churches'] = _insert_chunks(engine, Church.__table__, churches(), 'churches')
+    _insert_chunks(engine, Contacts.__table__, person_contacts(), 'person contacts')
+    written['people'] = _insert_chunks(engine, Person.__table__, people(), 'people')
+
+    def tasks():
+        for n in range(counts['tasks']):
+            user_n = n % len(users)
+            row = {
+                'title': _sentence(rng, 2, 4).capitalize(),
+                'description': _sentence(rng, 5, 15),
+                'due_date': today + timedelta(days=rng.randint(-365, 365)),
+                'priority': rng.choice(['High', 'Medium', 'Low']),
+                'status': rng.choices(['Not Started', 'In Progress', 'Completed'], weights=[4, 2, 4])[0],
+                'user_id': users[user_n],
+                'google_calendar_sync_enabled': False,
+                'person_id': None,
+                'church_id': None,
+            }
+            if rng.random() < 0.8:
+                row['person_id'] = user_person(user_n)
+            else:
+                row['church_id'] = rng.choice(church_ids)
+            yield row
+
+    written['tasks'] = _insert_chunks(engine, Task.__table__, tasks(), 'tasks')
+
+    first_day = now - timedelta(days=3 * 365)
+    span = int((now - first_day).total_seconds())
+
+    def communications():
+        for n in range(counts['communications']):
+            sent = first_day + timedelta(seconds=rng.randrange(span))
+            email = rng.random() < 0.9
+            row = {
+                'type': 'Email' if email else rng.choice(['Phone', 'Text']),
+                'subject': _sentence(rng, 3, 7).capitalize() if email else None,
+                'message': _sentence(rng, 10, 30),
+                'date_sent': sent,
+                'date': sent,
+                'direction': rng.choice(['inbound', 'outbound']),
+                'gmail_message_id': f'bench{n:08x}' if email else None,
+                'gmail_thread_id': f'thread{n // 3:08x}' if email else None,
+                'email_status': 'sent' if email else None,
+                'person_id': None,
+                'church_id': None,
+            }
+            if rng.random() < 0.85:
+                person_id = rng.choice(person_ids)
+                row.update(person_id=person_id, user_id=person_user(person_id))
+            else:
+                row.update(church_id=rng.choice(church_ids), user_id=rng.choice(users))
+            yield row
+
+    written['communications'] = _insert_chunks(engine, Communication.__table__, communications(), 'communications')
+
+    with Session(bind=engine) as session, session.begin():
+        rebuild_pipeline_rollups(session)
+
+    with engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Ids were assigned here, so move the sequences past them
+            for table in ('contacts', 'tasks', 'communications', 'offices', 'user_offices', 'email_signatures'):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+                ))
+        # Row counts for the planner, as a long-running database would have
+        connection.execute(text('ANALYZE'))
+
+    logger.info(f"Seeded database in {time.time() - started:.1f}s")
+    return written
+
+
+def dataset_counts(engine):
+    """
+    Rows currently in the benchmarked tables
+
+    Returns:
+        dict: Count per entity, as returned by seed_database
+    """
+    with engine.connect() as connection:
+        def count(table):
+            return connection.execute(select(func.count()).select_from(table)).scalar()
+        return {
+            'users': connection.execute(select(func.count(func.distinct(UserOffice.user_id)))).scalar(),
+            'offices': count(Office.__table__),
+            'churches': count(Church.__table__),
+            'people': count(Person.__table__),
+            'tasks': count(Task.__table__),
+            'communications': count(Communication.__table__),
+        }
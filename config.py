@@ -6,6 +6,10 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Absolute path so every subsystem opens the same SQLite file whatever the working directory
+SQLITE_DATABASE_URI = f'sqlite:///{os.path.abspath(os.path.join(os.path.dirname(__file__), "instance", "mobilize_crm.db"))}'
+
+
 class BaseConfig:
     """Base configuration with common settings"""
     # Flask
@@ -16,6 +20,21 @@ class BaseConfig:
     
     # Database
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool for server databases (PostgreSQL); see database.engine_options
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    # Seconds before a pooled connection is replaced; keep below the server's idle timeout
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    # Milliseconds a SQLite connection waits for another writer before failing
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    # Page cache per SQLite connection in KiB, and bytes of the file to memory-map
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 32768))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    # Route background sync writes on SQLite through one writer thread (see utils.write_queue)
+    SQLITE_WRITE_QUEUE = os.environ.get('SQLITE_WRITE_QUEUE', 'true').lower() in ('1', 'true', 'yes')
+    # Most writes waiting for the writer before callers block; 0 is unbounded
+    SQLITE_WRITE_QUEUE_SIZE = int(os.environ.get('SQLITE_WRITE_QUEUE_SIZE', 0))
     
     # Email
     SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
@@ -60,6 +79,43 @@ class BaseConfig:
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
     GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+    # Built Google API clients are cached per user, API and scopes
+    GOOGLE_SERVICE_CACHE_TTL = int(os.environ.get('GOOGLE_SERVICE_CACHE_TTL', 3600))
+    GOOGLE_SERVICE_CACHE_SIZE = int(os.environ.get('GOOGLE_SERVICE_CACHE_SIZE', 256))
+
+    # Gmail sync
+    # When a user's history cursor is missing or has expired, the sync falls back
+    # to a search limited to this many days and messages
+    GMAIL_FULL_RESYNC_DAYS = int(os.environ.get('GMAIL_FULL_RESYNC_DAYS', 30))
+    GMAIL_FULL_RESYNC_MAX_MESSAGES = int(os.environ.get('GMAIL_FULL_RESYNC_MAX_MESSAGES', 2000))
+    # Background sync runs this many users at once; keep it low to stay within
+    # the project's Gmail API quota. Each user's sync is given up after the timeout.
+    GMAIL_SYNC_MAX_WORKERS = int(os.environ.get('GMAIL_SYNC_MAX_WORKERS', 4))
+    GMAIL_SYNC_USER_TIMEOUT = int(os.environ.get('GMAIL_SYNC_USER_TIMEOUT', 600))
+    # Synced emails are inserted and committed in chunks of this many rows
+    GMAIL_SYNC_COMMIT_CHUNK = int(os.environ.get('GMAIL_SYNC_COMMIT_CHUNK', 200))
+
+    # Google Calendar sync
+    # Number of users whose calendars are synced at once
+    CALENDAR_SYNC_MAX_WORKERS = int(os.environ.get('CALENDAR_SYNC_MAX_WORKERS', 4))
+
+    # Communications timeline
+    # Seconds a timeline's total count is reused before it is counted again
+    COMMUNICATIONS_COUNT_TTL = int(os.environ.get('COMMUNICATIONS_COUNT_TTL', 60))
+
+    # Dashboard
+    # Seconds a user's dashboard summary is cached; writes to their data clear it sooner
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 300))
+
+    # Office access
+    # Seconds a user's office memberships and roles are cached; membership changes clear them sooner
+    ACCESS_CONTEXT_TTL = int(os.environ.get('ACCESS_CONTEXT_TTL', 300))
+
+    # Query stats (see utils.query_stats)
+    # Add X-Query-Count and Server-Timing headers with each request's query count and database time
+    QUERY_STATS_HEADERS = os.environ.get('QUERY_STATS_HEADERS', 'true').lower() in ('1', 'true', 'yes')
+    # Statements taking at least this many milliseconds are logged with their route; 0 turns it off
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 500))
 
     @staticmethod
     def init_logging(app):
@@ -88,7 +144,7 @@ class DevelopmentConfig(BaseConfig):
     """Development environment configuration"""
     DEBUG = True
     # Use absolute path to instance folder to ensure consistency
-    SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.abspath(os.path.join(os.path.dirname(__file__), "instance", "mobilize_crm.db"))}'
+    SQLALCHEMY_DATABASE_URI = SQLITE_DATABASE_URI
     # Enable more detailed logging for development
     LOG_LEVEL = 'DEBUG'
     # Enable SQLAlchemy echo for query debugging
@@ -114,12 +170,14 @@ class ProductionConfig(BaseConfig):
             SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
         else:
             # Fallback to SQLite if no PostgreSQL configuration is provided
-            SQLALCHEMY_DATABASE_URI = 'sqlite:///instance/mobilize_crm.db'
+            SQLALCHEMY_DATABASE_URI = SQLITE_DATABASE_URI
     
     # Production-specific settings
     LOG_TO_STDOUT = True
     LOG_LEVEL = 'INFO'
     SQLALCHEMY_ECHO = False
+    # Query counts and timings are not exposed to clients unless asked for
+    QUERY_STATS_HEADERS = os.environ.get('QUERY_STATS_HEADERS', 'false').lower() in ('1', 'true', 'yes')
 
 
 class TestingConfig(BaseConfig):
@@ -1,12 +1,209 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from contextlib import contextmanager
+from collections import Counter
+from weakref import WeakKeyDictionary
+import logging
+import os
+import threading
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# The process-wide engine for the configured database (see get_engine)
+_engine = None
+_engine_lock = threading.Lock()
+
+# Pool event counts per engine, reported by pool_status
+_pool_counters = WeakKeyDictionary()
+_pool_counters_lock = threading.Lock()
+
+
+def _setting(config, name):
+    """Read a setting from a Flask config mapping or a config class"""
+    if isinstance(config, dict):
+        return config.get(name, getattr(get_config(), name))
+    return getattr(config, name)
+
+
+def _is_memory_sqlite(url):
+    return url.database in (None, '', ':memory:') or 'mode=memory' in str(url)
+
+
+def engine_options(url, config=None):
+    """
+    Engine keyword arguments for a database URL
+
+    Server databases get a bounded connection pool that checks connections
+    before use and replaces them before the server drops idle ones. SQLite
+    gets a busy timeout so writers wait for each other instead of failing.
+
+    Args:
+        url: Database URL
+        config: Flask config or config class; defaults to get_config()
+
+    Returns:
+        dict: Keyword arguments for create_engine
+    """
+    config = config if config is not None else get_config()
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return {
+            'connect_args': {
+                'timeout': _setting(config, 'SQLITE_BUSY_TIMEOUT') / 1000,
+                'check_same_thread': False
+            }
+        }
+    return {
+        'pool_size': _setting(config, 'DB_POOL_SIZE'),
+        'max_overflow': _setting(config, 'DB_MAX_OVERFLOW'),
+        'pool_timeout': _setting(config, 'DB_POOL_TIMEOUT'),
+        'pool_recycle': _setting(config, 'DB_POOL_RECYCLE'),
+        'pool_pre_ping': True
+    }
+
+
+def sqlite_pragmas(config=None, in_memory=False):
+    """
+    PRAGMA settings applied to every SQLite connection
+
+    File databases use WAL so readers never block the writer (or each other),
+    with synchronous=NORMAL, which is durable across application crashes in
+    WAL mode. All connections wait busy_timeout ms for the write lock.
+
+    Returns:
+        list: (name, value) pairs in the order they are applied
+    """
+    config = config if config is not None else get_config()
+    pragmas = [('busy_timeout', int(_setting(config, 'SQLITE_BUSY_TIMEOUT')))]
+    if not in_memory:
+        pragmas += [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'NORMAL'),
+            # A negative cache_size is in KiB rather than pages
+            ('cache_size', -int(_setting(config, 'SQLITE_CACHE_SIZE_KB'))),
+            ('mmap_size', int(_setting(config, 'SQLITE_MMAP_SIZE'))),
+            ('temp_store', 'MEMORY'),
+        ]
+    return pragmas
+
+
+def _configure_engine(engine, config):
+    """Set SQLite pragmas on new connections and count pool events"""
+    counters = Counter()
+    _pool_counters[engine] = counters
+
+    def count(name):
+        with _pool_counters_lock:
+            counters[name] += 1
+
+    if engine.dialect.name == 'sqlite':
+        pragmas = sqlite_pragmas(config, in_memory=_is_memory_sqlite(engine.url))
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas:
+                    cursor.execute(f'PRAGMA {name} = {value}')
+            finally:
+                cursor.close()
+
+    event.listen(engine, 'connect', lambda *args: count('connections_opened'))
+    event.listen(engine, 'checkout', lambda *args: count('checkouts'))
+    event.listen(engine, 'checkin', lambda *args: count('checkins'))
+    event.listen(engine, 'invalidate', lambda *args: count('invalidated'))
+
+
+def create_configured_engine(url, config=None, **options):
+    """
+    Create an engine with the pool and SQLite settings from engine_options
+
+    Args:
+        url: Database URL
+        config: Flask config or config class; defaults to get_config()
+        **options: create_engine arguments that take precedence
+
+    Returns:
+        Engine: The new engine
+    """
+    config = config if config is not None else get_config()
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and not _is_memory_sqlite(url):
+        os.makedirs(os.path.dirname(os.path.abspath(url.database)), exist_ok=True)
+    merged = engine_options(url, config)
+    for name, value in options.items():
+        if name == 'connect_args':
+            merged['connect_args'] = {**merged.get('connect_args', {}), **value}
+        else:
+            merged[name] = value
+    engine = create_engine(url, **merged)
+    _configure_engine(engine, config)
+    logger.info(f"Created {engine.dialect.name} engine with {type(engine.pool).__name__}")
+    return engine
+
+
+def get_engine():
+    """
+    The engine for the configured database, shared by the whole process
+
+    Flask-SQLAlchemy's db.session, models.Session, token storage and the
+    health checks all use this engine and its connection pool.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                config = get_config()
+                _engine = create_configured_engine(
+                    config.SQLALCHEMY_DATABASE_URI,
+                    config,
+                    echo=getattr(config, 'SQLALCHEMY_ECHO', False)
+                )
+    return _engine
+
+
+def pool_status(engine=None):
+    """
+    Connection pool usage for an engine (the shared engine by default)
+
+    Returns:
+        dict: Pool class, current size and checked in/out/overflow
+        connections, plus counts of pool events since the engine was created
+    """
+    engine = engine if engine is not None else get_engine()
+    pool = engine.pool
+    status = {'dialect': engine.dialect.name, 'pool': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            status[name] = method()
+    with _pool_counters_lock:
+        status.update(_pool_counters.get(engine, {}))
+    return status
+
+
+class SharedEngineSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy that uses the shared engine for the configured database"""
+
+    def _make_engine(self, bind_key, options, app):
+        options = dict(options)
+        url = make_url(options.pop('url'))
+        shared = get_engine()
+        if bind_key is None and url == shared.url:
+            return shared
+        # Another database (tests, extra binds) gets its own engine with the same settings
+        return create_configured_engine(url, app.config, **options)
+
 
 # Create the SQLAlchemy object
-db = SQLAlchemy()
+db = SharedEngineSQLAlchemy()
 
 def init_db(app):
     """Initialize the database with the app"""
-    db.init_app(app) 
+    db.init_app(app)
 
 @contextmanager
 def session_scope():
@@ -19,4 +216,4 @@ def session_scope():
         session.rollback()
         raise
     finally:
-        session.close() 
\ No newline at end of file
+        session.close()
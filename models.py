@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Date, Boolean, Text, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean, Text, DateTime, Index, DDL, event
 from sqlalchemy.orm import relationship, declarative_base, scoped_session, sessionmaker
 from contextlib import contextmanager
 from marshmallow import Schema, fields, validate, ValidationError, pre_load, post_load
@@ -6,6 +6,8 @@ from datetime import datetime
 import os
 import logging
 
+from database import get_engine
+
 Base = declarative_base()
 
 def get_image_path(instance, filename):
@@ -278,6 +280,11 @@ class Contacts(Base):
         'polymorphic_identity': 'contact',
         'polymorphic_on': type
     }
+
+    __table_args__ = (
+        # Matching sent and received email to a contact
+        Index('ix_contacts_email', 'email'),
+    )
     
     def get_name(self):
         """Get display name for the contact, handling both church and person cases"""
@@ -321,6 +328,13 @@ class Person(Contacts):
     __mapper_args__ = {
         'polymorphic_identity': 'person',
     }
+
+    __table_args__ = (
+        # People lists and dashboard counts are per user
+        Index('ix_people_user_id', 'user_id'),
+        # Members of a church
+        Index('ix_people_church_id', 'church_id'),
+    )
     
     def __repr__(self):
         return f"<Person(name='{self.first_name} {self.last_name}', email='{self.email}')>"
@@ -367,6 +381,13 @@ class Church(Contacts):
     __mapper_args__ = {
         'polymorphic_identity': 'church',
     }
+
+    __table_args__ = (
+        # Church lists filtered by office and per-office counts
+        Index('ix_churches_office_id', 'office_id'),
+        # Clearing main contacts when people are deleted
+        Index('ix_churches_main_contact_id', 'main_contact_id'),
+    )
     
     def __repr__(self):
         return f"<Church(id={self.id}, name='{self.church_name}')>"
@@ -393,6 +414,14 @@ class Task(Base):
     person = relationship("Person", back_populates="tasks")
     church = relationship("Church", back_populates="tasks")
 
+    __table_args__ = (
+        # A user's open tasks by due date (dashboard) and all their tasks (task list)
+        Index('ix_tasks_user_status_due_date', 'user_id', 'status', 'due_date'),
+        # Person and church detail pages list the latest due tasks first
+        Index('ix_tasks_person_due_date', 'person_id', 'due_date'),
+        Index('ix_tasks_church_due_date', 'church_id', 'due_date'),
+    )
+
     def __repr__(self):
         return f"<Task(title='{self.title}', due_date='{self.due_date}')>"
 
@@ -402,7 +431,7 @@ class Communication(Base):
     id = Column(Integer, primary_key=True)
     type = Column(String)
     message = Column(String)
-    date_sent = Column(DateTime, default=datetime.now)
+    date_sent = Column(DateTime, nullable=False, default=datetime.now)  # Timeline sort key, see utils.communication_timeline
     date = Column(DateTime, nullable=False, default=datetime.now)  # Required by the database schema
     person_id = Column(Integer, ForeignKey('people.id'))
     church_id = Column(Integer, ForeignKey('churches.id'))
@@ -419,9 +448,57 @@ class Communication(Base):
     person = relationship("Person", back_populates="communications")
     church = relationship("Church", back_populates="communications")
 
+    __table_args__ = (
+        # Each Gmail message is synced at most once per user
+        Index('uq_communications_user_gmail_message', 'user_id', 'gmail_message_id', unique=True),
+        # Backs the newest-first timeline and its (date_sent, id) cursor
+        Index('ix_communications_user_date_sent_id', 'user_id', 'date_sent', 'id'),
+        # Newest-first communications on person and church detail pages
+        Index('ix_communications_person_date_sent', 'person_id', 'date_sent'),
+        Index('ix_communications_church_date_sent', 'church_id', 'date_sent'),
+        # Message lookups that don't know the owner: sent drafts and the
+        # timeline's check for newer copies of the same message
+        Index('ix_communications_gmail_message_id', 'gmail_message_id'),
+    )
+
     def __repr__(self):
         return f"<Communication(type='{self.type}', date_sent='{self.date_sent}')>"
 
+# Full-text search over communication subjects and bodies, kept in step with the
+# table by the database itself: an external-content FTS5 table maintained by
+# triggers on SQLite, a generated tsvector column with a GIN index on PostgreSQL
+COMMUNICATION_SEARCH_DDL = {
+    'sqlite': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS communications_fts USING fts5(
+            subject, message, content='communications', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2')""",
+        """CREATE TRIGGER IF NOT EXISTS communications_fts_insert AFTER INSERT ON communications BEGIN
+            INSERT INTO communications_fts(rowid, subject, message) VALUES (new.id, new.subject, new.message);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS communications_fts_delete AFTER DELETE ON communications BEGIN
+            INSERT INTO communications_fts(communications_fts, rowid, subject, message)
+            VALUES ('delete', old.id, old.subject, old.message);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS communications_fts_update AFTER UPDATE OF subject, message ON communications BEGIN
+            INSERT INTO communications_fts(communications_fts, rowid, subject, message)
+            VALUES ('delete', old.id, old.subject, old.message);
+            INSERT INTO communications_fts(rowid, subject, message) VALUES (new.id, new.subject, new.message);
+        END""",
+    ],
+    'postgresql': [
+        """ALTER TABLE communications ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(subject, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(message, '')), 'B')
+            ) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_communications_search_vector ON communications USING GIN (search_vector)",
+    ],
+}
+
+for _dialect, _statements in COMMUNICATION_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Communication.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
 class EmailSignature(Base):
     __tablename__ = 'email_signatures'
 
@@ -434,6 +511,11 @@ class EmailSignature(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+    __table_args__ = (
+        # A user's signatures, and their default one when sending
+        Index('ix_email_signatures_user_default', 'user_id', 'is_default'),
+    )
+
     def __repr__(self):
         return f"<EmailSignature(name='{self.name}', user_id='{self.user_id}')>"
 
@@ -482,13 +564,168 @@ class UserOffice(Base):
     
     # Relationship
     office = relationship("Office")
+
+    __table_args__ = (
+        # Office membership checks run on nearly every page
+        Index('ix_user_offices_user_office', 'user_id', 'office_id'),
+        Index('ix_user_offices_office_id', 'office_id'),
+    )
     
     def __repr__(self):
         return f"<UserOffice(user_id='{self.user_id}', office_id={self.office_id}, role='{self.role}')>"
 
-# Use explicit path to instance folder to ensure consistency
-engine = create_engine('sqlite:///instance/mobilize_crm.db')
-Base.metadata.create_all(engine)
+class PipelineRollup(Base):
+    """Daily counts of contacts entering and leaving a pipeline bucket.
+
+    Maintained by utils.pipeline_rollups; a bucket's current size is the sum of
+    entered - exited over all days. Missing values are stored as '' (or office 0)
+    so every bucket has exactly one row per day.
+    """
+    __tablename__ = 'pipeline_rollups'
+
+    id = Column(Integer, primary_key=True)
+    contact_type = Column(String(50), nullable=False)  # 'person' or 'church'
+    office_id = Column(Integer, nullable=False, default=0)
+    user_id = Column(String(128), nullable=False, default='')
+    pipeline_stage = Column(String(100), nullable=False, default='')
+    priority = Column(String(100), nullable=False, default='')
+    assigned_to = Column(String(100), nullable=False, default='')
+    day = Column(Date, nullable=False)
+    entered = Column(Integer, nullable=False, default=0)
+    exited = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('uq_pipeline_rollups_bucket_day', 'contact_type', 'office_id', 'user_id', 'pipeline_stage',
+              'priority', 'assigned_to', 'day', unique=True),
+        # Backs the over-time charts, which read a date range per contact type
+        Index('ix_pipeline_rollups_type_day', 'contact_type', 'day'),
+    )
+
+    def __repr__(self):
+        return f"<PipelineRollup(contact_type='{self.contact_type}', stage='{self.pipeline_stage}', day='{self.day}')>"
+
+class ImportJob(Base):
+    """Progress of a contact import running in the background (see utils.csv_import)"""
+    __tablename__ = 'import_jobs'
+
+    id = Column(String(36), primary_key=True)  # UUID
+    user_id = Column(String(128), nullable=False)
+    contact_type = Column(String(50), nullable=False)  # 'person' or 'church'
+    source = Column(String(50), nullable=False, default='csv')
+    filename = Column(String(255), nullable=True)
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    total_bytes = Column(Integer, nullable=False, default=0)
+    processed_bytes = Column(Integer, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_imported = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    errors = Column(Text, nullable=True)  # JSON list of {'row', 'errors'}, capped
+    message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ImportJob(id='{self.id}', status='{self.status}')>"
+
+class GoogleToken(Base):
+    """Google OAuth tokens saved for background jobs (see routes.google_auth)"""
+    __tablename__ = 'google_tokens'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    user_email = Column(String, nullable=True)
+    token = Column(String, nullable=True)
+    refresh_token = Column(String, nullable=True)
+    token_uri = Column(String, nullable=True)
+    client_id = Column(String, nullable=True)
+    client_secret = Column(String, nullable=True)
+    scopes = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_google_tokens_user_updated', 'user_id', 'updated_at'),
+    )
+
+    def __repr__(self):
+        return f"<GoogleToken(user_id='{self.user_id}', updated_at='{self.updated_at}')>"
+
+class GoogleSyncState(Base):
+    """Per-user Gmail and Calendar sync cursors (see routes.google_auth)"""
+    __tablename__ = 'google_sync_state'
+
+    user_id = Column(String, primary_key=True)
+    gmail_history_id = Column(String, nullable=True)
+    calendar_sync_token = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<GoogleSyncState(user_id='{self.user_id}')>"
+
+# Contact search over names, emails, phones, city and church pastor names. On
+# SQLite an FTS5 table with prefix indexes is kept current by triggers on
+# contacts and churches; on PostgreSQL generated lowercase search columns carry
+# pg_trgm GIN indexes. Runs after create_all so both tables exist, and fills
+# the SQLite index from existing rows the first time it is created.
+_CONTACT_NAME_SQL = "trim(coalesce({0}.first_name, '') || ' ' || coalesce({0}.last_name, '') || ' ' || coalesce({0}.church_name, ''))"
+_CHURCH_PASTORS_SQL = ("trim(coalesce({0}.senior_pastor_first_name, '') || ' ' || coalesce({0}.senior_pastor_last_name, '') || ' ' || "
+                       "coalesce({0}.missions_pastor_first_name, '') || ' ' || coalesce({0}.missions_pastor_last_name, '') || ' ' || "
+                       "coalesce({0}.primary_contact_first_name, '') || ' ' || coalesce({0}.primary_contact_last_name, ''))")
+
+CONTACT_SEARCH_DDL = {
+    'sqlite': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+            type UNINDEXED, name, email, phone, city, pastors,
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+        f"""CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts(rowid, type, name, email, phone, city, pastors)
+            VALUES (new.id, new.type, {_CONTACT_NAME_SQL.format('new')}, new.email, new.phone, new.city, '');
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS contacts_fts_update AFTER UPDATE ON contacts BEGIN
+            UPDATE contacts_fts SET type = new.type, name = {_CONTACT_NAME_SQL.format('new')},
+                email = new.email, phone = new.phone, city = new.city
+            WHERE rowid = old.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS contacts_fts_delete AFTER DELETE ON contacts BEGIN
+            DELETE FROM contacts_fts WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS churches_fts_insert AFTER INSERT ON churches BEGIN
+            UPDATE contacts_fts SET pastors = {_CHURCH_PASTORS_SQL.format('new')} WHERE rowid = new.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS churches_fts_update AFTER UPDATE ON churches BEGIN
+            UPDATE contacts_fts SET pastors = {_CHURCH_PASTORS_SQL.format('new')} WHERE rowid = new.id;
+        END""",
+        f"""INSERT INTO contacts_fts(rowid, type, name, email, phone, city, pastors)
+            SELECT c.id, c.type, {_CONTACT_NAME_SQL.format('c')}, c.email, c.phone, c.city,
+                   coalesce({_CHURCH_PASTORS_SQL.format('ch')}, '')
+            FROM contacts c LEFT JOIN churches ch ON ch.id = c.id
+            WHERE NOT EXISTS (SELECT 1 FROM contacts_fts)""",
+    ],
+    'postgresql': [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        """ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_text text
+            GENERATED ALWAYS AS (lower(
+                coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' ||
+                coalesce(church_name, '') || ' ' || coalesce(email, '') || ' ' ||
+                coalesce(phone, '') || ' ' || coalesce(city, '')
+            )) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_search_text_trgm ON contacts USING GIN (search_text gin_trgm_ops)",
+        f"""ALTER TABLE churches ADD COLUMN IF NOT EXISTS pastor_search_text text
+            GENERATED ALWAYS AS (lower({_CHURCH_PASTORS_SQL.format('churches')})) STORED""",
+        "CREATE INDEX IF NOT EXISTS ix_churches_pastor_search_text_trgm ON churches USING GIN (pastor_search_text gin_trgm_ops)",
+    ],
+}
+
+for _dialect, _statements in CONTACT_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Base.metadata, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
+# The shared engine for the configured database (see database.get_engine)
+engine = get_engine()
+if engine.dialect.name == 'sqlite':
+    # Server databases are managed by the Alembic migrations
+    Base.metadata.create_all(engine)
 
 # Create a scoped session factory
 session_factory = sessionmaker(bind=engine)
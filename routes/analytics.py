@@ -0,0 +1,117 @@
+from flask import Blueprint, jsonify, request, current_app
+from datetime import date, datetime, timedelta
+from database import session_scope
+from utils.auth import get_current_user_id
+from utils.permissions import is_super_admin
+from utils.pipeline_rollups import (pipeline_funnel, pipeline_conversions, staff_workload,
+                                    rebuild_pipeline_rollups, PERSON, CHURCH, PERIODS)
+
+analytics_bp = Blueprint('analytics_bp', __name__)
+
+# Range shown by the conversion chart when no dates are given
+DEFAULT_CONVERSION_DAYS = 90
+
+
+def _date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _rollup_filters(user_id):
+    """
+    Read the contact type and filters shared by the analytics endpoints
+
+    People are limited to the current user's own unless they are a super admin,
+    who may pass user_id to look at someone else's. Churches are shared.
+    """
+    contact_type = request.args.get('type', PERSON)
+    if contact_type not in (PERSON, CHURCH):
+        raise ValueError(f"Unknown contact type: {contact_type}")
+
+    filters = {
+        'office_id': request.args.get('office_id', type=int),
+        'priority': request.args.get('priority'),
+        'assigned_to': request.args.get('assigned_to'),
+    }
+    if contact_type == PERSON:
+        filters['user_id'] = request.args.get('user_id') if is_super_admin(user_id) else user_id
+    return contact_type, filters
+
+
+@analytics_bp.route('/funnel', methods=['GET'])
+def funnel():
+    """Current contacts per pipeline stage"""
+    user_id = get_current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        contact_type, filters = _rollup_filters(user_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with session_scope() as session:
+        stages = pipeline_funnel(session, contact_type, **filters)
+    return jsonify({'type': contact_type, 'stages': stages})
+
+
+@analytics_bp.route('/conversions', methods=['GET'])
+def conversions():
+    """
+    Contacts entering each pipeline stage over time
+
+    Query parameters: start and end (YYYY-MM-DD, default the last 90 days) and
+    period ('day', 'week' or 'month'), plus the shared filters.
+    """
+    user_id = get_current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        contact_type, filters = _rollup_filters(user_id)
+        end = _date_arg('end', date.today())
+        start = _date_arg('start', end - timedelta(days=DEFAULT_CONVERSION_DAYS))
+        period = request.args.get('period', 'week')
+        if period not in PERIODS or start > end:
+            raise ValueError('Invalid period or date range')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with session_scope() as session:
+        result = pipeline_conversions(session, contact_type, start, end, period=period, **filters)
+    return jsonify({'type': contact_type, 'period': period, **result})
+
+
+@analytics_bp.route('/workload', methods=['GET'])
+def workload():
+    """Current contacts per assigned staff member and stage"""
+    user_id = get_current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        contact_type, filters = _rollup_filters(user_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with session_scope() as session:
+        staff = staff_workload(session, contact_type, **filters)
+    return jsonify({'type': contact_type, 'staff': staff})
+
+
+@analytics_bp.route('/rebuild', methods=['POST'])
+def rebuild():
+    """Recompute the pipeline rollups from the contact tables (super admins only)"""
+    user_id = get_current_user_id()
+    if not user_id or not is_super_admin(user_id):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    try:
+        with session_scope() as session:
+            contacts = rebuild_pipeline_rollups(session)
+        return jsonify({'success': True, 'contacts': contacts})
+    except Exception as e:
+        current_app.logger.error(f"Error rebuilding pipeline rollups: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
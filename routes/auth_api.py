@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request, current_app
 import os
 import firebase_admin
 from firebase_admin import auth
+from utils.auth import verify_firebase_id_token
 
 auth_api = Blueprint('auth_api', __name__)
 
@@ -30,7 +31,7 @@ def update_token():
             return jsonify({'error': 'No authorization header'}), 401
         
         id_token = request.headers['Authorization'].split('Bearer ')[1]
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = verify_firebase_id_token(id_token)
         uid = decoded_token['uid']
         
         # Get access token from request body
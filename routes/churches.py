@@ -1,13 +1,18 @@
-from models import Session, Church, Person, Contacts, Communication, Office, UserOffice, Task
+from models import Session, Church, Person, Contacts, Office
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
 from datetime import datetime
 from sqlalchemy import func, or_, text
+from sqlalchemy.orm import selectinload
 from database import db, session_scope
 from routes.dashboard import auth_required
 from routes.google_auth import get_current_user_id
-from routes.offices_admin import is_super_admin, get_user_offices
 from utils.auth import get_current_user_id as utils_get_current_user_id
+from utils.access_context import get_access_context
 from utils.permissions import has_permission
+from utils.contact_search import matching_contact_ids, lookup_contacts, CHURCH, LOOKUP_PAGE_SIZE
+from utils.pagination import parse_page_size, InvalidCursorError
+from utils.contact_batch import parse_id_list, batch_update_contacts, batch_delete_contacts
+from utils.contact_activity import recent_contact_communications, contact_tasks
 import logging
 
 churches_bp = Blueprint('churches_bp', __name__)
@@ -21,16 +26,15 @@ def list_churches():
     search_term = request.args.get('search', '')
     
     # Get user's offices
-    super_admin = is_super_admin(user_id)
+    access = get_access_context(user_id)
     
     with session_scope() as session:
         try:
             # Get all offices for the filter dropdown
-            if super_admin:
+            if access.is_super_admin:
                 all_offices = session.query(Office).all()
             else:
-                user_office_records = session.query(UserOffice).filter_by(user_id=user_id).all()
-                office_ids = [uo.office_id for uo in user_office_records]
+                office_ids = access.office_ids
                 all_offices = session.query(Office).filter(Office.id.in_(office_ids) if office_ids else False).all()
             
             # Use ORM query instead of raw SQL
@@ -38,7 +42,9 @@ def list_churches():
             
             # Apply search filter if provided
             if search_term:
-                churches_query = churches_query.filter(Church.church_name.ilike(f'%{search_term}%'))
+                matching_ids = matching_contact_ids(session, search_term)
+                if matching_ids is not None:
+                    churches_query = churches_query.filter(Church.id.in_(matching_ids))
             
             # Apply office filter if provided
             if office_id:
@@ -66,57 +72,27 @@ def list_churches():
 @auth_required
 def view_church(church_id):
     """View a church."""
-    user_id = get_current_user_id()
-    
     with session_scope() as session:
         try:
-            # Check if user has access to this church
-            super_admin = is_super_admin(user_id)
-            
-            # Get user offices within the session scope
-            if super_admin:
-                user_office_ids = [office.id for office in session.query(Office).all()]
-            else:
-                user_office_records = session.query(UserOffice).filter_by(user_id=user_id).all()
-                user_office_ids = [uo.office_id for uo in user_office_records]
-            
-            church = session.query(Church).filter(Church.id == church_id).first()
+            church = session.query(Church).options(
+                selectinload(Church.office),
+                selectinload(Church.main_contact)
+            ).filter(Church.id == church_id).first()
             
             if not church:
                 flash("Church not found.", "danger")
                 return redirect(url_for('churches_bp.list_churches'))
             
-            current_app.logger.info(f"Church found: {church.church_name}")
-            
-            # Check if user has access to this church's office
             # Office access check bypassed
             
-            # Get tasks for this church
-            tasks = session.query(Task).filter(Task.church_id == church_id).all()
-            current_app.logger.info(f"Tasks for church: {len(tasks)}")
-            
-            # Get communications for this church
-            communications = session.query(Communication).filter(Communication.church_id == church_id).all()
-            current_app.logger.info(f"Communications for church: {len(communications)}")
-            
-            # Get the 5 most recent communications for this church
-            recent_communications = session.query(Communication)\
-                .filter(Communication.church_id == church_id)\
-                .order_by(Communication.date_sent.desc())\
-                .limit(5)\
-                .all()
-            current_app.logger.info(f"Recent communications for church: {len(recent_communications)}")
-            
-            # Log church attributes to help troubleshoot template issues
-            current_app.logger.info(f"Church pipeline: {church.church_pipeline}")
-            current_app.logger.info(f"Church email: {church.email}")
-            current_app.logger.info(f"Church phone: {church.phone}")
+            # Both lists are capped and read from (church_id, date) indexes
+            tasks = contact_tasks(session, church_id=church_id)
+            recent_communications = recent_contact_communications(session, church_id=church_id)
             
             return render_template(
                 'churches/view.html',
                 church=church,
                 tasks=tasks,
-                communications=communications,
                 recent_communications=recent_communications
             )
         except Exception as e:
@@ -239,16 +215,15 @@ def new_church():
     with session_scope() as session:
         try:
             # Check if user has access to create churches
-            super_admin = is_super_admin(user_id)
+            access = get_access_context(user_id)
             
             # Get user's offices
-            if super_admin:
+            if access.is_super_admin:
                 # Super admin can see all offices
                 offices = session.query(Office).all()
             else:
                 # Get user's offices
-                user_office_records = session.query(UserOffice).filter_by(user_id=user_id).all()
-                office_ids = [uo.office_id for uo in user_office_records]
+                office_ids = access.office_ids
                 offices = session.query(Office).filter(Office.id.in_(office_ids) if office_ids else False).all()
             
             return render_template('churches/new.html', offices=offices)
@@ -268,14 +243,8 @@ def edit_church(church_id):
     
     with session_scope() as session:
         # Check if user has access to this church
-        super_admin = is_super_admin(user_id)
-        
-        # Get user offices within the session scope
-        if super_admin:
-            user_office_ids = [office.id for office in session.query(Office).all()]
-        else:
-            user_office_records = session.query(UserOffice).filter_by(user_id=user_id).all()
-            user_office_ids = [uo.office_id for uo in user_office_records]
+        access = get_access_context(user_id)
+        super_admin = access.is_super_admin
         
         church = session.query(Church).filter(Church.id == church_id).first()
         
@@ -297,7 +266,7 @@ def edit_church(church_id):
             # Update office if user is super admin or has access to both offices
             new_office_id = request.form.get('office_id', type=int)
             if new_office_id:
-                if super_admin or new_office_id in user_office_ids:
+                if access.can_access_office(new_office_id):
                     church.office_id = new_office_id
             
             # Update contact information
@@ -325,88 +294,87 @@ def edit_church(church_id):
             offices = session.query(Office).all()
         else:
             # Other users can only see their offices
-            offices = session.query(Office).filter(Office.id.in_(user_office_ids) if user_office_ids else False).all()
+            office_ids = access.office_ids
+            offices = session.query(Office).filter(Office.id.in_(office_ids) if office_ids else False).all()
         
         return render_template('churches/edit.html', church=church, offices=offices)
 
 @churches_bp.route('/batch_update', methods=['POST'])
 def batch_update():
     """Handle batch updates for multiple churches"""
-    with session_scope() as session:
-        selected_ids = request.form.get('selected_ids', '')
-        if not selected_ids:
-            flash('No churches selected for update', 'error')
-            return redirect(url_for('churches_bp.churches'))
-        
-        # Parse the comma-separated list of IDs
-        church_ids = [int(id) for id in selected_ids.split(',')]
-        
-        # Get the batch update values from the form
-        batch_pipeline = request.form.get('batch_pipeline')
-        batch_priority = request.form.get('batch_priority')
-        batch_assigned_to = request.form.get('batch_assigned_to')
-        batch_virtuous = request.form.get('batch_virtuous')
-        
-        # Count how many records were updated
-        update_count = 0
-        
-        # Update each selected church
-        for church_id in church_ids:
-            church = session.query(Church).filter(Church.id == church_id).first()
-            if church:
-                # Only update fields that were selected for batch update
-                if batch_pipeline:
-                    church.church_pipeline = batch_pipeline
-                
-                if batch_priority:
-                    church.priority = batch_priority
-                
-                if batch_assigned_to:
-                    church.assigned_to = batch_assigned_to
-                
-                if batch_virtuous:
-                    church.virtuous = (batch_virtuous.lower() == 'true')
-                
-                update_count += 1
-        
-        # Commit the changes
-        session.commit()
-        
-        # Flash a success message
-        flash(f'Successfully updated {update_count} churches', 'success')
-        
+    try:
+        church_ids = parse_id_list(request.form.get('selected_ids', ''))
+    except ValueError:
+        flash('Invalid selection', 'error')
+        return redirect(url_for('churches_bp.churches'))
+    if not church_ids:
+        flash('No churches selected for update', 'error')
+        return redirect(url_for('churches_bp.churches'))
+
+    # Only update fields that were selected for batch update
+    values = {}
+    if request.form.get('batch_pipeline'):
+        values['church_pipeline'] = request.form.get('batch_pipeline')
+    if request.form.get('batch_priority'):
+        values['priority'] = request.form.get('batch_priority')
+    if request.form.get('batch_assigned_to'):
+        values['assigned_to'] = request.form.get('batch_assigned_to')
+    if request.form.get('batch_virtuous'):
+        values['virtuous'] = request.form.get('batch_virtuous').lower() == 'true'
+    if not values:
+        flash('No fields selected for update', 'error')
         return redirect(url_for('churches_bp.churches'))
 
+    with session_scope() as session:
+        report = batch_update_contacts(session, CHURCH, church_ids, values)
+
+    message = f"Successfully updated {report['updated']} churches"
+    if report['missing']:
+        message += f" ({report['missing']} of the selected no longer exist)"
+    flash(message, 'success')
+    return redirect(url_for('churches_bp.churches'))
+
 @churches_bp.route('/batch_delete', methods=['POST'])
 def batch_delete():
     """Handle batch deletion for multiple churches"""
-    with session_scope() as session:
-        selected_ids = request.form.get('selected_ids', '')
-        if not selected_ids:
-            flash('No churches selected for deletion', 'error')
-            return redirect(url_for('churches_bp.churches'))
-        
-        # Parse the comma-separated list of IDs
-        church_ids = [int(id) for id in selected_ids.split(',')]
-        
-        # Count how many records were deleted
-        delete_count = 0
-        
-        # Delete each selected church
-        for church_id in church_ids:
-            church = session.query(Church).filter(Church.id == church_id).first()
-            if church:
-                session.delete(church)
-                delete_count += 1
-        
-        # Commit the changes
-        session.commit()
-        
-        # Flash a success message
-        flash(f'Successfully deleted {delete_count} churches', 'success')
-        
+    try:
+        church_ids = parse_id_list(request.form.get('selected_ids', ''))
+    except ValueError:
+        flash('Invalid selection', 'error')
+        return redirect(url_for('churches_bp.churches'))
+    if not church_ids:
+        flash('No churches selected for deletion', 'error')
         return redirect(url_for('churches_bp.churches'))
 
+    with session_scope() as session:
+        report = batch_delete_contacts(session, CHURCH, church_ids)
+
+    message = f"Successfully deleted {report['deleted']} churches"
+    if report['missing']:
+        message += f" ({report['missing']} of the selected no longer exist)"
+    flash(message, 'success')
+    return redirect(url_for('churches_bp.churches'))
+
+@churches_bp.route('/api/lookup')
+@auth_required
+def church_lookup():
+    """
+    Paginated church options for dropdowns
+
+    Query parameters: q (search), cursor and limit. Returns
+    {'results': [{'id', 'name'}], 'next_cursor', 'has_more'}.
+    """
+    with session_scope() as session:
+        try:
+            results, next_cursor = lookup_contacts(
+                session, CHURCH, request.args.get('q', ''),
+                cursor=request.args.get('cursor'),
+                limit=parse_page_size(request.args.get('limit'), default=LOOKUP_PAGE_SIZE, maximum=100)
+            )
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results, 'next_cursor': next_cursor, 'has_more': next_cursor is not None})
+
 @churches_bp.route('/api/churches/<int:church_id>', methods=['GET'])
 def get_church_api(church_id):
     """API endpoint to get a church by ID"""
@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify
+from markupsafe import escape
 from datetime import datetime
 import smtplib
 from email.mime.text import MIMEText
@@ -9,341 +10,89 @@ from routes.google_auth import get_user_tokens, get_current_user_id
 import os
 import requests
 import traceback
-from sqlalchemy import func, desc
+from sqlalchemy import desc
 from utils.gmail_integration import build_gmail_service, create_message, send_message
+from utils.communication_timeline import get_timeline_page, get_timeline_count
+from utils.communication_search import search_communications as search_communications_index
+from utils.contact_search import lookup_contacts, matching_contact_ids, PERSON, CHURCH, LOOKUP_PAGE_SIZE
+from utils.pagination import parse_page_size, InvalidCursorError
 
 communications_bp = Blueprint('communications_bp', __name__)
 
-@communications_bp.route('/')
-def communications_route():
+# Number of communications per timeline page
+COMMUNICATIONS_PER_PAGE = 50
+
+def _int_arg(name):
+    """Read an integer query parameter, ignoring invalid values"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        current_app.logger.error(f"Invalid {name}: {value}")
+        return None
+
+
+def _filter_name(session, person_id, church_id):
+    """Name of the person or church the timeline is filtered to"""
+    if person_id:
+        row = session.query(Person.first_name, Person.last_name).filter(Person.id == person_id).first()
+        if row:
+            return f"{row.first_name} {row.last_name}"
+    elif church_id:
+        row = session.query(Church.church_name).filter(Church.id == church_id).first()
+        if row:
+            return row.church_name
+    return None
+
+
+def _render_timeline(template, endpoint, search_term=None):
+    """Render a page of the communications timeline"""
     # Get the current user ID
     user_id = get_current_user_id()
     if not user_id:
         current_app.logger.warning("No user ID found in session, redirecting to login")
         return redirect(url_for('dashboard_bp.dashboard'))
-        
+
+    filters = {
+        'person_id': _int_arg('person_id'),
+        'church_id': _int_arg('church_id'),
+        'search_term': search_term or None
+    }
+    cursor = request.args.get('cursor')
+
     with session_scope() as session:
-        # Get filter parameters
-        person_id = request.args.get('person_id')
-        church_id = request.args.get('church_id')
-        
-        # Add pagination parameters
-        page = request.args.get('page', 1, type=int)
-        per_page = 50  # Limit the number of communications per page
-        
-        # Start with a base query with eager loading of relationships
-        query = session.query(Communication).options(
-            db.joinedload(Communication.person),
-            db.joinedload(Communication.church)
-        )
-        
-        # Apply filters
-        if person_id:
-            try:
-                # Convert person_id to integer if it's a string
-                person_id_int = int(person_id)
-                query = query.filter(Communication.person_id == person_id_int)
-                current_app.logger.debug(f"Filtering communications by person_id={person_id_int}")
-            except ValueError:
-                current_app.logger.error(f"Invalid person_id: {person_id}")
-            
-        if church_id:
-            try:
-                # Convert church_id to integer if it's a string
-                church_id_int = int(church_id)
-                query = query.filter(Communication.church_id == church_id_int)
-                current_app.logger.debug(f"Filtering communications by church_id={church_id_int}")
-            except ValueError:
-                current_app.logger.error(f"Invalid church_id: {church_id}")
-        
-        # Filter by user_id if it's set in the communication
-        # But don't exclude communications without a user_id
-        if user_id:
-            # Modified to include communications where user_id is NULL or matches the current user_id
-            query = query.filter((Communication.user_id == user_id) | (Communication.user_id == None))
-            current_app.logger.debug(f"Filtering communications by user_id={user_id} or NULL")
-            
-        # Order by date_sent, handling NULL values
-        query = query.order_by(func.coalesce(Communication.date_sent, datetime(1900, 1, 1)).desc())
-        
-        # Get total count for pagination info
-        total_count = query.count()
-        
-        # Apply pagination
-        query = query.limit(per_page).offset((page - 1) * per_page)
-        
-        # Execute the query
-        all_communications = query.all()
-        
-        # Filter out None values
-        all_communications = [comm for comm in all_communications if comm is not None]
-        
-        # Filter out duplicates based on gmail_message_id
-        # Use a dictionary to keep track of unique communications
-        unique_communications = {}
-        for comm in all_communications:
-            # If the communication has a gmail_message_id, use it as the key
-            if comm.gmail_message_id:
-                # Only keep the most recent communication for each gmail_message_id
-                if comm.gmail_message_id not in unique_communications:
-                    unique_communications[comm.gmail_message_id] = comm
-                elif comm.date_sent and unique_communications[comm.gmail_message_id].date_sent:
-                    # If we already have this message ID, keep the newer one
-                    if comm.date_sent > unique_communications[comm.gmail_message_id].date_sent:
-                        unique_communications[comm.gmail_message_id] = comm
-            else:
-                # For communications without a gmail_message_id, use the ID as the key
-                unique_communications[f"local_{comm.id}"] = comm
-        
-        # Convert the dictionary values back to a list and sort by date
-        communications_list = sorted(
-            unique_communications.values(),
-            key=lambda x: x.date_sent if x.date_sent else datetime(1900, 1, 1),
-            reverse=True
-        )
-        
-        current_app.logger.debug(f"Found {len(all_communications)} total communications, filtered to {len(communications_list)} unique communications")
-        
-        # Get the filter name if applicable
-        filter_name = None
-        if person_id:
-            try:
-                person_id_int = int(person_id)
-                person = session.query(Person).filter(Person.id == person_id_int).first()
-                if person:
-                    # Use first_name and last_name directly instead of get_name()
-                    filter_name = f"{person.first_name} {person.last_name}"
-            except ValueError:
-                current_app.logger.error(f"Invalid person_id: {person_id}")
-        elif church_id:
-            try:
-                church_id_int = int(church_id)
-                church = session.query(Church).filter(Church.id == church_id_int).first()
-                if church:
-                    # Use church_name directly instead of get_name()
-                    filter_name = church.church_name
-            except ValueError:
-                current_app.logger.error(f"Invalid church_id: {church_id}")
-        
-        # Debug the first few communications
-        for i, comm in enumerate(communications_list[:5]):
-            current_app.logger.debug(f"Communication {i+1}: ID={comm.id}, Type={comm.type}, Subject={comm.subject}, Person ID={comm.person_id}, User ID={comm.user_id}, Gmail Message ID={comm.gmail_message_id}")
-        
-        # Fetch people and churches in separate queries to avoid loading all communications
-        people_list = session.query(Person.id, Person.first_name, Person.last_name).all()
-        churches_list = session.query(Church.id, Church.church_name).all()
-        
-        # Calculate pagination info
-        total_pages = (total_count + per_page - 1) // per_page
-        has_next = page < total_pages
-        has_prev = page > 1
-        
-        # Import Python's built-in max and min functions for use in the template
-        import builtins
-        
-        return render_template('communications.html', 
-                             communications=communications_list, 
-                             people=people_list, 
-                             churches=churches_list,
-                             filter_name=filter_name,
-                             page=page,
-                             total_pages=total_pages,
-                             has_next=has_next,
-                             has_prev=has_prev,
-                             total_count=total_count,
-                             max=builtins.max,
-                             min=builtins.min)
+        try:
+            communications_list, next_cursor = get_timeline_page(
+                session, user_id, cursor=cursor, limit=COMMUNICATIONS_PER_PAGE, **filters
+            )
+        except InvalidCursorError:
+            current_app.logger.warning(f"Invalid communications cursor: {cursor}")
+            return redirect(url_for(endpoint, **{k: v for k, v in request.args.items() if k != 'cursor'}))
+
+        total_count = get_timeline_count(session, user_id, **filters)
+        current_app.logger.debug(f"Timeline page has {len(communications_list)} of about {total_count} communications")
+
+        # Keep filters on the paging links
+        page_args = {key: value for key, value in request.args.items() if key not in ('cursor', 'page') and value}
+
+        return render_template(template,
+                             communications=communications_list,
+                             filter_name=_filter_name(session, filters['person_id'], filters['church_id']),
+                             next_url=url_for(endpoint, cursor=next_cursor, **page_args) if next_cursor else None,
+                             first_url=url_for(endpoint, **page_args) if cursor else None,
+                             total_count=total_count)
+
+
+@communications_bp.route('/')
+def communications_route():
+    return _render_timeline('communications.html', 'communications_bp.communications_route')
 
 @communications_bp.route('/all')
 def all_communications_route():
-    # Get the current user ID
-    user_id = get_current_user_id()
-    if not user_id:
-        current_app.logger.warning("No user ID found in session, redirecting to login")
-        return redirect(url_for('dashboard_bp.dashboard'))
-        
-    with session_scope() as session:
-        # Get filter parameters
-        person_id = request.args.get('person_id')
-        church_id = request.args.get('church_id')
-        search_term = request.args.get('search', '')
-        
-        # Add pagination parameters
-        page = request.args.get('page', 1, type=int)
-        per_page = 50  # Limit the number of communications per page
-        
-        current_app.logger.debug(f"all_communications_route called with person_id={person_id}, church_id={church_id}, user_id={user_id}, search_term={search_term}, page={page}")
-        
-        # Start with a base query with eager loading
-        query = session.query(Communication).options(
-            db.joinedload(Communication.person),
-            db.joinedload(Communication.church)
-        )
-        
-        # Apply filters
-        if person_id:
-            try:
-                # Convert person_id to integer if it's a string
-                person_id_int = int(person_id)
-                query = query.filter(Communication.person_id == person_id_int)
-                current_app.logger.debug(f"Filtering communications by person_id={person_id_int}")
-            except ValueError:
-                current_app.logger.error(f"Invalid person_id: {person_id}")
-            
-        if church_id:
-            try:
-                # Convert church_id to integer if it's a string
-                church_id_int = int(church_id)
-                query = query.filter(Communication.church_id == church_id_int)
-                current_app.logger.debug(f"Filtering communications by church_id={church_id_int}")
-            except ValueError:
-                current_app.logger.error(f"Invalid church_id: {church_id}")
-        
-        # Filter by user_id if it's set in the communication
-        # But don't exclude communications without a user_id
-        if user_id:
-            query = query.filter((Communication.user_id == user_id) | (Communication.user_id == None))
-            current_app.logger.debug(f"Filtering communications by user_id={user_id} or NULL")
-            
-        # Apply search term if provided
-        if search_term:
-            # Join with Person and Church to search in their fields too
-            query = query.outerjoin(Person, Communication.person_id == Person.id)
-            query = query.outerjoin(Church, Communication.church_id == Church.id)
-            
-            # Search in multiple fields
-            search_filter = (
-                func.lower(Communication.message).contains(search_term.lower()) |
-                func.lower(Communication.subject).contains(search_term.lower()) |
-                func.lower(Person.first_name).contains(search_term.lower()) |
-                func.lower(Person.last_name).contains(search_term.lower()) |
-                func.lower(Person.email).contains(search_term.lower()) |
-                func.lower(Church.church_name).contains(search_term.lower()) |
-                func.lower(Church.email).contains(search_term.lower())
-            )
-            query = query.filter(search_filter)
-            
-        # Order by date_sent, handling NULL values
-        query = query.order_by(func.coalesce(Communication.date_sent, datetime(1900, 1, 1)).desc())
-        
-        # Get total count for pagination
-        total_count = query.count()
-        
-        # Add debug logging for total count
-        current_app.logger.info(f"Total communications count before pagination: {total_count}")
-        
-        # Apply pagination
-        query = query.limit(per_page).offset((page - 1) * per_page)
-        
-        # Debug the SQL query
-        current_app.logger.debug(f"SQL Query: {query}")
-        
-        # Execute the query
-        all_communications = query.all()
-        
-        # Add debug logging for query results
-        current_app.logger.info(f"Query returned {len(all_communications)} communications")
-        
-        # Log the types of communications found
-        comm_types = {}
-        for comm in all_communications:
-            if comm and comm.type:
-                if comm.type in comm_types:
-                    comm_types[comm.type] += 1
-                else:
-                    comm_types[comm.type] = 1
-        
-        current_app.logger.info(f"Communication types found: {comm_types}")
-        
-        # Filter out None values
-        all_communications = [comm for comm in all_communications if comm is not None]
-        
-        # Add debug logging after filtering None values
-        current_app.logger.info(f"After filtering None values: {len(all_communications)} communications")
-        
-        # Filter out duplicates based on gmail_message_id
-        # Use a dictionary to keep track of unique communications
-        unique_communications = {}
-        for comm in all_communications:
-            # If the communication has a gmail_message_id, use it as the key
-            if comm.gmail_message_id:
-                # Only keep the most recent communication for each gmail_message_id
-                if comm.gmail_message_id not in unique_communications:
-                    unique_communications[comm.gmail_message_id] = comm
-                elif comm.date_sent and unique_communications[comm.gmail_message_id].date_sent:
-                    # If we already have this message ID, keep the newer one
-                    if comm.date_sent > unique_communications[comm.gmail_message_id].date_sent:
-                        unique_communications[comm.gmail_message_id] = comm
-            else:
-                # For communications without a gmail_message_id, use the ID as the key
-                unique_communications[f"local_{comm.id}"] = comm
-        
-        # Add debug logging after filtering duplicates
-        current_app.logger.info(f"After filtering duplicates: {len(unique_communications)} communications")
-        
-        # Convert the dictionary values back to a list and sort by date
-        communications_list = sorted(
-            unique_communications.values(),
-            key=lambda x: x.date_sent if x.date_sent else datetime(1900, 1, 1),
-            reverse=True
-        )
-        
-        # Add debug logging for final communications list
-        current_app.logger.info(f"Final communications list length: {len(communications_list)}")
-        
-        current_app.logger.debug(f"Found {len(all_communications)} total communications, filtered to {len(communications_list)} unique communications")
-        
-        # Get filter name if applicable
-        filter_name = None
-        if person_id:
-            try:
-                person_id_int = int(person_id)
-                person = session.query(Person).filter_by(id=person_id_int).first()
-                if person:
-                    # Use first_name and last_name directly instead of get_name()
-                    filter_name = f"{person.first_name} {person.last_name}"
-            except ValueError:
-                current_app.logger.error(f"Invalid person_id: {person_id}")
-        elif church_id:
-            try:
-                church_id_int = int(church_id)
-                church = session.query(Church).filter_by(id=church_id_int).first()
-                if church:
-                    # Use church_name directly instead of get_name()
-                    filter_name = church.church_name
-            except ValueError:
-                current_app.logger.error(f"Invalid church_id: {church_id}")
-                
-        current_app.logger.debug(f"Found {len(communications_list)} unique communications with filters: person_id={person_id}, church_id={church_id}")
-        
-        # Debug the first few communications
-        for i, comm in enumerate(communications_list[:5]):
-            current_app.logger.debug(f"Communication {i+1}: ID={comm.id}, Type={comm.type}, Subject={comm.subject}, Person ID={comm.person_id}, User ID={comm.user_id}, Gmail Message ID={comm.gmail_message_id}")
-        
-        # Fetch people and churches in separate queries to avoid loading all communications
-        people_list = session.query(Person.id, Person.first_name, Person.last_name).all()
-        churches_list = session.query(Church.id, Church.church_name).all()
-        
-        # Calculate pagination info
-        total_pages = (total_count + per_page - 1) // per_page
-        has_next = page < total_pages
-        has_prev = page > 1
-        
-        # Import Python's built-in max and min functions for use in the template
-        import builtins
-        
-        return render_template('all_communications.html', 
-                             communications=communications_list, 
-                             people=people_list, 
-                             churches=churches_list,
-                             filter_name=filter_name,
-                             page=page,
-                             total_pages=total_pages,
-                             has_next=has_next,
-                             has_prev=has_prev,
-                             total_count=total_count,
-                             max=builtins.max,
-                             min=builtins.min)
+    return _render_timeline('all_communications.html', 'communications_bp.all_communications_route',
+                            search_term=request.args.get('search', ''))
 
 @communications_bp.route('/send', methods=['POST'])
 def send_communication_route():
@@ -736,13 +485,18 @@ def send_communication_route():
 
 @communications_bp.route('/api/communication-people')
 def get_people():
-    """Get list of people for communication form."""
+    """Get a page of people for the communication form, optionally matching q."""
     user_id = get_current_user_id()
     if not user_id:
         return jsonify([])
 
     with session_scope() as session:
-        people = session.query(Person).all()
+        query = session.query(Person.id, Person.first_name, Person.last_name).filter(Person.type == PERSON)
+        matching_ids = matching_contact_ids(session, request.args.get('q', ''))
+        if matching_ids is not None:
+            query = query.filter(Person.id.in_(matching_ids))
+        limit = parse_page_size(request.args.get('limit'), default=LOOKUP_PAGE_SIZE, maximum=100)
+        people = query.order_by(Person.last_name, Person.first_name, Person.id).limit(limit)
         return jsonify([{
             'id': person.id,
             'first_name': person.first_name,
@@ -751,16 +505,18 @@ def get_people():
 
 @communications_bp.route('/api/communication-churches')
 def get_churches():
-    """Get list of churches for communication form."""
+    """Get a page of churches for the communication form, optionally matching q."""
     user_id = get_current_user_id()
     if not user_id:
         return jsonify([])
 
     with session_scope() as session:
-        churches = session.query(Church).all()
+        churches, _ = lookup_contacts(session, CHURCH, request.args.get('q', ''),
+                                      limit=parse_page_size(request.args.get('limit'), default=LOOKUP_PAGE_SIZE,
+                                                            maximum=100))
         return jsonify([{
-            'id': church.id,
-            'church_name': church.church_name
+            'id': church['id'],
+            'church_name': church['name']
         } for church in churches])
 
 @communications_bp.route('/api/search')
@@ -780,39 +536,35 @@ def search_communications():
 
     # Get search parameters
     search_term = request.args.get('q', '')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 10))
-    person_id = request.args.get('person_id')
-    church_id = request.args.get('church_id')
+    page = request.args.get('page', 1, type=int)
+    per_page = parse_page_size(request.args.get('per_page'), default=10, maximum=100)
+    person_id = _int_arg('person_id')
+    church_id = _int_arg('church_id')
 
     with session_scope() as session:
-        # Base query
-        query = session.query(Communication)
-
-        # Apply filters
         if search_term:
-            query = query.filter(
-                (Communication.message.ilike(f'%{search_term}%')) |
-                (Communication.subject.ilike(f'%{search_term}%'))
+            results, total_count = search_communications_index(
+                session, search_term, user_id=user_id, person_id=person_id, church_id=church_id,
+                page=page, per_page=per_page
             )
-        if person_id:
-            query = query.filter(Communication.person_id == person_id)
-        if church_id:
-            query = query.filter(Communication.church_id == church_id)
-
-        # Get total count
-        total_count = query.count()
-
-        # Apply pagination
-        query = query.order_by(Communication.date_sent.desc())
-        query = query.offset((page - 1) * per_page).limit(per_page)
-
-        # Execute query
-        communications = query.all()
+        else:
+            # Without a search term show the newest communications
+            query = session.query(Communication).options(
+                db.selectinload(Communication.person),
+                db.selectinload(Communication.church)
+            ).filter((Communication.user_id == user_id) | (Communication.user_id == None))
+            if person_id:
+                query = query.filter(Communication.person_id == person_id)
+            if church_id:
+                query = query.filter(Communication.church_id == church_id)
+            total_count = query.count()
+            results = [{'communication': comm, 'rank': None, 'snippet': None} for comm in
+                       query.order_by(Communication.date_sent.desc()).offset((page - 1) * per_page).limit(per_page)]
 
         # Format results
         communications_data = []
-        for comm in communications:
+        for result in results:
+            comm = result['communication']
             recipient_name = "N/A"
             if comm.person:
                 recipient_name = f"{comm.person.first_name} {comm.person.last_name}"
@@ -823,9 +575,11 @@ def search_communications():
                 'id': comm.id,
                 'date_sent': comm.date_sent.strftime('%Y-%m-%d %H:%M') if comm.date_sent else 'N/A',
                 'type': comm.type,
-                'subject': comm.subject or 'N/A',
-                'recipient': recipient_name,
-                'message': (comm.message[:50] + '...') if comm.message and len(comm.message) > 50 else (comm.message or 'N/A'),
+                'subject': str(escape(comm.subject or 'N/A')),
+                'recipient': str(escape(recipient_name)),
+                'message': str(escape((comm.message[:50] + '...') if comm.message and len(comm.message) > 50 else (comm.message or 'N/A'))),
+                'snippet': str(result['snippet']) if result['snippet'] else None,
+                'rank': result['rank'],
                 'email_status': comm.email_status or 'N/A',
                 'view_url': url_for('communications_bp.view_communication', comm_id=comm.id) if comm.type == 'Email' else None
             })
@@ -858,15 +612,9 @@ def view_communication(comm_id):
         elif communication.church_id:
             recipient = session.query(Church).filter_by(id=communication.church_id).first()
         
-        # Get all people and churches for the reply form
-        people = session.query(Person).all()
-        churches = session.query(Church).all()
-        
         return render_template('view_communication.html',
                               communication=communication,
-                              recipient=recipient,
-                              people=people,
-                              churches=churches)
+                              recipient=recipient)
 
 @communications_bp.route('/reply/<int:comm_id>', methods=['POST'])
 def reply_to_communication(comm_id):
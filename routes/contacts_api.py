@@ -4,7 +4,6 @@ from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import firebase_admin
-from firebase_admin import auth
 from sqlalchemy import or_
 from models import Person, Church, Contacts
 from database import db, session_scope
@@ -14,6 +13,11 @@ from datetime import datetime
 import json
 import logging
 from routes.google_auth import get_access_token_from_header, get_current_user_id
+from utils.auth import verify_firebase_id_token
+from utils.contact_search import search_contacts, PERSON, CHURCH
+from utils.permissions import is_super_admin
+from utils.google_contacts import (list_contact_groups, list_connections, get_contacts, imported_resource_names,
+                                   import_google_contacts, parse_address)
 
 contacts_api = Blueprint('contacts_api', __name__)
 
@@ -23,12 +27,38 @@ def verify_firebase_token(request):
     
     token = request.headers['Authorization'].split('Bearer ')[1]
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_firebase_id_token(token)
         return decoded_token
     except Exception as e:
         current_app.logger.error(f"Token verification error: {e}")
         return None
 
+@contacts_api.route('/search', methods=['GET'])
+def search_contacts_api():
+    """
+    Typeahead search over people and churches
+
+    Query parameters: q (search text), type ('person' or 'church', optional)
+    and limit. Returns the best matches first as typed hits with IDs.
+    """
+    user_id = get_current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    contact_type = request.args.get('type')
+    types = [contact_type] if contact_type in (PERSON, CHURCH) else None
+    limit = request.args.get('limit', 10, type=int)
+
+    with session_scope() as session:
+        hits = search_contacts(
+            session,
+            request.args.get('q', ''),
+            user_id=None if is_super_admin(user_id) else user_id,
+            types=types,
+            limit=limit
+        )
+    return jsonify({'results': hits})
+
 @contacts_api.route('/api/contacts/check-import/<resource_name>', methods=['GET'])
 def check_import_status(resource_name):
     token_data = verify_firebase_token(request)
@@ -57,9 +87,40 @@ def check_import_status(resource_name):
         current_app.logger.error(f"Error checking import status: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _people_service(access_token):
+    """Build a People API client from the browser's Google access token"""
+    google_credentials = Credentials(
+        token=access_token,
+        refresh_token=None,
+        token_uri="https://oauth2.googleapis.com/token",
+        client_id=os.getenv('GOOGLE_CLIENT_ID'),
+        client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
+        scopes=[
+            "https://www.googleapis.com/auth/contacts.readonly",
+            "https://www.googleapis.com/auth/contacts.other.readonly"
+        ]
+    )
+    return build('people', 'v1', credentials=google_credentials)
+
+def _google_error_response(e):
+    """JSON response for People API auth errors, or None for other errors"""
+    current_app.logger.error(f"Google API error: {e}")
+    if e.resp.status == 403:
+        return jsonify({'error': 'Access to contacts denied. Please check permissions.'}), 403
+    elif e.resp.status == 401:
+        return jsonify({'error': 'Authentication failed. Please sign in again.'}), 401
+    return None
+
 @contacts_api.route('/api/contacts/list', methods=['POST'])
 def list_contacts():
-    """List Google contacts"""
+    """
+    List Google contacts
+
+    Pages through all connections. Pass the sync_token from a previous
+    response to get only the contacts changed since then; full_sync is False
+    in that case and deleted lists the removed resource names. Each contact
+    carries an imported flag.
+    """
     token_data = verify_firebase_token(request)
     if not token_data:
         return jsonify({'error': 'Unauthorized'}), 401
@@ -71,94 +132,100 @@ def list_contacts():
             current_app.logger.error("No access token provided in request")
             return jsonify({'error': 'No access token provided'}), 400
         
-        access_token = request_data['access_token']
-        current_app.logger.info("Received access token, creating Google credentials")
-        
-        # Create Google credentials with the access token
-        google_credentials = Credentials(
-            token=access_token,
-            refresh_token=None,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=os.getenv('GOOGLE_CLIENT_ID'),
-            client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
-            scopes=[
-                "https://www.googleapis.com/auth/contacts.readonly",
-                "https://www.googleapis.com/auth/contacts.other.readonly"
-            ]
-        )
-
         current_app.logger.info("Building People API service")
-        service = build('people', 'v1', credentials=google_credentials)
+        service = _people_service(request_data['access_token'])
         
         try:
             current_app.logger.info("Fetching contact groups")
-            # First fetch contact groups
-            groups_result = service.contactGroups().list(pageSize=100).execute()
-            groups = groups_result.get('contactGroups', [])
-            processed_groups = []
-            
-            # Create a map of group IDs to their resourceNames for quick lookup
-            group_map = {}
-            for group in groups:
-                if group.get('resourceName') and group.get('name'):
-                    processed_groups.append({
-                        'resourceName': group.get('resourceName'),
-                        'name': group.get('name')
-                    })
-                    group_map[group.get('resourceName')] = group.get('name')
-            
+            groups = list_contact_groups(service)
+
             current_app.logger.info("Fetching contacts")
-            # Then fetch contacts with their memberships
-            results = service.people().connections().list(
-                resourceName='people/me',
-                pageSize=1000,
-                personFields='names,emailAddresses,phoneNumbers,addresses,memberships'
-            ).execute()
-            
-            connections = results.get('connections', [])
-            processed_contacts = []
-            
-            current_app.logger.info(f"Processing {len(connections)} contacts")
-            for person in connections:
-                names = person.get('names', [])
-                name = names[0].get('displayName') if names else 'No Name'
-                contact = {
-                    'resource_name': person.get('resourceName'),
-                    'names': name,
-                    'email_addresses': [email.get('value') for email in person.get('emailAddresses', [])],
-                    'phone_numbers': [phone.get('value') for phone in person.get('phoneNumbers', [])],
-                    'addresses': [addr.get('formattedValue') for addr in person.get('addresses', [])],
-                    'groups': []
-                }
-                
-                # Extract group memberships
-                memberships = person.get('memberships', [])
-                for membership in memberships:
-                    if 'contactGroupMembership' in membership:
-                        group_resource_name = membership['contactGroupMembership'].get('contactGroupResourceName')
-                        if group_resource_name:
-                            contact['groups'].append(group_resource_name)
-                
-                processed_contacts.append(contact)
-            
-            current_app.logger.info(f"Found {len(processed_groups)} groups and {len(processed_contacts)} contacts")
-            return jsonify({
-                'contacts': processed_contacts,
-                'groups': processed_groups
-            })
-            
+            listing = list_connections(service, request_data.get('sync_token'))
         except HttpError as e:
-            current_app.logger.error(f"Google API error: {e}")
-            if e.resp.status == 403:
-                return jsonify({'error': 'Access to contacts denied. Please check permissions.'}), 403
-            elif e.resp.status == 401:
-                return jsonify({'error': 'Authentication failed. Please sign in again.'}), 401
+            error_response = _google_error_response(e)
+            if error_response:
+                return error_response
             raise
+
+        contacts = listing['contacts']
+        with session_scope() as session:
+            imported = imported_resource_names(session, [contact['resource_name'] for contact in contacts])
+        for contact in contacts:
+            contact['imported'] = contact['resource_name'] in imported
+
+        current_app.logger.info(f"Found {len(groups)} groups and {len(contacts)} contacts "
+                                f"({'full' if listing['full_sync'] else 'incremental'} listing)")
+        return jsonify({
+            'contacts': contacts,
+            'groups': groups,
+            'deleted': listing['deleted'],
+            'sync_token': listing['sync_token'],
+            'full_sync': listing['full_sync']
+        })
             
     except Exception as e:
         current_app.logger.error(f"Error listing contacts: {e}", exc_info=True)
         return jsonify({'error': 'Failed to access contacts. Please try signing out and in again.'}), 500
 
+@contacts_api.route('/api/contacts/import/bulk', methods=['POST'])
+def import_contacts_bulk():
+    """
+    Import many Google contacts as people or churches
+
+    The body has contacts, a list of {resource_name, import_type} with the
+    contact details from the listing. An import_type at the top level applies
+    to contacts without one. When access_token is given, contacts sent without
+    details are fetched from Google. Returns created, updated and skipped
+    counts with a result per contact.
+    """
+    token_data = verify_firebase_token(request)
+    if not token_data:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('contacts'), list):
+        return jsonify({'error': 'No contacts provided'}), 400
+
+    default_type = data.get('import_type')
+    contacts = []
+    for item in data['contacts']:
+        if isinstance(item, str):
+            item = {'resource_name': item}
+        elif not isinstance(item, dict):
+            continue
+        contacts.append({**item, 'import_type': item.get('import_type') or default_type})
+
+    try:
+        if data.get('access_token'):
+            missing = [contact for contact in contacts if contact.get('resource_name') and not contact.get('names')]
+            if missing:
+                try:
+                    details = {
+                        contact['resource_name']: contact
+                        for contact in get_contacts(_people_service(data['access_token']),
+                                                    [contact['resource_name'] for contact in missing])
+                    }
+                except HttpError as e:
+                    error_response = _google_error_response(e)
+                    if error_response:
+                        return error_response
+                    raise
+                for contact in missing:
+                    contact.update(details.get(contact['resource_name'], {}))
+
+        user_id = get_current_user_id()
+        with session_scope() as session:
+            summary = import_google_contacts(session, contacts, user_id)
+        return jsonify(summary)
+
+    except Exception as e:
+        current_app.logger.error(f"Error importing contacts: {e}")
+        current_app.logger.error(traceback.format_exc())
+        return jsonify({
+            'error': 'Failed to import contacts',
+            'message': str(e)
+        }), 500
+
 @contacts_api.route('/api/contacts/import', methods=['POST'])
 def import_contact():
     """Import a Google contact as either a person or church"""
@@ -190,26 +257,7 @@ def import_contact():
             ).first()
 
             # Parse address components
-            address_parts = {}
-            if addresses:
-                address = addresses[0]
-                current_app.logger.debug(f"Processing address: {address}")
-                try:
-                    # Try to parse the formatted address
-                    address_lines = address.split(',')
-                    if len(address_lines) >= 2:
-                        # Last part usually contains state and zip
-                        state_zip = address_lines[-1].strip().split()
-                        if len(state_zip) >= 2:
-                            address_parts['state'] = state_zip[0]
-                            address_parts['zip_code'] = state_zip[1]
-                        # Second to last part usually contains city
-                        address_parts['city'] = address_lines[-2].strip()
-                        # First part(s) contain street address
-                        address_parts['street_address'] = ','.join(address_lines[:-2]).strip()
-                except Exception as e:
-                    current_app.logger.warning(f"Error parsing address: {e}")
-
+            address_parts = parse_address(addresses[0]) if addresses else {}
             current_app.logger.debug(f"Address parts: {address_parts}")
 
             try:
@@ -1,8 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify, session, flash
-from sqlalchemy import func
-from models import Session, Person, Church, Task, Communication, EmailSignature, UserOffice, Office
+from models import Session, EmailSignature
 from database import db, session_scope
-from firebase_admin import auth
 from functools import wraps
 from routes.google_auth import get_current_user_id
 import os
@@ -14,8 +12,10 @@ import base64
 import requests
 import traceback
 
-from utils.auth import auth_required, get_current_user_id
+from utils.auth import auth_required, get_current_user_id, verify_firebase_id_token
 from utils.gmail_integration import convert_image_urls_to_data_urls
+from utils.dashboard_cache import get_dashboard_summary, serialize_summary
+from utils.pipeline_rollups import pipeline_funnel, PERSON, CHURCH
 
 dashboard_bp = Blueprint('dashboard_bp', __name__)
 
@@ -33,7 +33,7 @@ def auth_required(f):
         if auth_header and auth_header.startswith('Bearer '):
             try:
                 token = auth_header.split('Bearer ')[1]
-                decoded_token = auth.verify_id_token(token)
+                decoded_token = verify_firebase_id_token(token)
                 # Set the user_id in the session
                 session['user_id'] = decoded_token['uid']
                 return f(*args, **kwargs)
@@ -43,7 +43,7 @@ def auth_required(f):
         # If no valid bearer token, check for session token
         if 'firebase_token' in request.cookies:
             try:
-                decoded_token = auth.verify_id_token(request.cookies['firebase_token'])
+                decoded_token = verify_firebase_id_token(request.cookies['firebase_token'])
                 # Set the user_id in the session
                 session['user_id'] = decoded_token['uid']
                 return f(*args, **kwargs)
@@ -65,7 +65,7 @@ def dashboard():
         try:
             if 'firebase_token' in request.cookies:
                 token = request.cookies['firebase_token']
-                decoded_token = auth.verify_id_token(token)
+                decoded_token = verify_firebase_id_token(token)
                 user_id = decoded_token['uid']
                 current_app.logger.info(f"Retrieved user_id from firebase_token cookie: {user_id}")
         except Exception as e:
@@ -77,77 +77,32 @@ def dashboard():
         return redirect(url_for('home'))
     
     with session_scope() as session:
-        # Count only the user's people
-        total_people = session.query(func.count(Person.id)).filter(
-            Person.type == 'person',
-            Person.user_id == user_id
-        ).scalar()
-        
-        # Log the query and result for debugging
-        current_app.logger.info(f"Dashboard people count query for user_id={user_id}: {total_people}")
-        
-        # Show all churches
-        total_churches = session.query(func.count(Church.id)).filter(
-            Church.type == 'church'
-        ).scalar()
-        
-        # Get pending tasks and format them properly
-        # Only show tasks for this user
-        pending_tasks = (
-            session.query(
-                Task.id,
-                Task.title,
-                Task.description,
-                Task.due_date,
-                Task.due_time,
-                Task.status,
-                Task.priority,
-                Person.first_name,
-                Person.last_name,
-                Church.church_name,
-                Task.person_id,
-                Task.church_id
-            )
-            .outerjoin(Person, Task.person_id == Person.id)
-            .outerjoin(Church, Task.church_id == Church.id)
-            .filter(Task.user_id == user_id)
-            .filter(Task.status != 'Completed')
-            .order_by(Task.due_date)
-            .limit(5)
-            .all()
-        )
-        
-        # Get recent communications
-        recent_communications = (
-            session.query(Communication)
-            .filter(Communication.user_id == user_id)
-            .order_by(Communication.date_sent.desc())
-            .limit(5)
-            .all()
-        )
-        
-        # Get user's offices and roles
-        user_offices = (
-            session.query(UserOffice)
-            .filter(UserOffice.user_id == user_id)
-            .join(Office, UserOffice.office_id == Office.id)
-            .all()
-        )
-        
-        # Debug logging for user offices
-        current_app.logger.info(f"User ID: {user_id}")
-        current_app.logger.info(f"User offices: {user_offices}")
-        for office in user_offices:
-            current_app.logger.info(f"Office: {office.office.name}, Role: {office.role}")
-        
-        return render_template(
-            'dashboard.html',
-            total_people=total_people,
-            total_churches=total_churches,
-            pending_tasks=pending_tasks,
-            recent_communications=recent_communications,
-            user_offices=user_offices
-        )
+        summary = get_dashboard_summary(session, user_id)
+
+    return render_template(
+        'dashboard.html',
+        total_people=summary['total_people'],
+        total_churches=summary['total_churches'],
+        pending_tasks=summary['pending_tasks'],
+        recent_communications=summary['recent_communications'],
+        user_offices=summary['user_offices']
+    )
+
+@dashboard_bp.route('/api/dashboard-summary', methods=['GET'])
+@auth_required
+def dashboard_summary():
+    """API endpoint returning the user's cached dashboard summary; pass refresh=1 to recompute it"""
+    user_id = get_current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    try:
+        with session_scope() as session:
+            summary = get_dashboard_summary(session, user_id, refresh=request.args.get('refresh') == '1')
+        return jsonify(serialize_summary(summary))
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving dashboard summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/google-settings')
 @auth_required
@@ -428,27 +383,13 @@ def pipeline_stats():
     """API endpoint to get pipeline statistics for both People and Churches"""
     try:
         with session_scope() as session:
-            # Get people pipeline statistics
-            people_pipeline_stats = (
-                session.query(
-                    Person.people_pipeline,
-                    func.count(Person.id).label('count')
-                )
-                .filter(Person.people_pipeline.isnot(None))
-                .group_by(Person.people_pipeline)
-                .all()
-            )
-            
-            # Get church pipeline statistics
-            church_pipeline_stats = (
-                session.query(
-                    Church.church_pipeline,
-                    func.count(Church.id).label('count')
-                )
-                .filter(Church.church_pipeline.isnot(None))
-                .group_by(Church.church_pipeline)
-                .all()
-            )
+            # Read the counts from the pipeline rollups rather than scanning the contacts
+            people_pipeline_stats = [
+                (item['stage'], item['count']) for item in pipeline_funnel(session, PERSON)
+            ]
+            church_pipeline_stats = [
+                (item['stage'], item['count']) for item in pipeline_funnel(session, CHURCH)
+            ]
             
             # Convert to dictionaries
             people_stats = {
@@ -2,8 +2,6 @@
 Blueprint for Gmail integration with Communications
 """
 from flask import Blueprint, request, jsonify, current_app
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from models import Communication, Person, Church, EmailSignature
 from database import db, session_scope
 from routes.google_auth import get_access_token_from_header, get_current_user_id
@@ -30,7 +28,8 @@ from utils.gmail_integration import (
     create_draft,
     send_draft
 )
-from sqlalchemy import func, desc
+from utils.gmail_sync import sync_user_emails, record_sync_result
+from sqlalchemy import desc
 
 gmail_api = Blueprint('gmail_api', __name__)
 logger = logging.getLogger(__name__)
@@ -649,248 +648,17 @@ def _sync_emails_impl():
                 'message': 'No Google access token found'
             }), 400
             
-        # Log the start of the sync process
-        current_app.logger.info(f"Starting Gmail sync for user {user_id}")
+        include_history = request.headers.get('X-Include-History', '').lower() == 'true'
+        result = sync_user_emails(user_id, access_token, user_email=user_email, include_history=include_history)
         
-        try:
-            # Get all contacts (people and churches) with email addresses
-            with session_scope() as session:
-                people_with_email = session.query(Person).filter(Person.email != None, Person.email != '').all()
-                church_with_email = session.query(Church).filter(Church.email != None, Church.email != '').all()
-                
-                all_contacts_emails = []
-                # Add person emails
-                for person in people_with_email:
-                    if person.email and person.email.strip():
-                        all_contacts_emails.append(person.email.lower())
-                
-                # Add church emails
-                for church in church_with_email:
-                    if church.email and church.email.strip():
-                        all_contacts_emails.append(church.email.lower())
-                
-                if not all_contacts_emails:
-                    return jsonify({
-                        'success': False,
-                        'message': 'No contacts with email found'
-                    }), 400
-                    
-                # Get existing message IDs to avoid duplicates
-                existing_message_ids = session.query(Communication.gmail_message_id).filter(
-                    Communication.gmail_message_id != None
-                ).all()
-                
-                # Convert to a set for faster lookups
-                existing_message_ids = {id[0] for id in existing_message_ids if id[0]}
-                
-                current_app.logger.info(f"Found {len(existing_message_ids)} already synced messages")
-                current_app.logger.info(f"Searching for emails for contacts: {', '.join(all_contacts_emails[:5])}{'...' if len(all_contacts_emails) > 5 else ''}")
-                
-                # Build query to find emails from or to contacts
-                query_parts = []
-
-                # Get user's email from Google API for more targeted searching
-                user_email_str = None
-                try:
-                    credentials = Credentials(token=access_token)
-                    user_info_service = build('oauth2', 'v2', credentials=credentials)
-                    user_info = user_info_service.userinfo().get().execute()
-                    if 'email' in user_info:
-                        user_email_str = user_info['email']
-                        current_app.logger.debug(f"Found user email: {user_email_str}")
-                except Exception as e:
-                    current_app.logger.warning(f"Unable to get user email from Google API: {e}")
-
-                # If we have the user's email, build more targeted queries
-                if user_email_str:
-                    # Emails FROM contacts TO the user
-                    for contact_email in all_contacts_emails:
-                        query_parts.append(f"(from:{contact_email} AND to:{user_email_str})")
-                    
-                    # Emails FROM the user TO contacts
-                    for contact_email in all_contacts_emails:
-                        query_parts.append(f"(from:{user_email_str} AND to:{contact_email})")
-                else:
-                    # Fallback to the simpler but less precise approach
-                    # Find emails FROM any contact 
-                    from_queries = [f"from:{email}" for email in all_contacts_emails]
-                    # Find emails TO any contact
-                    to_queries = [f"to:{email}" for email in all_contacts_emails]
-                    query_parts = from_queries + to_queries
-
-                # Combine all queries with OR
-                query = " OR ".join(query_parts)
-                current_app.logger.debug(f"Gmail search query: {query}")
-            
-            # Setup Gmail service
-            token_dict = {
-                'token': access_token
-            }
-            service = build_gmail_service(access_token)
-            if not service:
-                current_app.logger.error("Failed to build Gmail service")
-                return jsonify({
-                    'success': False,
-                    'message': 'Failed to build Gmail service. Please check your Google account permissions and try again.'
-                }), 500
-
-            # Check if we should include historical emails
-            include_history = request.headers.get('X-Include-History', '').lower() == 'true'
-            if include_history:
-                current_app.logger.info("Including historical emails in sync")
-
-            # Get messages matching the query
-            messages = list_messages(service, 'me', query)
-            current_app.logger.info(f"Found {len(messages) if messages else 0} messages matching query")
-
-            if not messages:
-                return jsonify({
-                    'success': True,
-                    'message': 'No new emails found',
-                    'synced_count': 0,
-                    'total_messages_found': 0
-                })
-                
-            # Process each message that isn't already synced
-            synced_count = 0
-            for msg in messages:
-                msg_id = msg.get('id')
-                
-                # Skip if already synced
-                if msg_id in existing_message_ids:
-                    continue
-                
-                # Get full message
-                message_data = get_message_content(service, 'me', msg_id)
-                
-                if not message_data:
-                    continue
-                
-                # Extract email addresses
-                sender_email = extract_email_address(message_data.get('from', ''))
-                recipient_email = extract_email_address(message_data.get('to', ''))
-                
-                # Log for debugging
-                current_app.logger.debug(f"Processing message: ID={msg_id}, From={sender_email}, To={recipient_email}")
-
-                # Only sync emails that are between user and a contact
-                user_is_sender = user_email_str and sender_email and sender_email.lower() == user_email_str.lower()
-                user_is_recipient = user_email_str and recipient_email and recipient_email.lower() == user_email_str.lower()
-                contact_is_sender = sender_email and sender_email.lower() in [email.lower() for email in all_contacts_emails]
-                contact_is_recipient = recipient_email and recipient_email.lower() in [email.lower() for email in all_contacts_emails]
-
-                # Modified validation logic:
-                # 1. User sending to contact OR
-                # 2. Contact sending to user OR
-                # 3. Email involves a contact (either as sender or recipient)
-                valid_email = (user_is_sender and contact_is_recipient) or \
-                              (contact_is_sender and user_is_recipient) or \
-                              contact_is_sender or contact_is_recipient
-
-                if not valid_email:
-                    current_app.logger.debug(f"Skipping message - not involving any contact: {sender_email} -> {recipient_email}")
-                    continue
-                
-                # Create a new communication record
-                communication = Communication(
-                    type='Email',
-                    message=message_data.get('body', ''),
-                    date_sent=datetime.now(),  # Will be overridden below if date available
-                    date=datetime.now(),  # Will be overridden below if date available
-                    subject=message_data.get('subject', ''),
-                    gmail_message_id=msg_id,
-                    gmail_thread_id=message_data.get('threadId'),
-                    user_id=user_id,  # Ensure user_id is set
-                    direction='inbound' if contact_is_sender else 'outbound'  # Set direction based on sender
-                )
-                
-                # Parse date if available
-                if message_data.get('date'):
-                    try:
-                        # Try parsing ISO format first
-                        parsed_date = datetime.fromisoformat(message_data.get('date').replace('Z', '+00:00'))
-                        communication.date_sent = parsed_date
-                        communication.date = parsed_date
-                    except ValueError:
-                        try:
-                            # Try parsing email format
-                            from email.utils import parsedate_to_datetime
-                            parsed_date = parsedate_to_datetime(message_data.get('date'))
-                            communication.date_sent = parsed_date
-                            communication.date = parsed_date
-                        except Exception as e:
-                            # Default to current date if parsing fails
-                            current_app.logger.error(f"Error parsing date {message_data.get('date')}: {e}")
-                            now = datetime.now()
-                            communication.date_sent = now
-                            communication.date = now
-                else:
-                    now = datetime.now()
-                    communication.date_sent = now
-                    communication.date = now
-                    
-                # Link to person/church if sender/recipient matches
-                if contact_is_sender:
-                    # Find matching person or church
-                    person = session.query(Person).filter(func.lower(Person.email) == sender_email.lower()).first()
-                    church = session.query(Church).filter(func.lower(Church.email) == sender_email.lower()).first()
-                    
-                    if person:
-                        communication.person_id = person.id
-                    elif church:
-                        communication.church_id = church.id
-                
-                elif contact_is_recipient:
-                    # Find matching person or church
-                    person = session.query(Person).filter(func.lower(Person.email) == recipient_email.lower()).first()
-                    church = session.query(Church).filter(func.lower(Church.email) == recipient_email.lower()).first()
-                    
-                    if person:
-                        communication.person_id = person.id
-                    elif church:
-                        communication.church_id = church.id
-                
-                session.add(communication)
-                synced_count += 1
-            
-            # Commit all changes
-            session.commit()
-            
-            # Store the result in the application config for status checks
-            current_app.config['LAST_SYNC_RESULT'] = {
-                'success': True,
-                'message': f'Successfully synced {synced_count} emails',
-                'synced_count': synced_count,
-                'total_messages_found': len(messages) if messages else 0,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            return jsonify({
-                'success': True,
-                'message': f'Successfully synced {synced_count} emails',
-                'synced_count': synced_count,
-                'total_messages_found': len(messages) if messages else 0
-            })
-            
-        except Exception as inner_e:
-            # Log the detailed error
-            current_app.logger.error(f"Error during Gmail sync process: {str(inner_e)}")
-            current_app.logger.error(traceback.format_exc())
-            
-            # Store the error in the application config
-            current_app.config['LAST_SYNC_RESULT'] = {
-                'success': False,
-                'message': f'Error during sync: {str(inner_e)}',
-                'synced_count': 0,
-                'total_messages_found': 0,
-                'timestamp': datetime.now().isoformat(),
-                'error': str(inner_e)
-            }
-            
-            return jsonify({
-                'success': False,
-                'message': f'Error syncing emails: {str(inner_e)}'
-            }), 500
+        # Store the result in the application config for status checks
+        record_sync_result(user_id, result)
+        
+        if result['success']:
+            return jsonify(result)
+        
+        status_code = 400 if result.get('error') == 'no_contacts' else 500
+        return jsonify(result), status_code
     
     except Exception as e:
         logger.error(f"Error syncing emails: {e}")
@@ -915,7 +683,6 @@ def _sync_emails_impl():
 @auth_required
 def force_sync_emails():
     """Force sync emails for testing purposes (temporary debug endpoint)"""
-    from utils.background_jobs import sync_gmail_emails
     from routes.google_auth import get_current_user_id
     
     try:
@@ -942,67 +709,17 @@ def force_sync_emails():
         # Run the sync job directly
         current_app.logger.info(f"Manually triggering Gmail email sync for user {user_id}")
         
-        # Call the sync_emails endpoint directly with the user ID and token
+        # Run the sync directly with the user ID and token
         try:
-            # Create a new request context
-            with current_app.test_request_context(
-                path='/api/gmail/sync-emails',
-                method='POST',
-                headers={
-                    'X-User-ID': user_id,
-                    'X-Google-Token': access_token
-                }
-            ):
-                # Call the _sync_emails_impl function directly to bypass auth_required
-                current_app.logger.info("Calling _sync_emails_impl function directly")
-                result = _sync_emails_impl()
-                current_app.logger.info(f"Sync result: {result}")
-                
-                # Check if the result is a redirect (302)
-                if hasattr(result, 'status_code') and result.status_code == 302:
-                    current_app.logger.warning("Received redirect response from sync_emails, likely due to authentication")
-                    # Return a JSON response instead of the redirect
-                    return jsonify({
-                        'success': False,
-                        'message': 'Authentication required',
-                        'redirect_url': result.location
-                    }), 401
-                
-                # Store the last run result in the application config for status checks
-                if hasattr(result, 'json'):
-                    try:
-                        result_data = result.json
-                        if callable(result_data):
-                            result_data = result_data()
-                        
-                        # Check if result_data is None before trying to access it
-                        if result_data is not None:
-                            current_app.config['LAST_SYNC_RESULT'] = {
-                                'success': result_data.get('success', False),
-                                'message': result_data.get('message', ''),
-                                'synced_count': result_data.get('synced_count', 0),
-                                'timestamp': datetime.now().isoformat()
-                            }
-                        else:
-                            current_app.logger.warning("Result data is None, cannot update LAST_SYNC_RESULT")
-                            current_app.config['LAST_SYNC_RESULT'] = {
-                                'success': False,
-                                'message': 'Sync completed but returned no data',
-                                'synced_count': 0,
-                                'timestamp': datetime.now().isoformat()
-                            }
-                    except Exception as json_error:
-                        current_app.logger.error(f"Error processing JSON result: {json_error}")
-                        current_app.config['LAST_SYNC_RESULT'] = {
-                            'success': False,
-                            'message': f'Error processing sync result: {str(json_error)}',
-                            'synced_count': 0,
-                            'timestamp': datetime.now().isoformat()
-                        }
-                
-                return result
+            result = sync_user_emails(user_id, access_token, include_history=False)
+            current_app.logger.info(f"Sync result: {result}")
+            
+            # Store the last run result in the application config for status checks
+            record_sync_result(user_id, result)
+            
+            return jsonify(result), (200 if result['success'] else 500)
         except Exception as e:
-            current_app.logger.error(f"Error calling _sync_emails_impl function: {e}")
+            current_app.logger.error(f"Error running Gmail sync: {e}")
             current_app.logger.error(traceback.format_exc())
             return jsonify({
                 'success': False,
@@ -1034,8 +751,9 @@ def get_sync_status():
         # Check if there's a manual sync in progress from session
         manual_sync = False  # We don't track manual syncs right now
         
-        # Get last run result if available
-        last_run_result = current_app.config.get('LAST_SYNC_RESULT', {})
+        # Get last run result if available, preferring this user's own result
+        last_run_result = current_app.config.get('LAST_SYNC_RESULTS', {}).get(user_id) or \
+            current_app.config.get('LAST_SYNC_RESULT', {})
         
         response_data = {
             'success': True,
@@ -1065,7 +783,6 @@ def get_sync_status():
 @auth_required
 def force_sync_emails_with_history():
     """Force sync emails including historical emails (useful for initial setup)"""
-    from utils.background_jobs import sync_gmail_emails
     from routes.google_auth import get_current_user_id
     
     try:
@@ -1092,68 +809,17 @@ def force_sync_emails_with_history():
         # Run the sync job directly
         current_app.logger.info(f"Manually triggering Gmail email sync WITH HISTORY for user {user_id}")
         
-        # Call the sync_emails endpoint directly with the user ID and token
+        # Run the sync directly with the user ID and token
         try:
-            # Create a new request context
-            with current_app.test_request_context(
-                path='/api/gmail/sync-emails',
-                method='POST',
-                headers={
-                    'X-User-ID': user_id,
-                    'X-Google-Token': access_token,
-                    'X-Include-History': 'true'  # Special header to indicate we want historical emails
-                }
-            ):
-                # Call the _sync_emails_impl function directly to bypass auth_required
-                current_app.logger.info("Calling _sync_emails_impl function directly with history flag")
-                result = _sync_emails_impl()
-                current_app.logger.info(f"Sync result: {result}")
-                
-                # Check if the result is a redirect (302)
-                if hasattr(result, 'status_code') and result.status_code == 302:
-                    current_app.logger.warning("Received redirect response from sync_emails, likely due to authentication")
-                    # Return a JSON response instead of the redirect
-                    return jsonify({
-                        'success': False,
-                        'message': 'Authentication required',
-                        'redirect_url': result.location
-                    }), 401
-                
-                # Store the last run result in the application config for status checks
-                if hasattr(result, 'json'):
-                    try:
-                        result_data = result.json
-                        if callable(result_data):
-                            result_data = result_data()
-                        
-                        # Check if result_data is None before trying to access it
-                        if result_data is not None:
-                            current_app.config['LAST_SYNC_RESULT'] = {
-                                'success': result_data.get('success', False),
-                                'message': result_data.get('message', ''),
-                                'synced_count': result_data.get('synced_count', 0),
-                                'timestamp': datetime.now().isoformat()
-                            }
-                        else:
-                            current_app.logger.warning("Result data is None, cannot update LAST_SYNC_RESULT")
-                            current_app.config['LAST_SYNC_RESULT'] = {
-                                'success': False,
-                                'message': 'Sync completed but returned no data',
-                                'synced_count': 0,
-                                'timestamp': datetime.now().isoformat()
-                            }
-                    except Exception as json_error:
-                        current_app.logger.error(f"Error processing JSON result: {json_error}")
-                        current_app.config['LAST_SYNC_RESULT'] = {
-                            'success': False,
-                            'message': f'Error processing sync result: {str(json_error)}',
-                            'synced_count': 0,
-                            'timestamp': datetime.now().isoformat()
-                        }
-                
-                return result
+            result = sync_user_emails(user_id, access_token, include_history=True)
+            current_app.logger.info(f"Sync result: {result}")
+            
+            # Store the last run result in the application config for status checks
+            record_sync_result(user_id, result)
+            
+            return jsonify(result), (200 if result['success'] else 500)
         except Exception as e:
-            current_app.logger.error(f"Error calling _sync_emails_impl function with history: {e}")
+            current_app.logger.error(f"Error running Gmail sync: {e}")
             current_app.logger.error(traceback.format_exc())
             return jsonify({
                 'success': False,
@@ -2,16 +2,29 @@ from flask import Blueprint, redirect, request, url_for, session, jsonify, curre
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
-from firebase_admin import auth
 import os
 import json
 from functools import wraps
-import sqlite3
 from datetime import datetime
 import traceback
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from database import get_engine
+from models import GoogleToken, GoogleSyncState
+from utils.write_queue import run_serialized_write
+from utils.auth import get_request_user
 
 google_auth_bp = Blueprint('google_auth', __name__)
 
+google_tokens = GoogleToken.__table__
+google_sync_state = GoogleSyncState.__table__
+
+# Dialect-specific INSERT constructs that support ON CONFLICT upserts
+_DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
 # This variable specifies the name of a file that contains the OAuth 2.0 information
 # including client_id and client_secret
 CLIENT_SECRETS_FILE = 'client_secret.json'
@@ -75,16 +88,10 @@ def get_current_user_id():
     
     # Then try to get from request headers (for API calls)
     try:
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            # Verify the Firebase token
-            try:
-                decoded_token = auth.verify_id_token(token)
-                return decoded_token['uid']
-            except Exception as e:
-                current_app.logger.error(f"Error verifying Firebase token: {str(e)}")
-                return None
+        # Verified once per request and cached across requests
+        user = get_request_user()
+        if user:
+            return user['uid']
     except Exception as e:
         current_app.logger.error(f"Error getting user ID from request: {str(e)}")
         return None
@@ -120,23 +127,9 @@ def auth_required(f):
         is_api_request = request.path.startswith('/api/') or request.headers.get('Accept') == 'application/json'
         current_app.logger.debug(f"Auth check for path: {request.path}, is_api_request: {is_api_request}")
         
-        # First check Authorization header
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            try:
-                token = auth_header.split('Bearer ')[1]
-                auth.verify_id_token(token)
-                return f(*args, **kwargs)
-            except Exception as e:
-                current_app.logger.error(f"Bearer token verification failed: {str(e)}")
-
-        # If no valid bearer token, check for session token
-        if 'firebase_token' in request.cookies:
-            try:
-                auth.verify_id_token(request.cookies['firebase_token'])
-                return f(*args, **kwargs)
-            except Exception as e:
-                current_app.logger.error(f"Cookie token verification failed: {str(e)}")
+        # Check the Authorization header, then the session cookie
+        if get_request_user():
+            return f(*args, **kwargs)
         
         # Check for X-Google-Token header for Gmail API requests
         if 'X-Google-Token' in request.headers:
@@ -185,17 +178,12 @@ def get_access_token_from_header():
     
     # Try to get tokens from database as a last resort
     try:
-        conn = sqlite3.connect('instance/mobilize_crm.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT token FROM google_tokens 
-            ORDER BY updated_at DESC LIMIT 1
-        """)
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and result[0]:
-            token = result[0]
+        with get_engine().connect() as conn:
+            token = conn.execute(
+                select(google_tokens.c.token).order_by(google_tokens.c.updated_at.desc()).limit(1)
+            ).scalar()
+        
+        if token:
             current_app.logger.info(f"Found token in database: {token[:10]}...")
             return token
         else:
@@ -226,42 +214,15 @@ def get_user_tokens():
             current_app.logger.debug("Not in request context, cannot access session")
             pass
             
-        # Connect to the database
         current_app.logger.debug("Attempting to retrieve Google tokens from database")
-        conn = sqlite3.connect('instance/mobilize_crm.db')
-        cursor = conn.cursor()
-        
-        # Create the table if it doesn't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS google_tokens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id VARCHAR NOT NULL,
-                access_token VARCHAR NOT NULL,
-                refresh_token VARCHAR,
-                token_uri VARCHAR,
-                client_id VARCHAR,
-                client_secret VARCHAR,
-                scopes VARCHAR,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Check if the table has any records
-        cursor.execute("SELECT COUNT(*) FROM google_tokens")
-        count = cursor.fetchone()[0]
-        current_app.logger.debug(f"Found {count} token records in database")
-        
-        # Query for the most recently used token
-        cursor.execute("""
-            SELECT token, refresh_token, token_uri, client_id, client_secret, scopes
-            FROM google_tokens
-            ORDER BY updated_at DESC
-            LIMIT 1
-        """)
-        
-        result = cursor.fetchone()
-        conn.close()
+        with get_engine().connect() as conn:
+            # Query for the most recently used token
+            result = conn.execute(
+                select(google_tokens.c.token, google_tokens.c.refresh_token, google_tokens.c.token_uri,
+                       google_tokens.c.client_id, google_tokens.c.client_secret, google_tokens.c.scopes)
+                .order_by(google_tokens.c.updated_at.desc())
+                .limit(1)
+            ).first()
         
         if not result:
             current_app.logger.debug("No tokens found in database")
@@ -316,63 +277,21 @@ def save_user_tokens(token_data):
             
         current_app.logger.info(f"Saving tokens for user_id: {user_id}, email: {user_email}")
         
-        # Connect to the database
-        conn = sqlite3.connect('instance/mobilize_crm.db')
-        cursor = conn.cursor()
-        
-        # Create the table if it doesn't exist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS google_tokens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id VARCHAR NOT NULL,
-                user_email VARCHAR,
-                access_token VARCHAR NOT NULL,
-                refresh_token VARCHAR,
-                token_uri VARCHAR,
-                client_id VARCHAR,
-                client_secret VARCHAR,
-                scopes VARCHAR,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Check if we need to add the user_email column
-        try:
-            cursor.execute("SELECT user_email FROM google_tokens LIMIT 1")
-        except sqlite3.OperationalError:
-            current_app.logger.info("Adding user_email column to google_tokens table")
-            cursor.execute("ALTER TABLE google_tokens ADD COLUMN user_email VARCHAR")
-        
-        # Insert or update the token
-        cursor.execute("""
-            INSERT INTO google_tokens 
-            (user_id, user_email, token, refresh_token, token_uri, client_id, client_secret, scopes, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            user_email,
-            token_data['token'],
-            token_data.get('refresh_token'),
-            token_data['token_uri'],
-            token_data['client_id'],
-            token_data['client_secret'],
-            ','.join(token_data['scopes']) if token_data.get('scopes') else None,
-            datetime.now()
-        ))
-        
-        conn.commit()
-        
-        # Verify the token was saved
-        cursor.execute("SELECT id FROM google_tokens WHERE token = ? ORDER BY updated_at DESC LIMIT 1", 
-                      (token_data['token'],))
-        result = cursor.fetchone()
-        if result:
-            current_app.logger.info(f"Google token saved successfully with ID: {result[0]}")
-        else:
-            current_app.logger.error("Failed to save Google token: No record found after insert")
-            
-        conn.close()
+        # Insert the token; the latest record per user is the one used
+        with get_engine().begin() as conn:
+            result = conn.execute(insert(google_tokens).values(
+                user_id=user_id,
+                user_email=user_email,
+                token=token_data['token'],
+                refresh_token=token_data.get('refresh_token'),
+                token_uri=token_data['token_uri'],
+                client_id=token_data['client_id'],
+                client_secret=token_data['client_secret'],
+                scopes=','.join(token_data['scopes']) if token_data.get('scopes') else None,
+                updated_at=datetime.now()
+            ))
+        
+        current_app.logger.info(f"Google token saved successfully with ID: {result.inserted_primary_key[0]}")
         
     except Exception as e:
         current_app.logger.error(f"Error saving Google tokens: {e}")
@@ -386,23 +305,20 @@ def build_credentials(token):
     
     if user_id:
         try:
-            conn = sqlite3.connect('instance/mobilize_crm.db')
-            cursor = conn.cursor()
+            with get_engine().connect() as conn:
+                # Query for refresh token
+                result = conn.execute(
+                    select(google_tokens.c.refresh_token)
+                    .where(google_tokens.c.user_id == user_id)
+                    .order_by(google_tokens.c.updated_at.desc())
+                    .limit(1)
+                ).first()
             
-            # Query for refresh token
-            cursor.execute("""
-                SELECT refresh_token FROM google_tokens 
-                WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1
-            """, (user_id,))
-            
-            result = cursor.fetchone()
             if result and result[0]:
                 refresh_token = result[0]
                 current_app.logger.info(f"Found refresh token for user {user_id}")
             else:
                 current_app.logger.warning(f"No refresh token found for user {user_id}")
-                
-            conn.close()
         except Exception as e:
             current_app.logger.error(f"Error retrieving refresh token: {e}")
     
@@ -577,51 +493,23 @@ def get_all_user_tokens():
         dict: Dictionary mapping user IDs to token information
     """
     try:
-        # Connect to the database
-        conn = sqlite3.connect('mobilize_crm.db')
-        cursor = conn.cursor()
-        
-        # Create the table if it doesn't exist (should already exist)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS google_tokens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id VARCHAR NOT NULL,
-                user_email VARCHAR,
-                access_token VARCHAR NOT NULL,
-                refresh_token VARCHAR,
-                token_uri VARCHAR,
-                client_id VARCHAR,
-                client_secret VARCHAR,
-                scopes VARCHAR,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Check if we need to add the user_email column
-        try:
-            cursor.execute("SELECT user_email FROM google_tokens LIMIT 1")
-        except sqlite3.OperationalError:
-            current_app.logger.info("Adding user_email column to google_tokens table")
-            cursor.execute("ALTER TABLE google_tokens ADD COLUMN user_email VARCHAR")
-        
-        # Query for all tokens
-        cursor.execute("""
-            SELECT user_id, user_email, token, refresh_token, token_uri, client_id, client_secret, scopes
-            FROM google_tokens
-            WHERE token IS NOT NULL
-            GROUP BY user_id
-            HAVING MAX(updated_at)
-        """)
-        
-        results = cursor.fetchall()
-        conn.close()
+        with get_engine().connect() as conn:
+            # Query for all tokens
+            results = conn.execute(
+                select(google_tokens.c.user_id, google_tokens.c.user_email, google_tokens.c.token,
+                       google_tokens.c.refresh_token, google_tokens.c.token_uri, google_tokens.c.client_id,
+                       google_tokens.c.client_secret, google_tokens.c.scopes)
+                .where(google_tokens.c.token.isnot(None))
+                .order_by(google_tokens.c.updated_at)
+            ).all()
         
         tokens = {}
         for row in results:
             user_id = row[0] or 'default'
+            # Rows are ordered by updated_at, so the latest token wins
             tokens[user_id] = {
                 'user_email': row[1],
+                'access_token': row[2],
                 'token': row[2],
                 'refresh_token': row[3],
                 'token_uri': row[4],
@@ -639,6 +527,144 @@ def get_all_user_tokens():
         current_app.logger.error(f"Error getting all user tokens: {str(e)}")
         return {}
 
+def get_stored_user_tokens(user_id):
+    """
+    Get the most recently stored Google tokens for one user
+    
+    Args:
+        user_id (str): The Firebase user ID
+        
+    Returns:
+        dict: Token information, or None if the user has no stored tokens
+    """
+    try:
+        with get_engine().connect() as conn:
+            result = conn.execute(
+                select(google_tokens.c.token, google_tokens.c.refresh_token, google_tokens.c.token_uri,
+                       google_tokens.c.client_id, google_tokens.c.client_secret, google_tokens.c.scopes)
+                .where(google_tokens.c.user_id == user_id)
+                .order_by(google_tokens.c.updated_at.desc())
+                .limit(1)
+            ).first()
+        
+        if not result:
+            return None
+            
+        return {
+            'token': result[0],
+            'refresh_token': result[1],
+            'token_uri': result[2],
+            'client_id': result[3],
+            'client_secret': result[4],
+            'scopes': result[5].split(',') if result[5] else []
+        }
+    except Exception as e:
+        current_app.logger.error(f"Error getting stored tokens for user {user_id}: {e}")
+        return None
+
+def save_refreshed_access_token(user_id, token):
+    """
+    Write a refreshed access token back to the user's latest token record
+    
+    Args:
+        user_id (str): The Firebase user ID
+        token (str): The new access token
+    """
+    try:
+        latest = (
+            select(google_tokens.c.id)
+            .where(google_tokens.c.user_id == user_id)
+            .order_by(google_tokens.c.updated_at.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        with get_engine().begin() as conn:
+            conn.execute(
+                update(google_tokens).where(google_tokens.c.id == latest).values(token=token, updated_at=datetime.now())
+            )
+    except Exception as e:
+        current_app.logger.error(f"Error saving refreshed token for user {user_id}: {e}")
+
+def _get_sync_state(user_id, column):
+    """Read one of a user's sync cursors"""
+    with get_engine().connect() as conn:
+        return conn.execute(
+            select(google_sync_state.c[column]).where(google_sync_state.c.user_id == user_id)
+        ).scalar()
+
+def _save_sync_state(user_id, column, value):
+    """Upsert one of a user's sync cursors, leaving the others as they are"""
+    engine = get_engine()
+    stmt = _DIALECT_INSERTS[engine.dialect.name](google_sync_state).values(
+        {'user_id': user_id, column: value, 'updated_at': datetime.now()}
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={column: stmt.excluded[column], 'updated_at': stmt.excluded.updated_at}
+    )
+    # Saved by the syncs, so it goes through the SQLite writer with their other writes
+    run_serialized_write(engine, lambda session: session.execute(stmt))
+
+def get_gmail_history_id(user_id):
+    """
+    Get the Gmail sync cursor (last seen historyId) for a user
+    
+    Args:
+        user_id (str): The Firebase user ID
+        
+    Returns:
+        str: The stored historyId, or None if the user has never completed a sync
+    """
+    try:
+        return _get_sync_state(user_id, 'gmail_history_id') or None
+    except Exception as e:
+        current_app.logger.error(f"Error getting Gmail history id for user {user_id}: {e}")
+        return None
+
+def save_gmail_history_id(user_id, history_id):
+    """
+    Save the Gmail sync cursor (last seen historyId) for a user
+    
+    Args:
+        user_id (str): The Firebase user ID
+        history_id (str): The mailbox historyId to resume from on the next sync.
+            Pass None to clear the cursor and force a full resync.
+    """
+    try:
+        _save_sync_state(user_id, 'gmail_history_id', history_id)
+    except Exception as e:
+        current_app.logger.error(f"Error saving Gmail history id for user {user_id}: {e}")
+
+def get_calendar_sync_token(user_id):
+    """
+    Get the Google Calendar sync token for a user's primary calendar
+    
+    Args:
+        user_id (str): The Firebase user ID
+        
+    Returns:
+        str: The stored nextSyncToken, or None if the calendar has never been listed
+    """
+    try:
+        return _get_sync_state(user_id, 'calendar_sync_token') or None
+    except Exception as e:
+        current_app.logger.error(f"Error getting calendar sync token for user {user_id}: {e}")
+        return None
+
+def save_calendar_sync_token(user_id, sync_token):
+    """
+    Save the Google Calendar sync token for a user's primary calendar
+    
+    Args:
+        user_id (str): The Firebase user ID
+        sync_token (str): The nextSyncToken to resume from on the next sync.
+            Pass None to clear it and force a full listing.
+    """
+    try:
+        _save_sync_state(user_id, 'calendar_sync_token', sync_token)
+    except Exception as e:
+        current_app.logger.error(f"Error saving calendar sync token for user {user_id}: {e}")
+
 @google_auth_bp.route('/google/store-token', methods=['POST'])
 @auth_required
 def store_token():
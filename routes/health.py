@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify
 from datetime import datetime
 import psutil
-from models import engine
+from database import get_engine, pool_status
 from sqlalchemy import text
+from utils.auth import get_token_cache_stats
+from utils.write_queue import write_queue_stats
 
 health_bp = Blueprint('health_bp', __name__)
 
@@ -14,14 +16,17 @@ def health_check():
         'version': '1.0.0',
         'services': {
             'database': check_database(),
-            'system': check_system_resources()
+            'database_pool': pool_status(),
+            'database_writers': write_queue_stats(),
+            'system': check_system_resources(),
+            'auth_token_cache': get_token_cache_stats()
         }
     }
     return jsonify(health_status)
 
 def check_database():
     try:
-        with engine.connect() as connection:
+        with get_engine().connect() as connection:
             connection.execute(text('SELECT 1'))
         return {'status': 'up', 'message': 'Database connection successful'}
     except Exception as e:
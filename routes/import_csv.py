@@ -1,17 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from werkzeug.utils import secure_filename
 import os
-from models import Person, Church, Contacts
-from database import db, session_scope
-import csv
-import io
-from datetime import datetime
+import tempfile
+from models import ImportJob
+from database import session_scope
 from routes.dashboard import auth_required
 from routes.google_auth import get_current_user_id
+from utils.background_jobs import run_job_now
+from utils.csv_import import (read_header, missing_headers, create_import_job, job_to_dict, run_csv_import,
+                              PERSON, CHURCH)
 
 # Create blueprint
 import_csv_bp = Blueprint('import_csv_bp', __name__)
 
+# The settings page posts import_type with plural names
+IMPORT_TYPE_ALIASES = {
+    'people': PERSON,
+    'churches': CHURCH,
+}
+
 @import_csv_bp.route('/csv', methods=['GET', 'POST'])
 @auth_required
 def import_csv():
@@ -21,121 +28,77 @@ def import_csv():
         if 'csv_file' not in request.files:
             flash('No file part', 'error')
             return redirect(request.url)
-        
+
         file = request.files['csv_file']
-        
+
         # If user does not select file, browser also
         # submit an empty part without filename
         if file.filename == '':
             flash('No selected file', 'error')
             return redirect(request.url)
-        
-        contact_type = request.form.get('contact_type')
-        if not contact_type or contact_type not in ['person', 'church']:
+
+        contact_type = request.form.get('contact_type') or IMPORT_TYPE_ALIASES.get(request.form.get('import_type'))
+        if not contact_type or contact_type not in [PERSON, CHURCH]:
             flash('Invalid contact type', 'error')
             return redirect(request.url)
-        
-        if file and file.filename.endswith('.csv'):
-            # Read the file
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_reader = csv.DictReader(stream)
-            
-            # Get the fieldnames from the CSV
-            fieldnames = csv_reader.fieldnames
-            
-            # Check for required fields based on contact type
-            required_fields = []
-            if contact_type == 'person':
-                required_fields = ['first_name', 'last_name', 'email']
-            else:  # church
-                required_fields = ['church_name', 'email']
-            
-            missing_fields = [field for field in required_fields if field not in fieldnames]
-            if missing_fields:
-                flash(f'Missing required fields: {", ".join(missing_fields)}', 'error')
-                return redirect(request.url)
-            
-            # Reset the stream position
-            stream.seek(0)
-            csv_reader = csv.DictReader(stream)
-            
-            # Process the CSV data
-            imported_count = 0
-            errors = []
-            
-            for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 to account for header row
-                try:
-                    # Create a new contact based on the type
-                    if contact_type == 'person':
-                        contact = Person(
-                            first_name=row.get('first_name', ''),
-                            last_name=row.get('last_name', ''),
-                            email=row.get('email', ''),
-                            phone=row.get('phone', ''),
-                            address=row.get('address', ''),
-                            city=row.get('city', ''),
-                            state=row.get('state', ''),
-                            zip_code=row.get('zip_code', ''),
-                            country=row.get('country', ''),
-                            church_role=row.get('church_role', ''),
-                            spouse_first_name=row.get('spouse_first_name', ''),
-                            spouse_last_name=row.get('spouse_last_name', ''),
-                            home_country=row.get('home_country', ''),
-                            notes=row.get('notes', ''),
-                            user_id=user_id,
-                            type='person'
-                        )
-                    else:  # church
-                        contact = Church(
-                            church_name=row.get('church_name', ''),
-                            email=row.get('email', ''),
-                            phone=row.get('phone', ''),
-                            address=row.get('address', ''),
-                            city=row.get('city', ''),
-                            state=row.get('state', ''),
-                            zip_code=row.get('zip_code', ''),
-                            country=row.get('country', ''),
-                            location=row.get('location', ''),
-                            website=row.get('website', ''),
-                            denomination=row.get('denomination', ''),
-                            senior_pastor_first_name=row.get('senior_pastor_first_name', ''),
-                            senior_pastor_last_name=row.get('senior_pastor_last_name', ''),
-                            senior_pastor_email=row.get('senior_pastor_email', ''),
-                            missions_pastor_first_name=row.get('missions_pastor_first_name', ''),
-                            missions_pastor_last_name=row.get('missions_pastor_last_name', ''),
-                            missions_pastor_email=row.get('missions_pastor_email', ''),
-                            congregation_size=row.get('congregation_size', ''),
-                            year_founded=row.get('year_founded', ''),
-                            notes=row.get('notes', '')
-                        )
-                    
-                    # Save to database
-                    with session_scope() as session:
-                        session.add(contact)
-                        session.commit()
-                    
-                    imported_count += 1
-                except Exception as e:
-                    errors.append(f"Error in row {row_num}: {str(e)}")
-            
-            # Report results
-            if imported_count > 0:
-                flash(f'Successfully imported {imported_count} {contact_type}(s)', 'success')
-            
-            if errors:
-                for error in errors[:5]:  # Show only first 5 errors to avoid overwhelming the user
-                    flash(error, 'error')
-                if len(errors) > 5:
-                    flash(f'... and {len(errors) - 5} more errors', 'error')
-            
-            # Redirect to the appropriate page
-            if contact_type == 'person':
-                return redirect(url_for('people_bp.list_people'))
-            else:
-                return redirect(url_for('churches_bp.churches'))
-        else:
+
+        if not file.filename.lower().endswith('.csv'):
             flash('File must be a CSV', 'error')
             return redirect(request.url)
-    
+
+        # Save the upload so the import can stream it after this request ends
+        fd, path = tempfile.mkstemp(prefix='import_', suffix='.csv')
+        os.close(fd)
+        file.save(path)
+
+        # Check for required fields based on contact type
+        try:
+            missing_fields = missing_headers(contact_type, read_header(path))
+        except UnicodeDecodeError:
+            os.remove(path)
+            flash('File must be a UTF-8 encoded CSV', 'error')
+            return redirect(request.url)
+        if missing_fields:
+            os.remove(path)
+            flash(f'Missing required fields: {", ".join(missing_fields)}', 'error')
+            return redirect(request.url)
+
+        with session_scope() as session:
+            job_id = create_import_job(session, user_id, contact_type, path, secure_filename(file.filename))
+
+        run_job_now(current_app._get_current_object(), run_csv_import, f'csv_import_{job_id}',
+                    f'Import {contact_type} CSV', job_id, path)
+        current_app.logger.info(f"Queued CSV import {job_id} of {contact_type} contacts for user {user_id}")
+
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({
+                'job_id': job_id,
+                'status_url': url_for('import_csv_bp.import_job_status', job_id=job_id)
+            }), 202
+        return redirect(url_for('import_csv_bp.import_job', job_id=job_id))
+
     # GET request - show the import form
-    return render_template('import_csv.html') 
\ No newline at end of file
+    return render_template('import_csv.html')
+
+@import_csv_bp.route('/jobs/<job_id>')
+@auth_required
+def import_job(job_id):
+    """Progress page for an import"""
+    user_id = get_current_user_id()
+    with session_scope() as session:
+        job = session.query(ImportJob).filter_by(id=job_id, user_id=user_id).first()
+        if not job:
+            flash('Import not found', 'error')
+            return redirect(url_for('import_csv_bp.import_csv'))
+        return render_template('import_csv_status.html', job=job_to_dict(job))
+
+@import_csv_bp.route('/api/jobs/<job_id>')
+@auth_required
+def import_job_status(job_id):
+    """Poll an import's progress and per-row errors"""
+    user_id = get_current_user_id()
+    with session_scope() as session:
+        job = session.query(ImportJob).filter_by(id=job_id, user_id=user_id).first()
+        if not job:
+            return jsonify({'error': 'Import not found'}), 404
+        return jsonify(job_to_dict(job))
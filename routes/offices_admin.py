@@ -4,6 +4,8 @@ Routes for office management.
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, current_app, flash
 from models import Office, UserOffice, Church, session_scope, office_schema, user_office_schema, ROLE_CHOICES
 from utils.auth import auth_required, get_current_user_id
+from utils.access_context import get_access_context
+from utils.permissions import is_super_admin, is_office_admin
 from sqlalchemy.exc import SQLAlchemyError
 import datetime
 from sqlalchemy import func
@@ -12,37 +14,13 @@ from firebase_admin import auth
 
 offices_admin_bp = Blueprint('offices_admin_bp', __name__)
 
-# Helper function to check if user is a super admin
-def is_super_admin(user_id):
-    """Check if the user is a super admin."""
-    with session_scope() as session:
-        user_office = session.query(UserOffice).filter_by(
-            user_id=user_id, 
-            role='super_admin'
-        ).first()
-        return user_office is not None
-
-# Helper function to check if user is an office admin
-def is_office_admin(user_id, office_id):
-    """Check if the user is an admin for the specified office."""
-    with session_scope() as session:
-        user_office = session.query(UserOffice).filter_by(
-            user_id=user_id, 
-            office_id=office_id,
-            role='office_admin'
-        ).first()
-        return user_office is not None
-
 # Helper function to get user's offices
-def get_user_offices(user_id):
+def get_user_offices(session, user_id):
     """Get all offices the user has access to."""
-    with session_scope() as session:
-        user_offices = session.query(UserOffice).filter_by(
-            user_id=user_id
-        ).all()
-        office_ids = [uo.office_id for uo in user_offices]
-        offices = session.query(Office).filter(Office.id.in_(office_ids)).all()
-        return offices
+    office_ids = get_access_context(user_id).office_ids
+    if not office_ids:
+        return []
+    return session.query(Office).filter(Office.id.in_(office_ids)).all()
 
 def get_user_email(user_id):
     """Get user email from Firebase UID."""
@@ -95,7 +73,8 @@ def list_offices():
     user_id = get_current_user_id()
     
     # Check if user is a super admin
-    super_admin = is_super_admin(user_id)
+    access = get_access_context(user_id)
+    super_admin = access.is_super_admin
     
     with session_scope() as session:
         if super_admin:
@@ -103,9 +82,7 @@ def list_offices():
             offices = session.query(Office).all()
         else:
             # Other users can only see offices they have access to
-            user_offices = session.query(UserOffice).filter_by(user_id=user_id).all()
-            office_ids = [uo.office_id for uo in user_offices]
-            offices = session.query(Office).filter(Office.id.in_(office_ids)).all()
+            offices = session.query(Office).filter(Office.id.in_(access.office_ids)).all()
         
         # Get user count for each office
         office_stats = []
@@ -395,7 +372,7 @@ def api_list_offices():
             offices = session.query(Office).all()
         else:
             # Other users can only see offices they have access to
-            offices = get_user_offices(user_id)
+            offices = get_user_offices(session, user_id)
         
         return jsonify({
             'offices': office_schema.dump(offices, many=True)
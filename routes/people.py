@@ -1,56 +1,145 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
 from datetime import datetime
-from models import Session, Person, Church, Communication, UserOffice, Office, Contacts
+from models import Session, Person, Church, UserOffice, Office, Contacts
 from sqlalchemy import func, or_, text
+from sqlalchemy.orm import selectinload
 import logging
 from database import db, session_scope
 from routes.dashboard import auth_required
 from routes.google_auth import get_current_user_id
 from utils.permissions import is_super_admin
+from utils.pagination import keyset_page, parse_page_size, InvalidCursorError
+from utils.contact_search import matching_contact_ids, lookup_contacts, PERSON, LOOKUP_PAGE_SIZE
+from utils.contact_batch import parse_id_list, batch_update_contacts, batch_delete_contacts
+from utils.contact_activity import recent_contact_communications, contact_tasks, activity_timeline
 
 people_bp = Blueprint('people_bp', __name__)
 
+# Columns the people list can be sorted by
+PEOPLE_SORT_COLUMNS = {
+    'last_name': Person.last_name,
+    'first_name': Person.first_name,
+    'email': Person.email,
+    'pipeline': Person.people_pipeline,
+    'priority': Person.priority,
+    'assigned_to': Person.assigned_to,
+    'state': Person.state,
+    'city': Person.city,
+}
+
+# Query string parameters and the columns they filter on
+PEOPLE_FILTER_COLUMNS = {
+    'pipeline': Person.people_pipeline,
+    'priority': Person.priority,
+    'assigned_to': Person.assigned_to,
+    'state': Person.state,
+}
+
+
+def _people_filters(args):
+    """Return the active filters from the query string"""
+    return {name: args.get(name, '').strip() for name in PEOPLE_FILTER_COLUMNS if args.get(name, '').strip()}
+
+
+def query_people_page(session, user_id, args, super_admin=False):
+    """
+    Fetch one page of the people list as lightweight rows
+
+    Only the columns the list shows are selected, filtered and sorted in the
+    database and paged with a (sort key, id) cursor.
+
+    Args:
+        session: Database session
+        user_id: Current user; people are limited to this user unless super_admin
+        args: Query string with q (search), sort, order, cursor, limit and filter parameters
+        super_admin: Show people for all users
+
+    Returns:
+        tuple: (rows, next_cursor)
+
+    Raises:
+        InvalidCursorError: If the cursor parameter is malformed
+    """
+    sort = args.get('sort', 'last_name')
+    if sort not in PEOPLE_SORT_COLUMNS:
+        sort = 'last_name'
+    descending = args.get('order', 'asc').lower() == 'desc'
+    limit = parse_page_size(args.get('limit'))
+
+    # NULLs would break the seek comparison, so sort them as empty strings
+    sort_column = func.coalesce(PEOPLE_SORT_COLUMNS[sort], '')
+
+    query = session.query(
+        Person.id.label('id'),
+        Person.first_name,
+        Person.last_name,
+        Person.email,
+        Person.phone,
+        Person.city,
+        Person.state,
+        Person.home_country,
+        Person.people_pipeline.label('pipeline'),
+        Person.priority,
+        Person.assigned_to,
+        Person.user_id,
+        sort_column.label('sort_key')
+    ).filter(Person.type == 'person')
+
+    if not super_admin:
+        query = query.filter(Person.user_id == user_id)
+
+    for name, value in _people_filters(args).items():
+        query = query.filter(func.upper(PEOPLE_FILTER_COLUMNS[name]) == value.upper())
+
+    matching_ids = matching_contact_ids(session, args.get('q', ''))
+    if matching_ids is not None:
+        query = query.filter(Person.id.in_(matching_ids))
+
+    return keyset_page(query, sort_column, Person.id, cursor=args.get('cursor'),
+                       limit=limit, descending=descending)
+
+
 @people_bp.route('/')
 @auth_required
 def list_people():
     user_id = get_current_user_id()
     current_app.logger.info(f"Getting people for user_id: {user_id}")
-    
-    # Debug authentication state
-    from flask import session, request
-    current_app.logger.info(f"Session data: {session}")
-    current_app.logger.info(f"Request cookies: {request.cookies}")
-    current_app.logger.info(f"Request headers: {request.headers}")
-    
+    super_admin = is_super_admin(user_id)
+
     with session_scope() as session:
         try:
-            # Use ORM query instead of raw SQL
-            people_query = session.query(Person).filter(Person.type == 'person')
-            
-            # Apply user filter if not super admin
-            if not is_super_admin(user_id):
-                people_query = people_query.filter(Person.user_id == user_id)
-            
-            # Get the people
-            people_objects = people_query.limit(100).all()
-            
-            current_app.logger.info(f"Found {len(people_objects)} people total using ORM query")
-            
-            return render_template('people/list.html', people=people_objects)
+            people, next_cursor = query_people_page(session, user_id, request.args, super_admin=super_admin)
+        except InvalidCursorError:
+            flash('That page link is no longer valid, showing the first page', 'warning')
+            return redirect(url_for('people_bp.list_people'))
         except Exception as e:
             current_app.logger.error(f"Error in list_people: {str(e)}")
             import traceback
             current_app.logger.error(traceback.format_exc())
             return redirect(url_for('dashboard_bp.dashboard'))
 
+        current_app.logger.info(f"Found {len(people)} people on this page")
+
+        # Keep sort and filter parameters on the next page link
+        page_args = {key: value for key, value in request.args.items() if key != 'cursor' and value}
+        next_url = url_for('people_bp.list_people', cursor=next_cursor, **page_args) if next_cursor else None
+        first_url = url_for('people_bp.list_people', **page_args) if request.args.get('cursor') else None
+
+        return render_template('people/list.html',
+                               people=people,
+                               next_url=next_url,
+                               first_url=first_url,
+                               filters=_people_filters(request.args),
+                               search_term=request.args.get('q', ''),
+                               sort=request.args.get('sort', 'last_name'),
+                               order=request.args.get('order', 'asc'))
+
 @people_bp.route('/new', methods=['GET', 'POST'])
 @auth_required
 def new_person():
     """Create a new person."""
     if request.method == 'GET':
-        with session_scope() as session:
-            churches = session.query(Church).all()
-            return render_template('people/new.html', churches=churches)
+        return render_template('people/new.html')
     
     user_id = get_current_user_id()
     with session_scope() as session:
@@ -123,117 +212,21 @@ def person_detail(person_id):
         return redirect(url_for('dashboard_bp.dashboard'))
         
     with session_scope() as session:
-        # Get the person
-        person = session.query(Person).filter_by(id=person_id).first()
+        # Get the person, with the church shown on the page
+        person = session.query(Person).options(selectinload(Person.church)).filter_by(id=person_id).first()
         
         if not person:
             flash('Person not found', 'danger')
             return redirect(url_for('people_bp.people_list'))
-            
-        # Get churches for this person
-        churches = []
-        try:
-            from models import Church
-            churches = session.query(Church).all()
-        except Exception as e:
-            current_app.logger.error(f"Error getting churches: {str(e)}")
-            
-        # Use distinct to avoid duplicates
-        query = session.query(Communication)\
-            .filter(
-                Communication.person_id == person_id,
-                # Filter by user_id if it's set in the communication
-                # But don't exclude communications without a user_id
-                ((Communication.user_id == user_id) | (Communication.user_id == None))
-            )\
-            .order_by(Communication.date_sent.desc())
-            
-        current_app.logger.debug(f"SQL Query for communications: {query}")
-        
-        # Execute the query and get distinct communications by gmail_message_id
-        all_communications = query.all()
-        
-        # Log the types of communications found
-        comm_types = {}
-        for comm in all_communications:
-            if comm and comm.type:
-                if comm.type in comm_types:
-                    comm_types[comm.type] += 1
-                else:
-                    comm_types[comm.type] = 1
-        
-        current_app.logger.info(f"Communication types found for person {person_id}: {comm_types}")
-        current_app.logger.info(f"Total communications found for person {person_id}: {len(all_communications)}")
-        
-        # Use a set to track seen message IDs
-        seen_message_ids = set()
-        recent_communications = []
-        
-        for comm in all_communications:
-            # Skip if comm is None or we've already seen this message ID
-            if comm is None:
-                continue
-                
-            # Skip if we've already seen this message ID
-            if comm.gmail_message_id and comm.gmail_message_id in seen_message_ids:
-                continue
-                
-            # Add to recent communications
-            recent_communications.append(comm)
-            
-            # Add message ID to seen set if it exists
-            if comm.gmail_message_id:
-                seen_message_ids.add(comm.gmail_message_id)
-                
-            # Limit to 5 recent communications
-            if len(recent_communications) >= 5:
-                break
-                
-        current_app.logger.debug(f"Found {len(recent_communications)} recent communications")
-        
-        # Get tasks for this person
-        tasks = []
-        try:
-            from models import Task
-            tasks = session.query(Task).filter(Task.person_id == person_id).all()
-            current_app.logger.debug(f"Found {len(tasks)} tasks for person {person_id}")
-        except Exception as e:
-            current_app.logger.error(f"Error getting tasks: {str(e)}")
-            
-        # Get activity timeline
-        activities = []
-        
-        # Add communications to activities
-        for comm in all_communications[:10]:  # Limit to 10 most recent
-            # Skip None communications
-            if comm is None:
-                continue
-                
-            activities.append({
-                'type': 'communication',
-                'title': f"{comm.type} Communication",
-                'description': comm.subject or comm.message[:50] + ('...' if len(comm.message) > 50 else ''),
-                'date': comm.date_sent
-            })
-            
-        # Add tasks to activities
-        for task in tasks:
-            activities.append({
-                'type': 'task',
-                'title': task.title,
-                'description': task.description[:50] + ('...' if len(task.description) > 50 else ''),
-                'date': task.due_date or task.date_created
-            })
-            
-        # Sort activities by date, newest first
-        activities.sort(key=lambda x: x['date'], reverse=True)
-        
-        # Limit to 10 most recent activities
-        activities = activities[:10]
+
+        # Each list is read newest first from an index and capped, so the page
+        # costs the same however much history the person has
+        recent_communications = recent_contact_communications(session, user_id=user_id, person_id=person_id)
+        tasks = contact_tasks(session, person_id=person_id)
+        activities = activity_timeline(session, user_id=user_id, person_id=person_id)
         
         return render_template('people/view.html', 
                               person=person, 
-                              churches=churches,
                               recent_communications=recent_communications,
                               tasks=tasks,
                               activities=activities)
@@ -254,8 +247,11 @@ def edit_person(person_id):
         
         if request.method == 'GET':
             # For GET requests, render the edit form with the person data
-            churches = session.query(Church).order_by(Church.church_name).all()
-            return render_template('people/edit.html', person=person, churches=churches)
+            # Only the current church is rendered; other options load on demand
+            church_name = None
+            if person.church_id:
+                church_name = session.query(Church.church_name).filter(Church.id == person.church_id).scalar()
+            return render_template('people/edit.html', person=person, church_name=church_name)
         else:
             # For POST requests, update the person data
             person.title = request.form['title']
@@ -300,81 +296,79 @@ def edit_person(person_id):
 @people_bp.route('/batch_update', methods=['POST'])
 def batch_update():
     """Handle batch updates for multiple people"""
-    with session_scope() as session:
-        selected_ids = request.form.get('selected_ids', '')
-        if not selected_ids:
-            flash('No people selected for update', 'error')
-            return redirect(url_for('people_bp.list_people'))
-        
-        # Parse the comma-separated list of IDs
-        person_ids = [int(id) for id in selected_ids.split(',')]
-        
-        # Get the batch update values from the form
-        batch_pipeline = request.form.get('batch_pipeline')
-        batch_priority = request.form.get('batch_priority')
-        batch_assigned_to = request.form.get('batch_assigned_to')
-        batch_virtuous = request.form.get('batch_virtuous')
-        
-        # Count how many records were updated
-        update_count = 0
-        
-        # Update each selected person
-        for person_id in person_ids:
-            person = session.query(Person).filter(Person.id == person_id).first()
-            if person:
-                # Only update fields that were selected for batch update
-                if batch_pipeline:
-                    person.people_pipeline = batch_pipeline
-                
-                if batch_priority:
-                    person.priority = batch_priority
-                
-                if batch_assigned_to:
-                    person.assigned_to = batch_assigned_to
-                
-                if batch_virtuous:
-                    person.virtuous = (batch_virtuous.lower() == 'true')
-                
-                update_count += 1
-        
-        # Commit the changes
-        session.commit()
-        
-        # Flash a success message
-        flash(f'Successfully updated {update_count} people', 'success')
-        
+    try:
+        person_ids = parse_id_list(request.form.get('selected_ids', ''))
+    except ValueError:
+        flash('Invalid selection', 'error')
+        return redirect(url_for('people_bp.list_people'))
+    if not person_ids:
+        flash('No people selected for update', 'error')
         return redirect(url_for('people_bp.list_people'))
 
+    # Only update fields that were selected for batch update
+    values = {}
+    if request.form.get('batch_pipeline'):
+        values['people_pipeline'] = request.form.get('batch_pipeline')
+    if request.form.get('batch_priority'):
+        values['priority'] = request.form.get('batch_priority')
+    if request.form.get('batch_assigned_to'):
+        values['assigned_to'] = request.form.get('batch_assigned_to')
+    if request.form.get('batch_virtuous'):
+        values['virtuous'] = request.form.get('batch_virtuous').lower() == 'true'
+    if not values:
+        flash('No fields selected for update', 'error')
+        return redirect(url_for('people_bp.list_people'))
+
+    with session_scope() as session:
+        report = batch_update_contacts(session, PERSON, person_ids, values)
+
+    message = f"Successfully updated {report['updated']} people"
+    if report['missing']:
+        message += f" ({report['missing']} of the selected no longer exist)"
+    flash(message, 'success')
+    return redirect(url_for('people_bp.list_people'))
+
 @people_bp.route('/batch_delete', methods=['POST'])
 def batch_delete():
     """Handle batch deletion for multiple people"""
-    with session_scope() as session:
-        selected_ids = request.form.get('selected_ids', '')
-        if not selected_ids:
-            flash('No people selected for deletion', 'error')
-            return redirect(url_for('people_bp.list_people'))
-        
-        # Parse the comma-separated list of IDs
-        person_ids = [int(id) for id in selected_ids.split(',')]
-        
-        # Count how many records were deleted
-        delete_count = 0
-        
-        # Delete each selected person
-        for person_id in person_ids:
-            person = session.query(Person).filter(Person.id == person_id).first()
-            if person:
-                session.delete(person)
-                delete_count += 1
-        
-        # Commit the changes
-        session.commit()
-        
-        # Flash a success message
-        flash(f'Successfully deleted {delete_count} people', 'success')
-        
+    try:
+        person_ids = parse_id_list(request.form.get('selected_ids', ''))
+    except ValueError:
+        flash('Invalid selection', 'error')
+        return redirect(url_for('people_bp.list_people'))
+    if not person_ids:
+        flash('No people selected for deletion', 'error')
         return redirect(url_for('people_bp.list_people'))
 
+    with session_scope() as session:
+        report = batch_delete_contacts(session, PERSON, person_ids)
+
+    message = f"Successfully deleted {report['deleted']} people"
+    if report['missing']:
+        message += f" ({report['missing']} of the selected no longer exist)"
+    flash(message, 'success')
+    return redirect(url_for('people_bp.list_people'))
+
+@people_bp.route('/api/lookup')
+@auth_required
+def person_lookup():
+    """
+    Paginated person options for dropdowns
+
+    Query parameters: q (search), cursor and limit. Returns
+    {'results': [{'id', 'name'}], 'next_cursor', 'has_more'}.
+    """
+    with session_scope() as session:
+        try:
+            results, next_cursor = lookup_contacts(
+                session, PERSON, request.args.get('q', ''),
+                cursor=request.args.get('cursor'),
+                limit=parse_page_size(request.args.get('limit'), default=LOOKUP_PAGE_SIZE, maximum=100)
+            )
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results, 'next_cursor': next_cursor, 'has_more': next_cursor is not None})
+
 @people_bp.route('/api/people/<int:person_id>', methods=['GET'])
 def get_person_api(person_id):
     """API endpoint to get a person by ID"""
@@ -416,47 +410,43 @@ def update_pipeline(person_id):
 @people_bp.route('/api/people')
 @auth_required
 def people_api():
-    """API endpoint for people that returns JSON data"""
+    """
+    API endpoint for a page of people
+
+    Query parameters: q (search), sort, order (asc/desc), limit, cursor, and
+    the pipeline, priority, assigned_to and state filters. Pass next_cursor from
+    the response as cursor to get the following page.
+    """
     user_id = get_current_user_id()
     current_app.logger.info(f"API: Getting people for user_id: {user_id}")
-    
+
     with session_scope() as session:
-        logging.info("API: Fetching people from database...")
         try:
-            # Filter people by user_id
-            query = session.query(Person).filter(
-                Person.type == 'person',
-                Person.user_id == user_id
-            )
-            
-            # Print the SQL query for debugging
-            current_app.logger.info(f"API: SQL Query: {query}")
-            
-            people_list = query.all()
-            current_app.logger.info(f"API: Found {len(people_list)} people")
-            
-            # Prepare JSON response
-            people_data = []
-            for person in people_list:
-                people_data.append({
-                    'id': person.id,
-                    'first_name': person.first_name,
-                    'last_name': person.last_name,
-                    'email': person.email,
-                    'phone': person.phone,
-                    'city': person.city,
-                    'state': person.state,
-                    'country': person.home_country,
-                    'pipeline': person.people_pipeline,
-                    'priority': person.priority,
-                    'user_id': person.user_id
-                })
-            
-            # Return JSON response
-            return jsonify({
-                'count': len(people_list),
-                'people': people_data[:10]  # Return first 10 for brevity
-            })
+            people, next_cursor = query_people_page(session, user_id, request.args)
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             logging.error(f"API: Error fetching people: {str(e)}", exc_info=True)
             return jsonify({'error': str(e)}), 500
+
+        people_data = [{
+            'id': person.id,
+            'first_name': person.first_name,
+            'last_name': person.last_name,
+            'email': person.email,
+            'phone': person.phone,
+            'city': person.city,
+            'state': person.state,
+            'country': person.home_country,
+            'pipeline': person.pipeline,
+            'priority': person.priority,
+            'assigned_to': person.assigned_to,
+            'user_id': person.user_id
+        } for person in people]
+
+        return jsonify({
+            'count': len(people_data),
+            'people': people_data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, current_app, flash
 from flask_restx import Resource, Namespace, fields
-from models import Task, Person, Church, task_schema
+from models import Task, task_schema
 from datetime import datetime, timedelta
 from database import db, session_scope
 from routes.dashboard import auth_required
@@ -181,40 +181,7 @@ def tasks():
             tasks = session.query(Task).filter(Task.user_id == user_id).order_by(Task.due_date.desc()).all()
             current_app.logger.debug(f"Found {len(tasks)} tasks for user {user_id}")
             
-            current_app.logger.debug("Querying database for people...")
-            people = session.query(Person).all()
-            current_app.logger.debug(f"Found {len(people)} people")
-            
-            # Log details about people for debugging
-            current_app.logger.debug("People data for dropdowns:")
-            for person in people:
-                current_app.logger.debug(f"Person: ID={person.id}, Name={person.get_name()}, "
-                                       f"Type={person.type}, Email={person.email}")
-                # Check if get_name method returns a valid value
-                if not person.get_name() or person.get_name().strip() == '':
-                    current_app.logger.warning(f"Person ID {person.id} has empty name: first_name='{person.first_name}', last_name='{person.last_name}'")
-            
-            current_app.logger.debug("Querying database for churches...")
-            churches = session.query(Church).all()
-            current_app.logger.debug(f"Found {len(churches)} churches")
-            
-            # Log details about churches for debugging
-            current_app.logger.debug("Church data for dropdowns:")
-            for church in churches:
-                current_app.logger.debug(f"Church: ID={church.id}, Name={church.get_name()}, "
-                                       f"Type={church.type}, Email={church.email}")
-                # Check if get_name method returns a valid value
-                if not church.get_name() or church.get_name().strip() == '':
-                    current_app.logger.warning(f"Church ID {church.id} has empty name: church_name='{church.church_name}'")
-            
-            # Add debug logging for template context
-            current_app.logger.debug("Rendering template with context: tasks=%d, people=%d, churches=%d", 
-                                   len(tasks), len(people), len(churches))
-            
-            return render_template('tasks/list.html', 
-                                tasks=tasks, 
-                                people=people, 
-                                churches=churches)
+            return render_template('tasks/list.html', tasks=tasks)
     except SQLAlchemyError as e:
         current_app.logger.error(f'Database error in tasks page: {str(e)}', exc_info=True)
         flash('A database error occurred. Please try again later.', 'error')
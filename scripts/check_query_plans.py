@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""
+Check that the hot route queries are served by indexes
+
+Creates the schema in a scratch database, fills it with sample data and runs
+the queries behind the busiest pages (dashboard, people, tasks, person and
+church details, the communications timeline, signatures and office checks).
+Every SELECT they issue is run through EXPLAIN, and the script exits with
+status 1 if any of them reads a whole table.
+
+On SQLite the plans come from EXPLAIN QUERY PLAN ("SCAN <table>" without an
+index is a full scan). On PostgreSQL sequential scans are disabled for the
+check, so a "Seq Scan" in a plan means no index could serve the query.
+
+Usage:
+    python scripts/check_query_plans.py
+    python scripts/check_query_plans.py --database-url postgresql://localhost/crm_scratch --verbose
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path so we can import from the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import create_configured_engine
+from models import (Base, Person, Church, Task, Communication, EmailSignature, Office, UserOffice)
+from utils.dashboard_cache import build_dashboard_summary
+from utils.communication_timeline import get_timeline_page
+from utils.contact_activity import recent_contact_communications, contact_tasks, activity_timeline
+from routes.people import query_people_page
+
+logger = logging.getLogger(__name__)
+
+# Enough users that one user's rows are a small share of each table, as in production
+USERS = [f'user-{n}' for n in range(1, 21)]
+
+# SQLite: "SCAN tasks" (3.36+) or "SCAN TABLE tasks AS t" (older); scans that
+# name an index or a virtual table index are not full scans
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+# Subqueries SQLite evaluates into a temporary result; scanning that result is
+# not a table scan, so only the tables read to build it count
+SQLITE_SUBQUERY = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)$')
+
+
+def seed(session, contacts_per_user=30, messages_per_contact=6):
+    """
+    Fill an empty database with contacts, tasks and email for USERS
+
+    Returns:
+        dict: Ids the route queries are run with
+    """
+    offices = [Office(name=f'Office {n}') for n in range(3)]
+    session.add_all(offices)
+    session.flush()
+
+    start = datetime(2026, 1, 1)
+    for u, user_id in enumerate(USERS):
+        office = offices[u % len(offices)]
+        session.add(UserOffice(user_id=user_id, office_id=office.id, role='standard_user'))
+        session.add_all([
+            EmailSignature(user_id=user_id, name='Default', content='<p>Thanks</p>', is_default=True),
+            EmailSignature(user_id=user_id, name='Short', content='<p>-</p>', is_default=False),
+        ])
+        for n in range(contacts_per_user // 6):
+            church = Church(church_name=f'Church {u}-{n}', email=f'church{u}.{n}@example.org',
+                            office_id=office.id, church_pipeline='INFORMATION')
+            session.add(church)
+            session.flush()
+            for p in range(5):
+                person = Person(first_name=f'First{p}', last_name=f'Last{u}-{n}', user_id=user_id,
+                                email=f'person{u}.{n}.{p}@example.org', church_id=church.id,
+                                people_pipeline='INFORMATION')
+                session.add(person)
+                session.flush()
+                for t, status in enumerate(['Not Started', 'In Progress', 'Completed']):
+                    session.add(Task(title=f'Task {t}', status=status, user_id=user_id, person_id=person.id,
+                                     due_date=date(2026, 1, 1) + timedelta(days=n + p + t)))
+                for m in range(messages_per_contact):
+                    sent = start + timedelta(hours=n * 24 + p * 3 + m)
+                    session.add(Communication(type='Email', user_id=user_id, person_id=person.id,
+                                              church_id=church.id if m % 3 == 0 else None,
+                                              gmail_message_id=f'{user_id}-{n}-{p}-{m}',
+                                              subject=f'Message {m}', message='Hello',
+                                              date_sent=sent, date=sent, email_status='sent'))
+            session.add(Task(title='Visit', status='Not Started', user_id=user_id, church_id=church.id,
+                             due_date=date(2026, 2, 1) + timedelta(days=n)))
+    session.commit()
+
+    person = session.query(Person).filter(Person.user_id == USERS[0]).first()
+    return {
+        'user_id': USERS[0],
+        'person_id': person.id,
+        'person_email': person.email,
+        'church_id': person.church_id,
+        'church_email': session.get(Church, person.church_id).email,
+        'office_id': offices[0].id,
+        'gmail_message_id': f'{USERS[0]}-0-0-0',
+    }
+
+
+def _people_list(session, ids):
+    query_people_page(session, ids['user_id'], {})
+
+
+def _person_detail(session, ids):
+    session.query(Person).options(selectinload(Person.church)).filter_by(id=ids['person_id']).first()
+    recent_contact_communications(session, user_id=ids['user_id'], person_id=ids['person_id'])
+    contact_tasks(session, person_id=ids['person_id'])
+    activity_timeline(session, user_id=ids['user_id'], person_id=ids['person_id'])
+    get_timeline_page(session, ids['user_id'], person_id=ids['person_id'])
+
+
+def _church_detail(session, ids):
+    session.query(Church).options(
+        selectinload(Church.office), selectinload(Church.main_contact)
+    ).filter(Church.id == ids['church_id']).first()
+    contact_tasks(session, church_id=ids['church_id'])
+    recent_contact_communications(session, church_id=ids['church_id'])
+    session.query(Person).filter(Person.church_id == ids['church_id']).all()
+
+
+def _churches_by_office(session, ids):
+    session.query(UserOffice).filter_by(user_id=ids['user_id']).all()
+    session.query(Church).filter(Church.type == 'church', Church.office_id == ids['office_id']).limit(100).all()
+
+
+def _office_counts(session, ids):
+    session.query(func.count(UserOffice.id)).filter(UserOffice.office_id == ids['office_id']).scalar()
+    session.query(func.count(Church.id)).filter(Church.office_id == ids['office_id']).scalar()
+    session.query(UserOffice).filter_by(user_id=ids['user_id'], office_id=ids['office_id']).first()
+
+
+def _signatures(session, ids):
+    session.query(EmailSignature).filter_by(user_id=ids['user_id']).all()
+    session.query(EmailSignature).filter_by(user_id=ids['user_id'], is_default=True).first()
+
+
+def _email_lookups(session, ids):
+    session.query(Person).filter(Person.email == ids['person_email']).first()
+    session.query(Church).filter(Church.email == ids['church_email']).first()
+    session.query(Communication).filter(
+        Communication.gmail_message_id == ids['gmail_message_id'],
+        Communication.email_status == 'draft'
+    ).first()
+
+
+# (name, function(session, ids), tables it may scan in full)
+ROUTE_QUERIES = [
+    ('dashboard', lambda session, ids: build_dashboard_summary(session, ids['user_id']), set()),
+    ('people list', _people_list, set()),
+    ('task list', lambda session, ids: session.query(Task).filter(Task.user_id == ids['user_id'])
+        .order_by(Task.due_date.desc()).all(), set()),
+    ('person detail', _person_detail, set()),
+    ('church detail', _church_detail, set()),
+    ('churches by office', _churches_by_office, set()),
+    ('office counts', _office_counts, set()),
+    ('communications timeline', lambda session, ids: get_timeline_page(session, ids['user_id']), set()),
+    ('email signatures', _signatures, set()),
+    ('email contact lookups', _email_lookups, set()),
+]
+
+
+@contextmanager
+def captured_selects(engine):
+    """Collect (statement, parameters) for each SELECT run on the engine"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def explain(connection, statement, parameters):
+    """
+    Query plan for a statement
+
+    Returns:
+        list: Plan lines
+    """
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql(f'EXPLAIN {statement}', parameters).all()
+    return [row[0] for row in rows]
+
+
+def full_scans(dialect, plan):
+    """Tables (or aliases) read in full according to a plan"""
+    scans = []
+    subqueries = set()
+    for line in plan:
+        if dialect == 'sqlite':
+            subquery = SQLITE_SUBQUERY.match(line.strip())
+            if subquery:
+                subqueries.add(subquery.group(1))
+            match = SQLITE_FULL_SCAN.match(line.strip())
+            if match and match.group(1) not in subqueries:
+                scans.append(match.group(1))
+        else:
+            scans.extend(POSTGRES_FULL_SCAN.findall(line))
+    return scans
+
+
+def check_query_plans(engine, ids, route_queries=ROUTE_QUERIES, verbose=False):
+    """
+    EXPLAIN every SELECT issued by the route queries
+
+    Args:
+        engine: Seeded database
+        ids: Ids from seed
+        route_queries: (name, function, allowed full scans) entries
+        verbose: Log every plan, not just failing ones
+
+    Returns:
+        list: (route name, statement, plan, full scans) for each failing statement
+    """
+    failures = []
+    for name, run, allowed in route_queries:
+        with captured_selects(engine) as statements, Session(bind=engine) as session:
+            run(session, ids)
+
+        with engine.connect() as connection:
+            if connection.dialect.name == 'postgresql':
+                connection.exec_driver_sql('SET enable_seqscan = off')
+            for statement, parameters in statements:
+                plan = explain(connection, statement, parameters)
+                scans = [table for table in full_scans(connection.dialect.name, plan)
+                         if table not in allowed]
+                if scans:
+                    failures.append((name, statement, plan, scans))
+                if verbose or scans:
+                    logger.info(f"[{name}] {' '.join(statement.split())}")
+                    for line in plan:
+                        logger.info(f"    {line}")
+        logger.info(f"{name}: {len(statements)} queries checked")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if hot route queries read whole tables')
+    parser.add_argument('--database-url', default='sqlite://',
+                        help='Empty scratch database to seed and check (default: in-memory SQLite)')
+    parser.add_argument('--verbose', action='store_true', help='Print every query plan')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    options = {'poolclass': StaticPool} if args.database_url == 'sqlite://' else {}
+    engine = create_configured_engine(args.database_url, **options)
+    Base.metadata.create_all(engine)
+    with Session(bind=engine) as session:
+        ids = seed(session)
+    with engine.begin() as connection:
+        # Give the planner row counts, as a long-running database would have
+        connection.exec_driver_sql('ANALYZE')
+
+    failures = check_query_plans(engine, ids, verbose=args.verbose)
+    engine.dispose()
+
+    if failures:
+        for name, _, _, scans in failures:
+            logger.error(f"FULL SCAN in {name}: {', '.join(scans)}")
+        return 1
+    logger.info("All route queries use indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
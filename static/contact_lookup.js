@@ -0,0 +1,138 @@
+/**
+ * Lazily loaded person/church dropdowns.
+ *
+ * Any <select data-lookup-url="..."> gets a search box above it. Options are
+ * fetched from the lookup endpoint the first time the select is used, filtered
+ * as the user types, and a "Load more..." option fetches the next page. The
+ * server only renders the placeholder and the currently selected option.
+ */
+(function () {
+    const MORE_VALUE = '__load_more__';
+    const SEARCH_DELAY_MS = 250;
+
+    function initLookupSelect(select) {
+        if (select.dataset.lookupReady) {
+            return;
+        }
+        select.dataset.lookupReady = 'true';
+
+        const url = select.dataset.lookupUrl;
+        let query = '';
+        let cursor = null;
+        let loaded = false;
+        let request = 0;
+        let searchTimer = null;
+
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control form-control-sm mb-1';
+        search.placeholder = select.dataset.lookupPlaceholder || 'Type to search...';
+        search.setAttribute('aria-label', search.placeholder);
+        select.parentNode.insertBefore(search, select);
+
+        function removeMoreOption() {
+            const more = select.querySelector(`option[value="${MORE_VALUE}"]`);
+            if (more) {
+                more.remove();
+            }
+        }
+
+        function resetOptions() {
+            // Keep the placeholder and whatever is currently selected
+            Array.from(select.options).forEach(option => {
+                if (option.value && option.value !== select.value) {
+                    option.remove();
+                }
+            });
+            removeMoreOption();
+        }
+
+        function load(reset) {
+            const params = new URLSearchParams();
+            if (query) params.set('q', query);
+            if (!reset && cursor) params.set('cursor', cursor);
+            const thisRequest = ++request;
+
+            fetch(`${url}?${params.toString()}`, { credentials: 'same-origin' })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Lookup failed with status ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    // Ignore responses to searches the user has already replaced
+                    if (thisRequest !== request) {
+                        return;
+                    }
+                    if (reset) {
+                        resetOptions();
+                    } else {
+                        removeMoreOption();
+                    }
+
+                    const existing = new Set(Array.from(select.options).map(option => option.value));
+                    (data.results || []).forEach(result => {
+                        const value = String(result.id);
+                        if (existing.has(value)) {
+                            return;
+                        }
+                        const option = document.createElement('option');
+                        option.value = value;
+                        option.textContent = result.name || '(no name)';
+                        select.appendChild(option);
+                    });
+
+                    cursor = data.next_cursor;
+                    if (data.has_more) {
+                        const more = document.createElement('option');
+                        more.value = MORE_VALUE;
+                        more.textContent = 'Load more...';
+                        select.appendChild(more);
+                    }
+                    loaded = true;
+                })
+                .catch(error => {
+                    console.error('Error loading options:', error);
+                });
+        }
+
+        function ensureLoaded() {
+            if (!loaded) {
+                load(true);
+            }
+        }
+
+        select.addEventListener('focus', ensureLoaded);
+        select.addEventListener('mousedown', ensureLoaded);
+        search.addEventListener('focus', ensureLoaded);
+
+        search.addEventListener('input', function () {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => {
+                query = search.value.trim();
+                cursor = null;
+                load(true);
+            }, SEARCH_DELAY_MS);
+        });
+
+        let previousValue = select.value;
+        select.addEventListener('change', function (event) {
+            if (select.value === MORE_VALUE) {
+                // Loading more isn't a real choice; restore the previous selection
+                event.stopImmediatePropagation();
+                select.value = previousValue;
+                load(false);
+                return;
+            }
+            previousValue = select.value;
+        });
+    }
+
+    function initAll(root) {
+        (root || document).querySelectorAll('select[data-lookup-url]').forEach(initLookupSelect);
+    }
+
+    window.initLookupSelect = initLookupSelect;
+    document.addEventListener('DOMContentLoaded', () => initAll());
+})();
@@ -19,7 +19,7 @@ class ContactsService {
         throw new Error(message);
     }
 
-    async listContacts() {
+    async listContacts(syncToken = null) {
         try {
             const user = this.auth.currentUser;
             if (!user) {
@@ -42,7 +42,8 @@ class ContactsService {
                     'Content-Type': 'application/json'
                 },
                 body: JSON.stringify({
-                    access_token: accessToken
+                    access_token: accessToken,
+                    sync_token: syncToken
                 })
             });
 
@@ -118,6 +119,43 @@ class ContactsService {
             this._handleError(error);
         }
     }
+
+    async importContacts(contacts, type) {
+        try {
+            const user = this.auth.currentUser;
+            if (!user) {
+                throw new Error('User must be authenticated');
+            }
+
+            const token = await user.getIdToken();
+            const response = await fetch('/api/contacts/import/bulk', {
+                method: 'POST',
+                headers: {
+                    'Authorization': `Bearer ${token}`,
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    import_type: type,
+                    contacts: contacts.map(contact => ({
+                        resource_name: contact.resource_name,
+                        names: contact.names,
+                        email_addresses: contact.email_addresses,
+                        phone_numbers: contact.phone_numbers,
+                        addresses: contact.addresses
+                    }))
+                })
+            });
+
+            if (!response.ok) {
+                const error = await response.json();
+                throw new Error(error.message || error.error || 'Failed to import contacts');
+            }
+
+            return await response.json();
+        } catch (error) {
+            this._handleError(error);
+        }
+    }
 }
 
 export { ContactsService };
\ No newline at end of file
@@ -0,0 +1,76 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+from models import Base, Office, UserOffice
+from utils.access_context import get_access_context, invalidate_access
+from utils.query_stats import count_queries
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    usa, canada = Office(name='USA Office', city='Dallas', state='TX'), Office(name='Canada Office')
+    session.add_all([usa, canada])
+    session.flush()
+    session.add_all([
+        UserOffice(user_id='admin', office_id=usa.id, role='super_admin'),
+        UserOffice(user_id='u1', office_id=usa.id, role='office_admin'),
+        UserOffice(user_id='u1', office_id=canada.id, role='standard_user'),
+    ])
+    session.commit()
+    invalidate_access()
+    app = Flask(__name__)
+    with app.app_context():
+        yield session
+    session.close()
+
+
+def test_roles_are_answered_from_one_query(session):
+    with count_queries() as stats:
+        access = get_access_context('u1', session)
+    assert stats.count == 1
+
+    usa, canada = (office.id for office in session.query(Office).order_by(Office.id))
+    assert not access.is_super_admin
+    assert access.is_office_admin(usa) and not access.is_office_admin(canada)
+    assert access.role_in(canada) == 'standard_user'
+    assert access.has_role(['standard_user', 'limited_user'])
+    assert access.office_ids == (usa, canada)
+    assert access.can_access_office(canada) and not access.can_access_office(canada + 1)
+    assert access.offices()[0]['office'] == {'id': usa, 'name': 'USA Office', 'city': 'Dallas', 'state': 'TX'}
+    assert get_access_context('admin', session).can_access_office(canada + 1)
+    assert get_access_context(None, session).office_ids == ()
+
+
+def test_contexts_are_cached_until_memberships_change(session):
+    access = get_access_context('u1', session)
+    other = get_access_context('admin', session)
+    with count_queries() as stats:
+        assert get_access_context('u1', session) is access
+    assert stats.count == 0
+
+    membership = session.query(UserOffice).filter_by(user_id='u1', role='standard_user').one()
+    membership.role = 'office_admin'
+    session.commit()
+    assert get_access_context('u1', session).role_in(membership.office_id) == 'office_admin'
+    # Another user's memberships didn't change
+    assert get_access_context('admin', session) is other
+
+    session.execute(delete(UserOffice).where(UserOffice.office_id == membership.office_id))
+    session.commit()
+    assert get_access_context('u1', session).office_ids == (access.office_ids[0],)
+    assert get_access_context('admin', session) is not other
+
+
+def test_one_context_per_request(session):
+    app = Flask(__name__)
+    with app.test_request_context():
+        access = get_access_context('u1', session)
+        invalidate_access()
+        with count_queries() as stats:
+            assert get_access_context('u1', session) is access
+        assert stats.count == 0
+        assert get_access_context('admin', session).is_super_admin
@@ -0,0 +1,42 @@
+import time
+import pytest
+from utils import auth as auth_utils
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    auth_utils._token_cache.clear()
+    yield
+    auth_utils._token_cache.clear()
+
+
+def test_verified_tokens_are_reused_until_expiry(monkeypatch):
+    calls = []
+
+    def fake_verify(token):
+        calls.append(token)
+        if token == 'bad':
+            raise ValueError('invalid token')
+        expires = time.time() + (3600 if token == 'fresh' else 10)
+        return {'uid': token, 'exp': expires}
+
+    monkeypatch.setattr(auth_utils.auth, 'verify_id_token', fake_verify)
+
+    assert auth_utils.verify_firebase_id_token('fresh')['uid'] == 'fresh'
+    assert auth_utils.verify_firebase_id_token('fresh')['uid'] == 'fresh'
+    assert calls == ['fresh']
+
+    # Tokens inside the expiry leeway are verified again
+    auth_utils.verify_firebase_id_token('expiring')
+    auth_utils.verify_firebase_id_token('expiring')
+    assert calls.count('expiring') == 2
+
+    # Failures are not cached
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            auth_utils.verify_firebase_id_token('bad')
+    assert calls.count('bad') == 2
+
+    stats = auth_utils.get_token_cache_stats()
+    assert stats['hits'] >= 1
+    assert stats['size'] == 2
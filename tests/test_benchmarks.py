@@ -0,0 +1,62 @@
+from sqlalchemy import func, select
+import pytest
+from benchmarks.run import compare, percentile, summarize
+from benchmarks.synthetic_data import FULL_SCALE, dataset_counts, scaled_counts, seed_database
+from database import create_configured_engine
+from models import Base, Communication, Person, Task
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_configured_engine(f"sqlite:///{tmp_path / 'bench.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_scaled_counts_keep_users_and_offices():
+    counts = scaled_counts(0.01)
+    assert counts['people'] == FULL_SCALE['people'] // 100
+    assert counts['communications'] == FULL_SCALE['communications'] // 100
+    assert counts['users'] == FULL_SCALE['users']
+    assert counts['offices'] == FULL_SCALE['offices']
+    assert scaled_counts(0)['churches'] == 1
+
+
+def test_seed_database_writes_the_requested_volumes(engine):
+    written = seed_database(engine, scale=0.001, user_ids=['signed-in-user'])
+    assert dataset_counts(engine) == written == scaled_counts(0.001)
+
+    with engine.connect() as connection:
+        people = connection.execute(
+            select(func.count()).where(Person.user_id == 'signed-in-user')).scalar()
+        orphan_tasks = connection.execute(
+            select(func.count()).select_from(Task).where(
+                Task.person_id.is_(None), Task.church_id.is_(None))).scalar()
+        mismatched = connection.execute(
+            select(func.count()).select_from(Communication)
+            .join(Person, Communication.person_id == Person.id)
+            .where(Communication.user_id != Person.user_id)).scalar()
+    assert people == written['people'] // written['users']
+    assert orphan_tasks == 0
+    assert mismatched == 0
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) is None
+    assert percentile([5], 95) == 5
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile(list(range(1, 101)), 95) == pytest.approx(95.05)
+
+
+def test_compare_flags_slower_p95_and_extra_queries():
+    samples = [(200, 0.010, 3)] * 19 + [(500, 0.050, 4)]
+    result = summarize(samples)
+    assert result['errors'] == 1
+    assert result['statuses'] == {'200': 19, '500': 1}
+    assert result['queries'] == 3
+
+    baseline = {'people': {'p95_ms': 10.0, 'queries': 3}, 'fast': {'p95_ms': 1.0, 'queries': 2}}
+    results = {'people': {'p95_ms': 20.0, 'queries': 4}, 'fast': {'p95_ms': 4.0, 'queries': 2},
+               'new': {'p95_ms': 100.0, 'queries': 9}}
+    assert compare(results, baseline) == ['people: p95 10.0ms -> 20.0ms', 'people: queries 3 -> 4']
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from utils.calendar_sync import plan_task_push
+
+
+def make_task(event_id='evt1', last_synced_at=None):
+    return SimpleNamespace(id=1, google_calendar_event_id=event_id, last_synced_at=last_synced_at)
+
+
+def event_updated(when):
+    return {'id': 'evt1', 'status': 'confirmed',
+            'updated': when.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')}
+
+
+def test_new_and_locally_edited_tasks_are_pushed():
+    assert plan_task_push(make_task(event_id=None)) == 'insert'
+    assert plan_task_push(make_task(last_synced_at=None)) == 'update'
+
+
+def test_remote_changes_after_last_sync_are_overwritten():
+    synced = datetime.now() - timedelta(hours=1)
+    task = make_task(last_synced_at=synced)
+
+    assert plan_task_push(task, event_updated(datetime.now().astimezone())) == 'update'
+    assert plan_task_push(task, event_updated((synced - timedelta(minutes=5)).astimezone())) is None
+    assert plan_task_push(task, {'id': 'evt1', 'status': 'cancelled'}) == 'insert'
+    assert plan_task_push(task) is None
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Communication, Person
+from utils.communication_search import search_communications, build_match_query
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    person = Person(first_name='Ann', last_name='Lee', user_id='u1')
+    session.add(person)
+    session.flush()
+    now = datetime(2024, 1, 1)
+    session.add_all([
+        Communication(type='Email', user_id='u1', person_id=person.id, subject='Mission trip',
+                      message='Plans for the <b>mission</b> trip to Kenya', date_sent=now, date=now),
+        Communication(type='Email', user_id='u1', subject='Budget',
+                      message='The mission budget is attached', date_sent=now, date=now),
+        Communication(type='Email', user_id='u2', subject='Mission trip',
+                      message='Another user', date_sent=now, date=now),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_build_match_query_strips_syntax():
+    assert build_match_query('mission "trip" OR x*', 'sqlite') == '"mission" "trip" "OR" "x"*'
+    assert build_match_query('mission tri', 'postgresql') == 'mission & tri:*'
+    assert build_match_query(' -- ', 'sqlite') is None
+
+
+def test_ranked_search_with_snippets(session):
+    results, total = search_communications(session, 'missi', user_id='u1')
+
+    assert total == 2
+    # A match in the subject ranks above a match only in the body
+    assert [r['communication'].subject for r in results] == ['Mission trip', 'Budget']
+    assert results[0]['communication'].person.first_name == 'Ann'
+    assert '<mark>Mission</mark>' in results[0]['snippet'] or '<mark>mission</mark>' in results[0]['snippet']
+    assert '<b>' not in results[0]['snippet']
+
+
+def test_index_follows_updates_and_deletes(session):
+    comm = session.query(Communication).filter_by(subject='Budget').one()
+    comm.message = 'Quarterly numbers'
+    session.commit()
+    assert search_communications(session, 'quarterly', user_id='u1')[1] == 1
+    assert search_communications(session, 'mission', user_id='u1')[1] == 1
+
+    session.delete(comm)
+    session.commit()
+    assert search_communications(session, 'quarterly', user_id='u1')[1] == 0
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Communication, Person
+from utils.communication_timeline import get_timeline_page, get_timeline_count, clear_timeline_counts
+from utils.pagination import InvalidCursorError
+
+START = datetime(2024, 1, 1, 9, 0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    person = Person(first_name='Ann', last_name='Lee', user_id='u1')
+    session.add(person)
+    session.flush()
+    for i in range(5):
+        session.add(Communication(type='Email', user_id='u1', person_id=person.id, subject=f'm{i}',
+                                  gmail_message_id=f'g{i}', date_sent=START + timedelta(hours=i),
+                                  date=START))
+    # The same message stored without an owner, newer than the user's copy
+    session.add(Communication(type='Email', user_id=None, subject='m2 copy', gmail_message_id='g2',
+                              date_sent=START + timedelta(hours=2, minutes=1), date=START))
+    # Two notes sent at the same time, and someone else's message
+    for subject in ('note a', 'note b'):
+        session.add(Communication(type='Note', user_id='u1', subject=subject,
+                                  date_sent=START + timedelta(hours=3), date=START))
+    session.add(Communication(type='Email', user_id='u2', subject='other', gmail_message_id='g9',
+                              date_sent=START, date=START))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_pages_are_full_newest_first_and_deduplicated(session):
+    subjects = []
+    cursor = None
+    page_sizes = []
+    while True:
+        page, cursor = get_timeline_page(session, 'u1', cursor=cursor, limit=3)
+        page_sizes.append(len(page))
+        subjects += [comm.subject for comm in page]
+        if not cursor:
+            break
+
+    assert page_sizes == [3, 3, 1]
+    assert subjects == ['m4', 'note b', 'note a', 'm3', 'm2 copy', 'm1', 'm0']
+
+
+def test_filters_and_cached_count(session):
+    app = Flask(__name__)
+    person_id = session.query(Person.id).scalar()
+    clear_timeline_counts()
+
+    with app.app_context():
+        page, _ = get_timeline_page(session, 'u1', person_id=person_id, search_term='M1')
+        assert [comm.subject for comm in page] == ['m1']
+        assert get_timeline_count(session, 'u1') == 7
+
+        session.add(Communication(type='Note', user_id='u1', date_sent=START, date=START))
+        session.commit()
+        assert get_timeline_count(session, 'u1') == 7
+
+        clear_timeline_counts('u1')
+        assert get_timeline_count(session, 'u1') == 8
+
+
+def test_invalid_cursor(session):
+    with pytest.raises(InvalidCursorError):
+        get_timeline_page(session, 'u1', cursor='WyJub3QgYSBkYXRlIiwxXQ')
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Communication
+from utils.communication_writer import CommunicationWriter
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_writer_ignores_already_synced_messages(session):
+    session.add(Communication(type='Email', user_id='u1', gmail_message_id='m1'))
+    session.commit()
+
+    with CommunicationWriter(session, chunk_size=2) as writer:
+        for msg_id in ('m1', 'm2', 'm3', 'm2'):
+            writer.add(type='Email', user_id='u1', gmail_message_id=msg_id, subject=msg_id)
+        # The same message for another user is a separate row
+        writer.add(type='Email', user_id='u2', gmail_message_id='m1')
+
+    assert writer.inserted == 3
+    assert writer.skipped == 2
+    assert session.query(Communication).count() == 4
+    assert session.query(Communication).filter_by(gmail_message_id='m2').one().direction == 'outbound'
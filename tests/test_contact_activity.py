@@ -0,0 +1,82 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Church, Communication, Person, Task
+from utils.contact_activity import activity_timeline, contact_tasks, recent_contact_communications
+from utils.query_stats import assert_max_queries
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    church = Church(church_name='Grace')
+    person = Person(first_name='Ann', last_name='Lee', user_id='u1', church=church)
+    session.add_all([church, person])
+    session.flush()
+
+    start = datetime(2024, 1, 1, 9, 0)
+    for n in range(30):
+        session.add(Communication(type='Email', subject=f'Message {n}', message='Hello', person_id=person.id,
+                                  church_id=church.id, user_id='u1', gmail_message_id=f'm{n}',
+                                  date_sent=start + timedelta(days=n)))
+    # The newest message was also synced without an owner
+    session.add(Communication(type='Email', subject='Message 29', message='Hello', person_id=person.id,
+                              gmail_message_id='m29', date_sent=start + timedelta(days=29)))
+    session.add(Communication(type='Phone Call', message='Another user', person_id=person.id, user_id='u2',
+                              date_sent=start + timedelta(days=40)))
+    for n in range(25):
+        session.add(Task(title=f'Task {n}', description='x' * 60, person_id=person.id, church_id=church.id,
+                         user_id='u1', status='Not Started', due_date=date(2024, 1, 1) + timedelta(days=n)))
+    session.add(Task(title='Someday', person_id=person.id, user_id='u1', status='Not Started'))
+    session.commit()
+    yield session, person, church
+    session.close()
+
+
+def test_recent_communications_are_newest_first_one_per_message(session):
+    session, person, church = session
+
+    recent = recent_contact_communications(session, user_id='u1', person_id=person.id)
+    assert [comm.subject for comm in recent] == [f'Message {n}' for n in (29, 28, 27, 26, 25)]
+
+    church_recent = recent_contact_communications(session, church_id=church.id, limit=3)
+    assert [comm.subject for comm in church_recent] == ['Message 29', 'Message 28', 'Message 27']
+
+
+def test_contact_tasks_are_capped(session):
+    session, person, church = session
+
+    tasks = contact_tasks(session, person_id=person.id)
+    assert len(tasks) == 20
+    assert tasks[0].title == 'Task 24'
+    assert len(contact_tasks(session, church_id=church.id, limit=5)) == 5
+
+
+def test_activity_timeline_merges_communications_and_dated_tasks(session):
+    session, person, _ = session
+
+    activities = activity_timeline(session, user_id='u1', person_id=person.id, limit=9)
+
+    # Message n is sent at 09:00 on the day Task n - 1 is due
+    assert [a['type'] for a in activities[:8]] == ['communication'] * 6 + ['task', 'communication']
+    assert activities[0]['title'] == 'Email Communication'
+    assert activities[6]['title'] == 'Task 24'
+    assert [a['description'] for a in activities[:2]] == ['Message 29', 'Message 28']
+    assert activities[6]['description'] == 'x' * 50 + '...'
+    assert len(activities) == 9
+    assert all(hasattr(a['date'], 'strftime') for a in activities)
+    assert 'Someday' not in [a['title'] for a in activities]
+
+
+def test_detail_queries_do_not_grow_with_history(session):
+    session, person, _ = session
+    person_id = person.id
+
+    with assert_max_queries(3):
+        recent_contact_communications(session, user_id='u1', person_id=person_id)
+        contact_tasks(session, person_id=person_id)
+        activity_timeline(session, user_id='u1', person_id=person_id)
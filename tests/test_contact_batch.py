@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Church, Communication, Contacts, Office, Person, Task
+from utils.contact_batch import batch_update_contacts, batch_delete_contacts, parse_id_list, PERSON, CHURCH
+from utils.pipeline_rollups import pipeline_funnel
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Office(id=1, name='USA'))
+    church = Church(church_name='Grace', church_pipeline='PROMOTION', office_id=1)
+    session.add(church)
+    session.flush()
+    people = [Person(first_name=f'P{i}', people_pipeline='PROMOTION', user_id='u1', church_id=church.id)
+              for i in range(5)]
+    session.add_all(people)
+    session.flush()
+    church.main_contact_id = people[0].id
+    session.add_all([
+        Task(title='Call', person_id=people[0].id, church_id=church.id, user_id='u1'),
+        Communication(type='Email', person_id=people[0].id, church_id=church.id, user_id='u1'),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def funnel(session, contact_type=PERSON, **filters):
+    return {item['stage']: item['count'] for item in pipeline_funnel(session, contact_type, **filters) if item['count']}
+
+
+def test_parse_id_list():
+    assert parse_id_list('3, 1,3,,2') == [3, 1, 2]
+    with pytest.raises(ValueError):
+        parse_id_list('1,x')
+
+
+def test_batch_update_in_chunks(session):
+    ids = [person.id for person in session.query(Person)] + [999]
+    report = batch_update_contacts(session, PERSON, ids, {'people_pipeline': 'INVITATION', 'city': 'Austin'},
+                                   chunk_size=2)
+    session.commit()
+
+    assert report == {'requested': 6, 'updated': 5, 'missing': 1}
+    assert {p.people_pipeline for p in session.query(Person)} == {'INVITATION'}
+    assert {c.city for c in session.query(Contacts)} == {'Austin', None}
+    assert funnel(session) == {'INVITATION': 5}
+
+    with pytest.raises(ValueError):
+        batch_update_contacts(session, PERSON, ids, {'church_pipeline': 'X'})
+    assert batch_update_contacts(session, PERSON, ids, {}) == {'requested': 6, 'updated': 0, 'missing': 1}
+
+
+def test_batch_delete_people_clears_references(session):
+    ids = [person.id for person in session.query(Person).order_by(Person.id)][:3]
+    report = batch_delete_contacts(session, PERSON, ids + [999], chunk_size=2)
+    session.commit()
+    session.expire_all()
+
+    assert report == {'requested': 4, 'deleted': 3, 'missing': 1}
+    assert session.query(Person).count() == 2
+    assert session.query(Contacts).filter(Contacts.id.in_(ids)).count() == 0
+    assert session.query(Task).one().person_id is None
+    assert session.query(Communication).one().person_id is None
+    assert session.query(Church).one().main_contact_id is None
+    assert funnel(session) == {'PROMOTION': 2}
+
+
+def test_batch_delete_church_moves_members_out_of_its_office(session):
+    church_id = session.query(Church).one().id
+    assert batch_delete_contacts(session, CHURCH, [church_id])['deleted'] == 1
+    session.commit()
+    session.expire_all()
+
+    assert session.query(Church).count() == 0
+    assert {p.church_id for p in session.query(Person)} == {None}
+    assert session.query(Task).one().church_id is None
+    assert funnel(session, CHURCH) == {}
+    assert funnel(session, office_id=1) == {}
+    assert funnel(session) == {'PROMOTION': 5}
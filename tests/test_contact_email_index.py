@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Person, Church
+from utils.contact_email_index import ContactEmailIndex
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_index_resolves_people_and_church_contacts(session):
+    person = Person(first_name='Ann', last_name='Lee', email='Ann@Example.com', user_id='u1')
+    church = Church(church_name='Grace', email='office@grace.org',
+                    senior_pastor_email='pastor@grace.org')
+    session.add_all([person, church])
+    session.commit()
+
+    index = ContactEmailIndex.build(session)
+
+    assert index.lookup(' ann@example.com ') == ('person', person.id)
+    assert index.lookup('pastor@grace.org') == ('church', church.id)
+    assert index.resolve('Someone <nobody@x.com>, Pastor <PASTOR@grace.org>') == \
+        ('pastor@grace.org', 'church', church.id)
+    assert index.resolve('nobody@x.com') is None
+
+
+def test_person_takes_precedence_over_church():
+    index = ContactEmailIndex()
+    index.add('shared@example.com', ContactEmailIndex.PERSON, 1)
+    index.add('shared@example.com', ContactEmailIndex.CHURCH, 2)
+
+    assert index.lookup('shared@example.com') == ('person', 1)
@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Person, Church
+from routes.people import query_people_page
+from utils.contact_search import search_contacts, lookup_contacts, PERSON, CHURCH
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Person(first_name='Johanna', last_name='Smith', email='jo@example.com', phone='555-123-4567',
+               city='Austin', user_id='u1'),
+        Person(first_name='John', last_name='Doe', city='Dallas', user_id='u2'),
+        Church(church_name='Grace Fellowship', city='Austin', senior_pastor_first_name='Mark',
+               senior_pastor_last_name='Johnson'),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_prefix_search_across_people_and_churches(session):
+    hits = search_contacts(session, 'joh')
+
+    assert {(hit['type'], hit['name']) for hit in hits} == {
+        ('person', 'Johanna Smith'), ('person', 'John Doe'), ('church', 'Grace Fellowship')
+    }
+    # Name matches rank above a pastor name match
+    assert hits[-1]['type'] == 'church'
+
+
+def test_filters_by_owner_type_and_all_words(session):
+    assert [hit['name'] for hit in search_contacts(session, 'joh', user_id='u1')] == \
+        ['Johanna Smith', 'Grace Fellowship']
+    assert [hit['name'] for hit in search_contacts(session, 'austin', types=['church'])] == ['Grace Fellowship']
+    assert [hit['name'] for hit in search_contacts(session, '555 austin')] == ['Johanna Smith']
+    assert search_contacts(session, '***') == []
+
+
+def test_index_follows_updates(session):
+    church = session.query(Church).one()
+    church.senior_pastor_last_name = 'Williams'
+    session.commit()
+    assert search_contacts(session, 'johnson', types=['church']) == []
+    assert search_contacts(session, 'williams')[0]['name'] == 'Grace Fellowship'
+
+
+def test_people_list_search(session):
+    rows, _ = query_people_page(session, 'u1', {'q': 'smith'}, super_admin=True)
+    assert [row.first_name for row in rows] == ['Johanna']
+
+
+def test_lookup_pages_alphabetically(session):
+    first, cursor = lookup_contacts(session, PERSON, limit=1)
+    second, last_cursor = lookup_contacts(session, PERSON, cursor=cursor, limit=1)
+
+    assert [p['name'] for p in first + second] == ['Johanna Smith', 'John Doe']
+    assert last_cursor is None
+    assert lookup_contacts(session, CHURCH, 'grace')[0] == [{'id': 3, 'name': 'Grace Fellowship'}]
@@ -0,0 +1,69 @@
+import pytest
+from flask import Flask
+from database import db, session_scope
+from models import Base, Church, ImportJob, Person
+from utils.csv_import import create_import_job, job_to_dict, missing_headers, read_header, run_csv_import
+from utils.pipeline_rollups import pipeline_funnel, PERSON
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        Base.metadata.create_all(db.engine)
+        yield app
+
+
+def write_csv(tmp_path, text):
+    path = tmp_path / 'contacts.csv'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def start_job(path, contact_type):
+    with session_scope() as session:
+        return create_import_job(session, 'u1', contact_type, path, 'contacts.csv')
+
+
+def test_header_check(tmp_path):
+    path = write_csv(tmp_path, '﻿first_name,last_name,address\n')
+    assert read_header(path) == ['first_name', 'last_name', 'address']
+    assert missing_headers('person', read_header(path)) == ['email']
+
+
+def test_people_are_imported_in_chunks_with_row_errors(app, tmp_path):
+    rows = ['first_name,last_name,email,state,address,country,people_pipeline']
+    rows += [f'P{i},Smith,p{i}@example.com,TX,{i} Main St,USA,PROMOTION' for i in range(5)]
+    rows += [',NoFirst,nofirst@example.com,,,,', 'Bad,Email,not-an-email,,,,']
+    path = write_csv(tmp_path, '\n'.join(rows) + '\n')
+    job_id = start_job(path, 'person')
+
+    run_csv_import(job_id, path, chunk_size=2)
+
+    with session_scope() as session:
+        job = job_to_dict(session.get(ImportJob, job_id))
+        people = session.query(Person).order_by(Person.id).all()
+        assert (job['status'], job['percent']) == ('completed', 100)
+        assert (job['rows_processed'], job['rows_imported'], job['rows_failed']) == (7, 5, 2)
+        assert [(error['row'], list(error['errors'])) for error in job['errors']] == \
+            [(7, ['first_name']), (8, ['email'])]
+        assert (people[0].street_address, people[0].state, people[0].user_id) == ('0 Main St', 'tx', 'u1')
+        assert {item['stage']: item['count'] for item in pipeline_funnel(session, PERSON)}['PROMOTION'] == 5
+    assert not (tmp_path / 'contacts.csv').exists()
+
+
+def test_churches_and_unreadable_files(app, tmp_path):
+    path = write_csv(tmp_path, 'church_name,email,website\nGrace,info@grace.org,www.grace.org\n')
+    job_id = start_job(path, 'church')
+    run_csv_import(job_id, path)
+
+    bad_path = tmp_path / 'bad.csv'
+    bad_path.write_bytes(b'church_name,email\n\xff\xfe,x\n')
+    bad_job_id = start_job(str(bad_path), 'church')
+    run_csv_import(bad_job_id, str(bad_path))
+
+    with session_scope() as session:
+        assert session.query(Church).one().website == 'https://www.grace.org'
+        assert session.get(ImportJob, bad_job_id).status == 'failed'
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import sessionmaker
+from models import Base, Church, Communication, Person, Task
+from utils.dashboard_cache import get_dashboard_summary, invalidate_dashboard, serialize_summary
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    app = Flask(__name__)
+    app.config['DASHBOARD_CACHE_TTL'] = 300
+    invalidate_dashboard()
+    with app.app_context():
+        session.add_all([Person(first_name='Ann', last_name='Lee', user_id='u1'), Church(church_name='Grace')])
+        session.commit()
+        yield session
+    session.close()
+
+
+def test_summary_is_cached_until_the_users_data_changes(session):
+    summary = get_dashboard_summary(session, 'u1')
+    assert (summary['total_people'], summary['total_churches']) == (1, 1)
+    assert get_dashboard_summary(session, 'u1') is summary
+    other = get_dashboard_summary(session, 'u2')
+
+    person = session.query(Person).one()
+    session.add(Task(title='Call Ann', status='Not Started', user_id='u1', person_id=person.id))
+    session.commit()
+
+    refreshed = get_dashboard_summary(session, 'u1')
+    assert refreshed['pending_tasks'][0]['first_name'] == 'Ann'
+    # Another user's data didn't change
+    assert get_dashboard_summary(session, 'u2') is other
+
+
+def test_church_changes_and_bulk_writes_invalidate(session):
+    summary = get_dashboard_summary(session, 'u1')
+    other = get_dashboard_summary(session, 'u2')
+
+    session.add(Church(church_name='Hope'))
+    session.commit()
+    assert get_dashboard_summary(session, 'u2') is not other
+    assert get_dashboard_summary(session, 'u1')['total_churches'] == 2
+
+    other = get_dashboard_summary(session, 'u2')
+    now = datetime(2024, 1, 1)
+    session.execute(insert(Communication.__table__), [
+        {'type': 'Email', 'user_id': 'u1', 'message': 'Hi', 'date_sent': now, 'date': now}
+    ])
+    session.commit()
+    assert get_dashboard_summary(session, 'u2') is other
+    summary = get_dashboard_summary(session, 'u1')
+    assert serialize_summary(summary)['recent_communications'][0]['date_sent'] == '2024-01-01T00:00:00'
+
+    session.execute(update(Person.__table__).values(user_id='u2'))
+    session.commit()
+    assert get_dashboard_summary(session, 'u2')['total_people'] == 1
+
+
+def test_rolled_back_changes_keep_the_cache(session):
+    summary = get_dashboard_summary(session, 'u1')
+    session.add(Person(first_name='Bo', user_id='u1'))
+    session.flush()
+    session.rollback()
+    assert get_dashboard_summary(session, 'u1') is summary
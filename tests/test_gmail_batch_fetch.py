@@ -0,0 +1,67 @@
+import base64
+from types import SimpleNamespace
+
+from googleapiclient.errors import HttpError
+from utils.gmail_integration import iter_message_contents
+
+
+def encode(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def message(msg_id, body=''):
+    payload = {'mimeType': 'text/plain', 'headers': [{'name': 'Subject', 'value': 'Hi'}], 'body': {}}
+    if body:
+        payload['body']['data'] = encode(body)
+    return {'id': msg_id, 'threadId': 't', 'payload': payload}
+
+
+class FakeGmail:
+    """Answers messages.get calls from a dict of message id -> resource or HTTP error status"""
+
+    def __init__(self, answers):
+        self.answers = answers
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id, format=None, fields=None):
+        raw = {'raw': encode(f"Subject: Hi\n\nRaw body of {id}")}
+        return SimpleNamespace(id=id, execute=lambda: raw)
+
+    def new_batch_http_request(self, callback):
+        calls = []
+
+        def execute():
+            for request in calls:
+                answer = self.answers[request.id]
+                if isinstance(answer, int):
+                    callback(request.id, None, HttpError(SimpleNamespace(status=answer, reason=''), b''))
+                else:
+                    callback(request.id, answer, None)
+
+        return SimpleNamespace(add=lambda request, request_id: calls.append(request), execute=execute)
+
+
+def test_failed_fetches_are_reported(monkeypatch):
+    monkeypatch.setattr('utils.gmail_integration.time.sleep', lambda seconds: None)
+    service = FakeGmail({'ok': message('ok', 'Hello'), 'gone': 404, 'denied': 403, 'busy': 429})
+
+    failed = []
+    contents = list(iter_message_contents(service, 'me', ['ok', 'gone', 'denied', 'busy'],
+                                          max_retries=1, failed_ids=failed))
+
+    assert [content['body'] for content in contents] == ['Hello']
+    # Deleted messages aren't failures; rate limited ones are once retries run out
+    assert sorted(failed) == ['busy', 'denied']
+
+
+def test_empty_bodies_fall_back_to_raw_message():
+    service = FakeGmail({'empty': message('empty')})
+
+    contents = list(iter_message_contents(service, 'me', ['empty']))
+
+    assert contents[0]['body'].strip() == 'Raw body of empty'
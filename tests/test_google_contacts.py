@@ -0,0 +1,123 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Church, Contacts, Person
+from utils.google_contacts import (import_google_contacts, imported_resource_names, list_connections,
+                                   parse_address, PERSON, CHURCH)
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeConnections:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def list(self, **params):
+        self.calls.append(params)
+        key = (params.get('syncToken'), params.get('pageToken'))
+        return FakeRequest(self.pages[key])
+
+
+class FakeService:
+    def __init__(self, pages):
+        self.connections_api = FakeConnections(pages)
+
+    def people(self):
+        return self
+
+    def connections(self):
+        return self.connections_api
+
+
+def google_person(resource_name, name, deleted=False):
+    person = {'resourceName': resource_name, 'names': [{'displayName': name}]}
+    if deleted:
+        person['metadata'] = {'deleted': True}
+    return person
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_list_connections_pages_and_syncs():
+    service = FakeService({
+        (None, None): {'connections': [google_person('people/1', 'Ann Lee')], 'nextPageToken': 'p2'},
+        (None, 'p2'): {'connections': [google_person('people/2', 'Bo Chan')], 'nextSyncToken': 's1'},
+        ('s1', None): {'connections': [google_person('people/1', 'Ann Li'), google_person('people/2', '', True)],
+                       'nextSyncToken': 's2'},
+    })
+
+    listing = list_connections(service)
+    assert [c['resource_name'] for c in listing['contacts']] == ['people/1', 'people/2']
+    assert listing['sync_token'] == 's1' and listing['full_sync']
+
+    changes = list_connections(service, 's1')
+    assert [c['names'] for c in changes['contacts']] == ['Ann Li']
+    assert changes['deleted'] == ['people/2']
+    assert changes['sync_token'] == 's2' and not changes['full_sync']
+    assert all(call['requestSyncToken'] for call in service.connections_api.calls)
+
+
+def test_parse_address():
+    assert parse_address('1 Main St, Springfield, IL 62701') == {
+        'street_address': '1 Main St', 'city': 'Springfield', 'state': 'il', 'zip_code': '62701'
+    }
+    assert parse_address('Springfield, Illinois 62701') == {'city': 'Springfield', 'zip_code': '62701'}
+
+
+def test_import_google_contacts(session):
+    session.add_all([
+        Person(first_name='Ann', last_name='Lee', google_resource_name='people/1', user_id='u1'),
+        Person(first_name='Grace', google_resource_name='people/2', user_id='u1'),
+        Church(church_name='Hope', google_resource_name='people/3', email='hope@example.com'),
+    ])
+    session.commit()
+
+    summary = import_google_contacts(session, [
+        {'resource_name': 'people/1', 'import_type': PERSON, 'names': 'Ann Lee',
+         'email_addresses': ['ann@example.com']},
+        {'resource_name': 'people/2', 'import_type': CHURCH, 'names': 'Grace Church'},
+        {'resource_name': 'people/3', 'import_type': CHURCH, 'names': 'Hope',
+         'email_addresses': ['other@example.com']},
+        {'resource_name': 'people/4', 'import_type': PERSON, 'names': 'Bo'},
+        {'resource_name': 'people/4', 'import_type': PERSON, 'names': 'Bo Chan',
+         'addresses': ['1 Main St, Springfield, IL 62701']},
+        {'resource_name': 'people/5', 'import_type': CHURCH, 'names': 'New Life'},
+        {'resource_name': 'people/6', 'import_type': 'office'},
+    ], 'u1', batch_size=2)
+    session.commit()
+
+    assert (summary['created'], summary['updated'], summary['skipped']) == (2, 2, 2)
+    outcomes = {item['resource_name']: (item['type'], item['outcome']) for item in summary['results']}
+    assert outcomes == {
+        'people/1': (PERSON, 'updated'),
+        'people/2': (CHURCH, 'updated'),
+        'people/3': (CHURCH, 'skipped'),
+        'people/4': (PERSON, 'created'),
+        'people/5': (CHURCH, 'created'),
+    }
+
+    assert session.query(Person).filter_by(google_resource_name='people/1').one().email == 'ann@example.com'
+    assert session.query(Church).filter_by(google_resource_name='people/2').one().church_name == 'Grace Church'
+    assert session.query(Church).filter_by(google_resource_name='people/3').one().email == 'hope@example.com'
+    bo = session.query(Person).filter_by(google_resource_name='people/4').one()
+    assert (bo.first_name, bo.last_name, bo.city, bo.user_id) == ('Bo', 'Chan', 'Springfield', 'u1')
+    assert session.query(Contacts).count() == 5
+
+    imported = imported_resource_names(session, ['people/2', 'people/9'])
+    assert imported == {'people/2': {'id': imported['people/2']['id'], 'type': CHURCH}}
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Person
+from routes.people import query_people_page
+from utils.pagination import InvalidCursorError
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(7):
+        session.add(Person(first_name=f'P{i}', last_name='Same' if i < 4 else f'Name{i}',
+                           people_pipeline='INFORMATION' if i % 2 else 'PROMOTION',
+                           user_id='u1'))
+    session.add(Person(first_name='Other', last_name='User', user_id='u2'))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _all_pages(session, args, user_id='u1'):
+    pages = []
+    cursor = None
+    while True:
+        page_args = dict(args, cursor=cursor) if cursor else args
+        rows, cursor = query_people_page(session, user_id, page_args)
+        pages.append([row.id for row in rows])
+        if not cursor:
+            return pages
+
+
+def test_pages_cover_every_row_once_with_ties(session):
+    pages = _all_pages(session, {'limit': '3'})
+
+    ids = [person_id for page in pages for person_id in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert len(ids) == len(set(ids)) == 7
+
+
+def test_descending_sort_and_filters(session):
+    rows, cursor = query_people_page(session, 'u1', {'sort': 'first_name', 'order': 'desc',
+                                                      'pipeline': 'information'})
+
+    assert [row.first_name for row in rows] == ['P5', 'P3', 'P1']
+    assert all(row.pipeline == 'INFORMATION' for row in rows)
+    assert cursor is None
+
+
+def test_super_admin_sees_all_users(session):
+    rows, _ = query_people_page(session, 'u1', {}, super_admin=True)
+    assert len(rows) == 8
+
+
+def test_invalid_cursor(session):
+    with pytest.raises(InvalidCursorError):
+        query_people_page(session, 'u1', {'cursor': 'not-a-cursor'})
@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Church, Office, Person, PipelineRollup
+from utils.pipeline_rollups import (pipeline_funnel, pipeline_conversions, staff_workload,
+                                    rebuild_pipeline_rollups, PERSON, CHURCH)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Office(id=1, name='USA'), Office(id=2, name='Canada')])
+    church = Church(church_name='Grace', church_pipeline='INFORMATION', assigned_to='JILL WALKER', office_id=1)
+    session.add(church)
+    session.flush()
+    session.add_all([
+        Person(first_name='Ann', people_pipeline='PROMOTION', priority='HIGH', assigned_to='JILL WALKER',
+               user_id='u1', church_id=church.id),
+        Person(first_name='Bo', people_pipeline='PROMOTION', assigned_to='BILL JONES', user_id='u1'),
+        Person(first_name='Cy', people_pipeline='INVITATION', user_id='u2'),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def counts(session, contact_type=PERSON, **filters):
+    return {item['stage']: item['count'] for item in pipeline_funnel(session, contact_type, **filters) if item['count']}
+
+
+def test_rollups_follow_inserts_updates_and_deletes(session):
+    assert counts(session) == {'PROMOTION': 2, 'INVITATION': 1}
+    assert counts(session, user_id='u1', office_id=1) == {'PROMOTION': 1}
+    assert counts(session, CHURCH) == {'INFORMATION': 1}
+
+    ann = session.query(Person).filter_by(first_name='Ann').one()
+    ann.people_pipeline = 'INVITATION'
+    session.delete(session.query(Person).filter_by(first_name='Cy').one())
+    session.commit()
+    assert counts(session) == {'PROMOTION': 1, 'INVITATION': 1}
+
+    # Moving a church to another office moves its people too
+    session.query(Church).one().office_id = 2
+    session.commit()
+    assert counts(session, office_id=2) == {'INVITATION': 1}
+    assert counts(session, CHURCH, office_id=2) == {'INFORMATION': 1}
+
+
+def test_conversions_and_workload(session):
+    today = date.today()
+    result = pipeline_conversions(session, PERSON, today - timedelta(days=1), today, period='day')
+    assert result['periods'] == [(today - timedelta(days=1)).isoformat(), today.isoformat()]
+    assert result['stages']['PROMOTION'] == [0, 2]
+
+    workload = staff_workload(session, PERSON, user_id='u1')
+    assert [(item['assigned_to'], item['total']) for item in workload] == [('BILL JONES', 1), ('JILL WALKER', 1)]
+
+
+def test_rebuild_matches_incremental_counts(session):
+    before = counts(session), counts(session, office_id=1), counts(session, CHURCH)
+    session.query(PipelineRollup).delete()
+    session.commit()
+
+    assert rebuild_pipeline_rollups(session) == 4
+    session.commit()
+    assert (counts(session), counts(session, office_id=1), counts(session, CHURCH)) == before
@@ -0,0 +1,57 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import pytest
+from database import create_configured_engine
+from models import Base
+from scripts.check_query_plans import ROUTE_QUERIES, check_query_plans, full_scans, seed
+
+
+@pytest.fixture(scope='module')
+def seeded(tmp_path_factory):
+    engine = create_configured_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'crm.db'}")
+    Base.metadata.create_all(engine)
+    with Session(bind=engine) as session:
+        ids = seed(session, contacts_per_user=12, messages_per_contact=2)
+    with engine.begin() as connection:
+        connection.execute(text('ANALYZE'))
+    yield engine, ids
+    engine.dispose()
+
+
+def test_sqlite_full_scans_are_told_apart_from_index_scans():
+    plan = [
+        'SCAN tasks',
+        'SCAN TABLE people AS p',
+        'SCAN churches USING COVERING INDEX ix_churches_office_id',
+        'SCAN contacts_fts VIRTUAL TABLE INDEX 0:M1',
+        'SEARCH communications USING INDEX ix_communications_person_date_sent (person_id=?)',
+        'CO-ROUTINE anon_1',
+        'SEARCH communications USING INDEX ix_communications_church_date_sent (church_id=?)',
+        'SCAN anon_1',
+    ]
+    assert full_scans('sqlite', plan) == ['tasks', 'people']
+    assert full_scans('postgresql', ['Seq Scan on tasks  (cost=0.00..1.10 rows=1 width=4)']) == ['tasks']
+
+
+def test_route_queries_use_indexes(seeded):
+    engine, ids = seeded
+    assert check_query_plans(engine, ids) == []
+
+
+def test_a_missing_index_is_reported(seeded):
+    engine, ids = seeded
+    task_person = [entry for entry in ROUTE_QUERIES if entry[0] == 'person detail']
+    with engine.begin() as connection:
+        connection.execute(text('DROP INDEX ix_tasks_person_due_date'))
+    # sqlite3 caches prepared EXPLAIN statements, so start from new connections
+    engine.dispose()
+    try:
+        failures = check_query_plans(engine, ids, task_person)
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text('CREATE INDEX ix_tasks_person_due_date ON tasks (person_id, due_date)'))
+        engine.dispose()
+
+    # The task list and the activity timeline both read the person's tasks
+    assert [(name, scans) for name, _, _, scans in failures] == [('person detail', ['tasks'])] * 2
+    assert all('WHERE tasks.person_id = ?' in statement for _, statement, _, _ in failures)
@@ -0,0 +1,86 @@
+import logging
+import time
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from utils.query_stats import assert_max_queries, count_queries, init_query_stats
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE offices (id INTEGER PRIMARY KEY, name TEXT)'))
+        connection.execute(text("INSERT INTO offices (name) VALUES ('USA'), ('Canada'), ('Mexico')"))
+        connection.connection.create_function('pause', 1, lambda ms: time.sleep(ms / 1000) or ms)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def app(engine):
+    app = Flask(__name__)
+    app.config.update(QUERY_STATS_HEADERS=True, SLOW_QUERY_THRESHOLD_MS=20)
+    init_query_stats(app)
+
+    @app.route('/offices')
+    def offices():
+        # One query per office, as an N+1 loop would
+        with engine.connect() as connection:
+            ids = connection.execute(text('SELECT id FROM offices')).scalars().all()
+            names = [connection.execute(text('SELECT name FROM offices WHERE id = :id'), {'id': office_id}).scalar()
+                     for office_id in ids]
+        return jsonify(names)
+
+    @app.route('/slow')
+    def slow():
+        with engine.connect() as connection:
+            connection.execute(text('SELECT pause(30)')).scalar()
+        return 'done'
+
+    return app
+
+
+def test_query_count_and_time_headers(app):
+    response = app.test_client().get('/offices')
+
+    assert response.headers['X-Query-Count'] == '4'
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert response.headers['Server-Timing'].endswith('desc="4 queries"')
+
+
+def test_headers_can_be_turned_off(app):
+    app.config['QUERY_STATS_HEADERS'] = False
+    response = app.test_client().get('/offices')
+    assert 'X-Query-Count' not in response.headers
+    assert 'Server-Timing' not in response.headers
+
+
+def test_slow_queries_are_logged_with_their_route(app, caplog):
+    with caplog.at_level(logging.WARNING, logger='utils.query_stats'):
+        app.test_client().get('/offices')
+        assert not caplog.records
+        app.test_client().get('/slow')
+
+    assert len(caplog.records) == 1
+    assert 'GET /slow (slow)' in caplog.records[0].getMessage()
+    assert 'SELECT pause(30)' in caplog.records[0].getMessage()
+
+
+def test_assert_max_queries(app, engine):
+    client = app.test_client()
+    with assert_max_queries(4):
+        client.get('/offices')
+
+    with pytest.raises(AssertionError) as failure:
+        with assert_max_queries(2):
+            client.get('/offices')
+    assert 'Expected at most 2 queries, 4 ran' in str(failure.value)
+    assert 'SELECT name FROM offices WHERE id = ?' in str(failure.value)
+
+    with count_queries() as stats:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    assert stats.count == 1
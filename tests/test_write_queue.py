@@ -0,0 +1,84 @@
+import threading
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from database import create_configured_engine
+from models import Base, Communication
+from utils.communication_writer import CommunicationWriter
+from utils.write_queue import WriteQueue, get_write_queue, run_serialized_write, uses_write_queue
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_configured_engine(f"sqlite:///{tmp_path / 'crm.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_file_sqlite_connections_get_the_performance_pragmas(engine):
+    with engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert connection.execute(text('PRAGMA cache_size')).scalar() < 0
+        assert connection.execute(text('PRAGMA temp_store')).scalar() == 2  # MEMORY
+
+
+def test_only_file_sqlite_uses_the_writer(engine):
+    assert uses_write_queue(engine)
+    assert not uses_write_queue(create_engine('sqlite://'))
+
+
+def test_writes_run_one_at_a_time_on_the_writer_thread(engine):
+    threads_seen = set()
+
+    def insert(session, n):
+        threads_seen.add(threading.current_thread().name)
+        session.add(Communication(type='Email', user_id='u1', gmail_message_id=f'm{n}'))
+        return n
+
+    results = []
+    workers = [threading.Thread(target=lambda n=n: results.append(run_serialized_write(engine, insert, n)))
+               for n in range(20)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sorted(results) == list(range(20))
+    assert threads_seen == {'db-writer'}
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT count(*) FROM communications')).scalar() == 20
+    assert get_write_queue(engine).stats()['completed'] >= 20
+
+
+def test_failed_writes_roll_back_and_raise(tmp_path):
+    engine = create_configured_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    Base.metadata.create_all(engine)
+    write_queue = WriteQueue(engine)
+
+    def fail(session):
+        session.add(Communication(type='Email', user_id='u1', gmail_message_id='m1'))
+        session.flush()
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        write_queue.run(fail)
+    # A write queued from the writer itself runs straight away
+    assert write_queue.run(lambda session: write_queue.run(lambda inner: 'nested')) == 'nested'
+
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT count(*) FROM communications')).scalar() == 0
+    assert write_queue.stats() == {'pending': 0, 'completed': 2, 'failed': 1}
+    engine.dispose()
+
+
+def test_communication_writer_commits_through_the_writer(engine):
+    session = sessionmaker(bind=engine)()
+    with CommunicationWriter(session, chunk_size=2) as writer:
+        for msg_id in ('m1', 'm2', 'm2', 'm3'):
+            writer.add(type='Email', user_id='u1', gmail_message_id=msg_id)
+
+    assert (writer.inserted, writer.skipped) == (3, 1)
+    assert session.query(Communication).count() == 3
+    session.close()
@@ -0,0 +1,190 @@
+"""
+Per-user office access, loaded once and shared between requests
+A user's office memberships and roles are read in one query and kept for
+ACCESS_CONTEXT_TTL seconds. Committing a change to UserOffice or Office
+drops the affected entries at once; the TTL bounds how stale another
+process's copy can get.
+"""
+from itertools import chain
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Office, UserOffice, session_factory
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+# Marks a change that can affect every user's access
+ALL_USERS = '*'
+
+_PENDING_KEY = 'access_context_pending'
+
+_cache = {}
+_lock = threading.Lock()
+# Bumped by every invalidation, so a context loaded while one ran isn't cached
+_generation = 0
+
+
+class AccessContext:
+    """A user's office memberships, answered without touching the database"""
+
+    def __init__(self, user_id, memberships):
+        """
+        Args:
+            user_id: Firebase user id
+            memberships: (office_id, role, office_name, city, state) per UserOffice row
+        """
+        self.user_id = user_id
+        self.memberships = tuple(memberships)
+        self.roles = frozenset(role for _, role, _, _, _ in self.memberships)
+        self.office_ids = tuple(sorted({office_id for office_id, _, _, _, _ in self.memberships}))
+
+    @property
+    def is_super_admin(self):
+        return 'super_admin' in self.roles
+
+    def role_in(self, office_id):
+        """The user's role in an office, or None if they aren't a member"""
+        for member_office_id, role, _, _, _ in self.memberships:
+            if member_office_id == office_id:
+                return role
+        return None
+
+    def is_office_admin(self, office_id):
+        return any(member_office_id == office_id and role == 'office_admin'
+                   for member_office_id, role, _, _, _ in self.memberships)
+
+    def has_role(self, roles):
+        """True if the user has any of the roles in any office"""
+        return not self.roles.isdisjoint(roles)
+
+    def can_access_office(self, office_id):
+        return self.is_super_admin or office_id in self.office_ids
+
+    def offices(self):
+        """Memberships in the shape templates expect for user_offices"""
+        return [{
+            'office_id': office_id,
+            'role': role,
+            'office': {'id': office_id, 'name': name, 'city': city, 'state': state}
+        } for office_id, role, name, city, state in self.memberships]
+
+
+def load_access_context(session, user_id):
+    """Read a user's memberships with their offices in one query"""
+    rows = session.query(
+        UserOffice.office_id, UserOffice.role, Office.name, Office.city, Office.state
+    ).outerjoin(
+        Office, UserOffice.office_id == Office.id
+    ).filter(
+        UserOffice.user_id == user_id
+    ).order_by(UserOffice.office_id, UserOffice.id).all()
+    return AccessContext(user_id, [tuple(row) for row in rows])
+
+
+def get_access_context(user_id, session=None):
+    """
+    Get a user's AccessContext, loading it if it isn't cached
+
+    Within a request the same object answers every check.
+
+    Args:
+        user_id: User to resolve
+        session: Session to load with on a cache miss; a short-lived one is used if not given
+
+    Returns:
+        AccessContext: Empty for an unknown or missing user
+    """
+    if has_request_context():
+        current = g.get('access_context')
+        if current is not None and current.user_id == user_id:
+            return current
+
+    context = None
+    if user_id:
+        now = time.monotonic()
+        with _lock:
+            cached = _cache.get(user_id)
+            if cached and cached[1] > now:
+                context = cached[0]
+            generation = _generation
+        if context is None:
+            if session is not None:
+                context = load_access_context(session, user_id)
+            else:
+                with session_factory() as own_session:
+                    context = load_access_context(own_session, user_id)
+            ttl = current_app.config.get('ACCESS_CONTEXT_TTL', DEFAULT_TTL) if has_app_context() else DEFAULT_TTL
+            with _lock:
+                if generation == _generation:
+                    _cache[user_id] = (context, now + ttl)
+    else:
+        context = AccessContext(user_id, [])
+
+    if has_request_context():
+        g.access_context = context
+    return context
+
+
+def invalidate_access(user_id=None):
+    """
+    Drop cached access contexts
+
+    Args:
+        user_id: Only drop this user's context; drops everything if None
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        if user_id is None or user_id == ALL_USERS:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_changes(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, UserOffice):
+            # A membership moved to another user affects both of them
+            history = inspect(obj).attrs.user_id.history
+            session.info.setdefault(_PENDING_KEY, set()).update(
+                user_id for user_id in chain(history.unchanged, history.added, history.deleted) if user_id)
+        elif isinstance(obj, Office):
+            # Office names are part of every member's context
+            session.info.setdefault(_PENDING_KEY, set()).add(ALL_USERS)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) not in ('user_offices', 'offices'):
+        return
+    # The affected users can't be told from the statement
+    orm_execute_state.session.info.setdefault(_PENDING_KEY, set()).add(ALL_USERS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    if ALL_USERS in pending:
+        invalidate_access()
+    else:
+        for user_id in pending:
+            invalidate_access(user_id)
+    logger.debug(f"Access contexts invalidated for {sorted(pending)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_changes(session):
+    session.info.pop(_PENDING_KEY, None)
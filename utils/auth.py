@@ -1,43 +1,149 @@
 """
 Authentication utilities for the Mobilize CRM application.
 """
+from collections import OrderedDict
 from functools import wraps
-from flask import request, redirect, url_for, current_app, session
+from flask import request, redirect, url_for, current_app, session, g
 import firebase_admin
 from firebase_admin import auth
+import hashlib
+import logging
+import threading
+import time
 
-def get_current_user_id():
+logger = logging.getLogger(__name__)
+
+# Verified ID tokens are reused until shortly before they expire
+TOKEN_CACHE_SIZE = 1024
+TOKEN_EXPIRY_LEEWAY = 30  # seconds
+
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {'hits': 0, 'misses': 0, 'failures': 0}
+
+def _token_cache_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def verify_firebase_id_token(token):
     """
-    Get the current user ID from the session or request headers.
+    Verify a Firebase ID token, reusing earlier verifications of the same token.
+    
+    Decoded tokens are kept in a bounded LRU cache until their exp claim
+    (less a small leeway), so repeat requests with the same token skip the
+    signature check. Failed verifications are never cached.
     
+    Args:
+        token: The Firebase ID token.
+        
     Returns:
-        str: The user ID if authenticated, None otherwise.
+        dict: The decoded token claims.
+        
+    Raises:
+        Any error raised by firebase_admin.auth.verify_id_token.
     """
-    # Check session first
-    user_id = session.get('user_id')
-    if user_id:
-        return user_id
+    key = _token_cache_key(token)
+    now = time.time()
+    
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            if cached.get('exp', 0) - TOKEN_EXPIRY_LEEWAY > now:
+                _token_cache.move_to_end(key)
+                _token_cache_stats['hits'] += 1
+                return cached
+            del _token_cache[key]
+        _token_cache_stats['misses'] += 1
+    
+    try:
+        decoded_token = auth.verify_id_token(token)
+    except Exception:
+        with _token_cache_lock:
+            _token_cache_stats['failures'] += 1
+        raise
+    
+    with _token_cache_lock:
+        _token_cache[key] = decoded_token
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    
+    return decoded_token
+
+def get_token_cache_stats():
+    """
+    Get hit/miss counters for the verified token cache.
+    
+    Returns:
+        dict: hits, misses, failures, hit_rate and size.
+    """
+    with _token_cache_lock:
+        stats = dict(_token_cache_stats, size=len(_token_cache))
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+def warm_firebase_public_keys():
+    """
+    Fetch Google's ID token signing keys so a request never waits on them.
     
-    # Check Authorization header
+    firebase_admin caches the keys for as long as Google's Cache-Control
+    header allows; calling this periodically refreshes them in the
+    background once that cache has expired.
+    """
+    try:
+        from firebase_admin import _token_gen
+        client = auth._get_client(None)
+        verifier = client._token_verifier
+        verifier.request(url=_token_gen.ID_TOKEN_CERT_URI, method='GET')
+    except Exception as e:
+        logger.warning(f"Could not refresh Firebase public keys: {str(e)}")
+
+def _request_tokens():
+    """Firebase ID tokens sent with the current request, header first"""
     auth_header = request.headers.get('Authorization')
     if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split('Bearer ')[1]
-        try:
-            decoded_token = auth.verify_id_token(token)
-            return decoded_token.get('uid')
-        except Exception as e:
-            current_app.logger.warning(f"Token verification failed: {str(e)}")
-    
-    # Check cookie
+        yield auth_header.split('Bearer ')[1]
     token = request.cookies.get('firebase_token')
     if token:
+        yield token
+
+def get_request_user():
+    """
+    Get the verified Firebase user for the current request.
+    
+    The token is resolved once per request and the result kept on flask.g,
+    so later callers in the same request don't verify it again.
+    
+    Returns:
+        dict: The decoded token claims, or None if there is no valid token.
+    """
+    if 'firebase_user' in g:
+        return g.firebase_user
+    
+    g.firebase_user = None
+    for token in _request_tokens():
         try:
-            decoded_token = auth.verify_id_token(token)
-            return decoded_token.get('uid')
+            g.firebase_user = verify_firebase_id_token(token)
+            break
         except Exception as e:
-            current_app.logger.warning(f"Cookie token verification failed: {str(e)}")
+            current_app.logger.warning(f"Token verification failed: {str(e)}")
+    return g.firebase_user
+
+def get_current_user_id():
+    """
+    Get the current user ID from the session or request headers.
+    
+    Returns:
+        str: The user ID if authenticated, None otherwise.
+    """
+    # Check session first
+    user_id = session.get('user_id')
+    if user_id:
+        return user_id
     
-    return None
+    # Check Authorization header, then cookie
+    user = get_request_user()
+    return user.get('uid') if user else None
 
 def auth_required(f):
     """
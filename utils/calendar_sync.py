@@ -0,0 +1,304 @@
+"""
+Google Calendar synchronization service for Mobilize CRM
+Keeps sync-enabled tasks and their Google Calendar events in step, one user
+(and one calendar) at a time.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import logging
+import traceback
+
+from flask import current_app
+from googleapiclient.errors import HttpError
+from sqlalchemy import bindparam, or_, update
+
+from database import session_scope
+from models import Task
+from routes.google_auth import (
+    get_user_tokens,
+    get_all_user_tokens,
+    get_calendar_sync_token,
+    save_calendar_sync_token
+)
+from utils.google_calendar import (
+    build_calendar_service,
+    build_event_body,
+    list_changed_events,
+    SyncTokenExpiredError
+)
+from utils.write_queue import run_serialized_write
+
+logger = logging.getLogger(__name__)
+
+# Google recommends keeping calendar batch requests to 50 calls
+CALENDAR_BATCH_SIZE = 50
+
+
+def _event_updated_at(event):
+    """Return when an event was last updated, as naive local time like Task.last_synced_at"""
+    updated = event.get('updated')
+    if not updated:
+        return None
+    return datetime.fromisoformat(updated.replace('Z', '+00:00')).astimezone().replace(tzinfo=None)
+
+
+def plan_task_push(task, event=None):
+    """
+    Decide what needs to be written to Google Calendar for a task
+
+    The CRM wins conflicts: an event edited in Google Calendar after the task
+    was last synced is overwritten with the task's data, and an event deleted
+    in Google Calendar is recreated.
+
+    Args:
+        task: Task with sync enabled
+        event: The task's event from the changed events listing, if it changed
+
+    Returns:
+        str: 'insert', 'update' or None if the event is already up to date
+    """
+    if not task.google_calendar_event_id:
+        return 'insert'
+    if event is not None and event.get('status') == 'cancelled':
+        logger.info(f"Event for task {task.id} was deleted in Google Calendar, recreating it")
+        return 'insert'
+    if task.last_synced_at is None:
+        return 'update'
+    if event is not None:
+        updated_at = _event_updated_at(event)
+        if updated_at and updated_at > task.last_synced_at:
+            logger.info(f"Conflict detected for task {task.id}: CRM data takes precedence")
+            return 'update'
+    return None
+
+
+def _execute_batches(service, calls):
+    """
+    Run (request_id, request) pairs through batch requests
+
+    Returns:
+        dict: request_id -> (response, exception)
+    """
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[request_id] = (response, exception)
+
+    for start in range(0, len(calls), CALENDAR_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for request_id, request in calls[start:start + CALENDAR_BATCH_SIZE]:
+            batch.add(request, request_id=request_id)
+        batch.execute()
+
+    return results
+
+
+def _push_tasks(service, inserts, updates):
+    """
+    Write task events to Google Calendar in batches
+
+    Updates whose event no longer exists are retried as inserts.
+
+    Returns:
+        tuple: (dict of task id -> event id written, number of failed writes)
+    """
+    events = service.events()
+    tasks = {task.id: task for task in inserts + updates}
+
+    calls = [(f"insert-{task.id}", events.insert(calendarId='primary', body=build_event_body(task)))
+             for task in inserts]
+    calls += [(f"update-{task.id}", events.update(calendarId='primary',
+                                                 eventId=task.google_calendar_event_id,
+                                                 body=build_event_body(task)))
+              for task in updates]
+
+    written = {}
+    failed = 0
+    recreate = []
+
+    for request_id, (response, exception) in _execute_batches(service, calls).items():
+        operation, task_id = request_id.split('-', 1)
+        task = tasks[int(task_id)]
+        if exception is None:
+            written[task.id] = response['id']
+        elif operation == 'update' and isinstance(exception, HttpError) and exception.resp.status in (404, 410):
+            logger.info(f"Event {task.google_calendar_event_id} not found in Google Calendar, recreating task {task.id}")
+            recreate.append(task)
+        else:
+            logger.error(f"Error syncing task {task.id}: {exception}")
+            failed += 1
+
+    if recreate:
+        calls = [(f"insert-{task.id}", events.insert(calendarId='primary', body=build_event_body(task)))
+                 for task in recreate]
+        for request_id, (response, exception) in _execute_batches(service, calls).items():
+            task_id = int(request_id.split('-', 1)[1])
+            if exception is None:
+                written[task_id] = response['id']
+            else:
+                logger.error(f"Error syncing task {task_id}: {exception}")
+                failed += 1
+
+    return written, failed
+
+
+def _record_pushed_tasks(session, written, synced_at):
+    """Store the event IDs of pushed tasks; written maps task ID -> event ID"""
+    tasks = Task.__table__
+    session.execute(
+        update(tasks)
+        .where(tasks.c.id == bindparam('task_id'))
+        .values(google_calendar_event_id=bindparam('event_id'), last_synced_at=synced_at),
+        [{'task_id': task_id, 'event_id': event_id} for task_id, event_id in written.items()]
+    )
+
+
+def sync_user_calendar(user_id, access_token, include_unowned=False):
+    """
+    Sync one user's tasks with their primary Google Calendar
+
+    Changed events are listed once with the stored sync token, conflicts are
+    decided locally, and only tasks that changed on either side are written,
+    through batch requests.
+
+    Args:
+        user_id: Owner of the tasks; the sync token is stored under this ID
+        access_token: Google OAuth access token for the user
+        include_unowned: Also sync tasks that have no owner
+
+    Returns:
+        dict: Counts of created, updated and failed events
+    """
+    service = build_calendar_service(access_token, user_id=user_id)
+    if not service:
+        raise RuntimeError(f"Failed to build calendar service for user {user_id}")
+
+    # Pull everything that changed in the calendar since the last run
+    sync_token = get_calendar_sync_token(user_id)
+    try:
+        events, next_sync_token = list_changed_events(service, sync_token)
+    except SyncTokenExpiredError:
+        logger.info(f"Calendar sync token expired for user {user_id}, listing all events")
+        events, next_sync_token = list_changed_events(service)
+    changed_events = {event['id']: event for event in events}
+
+    with session_scope() as session:
+        owner_filter = Task.user_id == user_id
+        if include_unowned:
+            owner_filter = or_(owner_filter, Task.user_id == None)
+
+        synced_tasks = session.query(Task).filter(
+            owner_filter,
+            Task.google_calendar_sync_enabled == True,
+            Task.due_date != None
+        )
+
+        # Tasks changed in the CRM: never pushed, or edited since the last push
+        tasks = synced_tasks.filter(or_(
+            Task.google_calendar_event_id == None,
+            Task.last_synced_at == None
+        )).all()
+
+        # Tasks whose events changed in Google Calendar
+        changed_ids = list(changed_events)
+        for start in range(0, len(changed_ids), 500):
+            tasks.extend(synced_tasks.filter(
+                Task.google_calendar_event_id.in_(changed_ids[start:start + 500])
+            ).all())
+
+        inserts, updates = [], []
+        for task in {task.id: task for task in tasks}.values():
+            action = plan_task_push(task, changed_events.get(task.google_calendar_event_id))
+            if action == 'insert':
+                inserts.append(task)
+            elif action == 'update':
+                updates.append(task)
+
+        logger.info(f"Calendar sync for user {user_id}: {len(changed_events)} changed events, "
+                    f"{len(inserts)} to create, {len(updates)} to update")
+
+        written, failed = _push_tasks(service, inserts, updates) if inserts or updates else ({}, 0)
+        result = {
+            'created': sum(1 for task in inserts if task.id in written),
+            'updated': sum(1 for task in updates if task.id in written),
+            'failed': failed
+        }
+        bind = session.get_bind()
+
+    # Record the pushed events in one short transaction (on SQLite, through the writer thread)
+    if written:
+        run_serialized_write(bind, _record_pushed_tasks, written, datetime.now())
+
+    # Only advance the sync token once the writes have been stored
+    if next_sync_token:
+        save_calendar_sync_token(user_id, next_sync_token)
+
+    return result
+
+
+def sync_all_users_calendars(max_workers=None):
+    """
+    Sync every task owner's calendar on a bounded thread pool
+
+    Each owner's tasks are synced with that owner's own Google token. Tasks
+    without an owner use the most recently stored token, as before.
+
+    Args:
+        max_workers: Number of users synced at once (CALENDAR_SYNC_MAX_WORKERS)
+
+    Returns:
+        dict: user ID -> result dictionary, or an error message for failed users
+    """
+    app = current_app._get_current_object()
+    max_workers = max_workers or app.config.get('CALENDAR_SYNC_MAX_WORKERS', 4)
+
+    with session_scope() as session:
+        owners = {row[0] for row in session.query(Task.user_id).filter(
+            Task.google_calendar_sync_enabled == True
+        ).distinct()}
+
+    if not owners:
+        logger.info("No tasks need syncing")
+        return {}
+
+    user_tokens = get_all_user_tokens()
+    jobs = []
+    for owner in owners:
+        if owner is None:
+            continue
+        tokens = user_tokens.get(owner)
+        if tokens and tokens.get('access_token'):
+            jobs.append((owner, tokens['access_token'], False))
+        else:
+            logger.warning(f"No Google token for user {owner}, skipping calendar sync")
+
+    if None in owners:
+        tokens = get_user_tokens()
+        token = tokens.get('token') if tokens else None
+        if token:
+            fallback_user = next((user_id for user_id, data in user_tokens.items()
+                                  if data.get('access_token') == token), 'default')
+            # Sync unowned tasks along with the token owner's own tasks
+            jobs = [job for job in jobs if job[0] != fallback_user]
+            jobs.append((fallback_user, token, True))
+        else:
+            logger.error("No access token available for tasks without an owner")
+
+    def run(user_id, access_token, include_unowned):
+        with app.app_context():
+            return sync_user_calendar(user_id, access_token, include_unowned=include_unowned)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='calendar-sync') as executor:
+        futures = {executor.submit(run, *job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            user_id = futures[future]
+            try:
+                results[user_id] = future.result()
+                logger.info(f"Calendar sync for user {user_id}: {results[user_id]}")
+            except Exception as e:
+                logger.error(f"Error syncing calendar for user {user_id}: {str(e)}")
+                logger.error(traceback.format_exc())
+                results[user_id] = {'error': str(e)}
+
+    return results
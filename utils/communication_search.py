@@ -0,0 +1,212 @@
+"""
+Full-text search over communications
+Uses the FTS5 table on SQLite and the search_vector column on PostgreSQL (see
+COMMUNICATION_SEARCH_DDL in models.py), ranking results and highlighting the
+matching part of each message.
+"""
+import logging
+import re
+
+from markupsafe import escape, Markup
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import joinedload
+
+from models import Communication
+
+logger = logging.getLogger(__name__)
+
+# Markers put around matched terms by the database, replaced after escaping
+MARK_START = '\x02'
+MARK_STOP = '\x03'
+
+SNIPPET_WORDS = 16
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Engines already checked for the search index, mapped to whether it exists
+_index_available = {}
+
+
+def search_tokens(search_term):
+    """Split a search term into the words that are matched"""
+    return _TOKEN_RE.findall(search_term or '')
+
+
+def build_match_query(search_term, dialect):
+    """
+    Turn free text into a full-text query for the given dialect
+
+    Every word must match; the last word also matches as a prefix so results
+    show up while the user is still typing. Only word characters are kept, so
+    user input can't inject query syntax.
+
+    Args:
+        search_term: Text entered by the user
+        dialect: 'sqlite' or 'postgresql'
+
+    Returns:
+        str: FTS5 MATCH expression or to_tsquery text, or None if there are no words
+    """
+    tokens = search_tokens(search_term)
+    if not tokens:
+        return None
+    if dialect == 'postgresql':
+        return ' & '.join(tokens[:-1] + [tokens[-1] + ':*'])
+    return ' '.join([f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*'])
+
+
+def highlight(snippet):
+    """Escape a snippet and wrap the marked terms in <mark>"""
+    if not snippet:
+        return Markup('')
+    return Markup(str(escape(snippet)).replace(MARK_START, '<mark>').replace(MARK_STOP, '</mark>'))
+
+
+def has_search_index(session):
+    """Check once per engine whether the full-text index has been created"""
+    bind = session.get_bind()
+    if bind not in _index_available:
+        dialect = bind.dialect.name
+        if dialect == 'sqlite':
+            available = inspect(bind).has_table('communications_fts')
+        elif dialect == 'postgresql':
+            available = 'search_vector' in {column['name'] for column in inspect(bind).get_columns('communications')}
+        else:
+            available = False
+        if not available:
+            logger.warning(f"Communications full-text index is missing on {dialect}, falling back to LIKE search")
+        _index_available[bind] = available
+    return _index_available[bind]
+
+
+def _filter_clauses(user_id, person_id, church_id):
+    clauses, params = [], {}
+    if user_id:
+        clauses.append("(c.user_id = :user_id OR c.user_id IS NULL)")
+        params['user_id'] = user_id
+    if person_id:
+        clauses.append("c.person_id = :person_id")
+        params['person_id'] = person_id
+    if church_id:
+        clauses.append("c.church_id = :church_id")
+        params['church_id'] = church_id
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+_SQLITE_SEARCH = """
+    SELECT c.id AS id,
+           bm25(communications_fts, 10.0, 1.0) AS rank,
+           snippet(communications_fts, -1, :mark_start, :mark_stop, '...', :words) AS snippet
+    FROM communications_fts
+    JOIN communications c ON c.id = communications_fts.rowid
+    WHERE communications_fts MATCH :match{filters}
+    ORDER BY rank, c.date_sent DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+_SQLITE_COUNT = """
+    SELECT count(*)
+    FROM communications_fts
+    JOIN communications c ON c.id = communications_fts.rowid
+    WHERE communications_fts MATCH :match{filters}
+"""
+
+# ts_headline reads the whole message, so it only runs on the page's rows
+_POSTGRES_SEARCH = """
+    SELECT ranked.id AS id,
+           ranked.rank AS rank,
+           ts_headline('english', coalesce(c.message, c.subject, ''), to_tsquery('english', :match),
+                       :headline_options) AS snippet
+    FROM (
+        SELECT c.id, ts_rank_cd(c.search_vector, to_tsquery('english', :match)) AS rank, c.date_sent
+        FROM communications c
+        WHERE c.search_vector @@ to_tsquery('english', :match){filters}
+        ORDER BY rank DESC, c.date_sent DESC
+        LIMIT :limit OFFSET :offset
+    ) ranked
+    JOIN communications c ON c.id = ranked.id
+    ORDER BY ranked.rank DESC, ranked.date_sent DESC
+"""
+
+_POSTGRES_COUNT = """
+    SELECT count(*)
+    FROM communications c
+    WHERE c.search_vector @@ to_tsquery('english', :match){filters}
+"""
+
+
+def _like_search(session, search_term, user_id, person_id, church_id, limit, offset):
+    """Substring search for databases without the full-text index"""
+    pattern = f'%{search_term}%'
+    query = session.query(Communication.id).filter(
+        Communication.message.ilike(pattern) | Communication.subject.ilike(pattern)
+    )
+    if user_id:
+        query = query.filter((Communication.user_id == user_id) | (Communication.user_id == None))
+    if person_id:
+        query = query.filter(Communication.person_id == person_id)
+    if church_id:
+        query = query.filter(Communication.church_id == church_id)
+
+    total_count = query.count()
+    ids = [row.id for row in query.order_by(Communication.date_sent.desc()).limit(limit).offset(offset)]
+    return [(comm_id, None, None) for comm_id in ids], total_count
+
+
+def search_communications(session, search_term, user_id=None, person_id=None, church_id=None,
+                          page=1, per_page=10):
+    """
+    Search communication subjects and bodies, best matches first
+
+    Args:
+        session: Database session
+        search_term: Text entered by the user
+        user_id: Only the user's communications and unowned ones
+        person_id: Only communications with this person
+        church_id: Only communications with this church
+        page: 1-based page number
+        per_page: Results per page
+
+    Returns:
+        tuple: (list of dicts with communication, rank and snippet, total count)
+    """
+    dialect = session.get_bind().dialect.name
+    match = build_match_query(search_term, dialect)
+    if not match:
+        return [], 0
+
+    limit = per_page
+    offset = (max(page, 1) - 1) * per_page
+
+    if has_search_index(session):
+        filters, params = _filter_clauses(user_id, person_id, church_id)
+        params.update(match=match, limit=limit, offset=offset)
+        if dialect == 'sqlite':
+            params.update(mark_start=MARK_START, mark_stop=MARK_STOP, words=SNIPPET_WORDS)
+            search_sql, count_sql = _SQLITE_SEARCH, _SQLITE_COUNT
+        else:
+            params['headline_options'] = (f'StartSel={MARK_START}, StopSel={MARK_STOP}, '
+                                          f'MaxWords={SNIPPET_WORDS}, MinWords=5')
+            search_sql, count_sql = _POSTGRES_SEARCH, _POSTGRES_COUNT
+
+        hits = [(row.id, row.rank, row.snippet)
+                for row in session.execute(text(search_sql.format(filters=filters)), params)]
+        total_count = session.execute(text(count_sql.format(filters=filters)), params).scalar()
+    else:
+        hits, total_count = _like_search(session, search_term, user_id, person_id, church_id, limit, offset)
+
+    # Load the page's communications with their contacts in one query
+    ids = [comm_id for comm_id, _, _ in hits]
+    loaded = {
+        comm.id: comm for comm in session.query(Communication).options(
+            joinedload(Communication.person),
+            joinedload(Communication.church)
+        ).filter(Communication.id.in_(ids))
+    } if ids else {}
+
+    results = [{
+        'communication': loaded[comm_id],
+        'rank': rank,
+        'snippet': highlight(snippet) if snippet else None
+    } for comm_id, rank, snippet in hits if comm_id in loaded]
+    return results, total_count
@@ -0,0 +1,182 @@
+"""
+Communications timeline queries
+Pages through a user's communications newest first with a (date_sent, id)
+cursor. Copies of the same Gmail message are collapsed in SQL so every page
+is full and consistent.
+"""
+from datetime import datetime
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import aliased, selectinload
+
+from models import Communication, Person, Church
+from utils.pagination import keyset_page, DEFAULT_PAGE_SIZE
+
+# Default number of seconds a timeline total is reused, see COMMUNICATIONS_COUNT_TTL
+DEFAULT_COUNT_TTL = 60
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+def _visible_to(model, user_id):
+    """Communications owned by the user or not owned by anyone"""
+    if not user_id:
+        return True
+    return or_(model.user_id == user_id, model.user_id == None)
+
+
+def timeline_query(session, user_id, person_id=None, church_id=None, search_term=None):
+    """
+    Build a query of the communications shown on the timeline
+
+    Rows are (id, sort_key) pairs, where sort_key is date_sent. When several
+    visible rows share a gmail_message_id only the newest one is kept.
+
+    Args:
+        session: Database session
+        user_id: Current user
+        person_id: Only communications with this person
+        church_id: Only communications with this church
+        search_term: Case-insensitive text matched against the message,
+            subject and contact name/email
+
+    Returns:
+        Query ready to be passed to keyset_page
+    """
+    newer = aliased(Communication)
+    duplicate_exists = session.query(newer.id).filter(
+        newer.gmail_message_id == Communication.gmail_message_id,
+        _visible_to(newer, user_id),
+        or_(
+            newer.date_sent > Communication.date_sent,
+            and_(newer.date_sent == Communication.date_sent, newer.id > Communication.id)
+        )
+    ).exists()
+
+    query = session.query(
+        Communication.id.label('id'),
+        Communication.date_sent.label('sort_key')
+    ).filter(
+        _visible_to(Communication, user_id),
+        or_(Communication.gmail_message_id == None, ~duplicate_exists)
+    )
+
+    if person_id:
+        query = query.filter(Communication.person_id == person_id)
+    if church_id:
+        query = query.filter(Communication.church_id == church_id)
+
+    if search_term:
+        term = search_term.lower()
+        # Join with Person and Church to search in their fields too
+        query = query.outerjoin(Person, Communication.person_id == Person.id)
+        query = query.outerjoin(Church, Communication.church_id == Church.id)
+        query = query.filter(
+            func.lower(Communication.message).contains(term) |
+            func.lower(Communication.subject).contains(term) |
+            func.lower(Person.first_name).contains(term) |
+            func.lower(Person.last_name).contains(term) |
+            func.lower(Person.email).contains(term) |
+            func.lower(Church.church_name).contains(term) |
+            func.lower(Church.email).contains(term)
+        )
+
+    return query
+
+
+def get_timeline_page(session, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, **filters):
+    """
+    Fetch one page of the communications timeline
+
+    The page is selected on (id, date_sent) only, then its communications are
+    loaded with their person and church.
+
+    Args:
+        session: Database session
+        user_id: Current user
+        cursor: Cursor from the previous page, or None for the newest page
+        limit: Page size
+        **filters: person_id, church_id and search_term, see timeline_query
+
+    Returns:
+        tuple: (list of Communication, next_cursor)
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    query = timeline_query(session, user_id, **filters)
+    rows, next_cursor = keyset_page(
+        query,
+        Communication.date_sent,
+        Communication.id,
+        cursor=cursor,
+        limit=limit,
+        descending=True,
+        decode_value=datetime.fromisoformat
+    )
+
+    ids = [row.id for row in rows]
+    if not ids:
+        return [], next_cursor
+
+    loaded = {
+        comm.id: comm for comm in session.query(Communication).options(
+            selectinload(Communication.person),
+            selectinload(Communication.church)
+        ).filter(Communication.id.in_(ids))
+    }
+    return [loaded[comm_id] for comm_id in ids if comm_id in loaded], next_cursor
+
+
+def get_timeline_count(session, user_id, **filters):
+    """
+    Count the timeline's communications, reusing a recent count
+
+    Counts are cached per user and filter for COMMUNICATIONS_COUNT_TTL seconds,
+    so the total shown next to a page can lag behind new communications.
+
+    Args:
+        session: Database session
+        user_id: Current user
+        **filters: person_id, church_id and search_term, see timeline_query
+
+    Returns:
+        int: Number of communications on the timeline
+    """
+    key = (user_id,) + tuple(sorted((name, value) for name, value in filters.items() if value))
+    ttl = current_app.config.get('COMMUNICATIONS_COUNT_TTL', DEFAULT_COUNT_TTL)
+    now = time.monotonic()
+
+    with _count_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    count = timeline_query(session, user_id, **filters).order_by(None).count()
+
+    with _count_lock:
+        # Drop expired entries so the cache doesn't grow with every search term
+        for stale in [k for k, (_, expires_at) in _count_cache.items() if expires_at <= now]:
+            del _count_cache[stale]
+        _count_cache[key] = (count, now + ttl)
+
+    return count
+
+
+def clear_timeline_counts(user_id=None):
+    """
+    Forget cached timeline counts
+
+    Args:
+        user_id: Only forget this user's counts; forgets everything if None
+    """
+    with _count_lock:
+        if user_id is None:
+            _count_cache.clear()
+        else:
+            for key in [key for key in _count_cache if key[0] == user_id]:
+                del _count_cache[key]
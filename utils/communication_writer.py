@@ -0,0 +1,96 @@
+"""
+Bulk writer for Communication rows created by email sync
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+import logging
+
+from models import Communication
+from utils.write_queue import run_serialized_write, uses_write_queue
+
+logger = logging.getLogger(__name__)
+
+# Rows inserted per statement and committed together
+DEFAULT_CHUNK_SIZE = 200
+
+# Columns of the unique index that identifies a synced message
+CONFLICT_COLUMNS = ['user_id', 'gmail_message_id']
+
+_DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+class CommunicationWriter:
+    """Buffer Communication rows and insert them in committed chunks.
+
+    Rows are written with insert-or-ignore semantics against the unique
+    (user_id, gmail_message_id) index, so messages that were already synced
+    are skipped by the database instead of being checked up front. On SQLite
+    each chunk is committed by the database's writer thread.
+
+    Usage:
+        with CommunicationWriter(session, chunk_size=200) as writer:
+            writer.add(type='Email', user_id=user_id, gmail_message_id=msg_id, ...)
+        writer.inserted, writer.skipped
+    """
+
+    def __init__(self, session, chunk_size=DEFAULT_CHUNK_SIZE):
+        dialect = session.get_bind().dialect.name
+        if dialect not in _DIALECT_INSERTS:
+            raise ValueError(f"Bulk communication insert is not supported on {dialect}")
+
+        self.session = session
+        self.chunk_size = max(1, chunk_size)
+        self.inserted = 0
+        self.skipped = 0
+        self._insert = _DIALECT_INSERTS[dialect]
+        self._rows = []
+
+    def add(self, **values):
+        """Queue a row, writing the buffer once it reaches the chunk size"""
+        self._rows.append(values)
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Insert and commit the buffered rows.
+
+        Returns:
+            Number of rows inserted; rows that already existed are not counted.
+        """
+        if not self._rows:
+            return 0
+
+        rows, self._rows = self._rows, []
+        # Every row in a statement must share the same keys
+        columns = set().union(*rows)
+        rows = [{column: row.get(column) for column in columns} for row in rows]
+
+        bind = self.session.get_bind()
+        if uses_write_queue(bind):
+            inserted = run_serialized_write(bind, self._insert_rows, rows)
+        else:
+            inserted = self._insert_rows(self.session, rows)
+            self.session.commit()
+
+        self.inserted += inserted
+        self.skipped += len(rows) - inserted
+        logger.debug(f"Inserted {inserted} of {len(rows)} communications")
+        return inserted
+
+    def _insert_rows(self, session, rows):
+        stmt = self._insert(Communication.__table__).on_conflict_do_nothing(
+            index_elements=CONFLICT_COLUMNS
+        ).returning(Communication.__table__.c.id)
+        return len(session.execute(stmt, rows).all())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._rows = []
+        return False
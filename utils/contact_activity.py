@@ -0,0 +1,153 @@
+"""
+Bounded queries for the person and church detail pages
+Each query reads a fixed number of rows from an index on (person_id or
+church_id, date), so a detail page costs the same however long the
+contact's history is.
+"""
+from sqlalchemy import String, cast, func, literal, or_, select, union_all
+
+from models import Communication, Task
+
+DETAIL_COMMUNICATIONS = 5
+DETAIL_TASKS = 20
+DETAIL_ACTIVITIES = 10
+
+# Newest rows read per communication shown, so copies of the same Gmail
+# message can be collapsed and still fill the list
+DEDUP_WINDOW = 4
+
+# Length descriptions are cut to on the activity timeline
+DESCRIPTION_LENGTH = 50
+
+
+def _for_contact(model, person_id, church_id):
+    if person_id:
+        return model.person_id == person_id
+    return model.church_id == church_id
+
+
+def _visible_to(user_id):
+    """Communications owned by the user or not owned by anyone"""
+    if not user_id:
+        return True
+    return or_(Communication.user_id == user_id, Communication.user_id == None)
+
+
+def _newest_communication_ids(session, user_id, person_id, church_id, limit):
+    """Ids of a contact's newest communications, one per Gmail message"""
+    newest = session.query(Communication.id, Communication.gmail_message_id).filter(
+        _for_contact(Communication, person_id, church_id),
+        _visible_to(user_id)
+    ).order_by(
+        Communication.date_sent.desc(), Communication.id.desc()
+    ).limit(limit * DEDUP_WINDOW).subquery()
+
+    # Rows without a Gmail message id are each their own group
+    return select(func.max(newest.c.id)).group_by(
+        func.coalesce(newest.c.gmail_message_id, cast(newest.c.id, String))
+    )
+
+
+def recent_contact_communications(session, user_id=None, person_id=None, church_id=None,
+                                  limit=DETAIL_COMMUNICATIONS):
+    """
+    The newest communications with a person or church, one per Gmail message
+
+    Args:
+        session: Database session
+        user_id: Only communications owned by this user or by no one
+        person_id: Person to list communications for
+        church_id: Church to list communications for, if no person_id
+        limit: Most communications to return
+
+    Returns:
+        list: Communication objects, newest first
+    """
+    return session.query(Communication).filter(
+        Communication.id.in_(_newest_communication_ids(session, user_id, person_id, church_id, limit))
+    ).order_by(
+        Communication.date_sent.desc(), Communication.id.desc()
+    ).limit(limit).all()
+
+
+def contact_tasks(session, person_id=None, church_id=None, limit=DETAIL_TASKS):
+    """
+    A person's or church's tasks, latest due date first
+
+    Returns:
+        list: Up to limit Task objects
+    """
+    return session.query(Task).filter(
+        _for_contact(Task, person_id, church_id)
+    ).order_by(
+        Task.due_date.desc(), Task.id.desc()
+    ).limit(limit).all()
+
+
+def _truncate(text):
+    text = text or ''
+    return text[:DESCRIPTION_LENGTH] + ('...' if len(text) > DESCRIPTION_LENGTH else '')
+
+
+def activity_timeline(session, user_id=None, person_id=None, church_id=None, limit=DETAIL_ACTIVITIES):
+    """
+    The newest communications and dated tasks for a person or church, merged
+
+    Each side reads a bounded number of rows from its index and a UNION ALL
+    merges them, so only limit rows come back. Communications are collapsed
+    to one per Gmail message as in recent_contact_communications.
+
+    Args:
+        session: Database session
+        user_id: Only communications owned by this user or by no one
+        person_id: Person to build the timeline for
+        church_id: Church to build the timeline for, if no person_id
+        limit: Most activities to return
+
+    Returns:
+        list: dicts with type, title, description and date, newest first
+    """
+    communications = select(
+        literal('communication').label('type'),
+        Communication.type.label('title'),
+        Communication.subject.label('subject'),
+        Communication.message.label('body'),
+        Communication.date_sent.label('date'),
+    ).where(
+        Communication.id.in_(_newest_communication_ids(session, user_id, person_id, church_id, limit))
+    ).order_by(Communication.date_sent.desc()).limit(limit).subquery()
+
+    # Tasks without a due date have no place on the timeline
+    tasks = select(
+        literal('task').label('type'),
+        Task.title.label('title'),
+        literal(None, String).label('subject'),
+        Task.description.label('body'),
+        Task.due_date.label('date'),
+    ).where(
+        _for_contact(Task, person_id, church_id),
+        Task.due_date != None
+    ).order_by(Task.due_date.desc()).limit(limit).subquery()
+
+    merged = union_all(select(communications), select(tasks)).subquery()
+    rows = session.execute(
+        select(merged).order_by(merged.c.date.desc()).limit(limit)
+    ).all()
+
+    activities = []
+    for row in rows:
+        if row.type == 'communication':
+            activities.append({
+                'type': 'communication',
+                'title': f"{row.title} Communication",
+                'description': row.subject or _truncate(row.body),
+                'date': row.date,
+            })
+        else:
+            activities.append({
+                'type': 'task',
+                'title': row.title,
+                'description': _truncate(row.body),
+                'date': row.date,
+            })
+    return activities
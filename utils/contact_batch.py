@@ -0,0 +1,201 @@
+"""
+Set-based batch inserts, updates and deletes for people and churches
+Selections are processed in chunks of IDs, each with one UPDATE or DELETE per
+table instead of loading and changing the contacts one by one. Contacts are
+stored across two tables (contacts plus people or churches), so deletes remove
+both rows and clear references from tasks, communications and other contacts
+the way the ORM would. Pipeline rollups are kept in step.
+"""
+from collections import Counter
+import logging
+
+from sqlalchemy import delete, func, insert, select, update
+
+from models import Contacts, Person, Church, Task, Communication
+from utils.pipeline_rollups import bucket_counts, record_bucket_changes, NO_OFFICE
+
+logger = logging.getLogger(__name__)
+
+PERSON = 'person'
+CHURCH = 'church'
+
+# IDs per statement; keeps IN lists under SQLite's bound parameter limit
+DEFAULT_CHUNK_SIZE = 500
+
+_MODELS = {
+    PERSON: Person,
+    CHURCH: Church,
+}
+
+# Columns that place a contact in a pipeline bucket
+_BUCKET_COLUMNS = {'user_id', 'church_id', 'office_id', 'people_pipeline', 'church_pipeline', 'priority',
+                   'assigned_to'}
+
+
+def parse_id_list(value):
+    """
+    Parse a comma-separated list of IDs as posted by the list pages
+
+    Returns:
+        list: Unique IDs in the order given
+
+    Raises:
+        ValueError: If an entry isn't a number
+    """
+    ids = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part:
+            ids.append(int(part))
+    return list(dict.fromkeys(ids))
+
+
+def _chunks(ids, chunk_size):
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
+
+def bulk_insert_contacts(session, contact_type, rows):
+    """
+    Insert many people or churches and count them in the pipeline rollups
+
+    Args:
+        session: Database session; the caller commits
+        contact_type: PERSON or CHURCH
+        rows: Dicts of column values; the contacts and subtype rows are both written
+
+    Returns:
+        list: IDs of the new contacts, in the order of rows
+    """
+    if not rows:
+        return []
+    model = _MODELS[contact_type]
+    ids = session.execute(
+        insert(model).returning(model.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    record_bucket_changes(session, Counter(), bucket_counts(session, contact_type, ids=ids))
+    return ids
+
+
+def batch_update_contacts(session, contact_type, ids, values, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Set the same values on many people or churches
+
+    Args:
+        session: Database session; the caller commits
+        contact_type: PERSON or CHURCH
+        ids: Contact IDs to update
+        values: Column name -> new value; columns may belong to either table
+        chunk_size: IDs per statement
+
+    Returns:
+        dict: requested, updated and missing counts
+
+    Raises:
+        ValueError: If a column doesn't exist on the contact type
+    """
+    model = _MODELS[contact_type]
+    contacts = Contacts.__table__
+    table = model.__table__
+
+    own_values = {name: value for name, value in values.items() if name in table.c and name != 'id'}
+    contact_values = {name: value for name, value in values.items() if name not in own_values}
+    unknown = [name for name in contact_values if name not in contacts.c or name in ('id', 'type')]
+    if unknown:
+        raise ValueError(f"Unknown {contact_type} columns: {', '.join(unknown)}")
+
+    updated = 0
+    found = 0
+    if values:
+        tracks_buckets = bool(_BUCKET_COLUMNS & set(values))
+        for chunk in _chunks(ids, chunk_size):
+            before = bucket_counts(session, contact_type, ids=chunk) if tracks_buckets else None
+
+            if own_values:
+                result = session.execute(update(table).where(table.c.id.in_(chunk)).values(**own_values))
+                updated += result.rowcount
+            if contact_values:
+                result = session.execute(
+                    update(contacts)
+                    .where(contacts.c.id.in_(chunk), contacts.c.type == contact_type)
+                    .values(**contact_values)
+                )
+                if not own_values:
+                    updated += result.rowcount
+
+            if tracks_buckets:
+                record_bucket_changes(session, before, bucket_counts(session, contact_type, ids=chunk))
+        found = updated
+    else:
+        # Nothing to change, so count the contacts that still exist
+        for chunk in _chunks(ids, chunk_size):
+            found += session.execute(
+                select(func.count()).select_from(table).where(table.c.id.in_(chunk))
+            ).scalar()
+
+    report = {'requested': len(ids), 'updated': updated, 'missing': len(ids) - found}
+    logger.info(f"Batch updated {contact_type} contacts: {report}")
+    return report
+
+
+def batch_delete_contacts(session, contact_type, ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Delete many people or churches
+
+    References to the deleted contacts from tasks, communications, people
+    (their church) and churches (their main contact) are set to NULL, as the
+    ORM does when deleting a single contact.
+
+    Args:
+        session: Database session; the caller commits
+        contact_type: PERSON or CHURCH
+        ids: Contact IDs to delete
+        chunk_size: IDs per statement
+
+    Returns:
+        dict: requested, deleted and missing counts
+    """
+    model = _MODELS[contact_type]
+    contacts = Contacts.__table__
+    people = Person.__table__
+    churches = Church.__table__
+    tasks = Task.__table__
+    communications = Communication.__table__
+
+    deleted = 0
+    for chunk in _chunks(ids, chunk_size):
+        before = bucket_counts(session, contact_type, ids=chunk)
+
+        if contact_type == PERSON:
+            references = [
+                (tasks, tasks.c.person_id),
+                (communications, communications.c.person_id),
+                (churches, churches.c.main_contact_id),
+            ]
+        else:
+            # Members lose their church and with it their office
+            members_before = bucket_counts(session, PERSON, church_ids=chunk)
+            references = [
+                (tasks, tasks.c.church_id),
+                (communications, communications.c.church_id),
+                (people, people.c.church_id),
+            ]
+        for table, column in references:
+            session.execute(update(table).where(column.in_(chunk)).values({column.name: None}))
+
+        session.execute(delete(model.__table__).where(model.__table__.c.id.in_(chunk)))
+        result = session.execute(delete(contacts).where(contacts.c.id.in_(chunk), contacts.c.type == contact_type))
+        deleted += result.rowcount
+
+        record_bucket_changes(session, before, {})
+        if contact_type == CHURCH:
+            # Former members keep their bucket apart from the office
+            members_after = Counter()
+            for bucket, count in members_before.items():
+                members_after[bucket[:1] + (NO_OFFICE,) + bucket[2:]] += count
+            record_bucket_changes(session, members_before, members_after)
+
+    report = {'requested': len(ids), 'deleted': deleted, 'missing': len(ids) - deleted}
+    logger.info(f"Batch deleted {contact_type} contacts: {report}")
+    return report
@@ -0,0 +1,100 @@
+from email.utils import getaddresses
+from sqlalchemy import select
+from models import Contacts, Church
+
+
+def normalize_email(email):
+    """Normalize an email address for lookups"""
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email or None
+
+
+class ContactEmailIndex:
+    """In-memory map of contact email addresses to the contact they belong to.
+
+    Built from a single projection query so email sync can filter and link
+    messages without querying the database for every message. Besides the
+    contact's own email, church senior pastor, mission pastor and primary
+    contact emails resolve to the church. When a person and a church share an
+    address, the person wins.
+    """
+
+    PERSON = 'person'
+    CHURCH = 'church'
+
+    def __init__(self):
+        self._contacts = {}
+
+    @classmethod
+    def build(cls, session):
+        """Build the index from the contacts table.
+
+        Args:
+            session: SQLAlchemy session to query with.
+
+        Returns:
+            A populated ContactEmailIndex.
+        """
+        index = cls()
+        churches = Church.__table__
+        rows = session.execute(
+            select(
+                Contacts.id,
+                Contacts.type,
+                Contacts.email,
+                churches.c.senior_pastor_email,
+                churches.c.mission_pastor_email,
+                churches.c.primary_contact_email
+            ).outerjoin(churches, churches.c.id == Contacts.id)
+        )
+        for contact_id, contact_type, email, senior_email, mission_email, primary_email in rows:
+            if contact_type == cls.PERSON:
+                index.add(email, cls.PERSON, contact_id)
+            elif contact_type == cls.CHURCH:
+                for church_email in (email, senior_email, mission_email, primary_email):
+                    index.add(church_email, cls.CHURCH, contact_id)
+        return index
+
+    def add(self, email, contact_type, contact_id):
+        """Add an email address, keeping an existing person match"""
+        email = normalize_email(email)
+        if not email:
+            return
+        existing = self._contacts.get(email)
+        if existing and existing[0] == self.PERSON and contact_type != self.PERSON:
+            return
+        self._contacts[email] = (contact_type, contact_id)
+
+    def lookup(self, email):
+        """Return (contact type, id) for an email address, or None"""
+        return self._contacts.get(normalize_email(email))
+
+    def resolve(self, header_value):
+        """Return the first contact matching any address in an email header.
+
+        Args:
+            header_value: A header such as 'Name <a@example.com>, b@example.com'.
+
+        Returns:
+            Tuple of (email, contact type, id), or None if no address matches.
+        """
+        if not header_value:
+            return None
+        for _, address in getaddresses([header_value]):
+            match = self.lookup(address)
+            if match:
+                return (normalize_email(address),) + match
+        return None
+
+    @property
+    def emails(self):
+        """All indexed email addresses"""
+        return list(self._contacts)
+
+    def __contains__(self, email):
+        return normalize_email(email) in self._contacts
+
+    def __len__(self):
+        return len(self._contacts)
@@ -0,0 +1,235 @@
+"""
+Contact search across people and churches
+Matches names, emails, phones, city and church pastor names using the
+contacts_fts table on SQLite and the pg_trgm indexed search columns on
+PostgreSQL (see CONTACT_SEARCH_DDL in models.py).
+"""
+import logging
+
+from sqlalchemy import func, inspect, literal_column, or_, select, table, text
+
+from models import Contacts, Church, Person
+from utils.communication_search import search_tokens
+from utils.pagination import keyset_page
+
+logger = logging.getLogger(__name__)
+
+PERSON = 'person'
+CHURCH = 'church'
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Options fetched per request by the lazy dropdowns
+LOOKUP_PAGE_SIZE = 25
+
+# Engines already checked for the search index, mapped to whether it exists
+_index_available = {}
+
+
+def has_contact_index(session):
+    """Check once per engine whether the contact search index has been created"""
+    bind = session.get_bind()
+    if bind not in _index_available:
+        dialect = bind.dialect.name
+        if dialect == 'sqlite':
+            available = inspect(bind).has_table('contacts_fts')
+        elif dialect == 'postgresql':
+            available = 'search_text' in {column['name'] for column in inspect(bind).get_columns('contacts')}
+        else:
+            available = False
+        if not available:
+            logger.warning(f"Contact search index is missing on {dialect}, falling back to LIKE search")
+        _index_available[bind] = available
+    return _index_available[bind]
+
+
+def _fts_match(tokens):
+    """Every word must match the start of a word in the contact"""
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _filter_clauses(user_id, types):
+    clauses, params = [], {}
+    if user_id:
+        # Churches aren't owned by a user; people are limited to the user's own
+        clauses.append("(c.type = 'church' OR p.user_id = :user_id)")
+        params['user_id'] = user_id
+    if types:
+        names = []
+        for i, contact_type in enumerate(types):
+            params[f'type_{i}'] = contact_type
+            names.append(f':type_{i}')
+        clauses.append(f"c.type IN ({', '.join(names)})")
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+_SQLITE_SEARCH = """
+    SELECT c.id AS id, c.type AS type, c.first_name, c.last_name, c.church_name,
+           c.email, c.phone, c.city,
+           bm25(contacts_fts, 0.0, 10.0, 5.0, 2.0, 1.0, 3.0) AS rank
+    FROM contacts_fts
+    JOIN contacts c ON c.id = contacts_fts.rowid
+    LEFT JOIN people p ON p.id = c.id
+    WHERE contacts_fts MATCH :match{filters}
+    ORDER BY rank, c.id
+    LIMIT :limit
+"""
+
+_POSTGRES_SEARCH = """
+    SELECT c.id AS id, c.type AS type, c.first_name, c.last_name, c.church_name,
+           c.email, c.phone, c.city,
+           greatest(similarity(c.search_text, :term),
+                    similarity(coalesce(ch.pastor_search_text, ''), :term)) AS rank
+    FROM contacts c
+    LEFT JOIN churches ch ON ch.id = c.id
+    LEFT JOIN people p ON p.id = c.id
+    WHERE {matches}{filters}
+    ORDER BY rank DESC, c.id
+    LIMIT :limit
+"""
+
+
+def _hit(row, rank):
+    if row.type == CHURCH:
+        name = row.church_name or ''
+    else:
+        name = f"{row.first_name or ''} {row.last_name or ''}".strip()
+    return {
+        'id': row.id,
+        'type': row.type,
+        'name': name,
+        'email': row.email,
+        'phone': row.phone,
+        'city': row.city,
+        'rank': rank
+    }
+
+
+def _like_conditions(tokens):
+    """LIKE conditions used when there is no search index"""
+    conditions = []
+    for token in tokens:
+        pattern = f'%{token}%'
+        conditions.append(or_(
+            Contacts.first_name.ilike(pattern),
+            Contacts.last_name.ilike(pattern),
+            Contacts.church_name.ilike(pattern),
+            Contacts.email.ilike(pattern),
+            Contacts.phone.ilike(pattern),
+            Contacts.city.ilike(pattern)
+        ))
+    return conditions
+
+
+def search_contacts(session, search_term, user_id=None, types=None, limit=DEFAULT_LIMIT):
+    """
+    Find people and churches matching a search term, best matches first
+
+    Args:
+        session: Database session
+        search_term: Text entered by the user; every word must match
+        user_id: Limit people to this user's; None searches everyone
+        types: Contact types to include, e.g. ['person']; None includes all
+        limit: Maximum number of hits (capped at MAX_LIMIT)
+
+    Returns:
+        list: Dicts with id, type, name, email, phone, city and rank
+    """
+    tokens = [token.lower() for token in search_tokens(search_term)]
+    if not tokens:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    if has_contact_index(session):
+        dialect = session.get_bind().dialect.name
+        filters, params = _filter_clauses(user_id, types)
+        params['limit'] = limit
+        if dialect == 'sqlite':
+            params['match'] = _fts_match(tokens)
+            sql = _SQLITE_SEARCH.format(filters=filters)
+        else:
+            matches = []
+            for i, token in enumerate(tokens):
+                params[f'pattern_{i}'] = f'%{token}%'
+                matches.append(f"(c.search_text LIKE :pattern_{i} OR ch.pastor_search_text LIKE :pattern_{i})")
+            params['term'] = ' '.join(tokens)
+            sql = _POSTGRES_SEARCH.format(matches=' AND '.join(matches), filters=filters)
+        return [_hit(row, row.rank) for row in session.execute(text(sql), params)]
+
+    query = session.query(
+        Contacts.id, Contacts.type, Contacts.first_name, Contacts.last_name,
+        Contacts.church_name, Contacts.email, Contacts.phone, Contacts.city
+    ).outerjoin(Person.__table__, Person.__table__.c.id == Contacts.id).filter(*_like_conditions(tokens))
+    if user_id:
+        query = query.filter(or_(Contacts.type == CHURCH, Person.__table__.c.user_id == user_id))
+    if types:
+        query = query.filter(Contacts.type.in_(types))
+    return [_hit(row, None) for row in query.order_by(Contacts.id).limit(limit)]
+
+
+def matching_contact_ids(session, search_term):
+    """
+    Select the IDs of all contacts matching a search term
+
+    Meant to be used as a subquery, e.g. Person.id.in_(matching_contact_ids(...)),
+    so list pages can combine search with their own filters and paging.
+
+    Returns:
+        Select of contact IDs, or None if the term has no words
+    """
+    tokens = [token.lower() for token in search_tokens(search_term)]
+    if not tokens:
+        return None
+
+    if has_contact_index(session):
+        if session.get_bind().dialect.name == 'sqlite':
+            return select(literal_column('rowid')).select_from(table('contacts_fts')).where(
+                literal_column('contacts_fts').op('MATCH')(_fts_match(tokens))
+            )
+        contacts = Contacts.__table__
+        churches = Church.__table__
+        search_text = literal_column('contacts.search_text')
+        pastor_search_text = literal_column('churches.pastor_search_text')
+        return select(contacts.c.id).select_from(
+            contacts.outerjoin(churches, churches.c.id == contacts.c.id)
+        ).where(*[
+            or_(search_text.like(f'%{token}%'), pastor_search_text.like(f'%{token}%'))
+            for token in tokens
+        ])
+
+    return select(Contacts.id).where(*_like_conditions(tokens))
+
+
+def lookup_contacts(session, contact_type, search_term='', cursor=None, limit=LOOKUP_PAGE_SIZE):
+    """
+    Fetch one alphabetical page of (id, name) options for a person or church dropdown
+
+    Args:
+        session: Database session
+        contact_type: PERSON or CHURCH
+        search_term: Only contacts matching this text, see matching_contact_ids
+        cursor: Cursor from the previous page
+        limit: Page size
+
+    Returns:
+        tuple: (list of dicts with id and name, next_cursor)
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    if contact_type == PERSON:
+        name = func.trim(func.coalesce(Person.first_name, '') + ' ' + func.coalesce(Person.last_name, ''))
+        id_column = Person.id
+        query = session.query(Person.id.label('id'), name.label('sort_key')).filter(Person.type == PERSON)
+    else:
+        name = func.coalesce(Church.church_name, '')
+        id_column = Church.id
+        query = session.query(Church.id.label('id'), name.label('sort_key')).filter(Church.type == CHURCH)
+
+    matching_ids = matching_contact_ids(session, search_term)
+    if matching_ids is not None:
+        query = query.filter(id_column.in_(matching_ids))
+
+    rows, next_cursor = keyset_page(query, name, id_column, cursor=cursor, limit=limit)
+    return [{'id': row.id, 'name': row.sort_key} for row in rows], next_cursor
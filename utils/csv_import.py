@@ -0,0 +1,233 @@
+"""
+Streaming contact import from CSV files
+The upload is saved to a temporary file and imported by a background job,
+which reads it one row at a time, validates rows with PersonSchema or
+ChurchSchema and bulk-inserts the valid ones in chunks, committing each chunk
+together with the job's progress. Progress and per-row errors are kept on the
+ImportJob row so any worker can report them.
+"""
+from datetime import date, datetime
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+
+from marshmallow import EXCLUDE, ValidationError
+
+from database import session_scope
+from models import Person, Church, ImportJob, PersonSchema, ChurchSchema
+from utils.contact_batch import bulk_insert_contacts
+
+logger = logging.getLogger(__name__)
+
+PERSON = 'person'
+CHURCH = 'church'
+
+# Rows validated and inserted per transaction
+DEFAULT_CHUNK_SIZE = 1000
+
+# Per-row errors kept on the job; later ones are only counted
+MAX_STORED_ERRORS = 200
+
+REQUIRED_HEADERS = {
+    PERSON: ['first_name', 'last_name', 'email'],
+    CHURCH: ['church_name', 'email'],
+}
+
+# CSV column names accepted for model columns with a different name
+COLUMN_ALIASES = {
+    'address': 'street_address',
+    'notes': 'initial_notes',
+    'missions_pastor_email': 'mission_pastor_email',
+    'missions_pastor_phone': 'mission_pastor_phone',
+}
+
+_MODELS = {
+    PERSON: Person,
+    CHURCH: Church,
+}
+
+_SCHEMAS = {
+    PERSON: PersonSchema,
+    CHURCH: ChurchSchema,
+}
+
+
+def read_header(path):
+    """Read the column names from the first line of a CSV file"""
+    with open(path, newline='', encoding='utf-8-sig') as csv_file:
+        return [name.strip() for name in next(csv.reader(csv_file), [])]
+
+
+def missing_headers(contact_type, fieldnames):
+    """Required columns absent from a CSV header"""
+    present = {COLUMN_ALIASES.get(name, name) for name in fieldnames} | set(fieldnames)
+    return [name for name in REQUIRED_HEADERS[contact_type] if name not in present]
+
+
+def clean_row(row):
+    """
+    Normalise a CSV row before validation
+
+    Blank cells are dropped so optional fields are simply missing, aliased
+    columns are renamed, states are lowercased to match STATE_CHOICES and
+    websites without a scheme get https://.
+    """
+    values = {}
+    for name, value in row.items():
+        if name is None or value is None:
+            continue
+        value = value.strip()
+        if value:
+            values[COLUMN_ALIASES.get(name.strip(), name.strip())] = value
+    if 'state' in values:
+        values['state'] = values['state'].lower()
+    if 'website' in values and '://' not in values['website']:
+        values['website'] = f"https://{values['website']}"
+    return values
+
+
+def create_import_job(session, user_id, contact_type, path, filename=None, source='csv'):
+    """
+    Record a queued import for a saved upload
+
+    Returns:
+        str: Job ID
+    """
+    job = ImportJob(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        contact_type=contact_type,
+        source=source,
+        filename=filename,
+        status='queued',
+        total_bytes=os.path.getsize(path) if path else 0
+    )
+    session.add(job)
+    session.flush()
+    return job.id
+
+
+def job_to_dict(job):
+    """Progress of an import job as JSON-friendly data"""
+    percent = 100 if job.status == 'completed' else (
+        int(job.processed_bytes * 100 / job.total_bytes) if job.total_bytes else 0
+    )
+    return {
+        'id': job.id,
+        'contact_type': job.contact_type,
+        'source': job.source,
+        'filename': job.filename,
+        'status': job.status,
+        'percent': min(percent, 100),
+        'rows_processed': job.rows_processed,
+        'rows_imported': job.rows_imported,
+        'rows_failed': job.rows_failed,
+        'errors': json.loads(job.errors) if job.errors else [],
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class ImportChunkWriter:
+    """Validate rows and write them in chunks, updating an ImportJob as it goes.
+
+    add() returns True once a chunk's worth of rows is queued; each flush
+    inserts the valid rows and saves the job's counters in one transaction.
+    """
+
+    def __init__(self, job_id, contact_type, user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.job_id = job_id
+        self.contact_type = contact_type
+        self.user_id = user_id
+        self.chunk_size = max(1, chunk_size)
+        self.schema = _SCHEMAS[contact_type](unknown=EXCLUDE)
+        self.columns = set(_MODELS[contact_type].__mapper__.columns.keys()) - {'id', 'type'}
+        self._rows = []
+        self._errors = []
+        self._processed = 0
+
+    def add(self, row_number, values):
+        """Validate one row, queueing it for insert or recording its errors"""
+        self._processed += 1
+        try:
+            loaded = self.schema.load(values)
+        except ValidationError as e:
+            self._errors.append({'row': row_number, 'errors': e.messages})
+        else:
+            row = {name: value for name, value in loaded.items() if name in self.columns}
+            if self.contact_type == PERSON:
+                row['user_id'] = self.user_id
+            row['date_created'] = row['date_modified'] = date.today()
+            self._rows.append(row)
+
+        return self._processed >= self.chunk_size
+
+    def flush(self, processed_bytes=None):
+        """Insert the queued rows and save progress"""
+        rows, self._rows = self._rows, []
+        errors, self._errors = self._errors, []
+        processed, self._processed = self._processed, 0
+
+        with session_scope() as session:
+            bulk_insert_contacts(session, self.contact_type, rows)
+            job = session.get(ImportJob, self.job_id)
+            job.rows_processed += processed
+            job.rows_imported += len(rows)
+            job.rows_failed += len(errors)
+            if processed_bytes is not None:
+                job.processed_bytes = processed_bytes
+            if errors:
+                stored = json.loads(job.errors) if job.errors else []
+                job.errors = json.dumps((stored + errors)[:MAX_STORED_ERRORS])
+        logger.debug(f"Import {self.job_id}: wrote {len(rows)} rows, {len(errors)} failed")
+
+
+def _set_status(job_id, status, message=None):
+    with session_scope() as session:
+        job = session.get(ImportJob, job_id)
+        job.status = status
+        if message is not None:
+            job.message = message
+        if status == 'running':
+            job.started_at = datetime.now()
+        elif status in ('completed', 'failed'):
+            job.finished_at = datetime.now()
+        return job.contact_type, job.user_id
+
+
+def run_csv_import(job_id, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import a saved CSV file for a queued job, then delete the file
+
+    Rows that fail validation are skipped and reported on the job; chunks
+    already written stay imported if a later part of the file can't be read.
+    """
+    contact_type, user_id = _set_status(job_id, 'running')
+    writer = ImportChunkWriter(job_id, contact_type, user_id, chunk_size=chunk_size)
+    try:
+        with open(path, 'rb') as raw:
+            reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+            # Row 1 is the header
+            for row_number, row in enumerate(reader, start=2):
+                if writer.add(row_number, clean_row(row)):
+                    writer.flush(processed_bytes=raw.tell())
+            writer.flush(processed_bytes=raw.tell())
+
+        _set_status(job_id, 'completed')
+        logger.info(f"CSV import {job_id} completed")
+    except (UnicodeDecodeError, csv.Error) as e:
+        logger.error(f"CSV import {job_id} failed: {str(e)}")
+        _set_status(job_id, 'failed', f"The file could not be read as UTF-8 CSV: {str(e)}")
+    except Exception as e:
+        logger.error(f"CSV import {job_id} failed: {str(e)}")
+        _set_status(job_id, 'failed', str(e))
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
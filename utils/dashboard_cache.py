@@ -0,0 +1,234 @@
+"""
+Per-user dashboard summary cache
+Summaries are kept for DASHBOARD_CACHE_TTL seconds and dropped as soon as a
+Person, Church, Task or Communication affecting the user is committed. Changes
+are picked up from ORM flushes and from bulk INSERT/UPDATE/DELETE statements
+run through a session.
+"""
+from datetime import date, datetime
+from itertools import chain
+import logging
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
+
+from models import Contacts, Person, Church, Task, Communication, UserOffice, Office
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+# Marks a change that can affect every user's summary
+ALL_USERS = '*'
+
+TRACKED_MODELS = (Person, Church, Task, Communication)
+TRACKED_TABLES = {'contacts', 'people', 'churches', 'tasks', 'communications'}
+
+_PENDING_KEY = 'dashboard_cache_pending'
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def build_dashboard_summary(session, user_id):
+    """
+    Compute the dashboard summary for a user
+
+    Returns:
+        dict: total_people, total_churches, pending_tasks, recent_communications,
+        user_offices and generated_at, as plain data safe to share between requests
+    """
+    # Count only the user's people
+    total_people = session.query(func.count(Person.id)).filter(
+        Person.type == 'person',
+        Person.user_id == user_id
+    ).scalar()
+
+    # Show all churches
+    total_churches = session.query(func.count(Church.id)).filter(
+        Church.type == 'church'
+    ).scalar()
+
+    # Only show tasks for this user. Names live on contacts, so join it directly;
+    # an outer join to the Person/Church subclasses makes SQLite build the whole
+    # people and churches joins first
+    task_person = aliased(Contacts)
+    task_church = aliased(Contacts)
+    pending_tasks = (
+        session.query(
+            Task.id,
+            Task.title,
+            Task.description,
+            Task.due_date,
+            Task.due_time,
+            Task.status,
+            Task.priority,
+            task_person.first_name,
+            task_person.last_name,
+            task_church.church_name,
+            Task.person_id,
+            Task.church_id
+        )
+        .outerjoin(task_person, Task.person_id == task_person.id)
+        .outerjoin(task_church, Task.church_id == task_church.id)
+        .filter(Task.user_id == user_id)
+        .filter(Task.status != 'Completed')
+        .order_by(Task.due_date)
+        .limit(5)
+        .all()
+    )
+
+    recent_communications = (
+        session.query(Communication)
+        .options(selectinload(Communication.person), selectinload(Communication.church))
+        .filter(Communication.user_id == user_id)
+        .order_by(Communication.date_sent.desc())
+        .limit(5)
+        .all()
+    )
+
+    user_offices = (
+        session.query(UserOffice)
+        .options(joinedload(UserOffice.office))
+        .filter(UserOffice.user_id == user_id)
+        .join(Office, UserOffice.office_id == Office.id)
+        .all()
+    )
+
+    return {
+        'total_people': total_people,
+        'total_churches': total_churches,
+        'pending_tasks': [dict(task._mapping) for task in pending_tasks],
+        'recent_communications': [{
+            'id': comm.id,
+            'type': comm.type,
+            'subject': comm.subject,
+            'message': comm.message,
+            'date_sent': comm.date_sent,
+            'person_id': comm.person_id,
+            'person_name': f"{comm.person.first_name} {comm.person.last_name}" if comm.person else None,
+            'church_id': comm.church_id,
+            'church_name': comm.church.church_name if comm.church else None
+        } for comm in recent_communications],
+        'user_offices': [{
+            'role': user_office.role,
+            'office': {
+                'id': user_office.office.id,
+                'name': user_office.office.name,
+                'city': user_office.office.city,
+                'state': user_office.office.state
+            }
+        } for user_office in user_offices],
+        'generated_at': datetime.now()
+    }
+
+
+def get_dashboard_summary(session, user_id, refresh=False):
+    """
+    Get a user's dashboard summary, computing it if it isn't cached
+
+    Args:
+        session: Database session used on a cache miss
+        user_id: User the summary is for
+        refresh: Recompute even if a cached summary exists
+
+    Returns:
+        dict: See build_dashboard_summary
+    """
+    now = time.monotonic()
+    if not refresh:
+        with _lock:
+            cached = _cache.get(user_id)
+            if cached and cached[1] > now:
+                return cached[0]
+
+    summary = build_dashboard_summary(session, user_id)
+    ttl = current_app.config.get('DASHBOARD_CACHE_TTL', DEFAULT_TTL)
+    with _lock:
+        _cache[user_id] = (summary, now + ttl)
+    return summary
+
+
+def invalidate_dashboard(user_id=None):
+    """
+    Drop cached dashboard summaries
+
+    Args:
+        user_id: Only drop this user's summary; drops everything if None
+    """
+    with _lock:
+        if user_id is None or user_id == ALL_USERS:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+def serialize_summary(summary):
+    """Make a summary JSON-friendly by writing dates in ISO format"""
+    def convert(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, dict):
+            return {key: convert(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        return value
+    return convert(summary)
+
+
+def _affected_users(obj):
+    """Users whose summaries a changed object can affect"""
+    if isinstance(obj, Church):
+        # Church counts are shared by everyone
+        return {ALL_USERS}
+    history = inspect(obj).attrs.user_id.history
+    return {user_id for user_id in chain(history.unchanged, history.added, history.deleted) if user_id}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, TRACKED_MODELS):
+            pending.update(_affected_users(obj))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is None or getattr(table, 'name', None) not in TRACKED_TABLES:
+        return
+
+    pending = orm_execute_state.session.info.setdefault(_PENDING_KEY, set())
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, list) else [params or {}]
+    user_ids = {row.get('user_id') for row in rows}
+    if orm_execute_state.is_insert and table.name != 'churches' and None not in user_ids:
+        pending.update(user_ids)
+    else:
+        # The affected rows can't be told from the statement
+        pending.add(ALL_USERS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_changes(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    if ALL_USERS in pending:
+        invalidate_dashboard()
+    else:
+        for user_id in pending:
+            invalidate_dashboard(user_id)
+    if has_app_context():
+        current_app.logger.debug(f"Dashboard cache invalidated for {sorted(pending)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_changes(session):
+    session.info.pop(_PENDING_KEY, None)
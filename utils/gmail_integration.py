@@ -2,21 +2,22 @@
 Gmail integration for Mobilize CRM
 This module provides functions to interact with Gmail API
 """
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
 from flask import current_app
 import base64
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.mime.image import MIMEImage
+import email
 import logging
+import time
 import json
 from datetime import datetime, timedelta
 import traceback
 from models import EmailSignature
 from database import session_scope
+from utils.google_services import get_google_service
 import os
 import requests
 from urllib.parse import urlparse
@@ -25,120 +26,31 @@ import re
 
 logger = logging.getLogger(__name__)
 
-def build_gmail_service(token):
-    """Build a Gmail service object with the provided token"""
+GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.send', 'https://www.googleapis.com/auth/gmail.readonly']
+
+def build_gmail_service(token, user_id=None):
+    """Get a Gmail service object for the provided token.
+
+    Service objects are cached per user, and expired tokens are refreshed with
+    the user's stored refresh token (see utils.google_services).
+
+    Args:
+        token: Google OAuth access token.
+        user_id: Owner of the token; defaults to the signed-in user.
+
+    Returns:
+        Gmail service object, or None if it could not be built.
+    """
     try:
         if not token:
             logger.error("No token provided to build Gmail service")
             return None
             
-        logger.debug(f"Building Gmail service with token: {token[:10]}...")
-        
-        # Log the client ID and secret (partially masked)
-        client_id = current_app.config.get('GOOGLE_CLIENT_ID', '')
-        client_secret = current_app.config.get('GOOGLE_CLIENT_SECRET', '')
-        
-        if not client_id or not client_secret:
+        if not current_app.config.get('GOOGLE_CLIENT_ID') or not current_app.config.get('GOOGLE_CLIENT_SECRET'):
             logger.error("Missing Google client ID or secret in application config")
             return None
             
-        logger.debug(f"Using client ID: {client_id[:10]}... and client secret: {client_secret[:5]}...")
-        
-        # Define the scopes needed
-        scopes = ['https://www.googleapis.com/auth/gmail.send', 'https://www.googleapis.com/auth/gmail.readonly']
-        logger.debug(f"Using scopes: {scopes}")
-        
-        # Try to get refresh token from database
-        refresh_token = None
-        try:
-            from routes.google_auth import get_user_tokens
-            tokens = get_user_tokens()
-            if tokens and 'refresh_token' in tokens and tokens['refresh_token']:
-                refresh_token = tokens['refresh_token']
-                logger.debug(f"Found refresh token: {refresh_token[:5]}...")
-            else:
-                logger.warning("No refresh token found in user tokens")
-                if tokens:
-                    logger.debug(f"Available token keys: {tokens.keys()}")
-        except Exception as e:
-            logger.warning(f"Could not retrieve refresh token: {str(e)}")
-            logger.warning(traceback.format_exc())
-        
-        # Create credentials object
-        try:
-            logger.debug("Creating credentials object")
-            
-            # If we don't have a refresh token, we can still create credentials with just the access token
-            # This won't allow token refresh, but it will work for the current session
-            if not refresh_token:
-                logger.warning("No refresh token available. Creating credentials with access token only.")
-                credentials = Credentials(
-                    token=token,
-                    scopes=scopes
-                )
-            else:
-                # Create full credentials with refresh capability
-                credentials = Credentials(
-                    token=token,
-                    refresh_token=refresh_token,
-                    token_uri="https://oauth2.googleapis.com/token",
-                    client_id=client_id,
-                    client_secret=client_secret,
-                    scopes=scopes
-                )
-            logger.debug("Credentials object created successfully")
-        except Exception as e:
-            logger.error(f"Error creating credentials object: {str(e)}")
-            logger.error(traceback.format_exc())
-            return None
-        
-        # Validate token before proceeding
-        try:
-            import google.auth.transport.requests
-            request = google.auth.transport.requests.Request()
-            
-            # Check if token needs refreshing
-            if hasattr(credentials, 'expired') and credentials.expired and credentials.refresh_token:
-                logger.info("Token is expired, attempting to refresh")
-                try:
-                    credentials.refresh(request)
-                    logger.info("Token refreshed successfully")
-                except Exception as refresh_error:
-                    logger.error(f"Error refreshing token: {str(refresh_error)}")
-                    logger.error(traceback.format_exc())
-                    # Continue anyway, as the build() call will fail if the token is invalid
-            
-            # Verify token is valid
-            auth_info = getattr(credentials, 'id_token', None) or getattr(credentials, 'token', None)
-            if not auth_info:
-                logger.error("Invalid token - no id_token or access token available")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Token validation error: {str(e)}")
-            logger.error(traceback.format_exc())
-            # Continue anyway, as the build() call will fail if the token is invalid
-        
-        # Build the Gmail service
-        try:
-            logger.debug("Creating Gmail service with credentials")
-            service = build('gmail', 'v1', credentials=credentials)
-            logger.info("Gmail service built successfully")
-            
-            # Test the service with a simple API call
-            try:
-                logger.debug("Testing Gmail service with getProfile call")
-                profile = service.users().getProfile(userId='me').execute()
-                logger.info(f"Gmail service test successful. Email: {profile.get('emailAddress')}")
-            except Exception as test_error:
-                logger.warning(f"Gmail service test failed: {str(test_error)}")
-                # Continue anyway, as the service might still work for other operations
-            
-            return service
-        except Exception as build_error:
-            logger.error(f"Error building Gmail service: {str(build_error)}")
-            logger.error(traceback.format_exc())
-            return None
+        return get_google_service('gmail', 'v1', GMAIL_SCOPES, token, user_id=user_id)
     except Exception as e:
         logger.error(f"Error building Gmail service: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
@@ -421,13 +333,14 @@ def get_message(service, user_id, msg_id):
         logger.error(f"An error occurred: {error}")
         return None
 
-def list_messages(service, user_id, query=''):
+def list_messages(service, user_id, query='', max_results=None):
     """List messages in the user's mailbox matching the query.
 
     Args:
         service: Authorized Gmail API service instance.
         user_id: User's email address. The special value "me" can be used to indicate the authenticated user.
         query: String used to filter messages returned (optional).
+        max_results: Stop paging once this many messages have been collected (optional).
 
     Returns:
         List of messages that match the criteria.
@@ -439,17 +352,229 @@ def list_messages(service, user_id, query=''):
             messages.extend(response['messages'])
 
         while 'nextPageToken' in response:
+            if max_results and len(messages) >= max_results:
+                break
             page_token = response['nextPageToken']
             response = service.users().messages().list(
                 userId=user_id, q=query, pageToken=page_token).execute()
             if 'messages' in response:
                 messages.extend(response['messages'])
 
+        if max_results:
+            messages = messages[:max_results]
         return messages
     except HttpError as error:
         logger.error(f"An error occurred: {error}")
         return []
 
+class HistoryExpiredError(Exception):
+    """Raised when a stored Gmail historyId is too old to be used as a sync cursor"""
+    pass
+
+def get_mailbox_history_id(service, user_id):
+    """Get the current historyId of a mailbox.
+
+    Args:
+        service: Authorized Gmail API service instance.
+        user_id: User's email address. The special value "me" can be used to indicate the authenticated user.
+
+    Returns:
+        The mailbox historyId as a string, or None if it could not be retrieved.
+    """
+    try:
+        profile = service.users().getProfile(userId=user_id).execute()
+        history_id = profile.get('historyId')
+        return str(history_id) if history_id else None
+    except HttpError as error:
+        logger.error(f"Error getting mailbox historyId: {error}")
+        return None
+
+def list_history_message_ids(service, user_id, start_history_id):
+    """List the IDs of messages added to the mailbox since a historyId.
+
+    Args:
+        service: Authorized Gmail API service instance.
+        user_id: User's email address. The special value "me" can be used to indicate the authenticated user.
+        start_history_id: The historyId saved at the end of the previous sync.
+
+    Returns:
+        A tuple of (message_ids, latest_history_id). Message IDs are de-duplicated
+        and returned in the order Gmail reported them. Drafts are skipped.
+
+    Raises:
+        HistoryExpiredError: If Gmail no longer has history for start_history_id.
+    """
+    message_ids = []
+    seen = set()
+    latest_history_id = start_history_id
+    page_token = None
+
+    try:
+        while True:
+            response = service.users().history().list(
+                userId=user_id,
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                pageToken=page_token
+            ).execute()
+
+            for record in response.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added.get('message', {})
+                    msg_id = message.get('id')
+                    if not msg_id or msg_id in seen:
+                        continue
+                    if 'DRAFT' in message.get('labelIds', []):
+                        continue
+                    seen.add(msg_id)
+                    message_ids.append(msg_id)
+
+            if response.get('historyId'):
+                latest_history_id = str(response['historyId'])
+
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+    except HttpError as error:
+        # Gmail returns 404 when the start historyId is outside the available history window
+        if error.resp.status == 404:
+            raise HistoryExpiredError(f"History {start_history_id} is no longer available") from error
+        raise
+
+    return message_ids, latest_history_id
+
+# Gmail accepts at most 100 calls in a single batch request
+GMAIL_BATCH_SIZE = 100
+
+# Partial response mask covering only what a Communication row needs: the
+# headers and the text parts (two levels of nesting) of each message
+MESSAGE_CONTENT_FIELDS = (
+    'id,threadId,labelIds,'
+    'payload(mimeType,headers,body/data,'
+    'parts(mimeType,body/data,parts(mimeType,body/data)))'
+)
+
+def _html_to_text(html):
+    """Very simple HTML to text conversion"""
+    from html.parser import HTMLParser
+
+    class MLStripper(HTMLParser):
+        def __init__(self):
+            super().__init__()
+            self.reset()
+            self.strict = False
+            self.convert_charrefs = True
+            self.text = []
+        def handle_data(self, d):
+            self.text.append(d)
+        def get_data(self):
+            return ''.join(self.text)
+
+    stripper = MLStripper()
+    stripper.feed(html)
+    return stripper.get_data()
+
+def _decode_part_data(data):
+    return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
+
+def parse_message_content(message):
+    """Process a Gmail message resource into the format used by the sync.
+
+    Args:
+        message: A message resource returned by users.messages.get.
+
+    Returns:
+        Dictionary with id, thread_id, subject, from, to, body and date keys.
+    """
+    # Extract headers
+    headers = message.get('payload', {}).get('headers', [])
+    subject = ''
+    from_email = ''
+    to_email = ''
+    date = ''
+    thread_id = message.get('threadId', '')
+
+    for header in headers:
+        name = header['name'].lower()
+        if name == 'subject':
+            subject = header['value']
+        elif name == 'from':
+            from_email = header['value']
+        elif name == 'to':
+            to_email = header['value']
+        elif name == 'date':
+            date = header['value']
+
+    # Extract body
+    body = ""
+    payload = message.get('payload', {})
+    if 'parts' in payload:
+        # Multi-part message
+        for part in payload['parts']:
+            if part['mimeType'] == 'text/plain':
+                if 'data' in part.get('body', {}):
+                    body = _decode_part_data(part['body']['data'])
+                    break
+            elif part['mimeType'] == 'text/html':
+                # If we don't have plain text yet, use HTML (will be our fallback)
+                if not body and 'data' in part.get('body', {}):
+                    body = _html_to_text(_decode_part_data(part['body']['data']))
+            elif 'parts' in part:
+                # Handle nested multipart messages
+                for subpart in part['parts']:
+                    if subpart['mimeType'] == 'text/plain':
+                        if 'data' in subpart.get('body', {}):
+                            body = _decode_part_data(subpart['body']['data'])
+                            break
+                    elif subpart['mimeType'] == 'text/html' and not body:
+                        if 'data' in subpart.get('body', {}):
+                            body = _html_to_text(_decode_part_data(subpart['body']['data']))
+    elif 'data' in payload.get('body', {}):
+        # Single part message
+        body = _decode_part_data(payload['body']['data'])
+
+    return {
+        'id': message.get('id'),
+        'thread_id': thread_id,
+        'subject': subject,
+        'from': from_email,
+        'to': to_email,
+        'body': body,
+        'date': date
+    }
+
+def get_raw_message_body(service, user_id, msg_id):
+    """Extract a message's plain text body from its raw RFC 822 form.
+
+    Used when the parsed payload has no text part the parser recognises.
+
+    Args:
+        service: Authorized Gmail API service instance.
+        user_id: User's email address. The special value "me" can be used to indicate the authenticated user.
+        msg_id: The ID of the message.
+
+    Returns:
+        The body text, or an empty string if none could be extracted.
+    """
+    try:
+        full_message = service.users().messages().get(
+            userId=user_id, id=msg_id, format='raw').execute()
+        if 'raw' in full_message:
+            # Decode the raw message
+            raw_email = base64.urlsafe_b64decode(full_message['raw'].encode('ASCII'))
+            email_message = email.message_from_bytes(raw_email)
+
+            # Get the body from the email
+            if email_message.is_multipart():
+                for part in email_message.walk():
+                    if part.get_content_type() == 'text/plain':
+                        return part.get_payload(decode=True).decode('utf-8', errors='replace')
+            else:
+                return email_message.get_payload(decode=True).decode('utf-8', errors='replace')
+    except Exception as e:
+        logger.warning(f"Error extracting raw email body: {str(e)}")
+    return ''
+
 def get_message_content(service, user_id, msg_id):
     """Get message content from Gmail API and process it into a usable format"""
     try:
@@ -457,129 +582,110 @@ def get_message_content(service, user_id, msg_id):
         if not message:
             return None
             
-        # Extract headers
-        headers = message['payload']['headers']
-        subject = ''
-        from_email = ''
-        to_email = ''
-        date = ''
-        thread_id = message.get('threadId', '')
-        
-        for header in headers:
-            name = header['name'].lower()
-            if name == 'subject':
-                subject = header['value']
-            elif name == 'from':
-                from_email = header['value']
-            elif name == 'to':
-                to_email = header['value']
-            elif name == 'date':
-                date = header['value']
-                
-        # Extract body
-        body = ""
-        if 'parts' in message['payload']:
-            # Multi-part message
-            for part in message['payload']['parts']:
-                if part['mimeType'] == 'text/plain':
-                    if 'data' in part['body']:
-                        text = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='replace')
-                        body = text
-                        break
-                elif part['mimeType'] == 'text/html':
-                    # If we don't have plain text yet, use HTML (will be our fallback)
-                    if not body and 'data' in part['body']:
-                        html = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='replace')
-                        # Very simple HTML to text conversion
-                        from html.parser import HTMLParser
-                        
-                        class MLStripper(HTMLParser):
-                            def __init__(self):
-                                super().__init__()
-                                self.reset()
-                                self.strict = False
-                                self.convert_charrefs = True
-                                self.text = []
-                            def handle_data(self, d):
-                                self.text.append(d)
-                            def get_data(self):
-                                return ''.join(self.text)
-                                
-                        stripper = MLStripper()
-                        stripper.feed(html)
-                        body = stripper.get_data()
-                elif 'parts' in part:
-                    # Handle nested multipart messages
-                    for subpart in part['parts']:
-                        if subpart['mimeType'] == 'text/plain':
-                            if 'data' in subpart['body']:
-                                text = base64.urlsafe_b64decode(subpart['body']['data']).decode('utf-8', errors='replace')
-                                body = text
-                                break
-                        elif subpart['mimeType'] == 'text/html' and not body:
-                            if 'data' in subpart['body']:
-                                html = base64.urlsafe_b64decode(subpart['body']['data']).decode('utf-8', errors='replace')
-                                # Strip HTML tags for plain text
-                                from html.parser import HTMLParser
-                                
-                                class MLStripper(HTMLParser):
-                                    def __init__(self):
-                                        super().__init__()
-                                        self.reset()
-                                        self.strict = False
-                                        self.convert_charrefs = True
-                                        self.text = []
-                                    def handle_data(self, d):
-                                        self.text.append(d)
-                                    def get_data(self):
-                                        return ''.join(self.text)
-                                        
-                                stripper = MLStripper()
-                                stripper.feed(html)
-                                body = stripper.get_data()
-        elif 'body' in message['payload'] and 'data' in message['payload']['body']:
-            # Single part message
-            body = base64.urlsafe_b64decode(message['payload']['body']['data']).decode('utf-8', errors='replace')
+        content = parse_message_content(message)
+        content['id'] = msg_id
             
         # If body is still empty, try one more approach
-        if not body:
-            try:
-                # Try to get full message with raw format to extract body
-                full_message = service.users().messages().get(
-                    userId=user_id, id=msg_id, format='raw').execute()
-                if 'raw' in full_message:
-                    # Decode the raw message
-                    raw_email = base64.urlsafe_b64decode(full_message['raw'].encode('ASCII'))
-                    # Parse the email using email package
-                    import email
-                    email_message = email.message_from_bytes(raw_email)
-                    
-                    # Get the body from the email
-                    if email_message.is_multipart():
-                        for part in email_message.walk():
-                            if part.get_content_type() == 'text/plain':
-                                body = part.get_payload(decode=True).decode('utf-8', errors='replace')
-                                break
-                    else:
-                        body = email_message.get_payload(decode=True).decode('utf-8', errors='replace')
-            except Exception as e:
-                logger.warning(f"Error extracting raw email body: {str(e)}")
+        if not content['body']:
+            content['body'] = get_raw_message_body(service, user_id, msg_id)
                 
-        # Return processed message content
-        return {
-            'id': msg_id,
-            'thread_id': thread_id,
-            'subject': subject,
-            'from': from_email,
-            'to': to_email,
-            'body': body,
-            'date': date
-        }
+        return content
     except Exception as e:
         logger.error(f"Error getting message content: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return None
 
+def iter_message_contents(service, user_id, msg_ids, batch_size=GMAIL_BATCH_SIZE, max_retries=3,
+                          failed_ids=None):
+    """Fetch and parse many messages using Gmail HTTP batch requests.
+
+    Messages are requested in batches of up to batch_size with a partial
+    response mask, and parsed results are yielded as each batch completes
+    so the caller can start storing them before the whole mailbox is fetched.
+    Calls rejected with a rate-limit or server error are retried in a later
+    batch with exponential backoff. Messages whose parsed body is empty
+    are fetched once more in raw form, as in get_message_content.
+
+    Args:
+        service: Authorized Gmail API service instance.
+        user_id: User's email address. The special value "me" can be used to indicate the authenticated user.
+        msg_ids: Iterable of message IDs to fetch.
+        batch_size: Number of calls per batch request (at most 100).
+        max_retries: Number of times to retry calls that were rate limited.
+        failed_ids: Optional list that receives the IDs of messages that could
+            not be fetched, including those still rate limited after max_retries.
+            Messages deleted since they were listed are not counted as failed.
+
+    Yields:
+        Dictionaries in the format returned by parse_message_content.
+    """
+    if failed_ids is None:
+        failed_ids = []
+
+    batch_size = max(1, min(batch_size, GMAIL_BATCH_SIZE))
+    pending = list(dict.fromkeys(msg_ids))
+    attempt = 0
+
+    while pending:
+        retry_ids = []
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            responses = {}
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    responses[request_id] = response
+                elif isinstance(exception, HttpError) and exception.resp.status in (429, 500, 503):
+                    retry_ids.append(request_id)
+                elif isinstance(exception, HttpError) and exception.resp.status == 404:
+                    logger.info(f"Message {request_id} was deleted before it could be fetched")
+                else:
+                    logger.warning(f"Error fetching message {request_id}: {exception}")
+                    failed_ids.append(request_id)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for msg_id in chunk:
+                batch.add(
+                    service.users().messages().get(
+                        userId=user_id,
+                        id=msg_id,
+                        format='full',
+                        fields=MESSAGE_CONTENT_FIELDS
+                    ),
+                    request_id=msg_id
+                )
+
+            try:
+                batch.execute()
+            except HttpError as error:
+                logger.error(f"Batch request for {len(chunk)} messages failed: {error}")
+                retry_ids.extend(msg_id for msg_id in chunk if msg_id not in responses)
+
+            for msg_id in chunk:
+                if msg_id in responses:
+                    try:
+                        content = parse_message_content(responses[msg_id])
+                    except Exception as e:
+                        logger.warning(f"Error parsing message {msg_id}: {e}")
+                        continue
+                    if not content['body']:
+                        content['body'] = get_raw_message_body(service, user_id, msg_id)
+                    yield content
+
+        if not retry_ids:
+            break
+
+        attempt += 1
+        if attempt > max_retries:
+            logger.error(f"Giving up on {len(retry_ids)} messages after {max_retries} retries")
+            failed_ids.extend(retry_ids)
+            break
+
+        logger.info(f"Retrying {len(retry_ids)} rate limited messages (attempt {attempt})")
+        time.sleep(2 ** attempt)
+        pending = retry_ids
+
 def create_draft(service, user_id, message_body):
     """Create a draft email.
 
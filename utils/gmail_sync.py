@@ -0,0 +1,357 @@
+"""
+Gmail synchronization service for Mobilize CRM
+Syncs emails between users and their contacts into Communications. Used by
+the sync API endpoints and run directly by the background scheduler.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+import logging
+import threading
+import time
+import traceback
+
+from flask import current_app
+
+from database import session_scope
+from models import Communication
+from routes.google_auth import get_gmail_history_id, save_gmail_history_id
+from utils.communication_writer import CommunicationWriter
+from utils.contact_email_index import ContactEmailIndex
+from utils.google_services import get_google_service
+from utils.gmail_integration import (
+    build_gmail_service,
+    list_messages,
+    iter_message_contents,
+    get_mailbox_history_id,
+    list_history_message_ids,
+    HistoryExpiredError
+)
+
+logger = logging.getLogger(__name__)
+
+USERINFO_SCOPES = ['https://www.googleapis.com/auth/userinfo.email']
+
+
+class SyncCancelled(Exception):
+    """Raised inside a sync when its time budget has run out"""
+
+
+def _parse_message_date(value):
+    """Parse a message Date header, falling back to now"""
+    if value:
+        try:
+            # Try parsing ISO format first
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                # Try parsing email format
+                return parsedate_to_datetime(value)
+            except Exception as e:
+                current_app.logger.error(f"Error parsing date {value}: {e}")
+    return datetime.now()
+
+
+def _get_google_user_email(access_token, user_id):
+    """Look up the Google account email for an access token"""
+    try:
+        user_info_service = get_google_service('oauth2', 'v2', USERINFO_SCOPES, access_token, user_id=user_id)
+        user_info = user_info_service.userinfo().get().execute()
+        return user_info.get('email')
+    except Exception as e:
+        current_app.logger.warning(f"Unable to get user email from Google API: {e}")
+        return None
+
+
+def _build_search_query(contact_emails, user_email):
+    """Build a Gmail search query for emails between the user and contacts"""
+    if user_email:
+        # Emails FROM contacts TO the user, and FROM the user TO contacts
+        query_parts = [f"(from:{email} AND to:{user_email})" for email in contact_emails]
+        query_parts += [f"(from:{user_email} AND to:{email})" for email in contact_emails]
+    else:
+        # Fallback to the simpler but less precise approach
+        query_parts = [f"from:{email}" for email in contact_emails]
+        query_parts += [f"to:{email}" for email in contact_emails]
+
+    # Combine all queries with OR
+    return " OR ".join(query_parts)
+
+
+def _find_synced_message_ids(session, user_id, message_ids, chunk_size=500):
+    """Return which of the given Gmail message IDs the user already has"""
+    found = set()
+    for start in range(0, len(message_ids), chunk_size):
+        chunk = message_ids[start:start + chunk_size]
+        found.update(
+            row[0] for row in session.query(Communication.gmail_message_id).filter(
+                Communication.user_id == user_id,
+                Communication.gmail_message_id.in_(chunk)
+            )
+        )
+    return found
+
+
+def record_sync_result(user_id, result):
+    """Store a sync result in the application config for status checks.
+
+    Args:
+        user_id: ID of the user the sync ran for.
+        result: Result dictionary returned by sync_user_emails.
+    """
+    record = dict(result, user_id=user_id, timestamp=datetime.now().isoformat())
+    current_app.config['LAST_SYNC_RESULT'] = record
+    current_app.config.setdefault('LAST_SYNC_RESULTS', {})[user_id] = record
+
+
+def sync_user_emails(user_id, access_token, user_email=None, include_history=False, cancel_event=None):
+    """Sync emails between a user and their contacts into Communications.
+
+    Args:
+        user_id: ID of the user to sync emails for.
+        access_token: Google OAuth access token for the user.
+        user_email: The user's email address, looked up from Google if not given.
+        include_history: Search the whole mailbox instead of syncing incrementally.
+        cancel_event: Optional threading.Event; the sync stops between messages once it is set.
+
+    Returns:
+        Dictionary with success, message, synced_count, total_messages_found and
+        sync_mode keys. Syncs that fetched messages also report failed_count,
+        and failed syncs include an error key.
+    """
+    current_app.logger.info(f"Starting Gmail sync for user {user_id}")
+
+    try:
+        # Get all contacts (people and churches) with email addresses
+        with session_scope() as session:
+            # Index every contact email once so messages can be matched without queries
+            contact_index = ContactEmailIndex.build(session)
+
+        all_contacts_emails = contact_index.emails
+        if not all_contacts_emails:
+            return {
+                'success': False,
+                'message': 'No contacts with email found',
+                'synced_count': 0,
+                'total_messages_found': 0,
+                'error': 'no_contacts'
+            }
+
+        current_app.logger.info(f"Searching for emails for contacts: {', '.join(all_contacts_emails[:5])}{'...' if len(all_contacts_emails) > 5 else ''}")
+
+        # Get user's email from Google API for more targeted searching
+        user_email_str = _get_google_user_email(access_token, user_id) or user_email
+        query = _build_search_query(all_contacts_emails, user_email_str)
+        current_app.logger.debug(f"Gmail search query: {query}")
+
+        # Setup Gmail service
+        service = build_gmail_service(access_token, user_id=user_id)
+        if not service:
+            current_app.logger.error("Failed to build Gmail service")
+            return {
+                'success': False,
+                'message': 'Failed to build Gmail service. Please check your Google account permissions and try again.',
+                'synced_count': 0,
+                'total_messages_found': 0,
+                'error': 'gmail_service'
+            }
+
+        if include_history:
+            current_app.logger.info("Including historical emails in sync")
+
+        # Capture the mailbox position before listing so nothing that arrives
+        # during this run is skipped by the next incremental sync
+        mailbox_history_id = get_mailbox_history_id(service, 'me')
+
+        # Prefer an incremental sync from the stored history cursor. A history
+        # sync is skipped when historical emails were explicitly requested.
+        messages = None
+        sync_mode = 'full'
+        history_id = None if include_history else get_gmail_history_id(user_id)
+        if history_id:
+            try:
+                message_ids, _ = list_history_message_ids(service, 'me', history_id)
+                messages = [{'id': msg_id} for msg_id in message_ids]
+                sync_mode = 'incremental'
+                current_app.logger.info(f"Found {len(messages)} new messages since history {history_id}")
+            except HistoryExpiredError:
+                current_app.logger.info(f"History cursor {history_id} expired for user {user_id}, falling back to full resync")
+
+        if messages is None:
+            # Full resync, bounded unless historical emails were requested
+            max_results = None
+            if not include_history:
+                days = current_app.config.get('GMAIL_FULL_RESYNC_DAYS', 30)
+                query = f"newer_than:{days}d ({query})"
+                max_results = current_app.config.get('GMAIL_FULL_RESYNC_MAX_MESSAGES', 2000)
+
+            messages = list_messages(service, 'me', query, max_results=max_results)
+            current_app.logger.info(f"Found {len(messages) if messages else 0} messages matching query")
+
+        if not messages:
+            if mailbox_history_id:
+                save_gmail_history_id(user_id, mailbox_history_id)
+            return {
+                'success': True,
+                'message': 'No new emails found',
+                'synced_count': 0,
+                'total_messages_found': 0,
+                'sync_mode': sync_mode
+            }
+
+        # Skip messages this user already has before fetching them; anything
+        # that slips through is ignored by the unique index on insert
+        message_ids = [msg.get('id') for msg in messages if msg.get('id')]
+        with session_scope() as session:
+            existing_message_ids = _find_synced_message_ids(session, user_id, message_ids)
+        new_message_ids = [msg_id for msg_id in message_ids if msg_id not in existing_message_ids]
+        current_app.logger.info(f"Fetching {len(new_message_ids)} new messages in batches ({len(existing_message_ids)} already synced)")
+
+        chunk_size = current_app.config.get('GMAIL_SYNC_COMMIT_CHUNK', 200)
+        failed_ids = []
+        with session_scope() as session, CommunicationWriter(session, chunk_size=chunk_size) as writer:
+            for message_data in iter_message_contents(service, 'me', new_message_ids, failed_ids=failed_ids):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise SyncCancelled(f"Sync for user {user_id} ran out of time")
+
+                msg_id = message_data['id']
+
+                # Only sync emails that involve a contact, either as sender or recipient
+                sender_contact = contact_index.resolve(message_data.get('from', ''))
+                recipient_contact = None if sender_contact else contact_index.resolve(message_data.get('to', ''))
+
+                if not (sender_contact or recipient_contact):
+                    current_app.logger.debug(f"Skipping message {msg_id} - not involving any contact")
+                    continue
+
+                message_date = _parse_message_date(message_data.get('date'))
+
+                # Link to the matching person or church
+                _, contact_type, contact_id = sender_contact or recipient_contact
+
+                writer.add(
+                    type='Email',
+                    message=message_data.get('body', ''),
+                    date_sent=message_date,
+                    date=message_date,
+                    subject=message_data.get('subject', ''),
+                    gmail_message_id=msg_id,
+                    gmail_thread_id=message_data.get('thread_id'),
+                    user_id=user_id,
+                    direction='inbound' if sender_contact else 'outbound',
+                    person_id=contact_id if contact_type == ContactEmailIndex.PERSON else None,
+                    church_id=contact_id if contact_type == ContactEmailIndex.CHURCH else None
+                )
+
+        synced_count = writer.inserted
+
+        # Only advance the cursor once the messages have been stored. If any
+        # could not be fetched the cursor stays put so the next run retries them.
+        if failed_ids:
+            current_app.logger.warning(f"{len(failed_ids)} messages could not be fetched for user {user_id}; keeping history cursor")
+        elif mailbox_history_id:
+            save_gmail_history_id(user_id, mailbox_history_id)
+
+        return {
+            'success': True,
+            'message': f'Successfully synced {synced_count} emails',
+            'synced_count': synced_count,
+            'total_messages_found': len(messages),
+            'failed_count': len(failed_ids),
+            'sync_mode': sync_mode
+        }
+
+    except Exception as e:
+        current_app.logger.error(f"Error during Gmail sync process for user {user_id}: {str(e)}")
+        current_app.logger.error(traceback.format_exc())
+        return {
+            'success': False,
+            'message': f'Error during sync: {str(e)}',
+            'synced_count': 0,
+            'total_messages_found': 0,
+            'error': str(e)
+        }
+
+
+def sync_all_users_emails(user_tokens, max_workers=None, user_timeout=None):
+    """Sync emails for many users on a bounded thread pool.
+
+    Each user runs in its own app context. A user whose sync runs longer than
+    user_timeout seconds is recorded as timed out and asked to stop at the
+    next message, without holding up the other users.
+
+    Args:
+        user_tokens: Dictionary mapping user IDs to token information.
+        max_workers: Number of users synced at once (GMAIL_SYNC_MAX_WORKERS).
+        user_timeout: Seconds allowed per user (GMAIL_SYNC_USER_TIMEOUT).
+
+    Returns:
+        Dictionary mapping user IDs to their result dictionaries.
+    """
+    app = current_app._get_current_object()
+    max_workers = max_workers or app.config.get('GMAIL_SYNC_MAX_WORKERS', 4)
+    user_timeout = user_timeout or app.config.get('GMAIL_SYNC_USER_TIMEOUT', 600)
+
+    results = {}
+    started_at = {}
+    cancel_events = {}
+
+    def run(user_id, tokens):
+        started_at[user_id] = time.monotonic()
+        with app.app_context():
+            return sync_user_emails(
+                user_id,
+                tokens['access_token'],
+                user_email=tokens.get('user_email'),
+                cancel_event=cancel_events[user_id]
+            )
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gmail-sync')
+    try:
+        futures = {}
+        for user_id, tokens in user_tokens.items():
+            if not tokens.get('access_token'):
+                logger.warning(f"User {user_id} has no access token")
+                continue
+            cancel_events[user_id] = threading.Event()
+            futures[executor.submit(run, user_id, tokens)] = user_id
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                user_id = futures[future]
+                try:
+                    results[user_id] = future.result()
+                except Exception as e:
+                    logger.error(f"Error syncing emails for user {user_id}: {str(e)}")
+                    results[user_id] = {
+                        'success': False,
+                        'message': f'Error during sync: {str(e)}',
+                        'synced_count': 0,
+                        'total_messages_found': 0,
+                        'error': str(e)
+                    }
+
+            # Give up waiting on users that have used up their time budget
+            now = time.monotonic()
+            for future in list(pending):
+                user_id = futures[future]
+                if user_id in started_at and now - started_at[user_id] > user_timeout:
+                    logger.error(f"Gmail sync for user {user_id} timed out after {user_timeout}s")
+                    cancel_events[user_id].set()
+                    pending.discard(future)
+                    results[user_id] = {
+                        'success': False,
+                        'message': f'Sync timed out after {user_timeout} seconds',
+                        'synced_count': 0,
+                        'total_messages_found': 0,
+                        'error': 'timeout'
+                    }
+    finally:
+        executor.shutdown(wait=False)
+
+    for user_id, result in results.items():
+        record_sync_result(user_id, result)
+
+    return results
@@ -2,31 +2,23 @@
 Google Calendar integration for Mobilize CRM
 This module provides functions to interact with Google Calendar API
 """
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
 from datetime import datetime, timedelta, time
-from flask import current_app
+from utils.google_services import get_google_service
 import logging
 
 logger = logging.getLogger(__name__)
 
-def build_calendar_service(token):
-    """Build a Google Calendar service object with the provided token"""
+CALENDAR_SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+def build_calendar_service(token, user_id=None):
+    """Get a Google Calendar service object for the provided token
+    
+    Service objects are cached per user, and expired tokens are refreshed with
+    the user's stored refresh token (see utils.google_services).
+    """
     try:
-        if not token:
-            logger.error("No token provided to build calendar service")
-            return None
-            
-        credentials = Credentials(
-            token=token,
-            refresh_token=None,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=current_app.config['GOOGLE_CLIENT_ID'],
-            client_secret=current_app.config['GOOGLE_CLIENT_SECRET'],
-            scopes=['https://www.googleapis.com/auth/calendar']
-        )
-        return build('calendar', 'v3', credentials=credentials)
+        return get_google_service('calendar', 'v3', CALENDAR_SCOPES, token, user_id=user_id)
     except Exception as e:
         logger.error(f"Error building calendar service: {e}")
         return None
@@ -47,95 +39,109 @@ def get_calendar_list(service):
         logger.error(f"Unexpected error retrieving calendar list: {e}")
         return []
 
-def create_event_from_task(service, task):
+def build_event_body(task):
     """
-    Create a Google Calendar event from a task
+    Build the Google Calendar event body for a task
     
     Args:
-        service: Google Calendar service object
-        task: Task object to create event from
+        task: Task object to build the event from
         
     Returns:
-        Created event object from Google Calendar API
+        dict: Event resource for events.insert / events.update
     """
-    try:
-        # Get task details
-        title = task.title
-        description = task.description or ''
-        due_date = task.due_date
-        
-        # Handle time component
-        start_datetime = None
-        end_datetime = None
-        
-        if due_date:
-            # If we have a due_time, use it to create a datetime event
-            if task.due_time:
-                # Parse the time string (HH:MM)
-                hour, minute = map(int, task.due_time.split(':'))
-                
-                # Create datetime objects for start and end
-                start_datetime = datetime.combine(due_date, time(hour, minute, 0))
-                end_datetime = start_datetime + timedelta(hours=1)  # Default to 1 hour duration
-                
-                # Format for Google Calendar API
-                start = {
-                    'dateTime': start_datetime.isoformat(),
-                    'timeZone': 'America/Los_Angeles'  # Use appropriate timezone
-                }
-                end = {
-                    'dateTime': end_datetime.isoformat(),
-                    'timeZone': 'America/Los_Angeles'  # Use appropriate timezone
-                }
-            else:
-                # All-day event
-                start = {
-                    'date': due_date.isoformat()
-                }
-                end = {
-                    'date': due_date.isoformat()
-                }
+    # Get task details
+    title = task.title
+    description = task.description or ''
+    due_date = task.due_date
+    
+    # Handle time component
+    start_datetime = None
+    end_datetime = None
+    
+    if due_date:
+        # If we have a due_time, use it to create a datetime event
+        if task.due_time:
+            # Parse the time string (HH:MM)
+            hour, minute = map(int, task.due_time.split(':'))
+            
+            # Create datetime objects for start and end
+            start_datetime = datetime.combine(due_date, time(hour, minute, 0))
+            end_datetime = start_datetime + timedelta(hours=1)  # Default to 1 hour duration
+            
+            # Format for Google Calendar API
+            start = {
+                'dateTime': start_datetime.isoformat(),
+                'timeZone': 'America/Los_Angeles'  # Use appropriate timezone
+            }
+            end = {
+                'dateTime': end_datetime.isoformat(),
+                'timeZone': 'America/Los_Angeles'  # Use appropriate timezone
+            }
         else:
-            # If no due date, default to today
-            today = datetime.now().date()
+            # All-day event
             start = {
-                'date': today.isoformat()
+                'date': due_date.isoformat()
             }
             end = {
-                'date': today.isoformat()
+                'date': due_date.isoformat()
             }
-        
-        # Create event object
-        event = {
-            'summary': title,
-            'description': description,
-            'start': start,
-            'end': end,
-            'extendedProperties': {
-                'private': {
-                    'mobilizeCrmTaskId': str(task.id),
-                    'mobilizeCrmTaskStatus': task.status,
-                    'mobilizeCrmTaskPriority': task.priority
-                }
+    else:
+        # If no due date, default to today
+        today = datetime.now().date()
+        start = {
+            'date': today.isoformat()
+        }
+        end = {
+            'date': today.isoformat()
+        }
+    
+    # Create event object
+    event = {
+        'summary': title,
+        'description': description,
+        'start': start,
+        'end': end,
+        'extendedProperties': {
+            'private': {
+                'mobilizeCrmTaskId': str(task.id),
+                'mobilizeCrmTaskStatus': task.status,
+                'mobilizeCrmTaskPriority': task.priority
             }
         }
+    }
+    
+    # Add reminder if specified
+    if task.reminder_time and task.reminder_time != '':
+        # Convert reminder_time to minutes before event
+        minutes = int(task.reminder_time)
         
-        # Add reminder if specified
-        if task.reminder_time and task.reminder_time != '':
-            # Convert reminder_time to minutes before event
-            minutes = int(task.reminder_time)
-            
-            event['reminders'] = {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'popup', 'minutes': minutes}
-                ]
-            }
-        else:
-            # Use default reminders
-            event['reminders'] = {
-                'useDefault': True
-            }
+        event['reminders'] = {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'popup', 'minutes': minutes}
+            ]
+        }
+    else:
+        # Use default reminders
+        event['reminders'] = {
+            'useDefault': True
+        }
+    
+    return event
+
+def create_event_from_task(service, task):
+    """
+    Create a Google Calendar event from a task
+    
+    Args:
+        service: Google Calendar service object
+        task: Task object to create event from
+        
+    Returns:
+        Created event object from Google Calendar API
+    """
+    try:
+        event = build_event_body(task)
         
         # Create the event
         created_event = service.events().insert(calendarId='primary', body=event).execute()
@@ -160,83 +166,7 @@ def update_event_from_task(service, task, event_id):
         Updated event object from Google Calendar API
     """
     try:
-        # Get task details
-        title = task.title
-        description = task.description or ''
-        due_date = task.due_date
-        
-        # Handle time component
-        start_datetime = None
-        end_datetime = None
-        
-        if due_date:
-            # If we have a due_time, use it to create a datetime event
-            if task.due_time:
-                # Parse the time string (HH:MM)
-                hour, minute = map(int, task.due_time.split(':'))
-                
-                # Create datetime objects for start and end
-                start_datetime = datetime.combine(due_date, time(hour, minute, 0))
-                end_datetime = start_datetime + timedelta(hours=1)  # Default to 1 hour duration
-                
-                # Format for Google Calendar API
-                start = {
-                    'dateTime': start_datetime.isoformat(),
-                    'timeZone': 'America/Los_Angeles'  # Use appropriate timezone
-                }
-                end = {
-                    'dateTime': end_datetime.isoformat(),
-                    'timeZone': 'America/Los_Angeles'  # Use appropriate timezone
-                }
-            else:
-                # All-day event
-                start = {
-                    'date': due_date.isoformat()
-                }
-                end = {
-                    'date': due_date.isoformat()
-                }
-        else:
-            # If no due date, default to today
-            today = datetime.now().date()
-            start = {
-                'date': today.isoformat()
-            }
-            end = {
-                'date': today.isoformat()
-            }
-        
-        # Create event object
-        event = {
-            'summary': title,
-            'description': description,
-            'start': start,
-            'end': end,
-            'extendedProperties': {
-                'private': {
-                    'mobilizeCrmTaskId': str(task.id),
-                    'mobilizeCrmTaskStatus': task.status,
-                    'mobilizeCrmTaskPriority': task.priority
-                }
-            }
-        }
-        
-        # Add reminder if specified
-        if task.reminder_time and task.reminder_time != '':
-            # Convert reminder_time to minutes before event
-            minutes = int(task.reminder_time)
-            
-            event['reminders'] = {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'popup', 'minutes': minutes}
-                ]
-            }
-        else:
-            # Use default reminders
-            event['reminders'] = {
-                'useDefault': True
-            }
+        event = build_event_body(task)
         
         # Update the event
         updated_event = service.events().update(
@@ -312,4 +242,55 @@ def get_events(service, time_min=None, time_max=None, calendar_id='primary', max
         return []
     except Exception as e:
         logger.error(f"Unexpected error getting calendar events: {e}")
-        return []
\ No newline at end of file
+        return []
+
+class SyncTokenExpiredError(Exception):
+    """Raised when a stored calendar sync token is no longer valid"""
+
+# Partial response mask for listing changed events during task sync
+CHANGED_EVENT_FIELDS = 'items(id,status,updated,extendedProperties/private),nextPageToken,nextSyncToken'
+
+def list_changed_events(service, sync_token=None, calendar_id='primary'):
+    """
+    List events changed since the last sync of a calendar
+    
+    With a sync token only events created, updated or deleted since that
+    token was issued are returned. Without one, every event is listed once
+    to obtain the first sync token.
+    
+    Args:
+        service: Google Calendar service object
+        sync_token: nextSyncToken from the previous listing, if any
+        calendar_id: ID of the calendar to list (default: primary)
+        
+    Returns:
+        tuple: (list of events, nextSyncToken to store for the next sync)
+        
+    Raises:
+        SyncTokenExpiredError: If Google no longer accepts the sync token
+    """
+    events = []
+    page_token = None
+    
+    while True:
+        params = {
+            'calendarId': calendar_id,
+            'maxResults': 2500,
+            'fields': CHANGED_EVENT_FIELDS
+        }
+        if sync_token:
+            params['syncToken'] = sync_token
+        if page_token:
+            params['pageToken'] = page_token
+        
+        try:
+            response = service.events().list(**params).execute()
+        except HttpError as error:
+            if error.resp.status == 410:
+                raise SyncTokenExpiredError(f"Calendar sync token for {calendar_id} has expired")
+            raise
+        
+        events.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events, response.get('nextSyncToken')
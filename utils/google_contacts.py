@@ -0,0 +1,338 @@
+"""
+Google Contacts listing and bulk import
+Connections are listed page by page with a sync token, so later refreshes only
+return contacts changed since the last listing. Imports are processed in
+batches: each batch checks which contacts already exist with a single
+google_resource_name IN (...) query, inserts the new ones in bulk and fills
+blank details on existing ones.
+"""
+from datetime import date
+import logging
+
+from googleapiclient.errors import HttpError
+from sqlalchemy import bindparam, select, update
+
+from models import Contacts
+from utils.contact_batch import bulk_insert_contacts, batch_delete_contacts
+
+logger = logging.getLogger(__name__)
+
+PERSON = 'person'
+CHURCH = 'church'
+
+PERSON_FIELDS = 'names,emailAddresses,phoneNumbers,addresses,memberships,metadata'
+
+# Largest page the People API returns for connections and contact groups
+CONNECTIONS_PAGE_SIZE = 1000
+GROUPS_PAGE_SIZE = 1000
+
+# Most resource names people.getBatchGet accepts per call
+BATCH_GET_SIZE = 200
+
+# Contacts per existence check and insert
+DEFAULT_IMPORT_BATCH_SIZE = 500
+
+# Details filled in on an existing contact when it has none
+FILL_COLUMNS = ('email', 'phone', 'street_address', 'city', 'state', 'zip_code')
+
+
+class SyncTokenExpired(Exception):
+    """The sync token is too old; a full listing is needed"""
+
+
+def contact_summary(person):
+    """Reduce a People API person to the fields the contacts page shows"""
+    names = person.get('names', [])
+    groups = []
+    for membership in person.get('memberships', []):
+        if 'contactGroupMembership' in membership:
+            group_resource_name = membership['contactGroupMembership'].get('contactGroupResourceName')
+            if group_resource_name:
+                groups.append(group_resource_name)
+
+    return {
+        'resource_name': person.get('resourceName'),
+        'names': names[0].get('displayName') if names else 'No Name',
+        'email_addresses': [email.get('value') for email in person.get('emailAddresses', [])],
+        'phone_numbers': [phone.get('value') for phone in person.get('phoneNumbers', [])],
+        'addresses': [addr.get('formattedValue') for addr in person.get('addresses', [])],
+        'groups': groups
+    }
+
+
+def list_contact_groups(service):
+    """
+    List all of the user's contact groups
+
+    Returns:
+        list: Dicts with resourceName and name
+    """
+    groups = []
+    page_token = None
+    while True:
+        result = service.contactGroups().list(pageSize=GROUPS_PAGE_SIZE, pageToken=page_token).execute()
+        for group in result.get('contactGroups', []):
+            if group.get('resourceName') and group.get('name'):
+                groups.append({'resourceName': group['resourceName'], 'name': group['name']})
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return groups
+
+
+def list_connections(service, sync_token=None):
+    """
+    List the user's connections across all pages
+
+    With a sync token only contacts changed since that listing are returned,
+    along with the resource names of deleted ones. An expired token falls
+    back to a full listing.
+
+    Args:
+        service: People API service
+        sync_token: nextSyncToken from an earlier listing
+
+    Returns:
+        dict: contacts, deleted (resource names), sync_token for the next
+        refresh and full_sync (False when only changes were returned)
+    """
+    if sync_token:
+        try:
+            return _list_connections(service, sync_token)
+        except SyncTokenExpired:
+            logger.info("Contacts sync token expired, listing all connections")
+    return _list_connections(service, None)
+
+
+def _list_connections(service, sync_token):
+    contacts = []
+    deleted = []
+    page_token = None
+    while True:
+        params = {
+            'resourceName': 'people/me',
+            'pageSize': CONNECTIONS_PAGE_SIZE,
+            'personFields': PERSON_FIELDS,
+            'requestSyncToken': True,
+        }
+        if sync_token:
+            params['syncToken'] = sync_token
+        if page_token:
+            params['pageToken'] = page_token
+        try:
+            result = service.people().connections().list(**params).execute()
+        except HttpError as e:
+            if sync_token and e.resp.status == 410:
+                raise SyncTokenExpired() from e
+            raise
+
+        for person in result.get('connections', []):
+            if person.get('metadata', {}).get('deleted'):
+                deleted.append(person.get('resourceName'))
+            else:
+                contacts.append(contact_summary(person))
+
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return {
+                'contacts': contacts,
+                'deleted': deleted,
+                'sync_token': result.get('nextSyncToken'),
+                'full_sync': sync_token is None
+            }
+
+
+def get_contacts(service, resource_names):
+    """
+    Fetch contacts by resource name, BATCH_GET_SIZE per API call
+
+    Returns:
+        list: Contact summaries for the contacts that were found
+    """
+    contacts = []
+    for start in range(0, len(resource_names), BATCH_GET_SIZE):
+        result = service.people().getBatchGet(
+            resourceNames=resource_names[start:start + BATCH_GET_SIZE],
+            personFields=PERSON_FIELDS
+        ).execute()
+        for response in result.get('responses', []):
+            if response.get('person'):
+                contacts.append(contact_summary(response['person']))
+    return contacts
+
+
+def imported_resource_names(session, resource_names, batch_size=DEFAULT_IMPORT_BATCH_SIZE):
+    """
+    Find which Google contacts are already in the CRM
+
+    Returns:
+        dict: Resource name -> {'id', 'type'} for the imported ones
+    """
+    imported = {}
+    resource_names = list(dict.fromkeys(name for name in resource_names if name))
+    for start in range(0, len(resource_names), batch_size):
+        rows = session.execute(
+            select(Contacts.id, Contacts.type, Contacts.google_resource_name)
+            .where(Contacts.google_resource_name.in_(resource_names[start:start + batch_size]))
+        )
+        for row in rows:
+            imported[row.google_resource_name] = {'id': row.id, 'type': row.type}
+    return imported
+
+
+def parse_address(address):
+    """
+    Split a formatted address like "1 Main St, Springfield, IL 62701"
+
+    Returns:
+        dict: street_address, city, state and zip_code where they could be found
+    """
+    parts = {}
+    if not address:
+        return parts
+    address_lines = address.split(',')
+    if len(address_lines) >= 2:
+        # Last part usually contains state and zip
+        state_zip = address_lines[-1].strip().split()
+        if len(state_zip) >= 2:
+            # States are stored as two-letter codes
+            if len(state_zip[0]) == 2:
+                parts['state'] = state_zip[0].lower()
+            parts['zip_code'] = state_zip[1][:10]
+        # Second to last part usually contains city
+        parts['city'] = address_lines[-2].strip()
+        # First part(s) contain street address
+        parts['street_address'] = ','.join(address_lines[:-2]).strip()
+    return {name: value for name, value in parts.items() if value}
+
+
+def contact_values(contact, import_type, user_id):
+    """Column values for a Google contact imported as a person or church"""
+    names = contact.get('names') or ''
+    email_addresses = contact.get('email_addresses') or []
+    phone_numbers = contact.get('phone_numbers') or []
+    addresses = contact.get('addresses') or []
+    address_parts = parse_address(addresses[0]) if addresses else {}
+
+    values = {
+        'email': email_addresses[0] if email_addresses else None,
+        'phone': phone_numbers[0] if phone_numbers else None,
+        'street_address': address_parts.get('street_address'),
+        'city': address_parts.get('city'),
+        'state': address_parts.get('state'),
+        'zip_code': address_parts.get('zip_code'),
+        'google_resource_name': contact['resource_name'],
+        'date_created': date.today(),
+        'date_modified': date.today(),
+    }
+    if import_type == CHURCH:
+        values['church_name'] = names
+        if values['city'] and values['state']:
+            values['location'] = f"{values['city']}, {values['state']}"
+    else:
+        name_parts = names.split()
+        values['first_name'] = name_parts[0] if name_parts else ''
+        values['last_name'] = ' '.join(name_parts[1:])
+        values['user_id'] = user_id
+    return values
+
+
+def import_google_contacts(session, contacts, user_id, batch_size=DEFAULT_IMPORT_BATCH_SIZE):
+    """
+    Import Google contacts as people or churches
+
+    New contacts are created. Contacts imported before keep their details,
+    apart from blank email, phone and address fields which are filled in.
+    A person imported again as a church is replaced by the church; a church
+    is never turned back into a person.
+
+    Args:
+        session: Database session; the caller commits
+        contacts: Contact summaries, each with resource_name and import_type
+        user_id: Owner of imported people
+        batch_size: Contacts per existence check and insert
+
+    Returns:
+        dict: created, updated and skipped counts, plus results with the
+        resource_name, id, type and outcome of each contact
+    """
+    summary = {'created': 0, 'updated': 0, 'skipped': 0, 'results': []}
+
+    unique = {}
+    for contact in contacts:
+        if contact.get('resource_name') and contact.get('import_type') in (PERSON, CHURCH):
+            unique[contact['resource_name']] = contact
+        else:
+            summary['skipped'] += 1
+    unique = list(unique.values())
+
+    contacts_table = Contacts.__table__
+    for start in range(0, len(unique), batch_size):
+        batch = unique[start:start + batch_size]
+        existing = {
+            row.google_resource_name: row
+            for row in session.execute(
+                select(contacts_table.c.id, contacts_table.c.type, contacts_table.c.google_resource_name,
+                       *[contacts_table.c[name] for name in FILL_COLUMNS])
+                .where(contacts_table.c.google_resource_name.in_([contact['resource_name'] for contact in batch]))
+            )
+        }
+
+        new_rows = {PERSON: [], CHURCH: []}
+        replaced_people = []
+        fills = {}
+        results = []
+        for contact in batch:
+            resource_name = contact['resource_name']
+            import_type = contact['import_type']
+            values = contact_values(contact, import_type, user_id)
+            row = existing.get(resource_name)
+
+            if row is None:
+                new_rows[import_type].append(values)
+                results.append((resource_name, import_type, 'created'))
+            elif row.type == PERSON and import_type == CHURCH:
+                replaced_people.append(row.id)
+                new_rows[CHURCH].append(values)
+                results.append((resource_name, CHURCH, 'updated'))
+            elif row.type == import_type:
+                blanks = {name: values[name] for name in FILL_COLUMNS if values[name] and not getattr(row, name)}
+                if blanks:
+                    fills[row.id] = blanks
+                results.append((resource_name, row.type, 'updated' if blanks else 'skipped'))
+            else:
+                results.append((resource_name, row.type, 'skipped'))
+
+        if replaced_people:
+            batch_delete_contacts(session, PERSON, replaced_people)
+
+        new_ids = {}
+        for import_type, rows in new_rows.items():
+            ids = bulk_insert_contacts(session, import_type, rows)
+            new_ids.update(zip((row['google_resource_name'] for row in rows), ids))
+
+        # One executemany per set of filled columns
+        by_columns = {}
+        for contact_id, blanks in fills.items():
+            params = {f'new_{name}': value for name, value in blanks.items()}
+            by_columns.setdefault(tuple(sorted(blanks)), []).append({'contact_id': contact_id, **params})
+        for columns, params in by_columns.items():
+            values = {name: bindparam(f'new_{name}') for name in columns}
+            values['date_modified'] = date.today()
+            session.execute(
+                update(contacts_table).where(contacts_table.c.id == bindparam('contact_id')).values(values),
+                params
+            )
+
+        for resource_name, contact_type, outcome in results:
+            summary[outcome] += 1
+            contact_id = new_ids.get(resource_name) or existing[resource_name].id
+            summary['results'].append({
+                'resource_name': resource_name,
+                'id': contact_id,
+                'type': contact_type,
+                'outcome': outcome
+            })
+
+    logger.info(f"Imported Google contacts for user {user_id}: created {summary['created']}, "
+                f"updated {summary['updated']}, skipped {summary['skipped']}")
+    return summary
@@ -0,0 +1,183 @@
+"""
+Cached Google API clients for Mobilize CRM
+Built service objects are kept per (user, API, scopes) so requests and sync
+jobs don't rebuild clients, re-read stored tokens, or re-parse discovery
+documents on every call.
+"""
+from collections import OrderedDict
+import hashlib
+import logging
+import threading
+import time
+
+from flask import current_app, has_request_context, session
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+import google_auth_httplib2
+import httplib2
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+# Defaults, overridable with GOOGLE_SERVICE_CACHE_TTL / GOOGLE_SERVICE_CACHE_SIZE
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class _StoredCredentials(Credentials):
+    """Credentials that save refreshed access tokens back to token storage"""
+
+    def __init__(self, *args, on_refresh=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_refresh = on_refresh
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, request):
+        with self._refresh_lock:
+            super().refresh(request)
+        logger.info("Google access token refreshed")
+        if self._on_refresh:
+            self._on_refresh(self.token)
+
+
+class _CacheEntry:
+    def __init__(self, service, credentials, access_token, expires_at):
+        self.service = service
+        self.credentials = credentials
+        # Tokens this entry answers for: the one it was built with and any it refreshed to
+        self.tokens = {access_token}
+        self.expires_at = expires_at
+
+
+def _current_user_id():
+    """Best-effort user ID for the current request, without verifying tokens"""
+    if has_request_context():
+        return session.get('user_id')
+    return None
+
+
+def _token_key(access_token):
+    return 'token:' + hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:32]
+
+
+def _load_refresh_credentials(user_id):
+    """Look up the stored refresh token for a user, if any"""
+    if not user_id:
+        return None
+    from routes.google_auth import get_stored_user_tokens
+    tokens = get_stored_user_tokens(user_id)
+    if tokens and tokens.get('refresh_token'):
+        return tokens
+    return None
+
+
+def _make_refresh_callback(app, user_id, key):
+    def on_refresh(token):
+        with _lock:
+            entry = _cache.get(key)
+            if entry:
+                entry.tokens.add(token)
+        if user_id:
+            from routes.google_auth import save_refreshed_access_token
+            with app.app_context():
+                save_refreshed_access_token(user_id, token)
+    return on_refresh
+
+
+def _build_entry(api, version, scopes, access_token, user_id, key):
+    app = current_app._get_current_object()
+    stored = _load_refresh_credentials(user_id)
+
+    if stored:
+        credentials = _StoredCredentials(
+            token=access_token,
+            refresh_token=stored['refresh_token'],
+            token_uri=stored.get('token_uri') or TOKEN_URI,
+            client_id=app.config.get('GOOGLE_CLIENT_ID') or stored.get('client_id'),
+            client_secret=app.config.get('GOOGLE_CLIENT_SECRET') or stored.get('client_secret'),
+            scopes=list(scopes),
+            on_refresh=_make_refresh_callback(app, user_id, key)
+        )
+    else:
+        # Without a refresh token the client works until the access token expires
+        credentials = _StoredCredentials(token=access_token, scopes=list(scopes))
+
+    # httplib2 connections are not thread-safe, so every request gets its own
+    # authorized transport while the service object itself is shared
+    def request_builder(http, *args, **kwargs):
+        authorized_http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        return HttpRequest(authorized_http, *args, **kwargs)
+
+    service = build(
+        api,
+        version,
+        requestBuilder=request_builder,
+        http=google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http()),
+        static_discovery=True,
+        cache_discovery=False
+    )
+
+    ttl = app.config.get('GOOGLE_SERVICE_CACHE_TTL', DEFAULT_TTL)
+    return _CacheEntry(service, credentials, access_token, time.monotonic() + ttl)
+
+
+def get_google_service(api, version, scopes, access_token, user_id=None):
+    """
+    Get a Google API service object, reusing a cached one when possible
+
+    Args:
+        api: API name, e.g. 'gmail'
+        version: API version, e.g. 'v1'
+        scopes: OAuth scopes the client needs
+        access_token: Google OAuth access token for the user
+        user_id: Owner of the token; defaults to the signed-in user. When known,
+            the stored refresh token is used and refreshed tokens are saved back.
+
+    Returns:
+        The service object, or None if no access token was given
+    """
+    if not access_token:
+        logger.error(f"No token provided to build {api} service")
+        return None
+
+    user_id = user_id or _current_user_id()
+    key = (user_id or _token_key(access_token), api, version, tuple(sorted(scopes)))
+    now = time.monotonic()
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry.expires_at > now and access_token in entry.tokens:
+            _cache.move_to_end(key)
+            return entry.service
+
+    entry = _build_entry(api, version, scopes, access_token, user_id, key)
+
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        max_entries = current_app.config.get('GOOGLE_SERVICE_CACHE_SIZE', DEFAULT_MAX_ENTRIES)
+        while len(_cache) > max_entries:
+            _cache.popitem(last=False)
+
+    logger.debug(f"Built {api} {version} service for {user_id or 'anonymous token'}")
+    return entry.service
+
+
+def clear_google_service_cache(user_id=None):
+    """
+    Drop cached service objects
+
+    Args:
+        user_id: Only drop this user's services; drops everything if None
+    """
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            for key in [key for key in _cache if key[0] == user_id]:
+                del _cache[key]
@@ -0,0 +1,121 @@
+"""
+Keyset (seek) pagination helpers for list pages and APIs
+"""
+import base64
+import json
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded"""
+
+
+def encode_cursor(values):
+    """
+    Encode the sort key values of the last row on a page as an opaque cursor
+
+    Args:
+        values: JSON-serializable list of values, e.g. [sort_value, id]
+
+    Returns:
+        str: URL-safe cursor string
+    """
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Args:
+        cursor: Cursor string from a previous page
+
+    Returns:
+        list: The encoded values
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list):
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a requested page size, clamped to 1..maximum"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def keyset_page(query, sort_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False,
+                decode_value=None):
+    """
+    Fetch one page of a query ordered by (sort_column, id_column)
+
+    Rows after the cursor are selected with a seek predicate instead of an
+    OFFSET, so every page costs the same no matter how deep it is. The sort
+    column must not be NULL (wrap it in coalesce if needed) and each row must
+    expose the sort value and id as the labels 'sort_key' and 'id'.
+
+    Args:
+        query: Query selecting the page rows, including sort_column labelled 'sort_key'
+        sort_column: Column or expression to sort by
+        id_column: Unique tie-breaker column
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Page size
+        descending: Sort newest/largest first
+        decode_value: Converts the sort value read from the cursor back to the
+            column's type, e.g. datetime.fromisoformat for DateTime columns
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise InvalidCursorError(f"Invalid cursor: {cursor}")
+        last_value, last_id = values
+        if decode_value is not None:
+            try:
+                last_value = decode_value(last_value)
+            except (TypeError, ValueError) as e:
+                raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+        if descending:
+            query = query.filter(or_(
+                sort_column < last_value,
+                and_(sort_column == last_value, id_column < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > last_value,
+                and_(sort_column == last_value, id_column > last_id)
+            ))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # Fetch one extra row to find out whether there is another page
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last.sort_key, last.id])
+    return rows, next_cursor
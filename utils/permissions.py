@@ -1,9 +1,12 @@
 """
 Permission checking middleware for role-based access control.
+
+Every check is answered from the user's cached AccessContext (see
+utils.access_context), so a request reads office memberships at most once.
 """
 from functools import wraps
 from flask import redirect, url_for, flash, current_app, request
-from models import UserOffice, session_scope
+from utils.access_context import get_access_context
 from utils.auth import get_current_user_id
 
 def has_permission(permission_name):
@@ -48,8 +51,10 @@ def check_permission(user_id, permission_name):
     Returns:
         bool: True if the user has the permission, False otherwise.
     """
+    access = get_access_context(user_id)
+
     # Super admins have all permissions
-    if is_super_admin(user_id):
+    if access.is_super_admin:
         return True
     
     # TODO: Implement more granular permission checking based on the permission_name
@@ -61,19 +66,19 @@ def check_permission(user_id, permission_name):
         return True
     elif permission_name == 'add_church':
         # Office admins and standard users can add churches
-        return has_role(user_id, ['office_admin', 'standard_user'])
+        return access.has_role(['office_admin', 'standard_user'])
     elif permission_name == 'edit_church':
         # Office admins and standard users can edit churches
-        return has_role(user_id, ['office_admin', 'standard_user'])
+        return access.has_role(['office_admin', 'standard_user'])
     elif permission_name == 'delete_church':
         # Only office admins can delete churches
-        return has_role(user_id, ['office_admin'])
+        return access.has_role(['office_admin'])
     elif permission_name == 'manage_offices':
-        # Only super admins can manage offices
-        return is_super_admin(user_id)
+        # Only super admins can manage offices, and they returned above
+        return False
     elif permission_name == 'manage_users':
         # Only super admins and office admins can manage users
-        return has_role(user_id, ['super_admin', 'office_admin'])
+        return access.has_role(['super_admin', 'office_admin'])
     
     # Default to denying permission
     return False
@@ -88,12 +93,7 @@ def is_super_admin(user_id):
     Returns:
         bool: True if the user is a super admin, False otherwise.
     """
-    with session_scope() as session:
-        user_office = session.query(UserOffice).filter_by(
-            user_id=user_id, 
-            role='super_admin'
-        ).first()
-        return user_office is not None
+    return get_access_context(user_id).is_super_admin
 
 def is_office_admin(user_id, office_id):
     """
@@ -106,13 +106,7 @@ def is_office_admin(user_id, office_id):
     Returns:
         bool: True if the user is an admin for the office, False otherwise.
     """
-    with session_scope() as session:
-        user_office = session.query(UserOffice).filter_by(
-            user_id=user_id, 
-            office_id=office_id,
-            role='office_admin'
-        ).first()
-        return user_office is not None
+    return get_access_context(user_id).is_office_admin(office_id)
 
 def has_role(user_id, roles):
     """
@@ -125,12 +119,7 @@ def has_role(user_id, roles):
     Returns:
         bool: True if the user has any of the roles, False otherwise.
     """
-    with session_scope() as session:
-        user_office = session.query(UserOffice).filter(
-            UserOffice.user_id == user_id,
-            UserOffice.role.in_(roles)
-        ).first()
-        return user_office is not None
+    return get_access_context(user_id).has_role(roles)
 
 def get_user_role(user_id, office_id):
     """
@@ -143,9 +132,5 @@ def get_user_role(user_id, office_id):
     Returns:
         str: The user's role in the office, or None if the user has no role.
     """
-    with session_scope() as session:
-        user_office = session.query(UserOffice).filter_by(
-            user_id=user_id, 
-            office_id=office_id
-        ).first()
-        return user_office.role if user_office else None 
\ No newline at end of file
+    return get_access_context(user_id).role_in(office_id)
+ 
\ No newline at end of file
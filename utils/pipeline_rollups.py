@@ -0,0 +1,395 @@
+"""
+Pipeline analytics backed by the pipeline_rollups table
+Every Person and Church falls in one bucket of (type, office, owner, pipeline
+stage, priority, assigned_to). Flushes that add, move or remove a contact
+record the change as entered/exited counts on today's row for each bucket, so
+funnel, conversion-over-time and workload charts never read the contact tables.
+People take the office of their church. Bulk statements that bypass the ORM
+record their effect with bucket_counts/record_bucket_changes, and
+rebuild_pipeline_rollups recomputes everything from the contact tables.
+"""
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+import logging
+
+from sqlalchemy import and_, delete, event, func, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import (Contacts, Person, Church, PipelineRollup, PEOPLE_PIPELINE_CHOICES,
+                    CHURCH_PIPELINE_CHOICES)
+
+logger = logging.getLogger(__name__)
+
+PERSON = 'person'
+CHURCH = 'church'
+
+# Stored for contacts without an office
+NO_OFFICE = 0
+
+PERIODS = ('day', 'week', 'month')
+
+STAGE_ORDER = {
+    PERSON: [choice[0] for choice in PEOPLE_PIPELINE_CHOICES],
+    CHURCH: [choice[0] for choice in CHURCH_PIPELINE_CHOICES],
+}
+
+BUCKET_COLUMNS = ('contact_type', 'office_id', 'user_id', 'pipeline_stage', 'priority', 'assigned_to')
+
+# Attributes each model's bucket is computed from
+_TRACKED_ATTRIBUTES = {
+    Person: ('user_id', 'church_id', 'people_pipeline', 'priority', 'assigned_to'),
+    Church: ('office_id', 'church_pipeline', 'priority', 'assigned_to'),
+}
+
+_DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+_rollups = PipelineRollup.__table__
+
+
+def _label(value):
+    return (value or '').strip().upper()
+
+
+def _bucket(contact_type, office_id, user_id, stage, priority, assigned_to):
+    return (contact_type, office_id or NO_OFFICE, user_id or '', _label(stage), _label(priority), _label(assigned_to))
+
+
+def _attribute_values(obj, attributes):
+    """Values of the tracked attributes before and after the flush"""
+    state = inspect(obj)
+    before, after = {}, {}
+    for name in attributes:
+        history = state.attrs[name].load_history()
+        unchanged = history.unchanged[0] if history.unchanged else None
+        before[name] = history.deleted[0] if history.deleted else unchanged
+        after[name] = history.added[0] if history.added else unchanged
+    return before, after
+
+
+def _church_offices(connection, church_ids):
+    church_ids = {church_id for church_id in church_ids if church_id}
+    if not church_ids:
+        return {}
+    churches = Church.__table__
+    rows = connection.execute(select(churches.c.id, churches.c.office_id).where(churches.c.id.in_(church_ids)))
+    return {row.id: row.office_id for row in rows}
+
+
+def _person_bucket(values, offices):
+    return _bucket(PERSON, offices.get(values['church_id']), values['user_id'], values['people_pipeline'],
+                   values['priority'], values['assigned_to'])
+
+
+def _church_bucket(values):
+    return _bucket(CHURCH, values['office_id'], None, values['church_pipeline'], values['priority'],
+                   values['assigned_to'])
+
+
+def _apply_deltas(connection, deltas, day):
+    """Add entered/exited counts to each bucket's row for the day"""
+    rows = [
+        dict(zip(BUCKET_COLUMNS, bucket), day=day, entered=counts[0], exited=counts[1])
+        for bucket, counts in deltas.items() if counts[0] or counts[1]
+    ]
+    if not rows:
+        return
+
+    insert = _DIALECT_INSERTS.get(connection.dialect.name)
+    if insert is None:
+        logger.warning(f"Pipeline rollups can't be updated incrementally on {connection.dialect.name}; "
+                       f"run rebuild_pipeline_rollups to refresh them")
+        return
+
+    stmt = insert(_rollups)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(BUCKET_COLUMNS) + ['day'],
+        set_={
+            'entered': _rollups.c.entered + stmt.excluded.entered,
+            'exited': _rollups.c.exited + stmt.excluded.exited,
+        }
+    )
+    connection.execute(stmt, rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_pipeline_changes(session, flush_context):
+    changes = []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        model = Person if isinstance(obj, Person) else Church if isinstance(obj, Church) else None
+        if model is None:
+            continue
+        before, after = _attribute_values(obj, _TRACKED_ATTRIBUTES[model])
+        if obj in session.new:
+            before = None
+        elif obj in session.deleted:
+            after = None
+        elif before == after:
+            continue
+        changes.append((obj, model, before, after))
+
+    if not changes:
+        return
+
+    connection = session.connection()
+    offices = _church_offices(connection, [
+        values['church_id'] for _, model, before, after in changes if model is Person
+        for values in (before, after) if values
+    ])
+    moved_people = {obj.id for obj, model, _, _ in changes if model is Person}
+
+    deltas = defaultdict(lambda: [0, 0])
+    for obj, model, before, after in changes:
+        if model is Person:
+            old = _person_bucket(before, offices) if before else None
+            new = _person_bucket(after, offices) if after else None
+        else:
+            old = _church_bucket(before) if before else None
+            new = _church_bucket(after) if after else None
+            if before and after and before['office_id'] != after['office_id']:
+                _move_church_people(connection, obj.id, before['office_id'], after['office_id'],
+                                    moved_people, deltas)
+        if old == new:
+            continue
+        if old:
+            deltas[old][1] += 1
+        if new:
+            deltas[new][0] += 1
+
+    _apply_deltas(connection, deltas, date.today())
+
+
+def _move_church_people(connection, church_id, old_office_id, new_office_id, skip_ids, deltas):
+    """Move the people of a church that changed office into the new office's buckets"""
+    people = Person.__table__
+    query = (
+        select(people.c.user_id, people.c.people_pipeline, people.c.priority, people.c.assigned_to,
+               func.count().label('count'))
+        .where(people.c.church_id == church_id)
+        .group_by(people.c.user_id, people.c.people_pipeline, people.c.priority, people.c.assigned_to)
+    )
+    if skip_ids:
+        query = query.where(people.c.id.notin_(skip_ids))
+    for row in connection.execute(query):
+        deltas[_bucket(PERSON, old_office_id, row.user_id, row.people_pipeline, row.priority, row.assigned_to)][1] += row.count
+        deltas[_bucket(PERSON, new_office_id, row.user_id, row.people_pipeline, row.priority, row.assigned_to)][0] += row.count
+
+
+def _grouped_buckets(connection, contact_type, where=None, by_day=False):
+    """Count contacts per bucket (and per day) straight from the contact tables"""
+    contacts = Contacts.__table__
+    people = Person.__table__
+    churches = Church.__table__
+
+    if contact_type == PERSON:
+        columns = [churches.c.office_id, people.c.user_id, people.c.people_pipeline, people.c.priority,
+                   people.c.assigned_to]
+        source = people.join(contacts, contacts.c.id == people.c.id).outerjoin(
+            churches, churches.c.id == people.c.church_id)
+    else:
+        columns = [churches.c.office_id, churches.c.church_pipeline, churches.c.priority, churches.c.assigned_to]
+        source = churches.join(contacts, contacts.c.id == churches.c.id)
+    if by_day:
+        columns.append(func.coalesce(contacts.c.date_modified, contacts.c.date_created, date.today()).label('day'))
+
+    query = select(*columns, func.count().label('count')).select_from(source).where(
+        contacts.c.type == contact_type)
+    if where is not None:
+        query = query.where(where)
+
+    # Labels are normalised after grouping, so merge rows that now share a bucket
+    counts = Counter()
+    for row in connection.execute(query.group_by(*columns)):
+        if contact_type == PERSON:
+            bucket = _bucket(PERSON, row.office_id, row.user_id, row.people_pipeline, row.priority, row.assigned_to)
+        else:
+            bucket = _bucket(CHURCH, row.office_id, None, row.church_pipeline, row.priority, row.assigned_to)
+        counts[bucket + (row.day,) if by_day else bucket] += row.count
+    return counts
+
+
+def bucket_counts(session, contact_type, ids=None, church_ids=None):
+    """
+    Count contacts per bucket, for recording a bulk change with record_bucket_changes
+
+    Args:
+        session: Database session
+        contact_type: PERSON or CHURCH
+        ids: Only these contacts
+        church_ids: Only people belonging to these churches
+
+    Returns:
+        Counter: bucket -> number of contacts
+    """
+    if contact_type == PERSON:
+        table = Person.__table__
+        where = table.c.id.in_(ids) if ids is not None else table.c.church_id.in_(church_ids or [])
+    else:
+        where = Church.__table__.c.id.in_(ids or [])
+    return _grouped_buckets(session.connection(), contact_type, where)
+
+
+def record_bucket_changes(session, before, after):
+    """
+    Record a bulk change that bypassed the ORM, given bucket_counts from before and after it
+
+    Contacts that left a bucket are counted as exiting it today and the
+    bucket's gain as entering, so the funnel stays exact.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for bucket in set(before) | set(after):
+        change = after.get(bucket, 0) - before.get(bucket, 0)
+        if change > 0:
+            deltas[bucket][0] += change
+        elif change < 0:
+            deltas[bucket][1] -= change
+    _apply_deltas(session.connection(), deltas, date.today())
+
+
+def rebuild_pipeline_rollups(session):
+    """
+    Recompute all rollups from the contact tables
+
+    Each contact is counted as having entered its current bucket on its
+    date_modified (or date_created, or today), so history from before the
+    rebuild is collapsed into those days.
+
+    Returns:
+        int: Number of contacts counted
+    """
+    connection = session.connection()
+    counts = _grouped_buckets(connection, PERSON, by_day=True) + _grouped_buckets(connection, CHURCH, by_day=True)
+
+    connection.execute(delete(_rollups))
+    if counts:
+        connection.execute(_rollups.insert(), [
+            dict(zip(BUCKET_COLUMNS + ('day',), key), entered=count, exited=0)
+            for key, count in counts.items()
+        ])
+
+    total = sum(counts.values())
+    logger.info(f"Rebuilt pipeline rollups from {total} contacts into {len(counts)} rows")
+    return total
+
+
+def _filters(contact_type, office_id=None, user_id=None, priority=None, assigned_to=None):
+    clauses = [_rollups.c.contact_type == contact_type]
+    if office_id is not None:
+        clauses.append(_rollups.c.office_id == office_id)
+    if user_id is not None:
+        clauses.append(_rollups.c.user_id == user_id)
+    if priority:
+        clauses.append(_rollups.c.priority == _label(priority))
+    if assigned_to:
+        clauses.append(_rollups.c.assigned_to == _label(assigned_to))
+    return and_(*clauses)
+
+
+def _ordered_stages(contact_type, stages):
+    known = [stage for stage in STAGE_ORDER[contact_type] if stage in stages]
+    return known + sorted(stage for stage in stages if stage not in known)
+
+
+def pipeline_funnel(session, contact_type, **filters):
+    """
+    Current number of contacts in each pipeline stage
+
+    Args:
+        session: Database session
+        contact_type: PERSON or CHURCH
+        **filters: office_id, user_id, priority and assigned_to
+
+    Returns:
+        list: Dicts with stage and count, in pipeline order; '' is the stage of
+        contacts without one
+    """
+    rows = session.execute(
+        select(_rollups.c.pipeline_stage, func.sum(_rollups.c.entered - _rollups.c.exited).label('count'))
+        .where(_filters(contact_type, **filters))
+        .group_by(_rollups.c.pipeline_stage)
+    ).all()
+    counts = {row.pipeline_stage: int(row.count or 0) for row in rows}
+    stages = _ordered_stages(contact_type, set(STAGE_ORDER[contact_type]) | set(counts))
+    return [{'stage': stage, 'count': counts.get(stage, 0)} for stage in stages]
+
+
+def _period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def pipeline_conversions(session, contact_type, start, end, period='week', **filters):
+    """
+    Number of contacts entering each stage per period
+
+    Args:
+        session: Database session
+        contact_type: PERSON or CHURCH
+        start, end: Inclusive date range
+        period: 'day', 'week' (starting Monday) or 'month'
+        **filters: office_id, user_id, priority and assigned_to
+
+    Returns:
+        dict: periods (ISO dates of each period start) and stages, mapping each
+        stage to its entered counts per period
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    rows = session.execute(
+        select(_rollups.c.day, _rollups.c.pipeline_stage, func.sum(_rollups.c.entered).label('entered'))
+        .where(_filters(contact_type, **filters), _rollups.c.day >= start, _rollups.c.day <= end)
+        .group_by(_rollups.c.day, _rollups.c.pipeline_stage)
+    ).all()
+
+    periods = []
+    current = _period_start(start, period)
+    while current <= end:
+        periods.append(current)
+        if period == 'day':
+            current += timedelta(days=1)
+        elif period == 'week':
+            current += timedelta(weeks=1)
+        else:
+            current = (current + timedelta(days=32)).replace(day=1)
+    index = {value: i for i, value in enumerate(periods)}
+
+    stages = _ordered_stages(contact_type, {row.pipeline_stage for row in rows})
+    series = {stage: [0] * len(periods) for stage in stages}
+    for row in rows:
+        series[row.pipeline_stage][index[_period_start(row.day, period)]] += int(row.entered or 0)
+
+    return {'periods': [value.isoformat() for value in periods], 'stages': series}
+
+
+def staff_workload(session, contact_type, **filters):
+    """
+    Current contacts per assigned staff member, split by pipeline stage
+
+    Returns:
+        list: Dicts with assigned_to, total and stages (stage -> count), largest first
+    """
+    rows = session.execute(
+        select(_rollups.c.assigned_to, _rollups.c.pipeline_stage,
+               func.sum(_rollups.c.entered - _rollups.c.exited).label('count'))
+        .where(_filters(contact_type, **filters))
+        .group_by(_rollups.c.assigned_to, _rollups.c.pipeline_stage)
+    ).all()
+
+    workload = defaultdict(dict)
+    for row in rows:
+        if row.count:
+            workload[row.assigned_to][row.pipeline_stage] = int(row.count)
+
+    result = [
+        {'assigned_to': assigned_to, 'total': sum(stages.values()),
+         'stages': {stage: stages[stage] for stage in _ordered_stages(contact_type, set(stages))}}
+        for assigned_to, stages in workload.items()
+    ]
+    return sorted(result, key=lambda item: (-item['total'], item['assigned_to']))
@@ -0,0 +1,160 @@
+"""
+SQL query counts and database time per request
+
+Every statement run on any engine is timed. Inside a request the count and
+total time are kept on flask.g and, when QUERY_STATS_HEADERS is on, returned
+as X-Query-Count and Server-Timing response headers. Statements slower than
+SLOW_QUERY_THRESHOLD_MS are logged with the route that ran them.
+
+Tests can cap the queries an endpoint runs:
+
+    with assert_max_queries(3):
+        client.get('/people/')
+"""
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_QUERY_THRESHOLD_MS = 500
+
+# Longest statement text written to the slow query log
+MAX_LOGGED_STATEMENT = 2000
+
+_START_KEY = 'query_stats_started'
+
+# QueryStats collecting statements from every thread, see count_queries
+_collectors = []
+_collectors_lock = threading.Lock()
+
+
+class QueryStats:
+    """Number of statements run and their total time"""
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = [] if keep_statements else None
+        self._lock = threading.Lock()
+
+    def record(self, statement, seconds):
+        with self._lock:
+            self.count += 1
+            self.duration += seconds
+            if self.statements is not None:
+                self.statements.append(statement)
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return getattr(get_config(), name, default)
+
+
+def _route():
+    """Describe the request running a statement, for the slow query log"""
+    if not has_request_context():
+        return 'outside a request'
+    return f"{request.method} {request.path} ({request.endpoint})"
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get(_START_KEY)
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+
+    if has_request_context():
+        stats = g.get('query_stats')
+        if stats is not None:
+            stats.record(statement, seconds)
+    if _collectors:
+        with _collectors_lock:
+            collectors = list(_collectors)
+        for stats in collectors:
+            stats.record(statement, seconds)
+
+    threshold = _setting('SLOW_QUERY_THRESHOLD_MS', DEFAULT_SLOW_QUERY_THRESHOLD_MS)
+    if threshold and seconds * 1000 >= threshold:
+        logger.warning(
+            f"Slow query ({seconds * 1000:.1f}ms) in {_route()}: "
+            f"{' '.join(statement.split())[:MAX_LOGGED_STATEMENT]}"
+        )
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_timer(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get(_START_KEY) if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def init_query_stats(app):
+    """Collect query stats for every request and add the response headers if enabled"""
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def add_query_stats_headers(response):
+        stats = g.get('query_stats')
+        if stats is None or not app.config.get('QUERY_STATS_HEADERS'):
+            return response
+        response.headers['X-Query-Count'] = str(stats.count)
+        timing = f'db;dur={stats.duration_ms:.2f};desc="{stats.count} queries"'
+        existing = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        return response
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the statements run on any engine, from any thread, inside the block
+
+    Yields:
+        QueryStats: With statements holding the SQL of each one
+    """
+    stats = QueryStats(keep_statements=True)
+    with _collectors_lock:
+        _collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        with _collectors_lock:
+            _collectors.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Fail with the statements that ran if the block runs more than limit queries
+
+    Args:
+        limit: Most statements the block may run
+    """
+    with count_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        listing = '\n'.join(f"  {n}. {' '.join(sql.split())}" for n, sql in enumerate(stats.statements, 1))
+        raise AssertionError(f"Expected at most {limit} queries, {stats.count} ran:\n{listing}")
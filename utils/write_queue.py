@@ -0,0 +1,131 @@
+"""
+Serialized database writes for SQLite
+SQLite lets one connection write at a time, so concurrent Gmail and calendar
+syncs queue up on the database lock and web requests can time out behind them
+with "database is locked". Sync writes are handed to a single writer thread
+per database file instead: each one runs as its own short transaction, in
+submission order, with no network calls inside it. Readers are never blocked
+in WAL mode, and web requests wait for at most one sync transaction.
+
+On other databases, and for in-memory SQLite, writes run in the calling thread.
+"""
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+
+from sqlalchemy.orm import Session
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Writer per engine, started on first use
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class WriteQueue:
+    """Apply write transactions to one engine from a single thread, in order.
+
+    Usage:
+        queue = WriteQueue(engine)
+        inserted = queue.run(insert_rows, rows)  # insert_rows(session, rows)
+    """
+
+    def __init__(self, engine, max_pending=0):
+        self.engine = engine
+        self.completed = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._work, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(session, *args, **kwargs) to run in its own transaction
+
+        Returns:
+            Future: Resolves to func's return value once the transaction has committed
+        """
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # Already on the writer; queueing would wait on ourselves
+            self._apply(future, func, args, kwargs)
+        else:
+            self._queue.put((future, func, args, kwargs))
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """Queue a write and wait for it to commit, returning func's result"""
+        return self.submit(func, *args, **kwargs).result()
+
+    def stats(self):
+        """Pending and finished write counts"""
+        return {'pending': self._queue.qsize(), 'completed': self.completed, 'failed': self.failed}
+
+    def _apply(self, future, func, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with Session(bind=self.engine) as session, session.begin():
+                result = func(session, *args, **kwargs)
+        except BaseException as e:
+            self.failed += 1
+            logger.error(f"Queued database write {getattr(func, '__name__', func)} failed: {str(e)}")
+            future.set_exception(e)
+        else:
+            self.completed += 1
+            future.set_result(result)
+
+    def _work(self):
+        while True:
+            future, func, args, kwargs = self._queue.get()
+            try:
+                self._apply(future, func, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+
+def uses_write_queue(bind):
+    """Whether writes to this engine go through a writer thread"""
+    if bind.dialect.name != 'sqlite' or not getattr(get_config(), 'SQLITE_WRITE_QUEUE', True):
+        return False
+    # Each thread would see its own in-memory database
+    return bind.url.database not in (None, '', ':memory:') and 'mode=memory' not in str(bind.url)
+
+
+def get_write_queue(bind):
+    """The writer thread for an engine, started on first use"""
+    with _queues_lock:
+        write_queue = _queues.get(bind)
+        if write_queue is None:
+            write_queue = _queues[bind] = WriteQueue(bind, getattr(get_config(), 'SQLITE_WRITE_QUEUE_SIZE', 0))
+            logger.info(f"Started database writer for {bind.url.render_as_string(hide_password=True)}")
+        return write_queue
+
+
+def run_serialized_write(bind, func, *args, **kwargs):
+    """
+    Run func(session, *args, **kwargs) in its own transaction and return its result
+
+    On file-backed SQLite the transaction runs on the engine's writer thread
+    and this call waits for it; elsewhere it runs here. func gets a fresh
+    session, so it should return plain values rather than ORM objects.
+
+    Args:
+        bind: Engine to write to
+        func: Function doing the writes; it must not commit
+    """
+    if uses_write_queue(bind):
+        return get_write_queue(bind).run(func, *args, **kwargs)
+    with Session(bind=bind) as session, session.begin():
+        return func(session, *args, **kwargs)
+
+
+def write_queue_stats():
+    """Pending and finished writes per database, for health checks"""
+    with _queues_lock:
+        queues = list(_queues.values())
+    return {write_queue.engine.url.render_as_string(hide_password=True): write_queue.stats()
+            for write_queue in queues}